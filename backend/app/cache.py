@@ -2,12 +2,12 @@
 
 import asyncio
 import hashlib
-import json
 import logging
 
 import redis.asyncio as redis
 
 from .config import get_settings
+from workers import portfolio_valuation
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -73,6 +73,17 @@ async def cache_set(key: str, value: str, expire_seconds: int = 300):
         logger.warning("Redis SET failed: %s", e)
 
 
+async def cache_mget(keys: list[str]) -> list[str | None]:
+    """여러 키를 MGET 한 번으로 조회. Redis 미연결/실패 시 전부 None."""
+    if redis_client is None or not keys:
+        return [None] * len(keys)
+    try:
+        return await asyncio.wait_for(redis_client.mget(keys), timeout=REDIS_OP_TIMEOUT_SEC)
+    except Exception as e:
+        logger.warning("Redis MGET failed: %s", e)
+        return [None] * len(keys)
+
+
 async def cache_delete(key: str):
     if redis_client is None:
         return
@@ -130,6 +141,20 @@ async def cache_set_with_last_good(key: str, value: str, expire_seconds: int = 3
     await cache_set(f"{key}:last_good", value, backup_ttl)
 
 
+async def cache_set_many_with_last_good(items: dict[str, str], expire_seconds: int = 300, backup_ttl: int = 86400):
+    """cache_set_with_last_good 다건 버전 (파이프라인 한 번)."""
+    if redis_client is None or not items:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.setex(key, expire_seconds, value)
+            pipe.setex(f"{key}:last_good", backup_ttl, value)
+        await asyncio.wait_for(pipe.execute(), timeout=REDIS_OP_TIMEOUT_SEC)
+    except Exception as e:
+        logger.warning("Redis pipeline SET failed: %s", e)
+
+
 async def blacklist_token(token: str, expire_seconds: int = 1800):
     if redis_client is None:
         return
@@ -154,34 +179,70 @@ async def is_token_blacklisted(token: str) -> bool:
         return False
 
 
-PORTFOLIO_CACHE_TTL = 60
+# 자산 목록 평가금액: workers/portfolio_valuation (사용자별 hash + symbol→users 역색인, tick마다 증분 갱신)
+
+
+async def get_portfolio_valuation(user_id: str) -> dict | None:
+    if redis_client is None:
+        return None
+    try:
+        return await asyncio.wait_for(
+            portfolio_valuation.read_portfolio(redis_client, user_id), timeout=REDIS_OP_TIMEOUT_SEC
+        )
+    except Exception as e:
+        logger.warning("Portfolio valuation get failed: %s", e)
+        return None
 
 
-async def cache_portfolio(user_id: str, portfolio_data: dict):
+async def store_portfolio_valuation(user_id: str, holdings: list[dict]):
     if redis_client is None:
         return
     try:
-        key = f"portfolio:{user_id}"
         await asyncio.wait_for(
-            redis_client.setex(key, PORTFOLIO_CACHE_TTL, json.dumps(portfolio_data, default=str)),
-            timeout=REDIS_OP_TIMEOUT_SEC,
+            portfolio_valuation.replace_portfolio(redis_client, user_id, holdings), timeout=REDIS_OP_TIMEOUT_SEC
         )
     except Exception as e:
-        logger.warning("Portfolio cache set failed: %s", e)
+        logger.warning("Portfolio valuation set failed: %s", e)
 
 
-async def get_cached_portfolio(user_id: str) -> dict | None:
+async def update_portfolio_holding(user_id: str, holding: dict) -> bool:
+    """종목 하나만 반영. 빌드된 평가 결과가 없거나 실패하면 False (다음 조회 때 다시 빌드)."""
     if redis_client is None:
-        return None
+        return False
     try:
-        key = f"portfolio:{user_id}"
-        cached = await asyncio.wait_for(redis_client.get(key), timeout=REDIS_OP_TIMEOUT_SEC)
-        if cached:
-            return json.loads(cached)
+        return await asyncio.wait_for(
+            portfolio_valuation.upsert_holding(redis_client, user_id, holding), timeout=REDIS_OP_TIMEOUT_SEC
+        )
+    except Exception as e:
+        logger.warning("Portfolio holding update failed: %s", e)
+        await invalidate_portfolio_cache(user_id)
+        return False
+
+
+async def remove_portfolio_holding(user_id: str, asset_id: str):
+    if redis_client is None:
+        return
+    try:
+        await asyncio.wait_for(
+            portfolio_valuation.remove_holding(redis_client, user_id, asset_id), timeout=REDIS_OP_TIMEOUT_SEC
+        )
+    except Exception as e:
+        logger.warning("Portfolio holding remove failed: %s", e)
+        await invalidate_portfolio_cache(user_id)
+
+
+async def mark_portfolio_prices(prices: dict[str, float]) -> int:
+    """{symbol: 원 통화 가격}을 보유자 평가금액에 반영 (price_consumer tick과 같은 apply_ticks)."""
+    if redis_client is None or not prices:
+        return 0
+    try:
+        return await asyncio.wait_for(
+            portfolio_valuation.apply_ticks(redis_client, prices), timeout=REDIS_OP_TIMEOUT_SEC
+        )
     except Exception as e:
-        logger.warning("Portfolio cache get failed: %s", e)
-    return None
+        logger.warning("Portfolio valuation tick failed: %s", e)
+        return 0
 
 
 async def invalidate_portfolio_cache(user_id: str):
-    await cache_delete(f"portfolio:{user_id}")
+    await cache_delete(portfolio_valuation.portfolio_key(user_id))
@@ -58,6 +58,7 @@ class Settings(BaseSettings):
     # 기본값은 현재 EKS in-cluster Service 주소를 사용한다.
     # 로컬/특수 환경은 환경변수 ELASTICSEARCH_URL로 덮어쓴다.
     ELASTICSEARCH_URL: str = "http://elasticsearch.tutum-data.svc.cluster.local:9200"
+    # 검색용 read alias (물리 인덱스는 news_v{N}, workers/reindex_es.py가 alias를 원자적으로 전환)
     ELASTICSEARCH_INDEX: str = "news"
 
     # Storage 설정 (S3 / MinIO fallback)
@@ -56,6 +56,23 @@ def get_news_collection():
     return database["news"]
 
 
+def get_candles_collection(resolution: str = "1m"):
+    """Return candle collection written by candle_aggregator (candles_1m, candles_1h, ...)."""
+    if database is None:
+        return None
+    return database[f"candles_{resolution}"]
+
+
+async def ensure_indexes():
+    """Keyset pagination indexes: (sort key, _id) descending, see app/pagination.py."""
+    if database is None:
+        return
+    await database["transactions"].create_index(
+        [("user_id", 1), ("transaction_date", -1), ("_id", -1)], name="idx_user_date_id"
+    )
+    await database["news"].create_index([("published_at_ts", -1), ("_id", -1)], name="idx_published_id")
+
+
 def get_db():
     """Alias for get_database."""
     return database
@@ -20,7 +20,7 @@ from prometheus_fastapi_instrumentator import Instrumentator
 
 from .cache import close_redis_connection, connect_to_redis
 from .config import get_settings
-from .database import close_mongodb_connection, connect_to_mongodb
+from .database import close_mongodb_connection, connect_to_mongodb, ensure_indexes, get_database
 from .mariadb import (
     close_mariadb_connection,
     connect_to_mariadb,
@@ -38,6 +38,8 @@ from .routers import (
     exchange_rate,
 )
 from .services.alert_service import MarketMonitor
+from .services import trading_analytics
+from .services.http_clients import http_clients
 
 
 class TraceContextFilter(logging.Filter):
@@ -131,6 +133,7 @@ async def lifespan(app: FastAPI):
     await connect_to_mongodb()
     await connect_to_mariadb()
     await connect_to_redis()
+    await http_clients.start()
 
     # 기존 DB 중복 포트폴리오 항목 병합
     try:
@@ -138,7 +141,16 @@ async def lifespan(app: FastAPI):
         if merged > 0:
             logger.info("Merged %d duplicate portfolio entries", merged)
     except Exception as e:
-        logger.warning("Portfolio dedup failed: %s", e)
+        # 유니크 키가 없으면 포트폴리오 추가는 행 단위 SELECT→UPDATE 병합으로 동작한다
+        logger.error("Portfolio dedup failed, upsert falls back to row-by-row merge: %s", e)
+
+    # Mongo 인덱스: keyset 페이지네이션(transactions, news) + 매매 분석 집계
+    if get_database() is not None:
+        try:
+            await ensure_indexes()
+            await trading_analytics.ensure_indexes(get_database())
+        except Exception as e:
+            logger.warning("Mongo index setup failed: %s", e)
 
     logger.info("All services registered")
 
@@ -146,6 +158,8 @@ async def lifespan(app: FastAPI):
     monitor_task = asyncio.create_task(monitor.start_monitoring())
     app.state.market_monitor = monitor
 
+    await market.price_hub.start()
+
     yield
 
     logger.info("Server shutting down")
@@ -155,6 +169,9 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         pass
 
+    await market.price_hub.stop()
+    await http_clients.close()
+
     await close_mongodb_connection()
     await close_mariadb_connection()
     await close_redis_connection()
@@ -177,6 +194,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
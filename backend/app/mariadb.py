@@ -19,9 +19,13 @@ from sqlalchemy import (
     Float,
     Integer,
     ForeignKey,
+    UniqueConstraint,
+    case,
     select,
     func,
+    text,
 )
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from datetime import datetime
 from typing import List
 
@@ -34,6 +38,12 @@ settings = get_settings()
 engine = None
 async_session_factory = None
 
+# (user_id, asset_code) 유니크 키: 포트폴리오 upsert(ON DUPLICATE KEY UPDATE)의 기준
+PORTFOLIO_UNIQUE_KEY = "uq_portfolios_user_asset"
+PORTFOLIO_MERGE_LOCK = "portfolios_merge_duplicates"
+# 유니크 키 존재 확인 결과 캐시. 키는 한 번 생기면 사라지지 않으므로 True만 기억한다.
+_portfolio_unique_key_ready = False
+
 
 # ============================================
 # ORM 모델
@@ -69,6 +79,9 @@ class Portfolio(Base):
     """사용자 포트폴리오 (보유 종목)"""
 
     __tablename__ = "portfolios"
+    __table_args__ = (
+        UniqueConstraint("user_id", "asset_code", name=PORTFOLIO_UNIQUE_KEY),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(
@@ -237,6 +250,36 @@ async def get_user_portfolios(user_id: int) -> list[Portfolio]:
         return list(result.scalars().all())
 
 
+def _portfolio_upsert(rows: list[dict]):
+    """다건 INSERT ... ON DUPLICATE KEY UPDATE.
+
+    동일 (user_id, asset_code)가 있으면 SQL에서 가중평균 매입가로 병합한다.
+    MySQL/MariaDB는 SET 절을 왼쪽부터 적용하므로 평단가를 수량보다 먼저 계산한다.
+    같은 문장 안의 중복 종목도 행 순서대로 차례로 병합된다.
+    """
+    stmt = mysql_insert(Portfolio).values(rows)
+    new = stmt.inserted
+    total_quantity = Portfolio.quantity + new.quantity
+    return stmt.on_duplicate_key_update(
+        [
+            (
+                "avg_buy_price",
+                case(
+                    (
+                        total_quantity > 0,
+                        (Portfolio.quantity * Portfolio.avg_buy_price + new.quantity * new.avg_buy_price)
+                        / total_quantity,
+                    ),
+                    else_=0,
+                ),
+            ),
+            ("quantity", total_quantity),
+            ("asset_name", new.asset_name),
+            ("updated_at", func.now()),
+        ]
+    )
+
+
 async def add_portfolio_item(
     user_id: int,
     asset_code: str,
@@ -247,44 +290,88 @@ async def add_portfolio_item(
     currency: str = "KRW",
 ) -> Portfolio:
     """포트폴리오에 종목 추가 (동일 종목 존재 시 수량/평단가 병합)"""
+    items = await bulk_upsert_portfolio_items(
+        user_id,
+        [
+            {
+                "asset_code": asset_code,
+                "asset_name": asset_name,
+                "asset_type": asset_type,
+                "quantity": quantity,
+                "avg_buy_price": avg_buy_price,
+                "currency": currency,
+            }
+        ],
+    )
+    return items[0]
+
+
+async def bulk_upsert_portfolio_items(user_id: int, items: list[dict]) -> list[Portfolio]:
+    """여러 종목을 upsert 한 문장 + 결과 SELECT 한 번으로 추가/병합.
+
+    items: asset_code, asset_name, asset_type, quantity, avg_buy_price, currency(선택)
+    Returns: 요청 순서대로 병합 후 종목 (같은 종목이 여러 번 오면 같은 행)
+    """
+    if not items:
+        return []
+    rows = [
+        {
+            "user_id": user_id,
+            "asset_code": item["asset_code"],
+            "asset_name": item["asset_name"],
+            "asset_type": item["asset_type"],
+            "quantity": item["quantity"],
+            "avg_buy_price": item["avg_buy_price"],
+            "currency": item.get("currency") or "KRW",
+        }
+        for item in items
+    ]
+    codes = list(dict.fromkeys(row["asset_code"] for row in rows))
     async with async_session_factory() as session:
-        # 동일 종목 존재 여부 확인
-        stmt = select(Portfolio).where(
-            Portfolio.user_id == user_id,
-            Portfolio.asset_code == asset_code,
+        if not await _portfolio_unique_key_exists(await session.connection()):
+            # 키가 없으면 ON DUPLICATE KEY UPDATE가 병합 없이 중복 행을 넣으므로 행 단위 병합으로 처리
+            return await _merge_portfolio_rows(session, rows)
+        await session.execute(_portfolio_upsert(rows))
+        await session.commit()
+        result = await session.execute(
+            select(Portfolio).where(Portfolio.user_id == user_id, Portfolio.asset_code.in_(codes))
         )
-        result = await session.execute(stmt)
-        existing = result.scalar_one_or_none()
+        by_code = {item.asset_code: item for item in result.scalars().all()}
+    return [by_code[row["asset_code"]] for row in rows]
 
-        if existing:
-            # 가중평균 매입가 계산 후 병합
-            total_cost = (existing.quantity * existing.avg_buy_price) + (
-                quantity * avg_buy_price
+
+async def _merge_portfolio_rows(session: AsyncSession, rows: list[dict]) -> list[Portfolio]:
+    """유니크 키가 없을 때의 병합 경로: 종목마다 SELECT 후 UPDATE 또는 INSERT.
+
+    기존 중복 행이 남아 있으면 merge_duplicate_portfolios와 같이 가장 오래된 행(MIN(id))에 병합한다.
+    """
+    merged: dict[str, Portfolio] = {}
+    for row in rows:
+        existing = merged.get(row["asset_code"])
+        if existing is None:
+            result = await session.execute(
+                select(Portfolio)
+                .where(Portfolio.user_id == row["user_id"], Portfolio.asset_code == row["asset_code"])
+                .order_by(Portfolio.id)
+                .limit(1)
             )
-            new_quantity = existing.quantity + quantity
+            existing = result.scalar_one_or_none()
+        if existing is None:
+            existing = Portfolio(**row)
+            session.add(existing)
+        else:
+            # 가중평균 매입가 계산 후 병합
+            total_cost = existing.quantity * existing.avg_buy_price + row["quantity"] * row["avg_buy_price"]
+            new_quantity = existing.quantity + row["quantity"]
             existing.quantity = new_quantity
-            existing.avg_buy_price = (
-                total_cost / new_quantity if new_quantity > 0 else 0
-            )
-            existing.asset_name = asset_name
+            existing.avg_buy_price = total_cost / new_quantity if new_quantity > 0 else 0
+            existing.asset_name = row["asset_name"]
             existing.updated_at = datetime.utcnow()
-            await session.commit()
-            await session.refresh(existing)
-            return existing
-
-        item = Portfolio(
-            user_id=user_id,
-            asset_code=asset_code,
-            asset_name=asset_name,
-            asset_type=asset_type,
-            quantity=quantity,
-            avg_buy_price=avg_buy_price,
-            currency=currency,
-        )
-        session.add(item)
-        await session.commit()
+        merged[row["asset_code"]] = existing
+    await session.commit()
+    for item in merged.values():
         await session.refresh(item)
-        return item
+    return [merged[row["asset_code"]] for row in rows]
 
 
 async def update_portfolio_item(
@@ -322,49 +409,89 @@ async def delete_portfolio_item(item_id: int, user_id: int) -> bool:
         return True
 
 
-async def merge_duplicate_portfolios() -> int:
-    """DB에 이미 존재하는 중복 포트폴리오 항목을 병합합니다. (startup 시 1회 실행)"""
-    if not async_session_factory:
-        return 0
+async def _has_portfolio_unique_key(conn) -> bool:
+    result = await conn.execute(
+        text(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = 'portfolios' AND index_name = :name LIMIT 1"
+        ),
+        {"name": PORTFOLIO_UNIQUE_KEY},
+    )
+    return result.first() is not None
 
-    merged_count = 0
-    async with async_session_factory() as session:
-        # 동일 user_id + asset_code 조합이 2개 이상인 경우 조회
-        from sqlalchemy import func as sa_func
 
-        dup_stmt = (
-            select(Portfolio.user_id, Portfolio.asset_code)
-            .group_by(Portfolio.user_id, Portfolio.asset_code)
-            .having(sa_func.count() > 1)
-        )
-        dup_result = await session.execute(dup_stmt)
-        duplicates = dup_result.all()
+async def _portfolio_unique_key_exists(conn) -> bool:
+    """유니크 키 존재 여부 (있다고 확인되면 이후 조회 생략)"""
+    global _portfolio_unique_key_ready
+    if not _portfolio_unique_key_ready:
+        _portfolio_unique_key_ready = await _has_portfolio_unique_key(conn)
+    return _portfolio_unique_key_ready
 
-        for user_id, asset_code in duplicates:
-            items_stmt = (
-                select(Portfolio)
-                .where(Portfolio.user_id == user_id, Portfolio.asset_code == asset_code)
-                .order_by(Portfolio.id)
-            )
-            items_result = await session.execute(items_stmt)
-            items = list(items_result.scalars().all())
 
-            if len(items) < 2:
-                continue
+async def merge_duplicate_portfolios() -> int:
+    """중복 (user_id, asset_code) 항목을 집합 연산 한 번으로 병합하고 유니크 키를 건다. (startup 시 실행)
+
+    유니크 키가 이미 있으면 중복이 생길 수 없으므로 바로 0을 반환한다.
+    여러 인스턴스가 동시에 떠도 GET_LOCK으로 한 곳에서만 병합한다.
+    Returns: 삭제(병합)된 행 수
+    """
+    global _portfolio_unique_key_ready
+    if not engine:
+        return 0
 
-            # 첫 번째 항목에 병합
-            primary = items[0]
-            for dup in items[1:]:
-                total_cost = (primary.quantity * primary.avg_buy_price) + (
-                    dup.quantity * dup.avg_buy_price
+    async with engine.connect() as conn:
+        if await _portfolio_unique_key_exists(conn):
+            return 0
+
+        locked = (await conn.execute(text("SELECT GET_LOCK(:name, 30)"), {"name": PORTFOLIO_MERGE_LOCK})).scalar()
+        if not locked:
+            return 0
+        try:
+            # 다른 인스턴스가 먼저 병합했을 수 있으므로 새 트랜잭션에서 다시 확인
+            await conn.commit()
+            if await _portfolio_unique_key_exists(conn):
+                return 0
+
+            # 그룹별 가장 오래된 행(MIN(id))에 수량 합계 + 가중평균 매입가
+            await conn.execute(
+                text(
+                    """
+                    UPDATE portfolios p
+                    JOIN (
+                        SELECT MIN(id) AS keep_id,
+                               SUM(quantity) AS total_quantity,
+                               SUM(quantity * avg_buy_price) AS total_cost
+                        FROM portfolios
+                        GROUP BY user_id, asset_code
+                        HAVING COUNT(*) > 1
+                    ) d ON p.id = d.keep_id
+                    SET p.avg_buy_price = IF(d.total_quantity > 0, d.total_cost / d.total_quantity, 0),
+                        p.quantity = d.total_quantity,
+                        p.updated_at = NOW()
+                    """
                 )
-                primary.quantity += dup.quantity
-                primary.avg_buy_price = (
-                    total_cost / primary.quantity if primary.quantity > 0 else 0
+            )
+            # 나머지 행 삭제
+            deleted = await conn.execute(
+                text(
+                    """
+                    DELETE p FROM portfolios p
+                    JOIN (
+                        SELECT user_id, asset_code, MIN(id) AS keep_id
+                        FROM portfolios
+                        GROUP BY user_id, asset_code
+                        HAVING COUNT(*) > 1
+                    ) d ON p.user_id = d.user_id AND p.asset_code = d.asset_code AND p.id <> d.keep_id
+                    """
                 )
-                primary.updated_at = datetime.utcnow()
-                await session.delete(dup)
-                merged_count += 1
+            )
+            await conn.commit()
 
-        await session.commit()
-    return merged_count
+            await conn.execute(
+                text(f"ALTER TABLE portfolios ADD UNIQUE KEY {PORTFOLIO_UNIQUE_KEY} (user_id, asset_code)")
+            )
+            await conn.commit()
+            _portfolio_unique_key_ready = True
+            return deleted.rowcount or 0
+        finally:
+            await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": PORTFOLIO_MERGE_LOCK})
@@ -0,0 +1,50 @@
+"""Keyset(cursor) pagination helpers.
+
+커서는 마지막 문서의 (정렬 키 값, _id)를 base64url(JSON)로 감싼 불투명 문자열이다.
+다음 페이지는 `정렬키 < 값 OR (정렬키 == 값 AND _id < 마지막 _id)` 조건으로 읽으므로
+(정렬키, _id) 복합 인덱스가 있으면 몇 번째 페이지든 첫 페이지와 비용이 같다.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def encode_cursor(value: Any, doc_id: Any) -> str:
+    if isinstance(value, datetime):
+        payload = {"d": value.isoformat(), "id": str(doc_id)}
+    else:
+        payload = {"v": value, "id": str(doc_id)}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[Any, ObjectId]:
+    """encode_cursor의 역. 형식이 맞지 않으면 ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        doc_id = ObjectId(payload["id"])
+        if "d" in payload:
+            return datetime.fromisoformat(payload["d"]), doc_id
+        return payload["v"], doc_id
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def keyset_filter(field: str, value: Any, doc_id: ObjectId) -> dict:
+    """(field, _id) 내림차순 정렬에서 커서 다음 문서들."""
+    return {"$or": [{field: {"$lt": value}}, {field: value, "_id": {"$lt": doc_id}}]}
+
+
+def next_cursor(docs: list[dict], limit: int, field: str) -> tuple[list[dict], str | None]:
+    """limit + 1개를 읽은 결과에서 페이지와 다음 커서를 분리."""
+    if len(docs) <= limit:
+        return docs, None
+    page = docs[:limit]
+    last = page[-1]
+    return page, encode_cursor(last.get(field), last["_id"])
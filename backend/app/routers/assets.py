@@ -16,16 +16,24 @@
 from fastapi import APIRouter, HTTPException, Query, Depends
 from pydantic import BaseModel  # noqa: F401 field_validator removed
 from datetime import datetime
-from typing import Optional, Dict, Literal
+from typing import Optional, Literal
 from bson import ObjectId
 from bson.errors import InvalidId
 from pymongo import UpdateOne, ReturnDocument
-from pymongo.errors import BulkWriteError
 from ..database import get_database, get_assets_collection
-from ..models.asset import AssetCreateExtended, BulkAssetCreate, BulkAssetResponse
+from ..models.asset import BulkAssetCreate, BulkAssetResponse
 from ..services.exchange_rate import get_exchange_rate
-from ..services.market_data import kis_client, crypto_client
-from ..cache import cache_portfolio, get_cached_portfolio, invalidate_portfolio_cache
+from ..services.market_data import get_prices
+from ..services import trading_analytics
+from ..services.asset_import import import_assets
+from ..cache import (
+    get_portfolio_valuation,
+    invalidate_portfolio_cache,
+    remove_portfolio_holding,
+    store_portfolio_valuation,
+    update_portfolio_holding,
+)
+from workers import portfolio_valuation
 from .auth import get_current_user, UserResponse
 
 import asyncio
@@ -97,6 +105,74 @@ class AssetResponse(BaseModel):
 # ============================================
 
 
+async def _value_assets(docs: list[dict]) -> tuple[list[dict], list[UpdateOne]]:
+    """
+    자산 문서 → 평가 결과(portfolio_valuation.build_holding) + current_price DB 갱신 작업.
+    시세는 get_prices 한 번 (MGET + Upbit 다건 시세 + KIS 동시 조회), 현금(FX)은 환율.
+    """
+    # FX rates (KRW base)
+    try:
+        usd_to_krw = await get_exchange_rate("USD", "KRW")
+    except Exception as e:
+        logger.warning("FX rate lookup failed (USD->KRW): %s", e)
+        usd_to_krw = 1.0
+
+    kinds = []
+    price_requests = []
+    fx_symbols = []
+    for doc in docs:
+        kind, request = portfolio_valuation.classify(doc)
+        kinds.append(kind)
+        if request:
+            price_requests.append(request)
+        elif kind == "fx" and doc["symbol"] not in fx_symbols:
+            fx_symbols.append(doc["symbol"])
+
+    fx_values, batch_prices = await asyncio.gather(
+        asyncio.gather(*(get_exchange_rate(s, "KRW") for s in fx_symbols), return_exceptions=True),
+        get_prices(price_requests),
+    )
+    fx_rates = dict(zip(fx_symbols, fx_values))
+
+    holdings = []
+    update_ops = []
+    now = datetime.utcnow()
+    for doc, kind in zip(docs, kinds):
+        if kind == "fx":
+            price_data = fx_rates.get(doc["symbol"])
+        elif kind == "other":
+            price_data = None
+        else:
+            price_data = batch_prices.get(doc["symbol"].strip().upper())
+        holding = portfolio_valuation.build_holding(doc, kind, price_data, usd_to_krw)
+        holdings.append(holding)
+
+        # Update DB only for non-converted assets
+        if (
+            isinstance(price_data, dict)
+            and "price" in price_data
+            and not price_data.get("stale")
+            and holding["currency"] == (doc.get("currency") or "KRW").upper()
+        ):
+            update_ops.append(
+                UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": {"current_price": holding["current_price"], "updated_at": now}},
+                )
+            )
+    return holdings, update_ops
+
+
+async def _refresh_holding(user_id: str, doc: dict):
+    """자산 하나가 바뀌면 그 종목만 다시 평가해 엔진에 반영 (빌드 전이면 다음 조회 때 빌드)."""
+    try:
+        holdings, _ = await _value_assets([doc])
+        await update_portfolio_holding(user_id, holdings[0])
+    except Exception as e:
+        logger.warning("Portfolio holding refresh failed: %s", e)
+        await invalidate_portfolio_cache(user_id)
+
+
 @router.get("")
 async def list_assets(
     current_user: UserResponse = Depends(get_current_user),
@@ -107,26 +183,22 @@ async def list_assets(
     """
     ?ъ슜???먯궛 紐⑸줉 議고쉶
 
-    - Redis 罹먯떆 ?곗꽑 議고쉶 (1遺?TTL)
+    - 평가금액 엔진(Redis hash, 시세 tick / 자산 변경마다 증분 갱신) 우선 조회
     - MongoDB?먯꽌 ?ъ슜?먯쓽 紐⑤뱺 ?먯궛 議고쉶
     - ?꾩옱媛 ?뺣낫??罹먯떆(Redis) ?먮뒗 蹂꾨룄 ?쒖꽭 API?먯꽌 議고쉶
     """
-    # 罹먯떆 ?뺤씤 (asset_type ?꾪꽣 ?녿뒗 ?꾩껜 議고쉶留?
-    if not skip_cache and not asset_type:
-        cached = await get_cached_portfolio(user_id)
+    # 평가금액 엔진 우선 조회 (tick마다 증분 갱신, 빌드 후 PORTFOLIO_VALUATION_MAX_AGE_SEC 동안 사용)
+    if not skip_cache:
+        cached = await get_portfolio_valuation(user_id)
         if cached:
-            cached["source"] = "cache"
+            if asset_type:
+                cached["assets"] = [a for a in cached["assets"] if a["asset_type"] == asset_type]
+                cached["total"] = len(cached["assets"])
+            cached["source"] = "valuation"
             return cached
 
     assets = get_assets_collection()
 
-    # FX rates (KRW base)
-    try:
-        usd_to_krw = await get_exchange_rate("USD", "KRW")
-    except Exception as e:
-        logger.warning("FX rate lookup failed (USD->KRW): %s", e)
-        usd_to_krw = 1.0
-
     query = {"user_id": current_user.id}
     if asset_type:
         query["asset_type"] = asset_type
@@ -135,126 +207,21 @@ async def list_assets(
         cursor = assets.find(query)
         docs = await cursor.to_list(length=100)
 
-        # ?ㅼ떆媛??쒖꽭 議고쉶瑜??꾪븳 鍮꾨룞湲??묒뾽 ?앹꽦
-        tasks = []
-        task_meta = []
-        for doc in docs:
-            # ... (omitted for brevity in replacement but kept in file)
-            symbol = doc["symbol"]
-            asset_type = doc["asset_type"]
-            if asset_type == "stock":
-                currency = (doc.get("currency") or "KRW").upper()
-                if symbol in {"USD", "KRW", "JPY"}:
-                    tasks.append(get_exchange_rate(symbol, "KRW"))
-                    task_meta.append({"kind": "fx", "symbol": symbol})
-                elif currency == "USD" or (not symbol.isdigit()):
-                    tasks.append(kis_client.get_current_price(symbol, market="US"))
-                    task_meta.append({"kind": "stock_usd"})
-                else:
-                    tasks.append(kis_client.get_current_price(symbol, market="KR"))
-                    task_meta.append({"kind": "stock_kr"})
-            elif asset_type == "crypto":
-                tasks.append(crypto_client.get_current_price(symbol))
-                task_meta.append({"kind": "crypto"})
-            else:
-                tasks.append(asyncio.sleep(0, result=None))
-                task_meta.append({"kind": "other"})
-
-        # ?쒖꽭 ?숈떆 議고쉶
-        prices = await asyncio.gather(*tasks, return_exceptions=True)
-
-        result = []
-        update_ops = []
-        now = datetime.utcnow()
-        for i, doc in enumerate(docs):
-            price_data = prices[i]
-            current_price = doc.get("current_price", doc["average_price"])
-            avg_price = doc["average_price"]
-            original_currency = (doc.get("currency") or "KRW").upper()
-            display_currency = original_currency
-            meta = task_meta[i] if i < len(task_meta) else {"kind": "other"}
-
-            if (
-                price_data
-                and not isinstance(price_data, Exception)
-                and isinstance(price_data, dict)
-                and "price" in price_data
-            ):
-                current_price = price_data["price"]
-
-            # FX cash (USD/JPY/KRW) -> KRW base
-            if meta.get("kind") == "fx":
-                if price_data and not isinstance(price_data, Exception):
-                    current_price = float(price_data)
-                display_currency = "KRW"
-
-            # USD assets -> convert to KRW for display/analysis
-            if original_currency == "USD" and meta.get("kind") in {"stock_usd"}:
-                # Heuristic: if avg_price is very large, assume it's already KRW
-                avg_is_krw = avg_price >= 10000
-                if not avg_is_krw:
-                    avg_price = avg_price * usd_to_krw
-                current_price = current_price * usd_to_krw
-                display_currency = "KRW"
-
-            # Update DB only for non-converted assets
-            if (
-                price_data
-                and not isinstance(price_data, Exception)
-                and isinstance(price_data, dict)
-                and "price" in price_data
-                and display_currency == original_currency
-            ):
-                update_ops.append(
-                    UpdateOne(
-                        {"_id": doc["_id"]},
-                        {"$set": {"current_price": current_price, "updated_at": now}},
-                    )
-                )
-
-            quantity = doc["quantity"]
-
-            profit = (current_price - avg_price) * quantity
-            profit_percent = (
-                ((current_price - avg_price) / avg_price * 100) if avg_price > 0 else 0
-            )
+        holdings, update_ops = await _value_assets(docs)
+        result = [AssetResponse(**portfolio_valuation.public_view(h)) for h in holdings]
 
-            result.append(
-                AssetResponse(
-                    id=str(doc["_id"]),
-                    symbol=doc["symbol"],
-                    name=doc["name"],
-                    asset_type=doc["asset_type"],
-                    quantity=quantity,
-                    average_price=avg_price,
-                    current_price=current_price,
-                    profit=profit,
-                    profit_percent=profit_percent,
-                    currency=display_currency,
-                    memo=doc.get("memo"),
-                    buy_reason=doc.get("buy_reason"),
-                    ai_analysis=doc.get("ai_analysis"),
-                    created_at=doc["created_at"],
-                    updated_at=doc["updated_at"],
-                )
-            )
-
-        # DB?癒?퐣 current_price ??낅쑓??꾨뱜 (揶쎛?館釉?野껋럩??
+        # 시세를 새로 받은 자산만 DB current_price 갱신
         if update_ops:
             try:
                 await assets.bulk_write(update_ops, ordered=False)
             except Exception as e:
                 logger.warning("Failed to update current_price: %s", e)
 
-        # 寃곌낵 罹먯떛 (asset_type ?꾪꽣 ?녿뒗 ?꾩껜 議고쉶留?
-        response_data = {"assets": result, "total": len(result), "source": "db"}
+        # 전체 조회 결과로 평가금액 엔진 빌드 (이후 시세 tick / 자산 변경은 증분 반영)
         if not asset_type:
-            await cache_portfolio(
-                user_id,
-                {"assets": [a.model_dump() for a in result], "total": len(result)},
-            )
+            await store_portfolio_valuation(user_id, holdings)
 
-        return response_data
+        return {"assets": result, "total": len(result), "source": "db"}
 
     except Exception as e:
         logger.error("list_assets failed: %s", e)
@@ -291,8 +258,8 @@ async def create_asset(
 
     result = await assets.insert_one(asset_doc)
 
-    # 罹먯떆 臾댄슚??
-    await invalidate_portfolio_cache(user_id)
+    # 평가금액 엔진에 새 종목만 반영
+    await _refresh_holding(user_id, {**asset_doc, "_id": result.inserted_id})
 
     return AssetResponse(
         id=str(result.inserted_id),
@@ -403,8 +370,13 @@ async def sell_asset(
     }
 
     transaction_result = await transactions.insert_one(transaction_doc)
+    await trading_analytics.record_transaction(db, transaction_doc)
 
-    await invalidate_portfolio_cache(user_id)
+    # 평가금액 엔진: 전량 매도면 종목 제거, 아니면 남은 수량으로 다시 반영
+    if new_quantity <= 0:
+        await remove_portfolio_holding(user_id, asset_id)
+    else:
+        await _refresh_holding(user_id, updated_asset)
 
     return {
         "message": message,
@@ -421,158 +393,22 @@ async def bulk_create_assets(
     bulk_request: BulkAssetCreate,
     current_user: UserResponse = Depends(get_current_user),
 ):
+    """
+    자산 대량 등록 (CSV 업로드, OCR 결과 확인 화면)
+
+    행 수와 무관하게 기존 보유 조회 1회($in) + 통화별 환율 1회 + bulk_write 1회
+    (services/asset_import.py). 실패는 원래 행 번호(rows)로 돌려준다.
+    """
     user_id = current_user.id
     assets = get_assets_collection()
-    now = datetime.utcnow()
-    # user_id = user_id # Query?먯꽌 吏곸젒 諛쏆쓬
-
-    merged_assets: Dict[str, AssetCreateExtended] = {}
-    merged_rows: Dict[str, int] = {}
-
-    for index, asset in enumerate(bulk_request.assets):
-        symbol = asset.symbol.upper()
-        if symbol in merged_assets:
-            existing = merged_assets[symbol]
-            total_quantity = existing.quantity + asset.quantity
-            if total_quantity != 0:
-                existing.average_price = (
-                    existing.average_price * existing.quantity
-                    + asset.average_price * asset.quantity
-                ) / total_quantity
-            else:
-                existing.average_price = 0
-            existing.quantity = total_quantity
-
-            if existing.exchange_rate is None and asset.exchange_rate is not None:
-                existing.exchange_rate = asset.exchange_rate
-        else:
-            if asset.symbol != symbol:
-                asset.symbol = symbol
-            merged_assets[symbol] = asset
-            merged_rows[symbol] = index
-
-    failures = []
-    operations = []
-    operation_meta = []
-
-    for symbol, asset_data in merged_assets.items():
-        row_index = merged_rows.get(symbol)
-        try:
-            currency = (asset_data.currency or "KRW").upper()
-            asset_data.currency = currency
-
-            exchange_rate = asset_data.exchange_rate
-            if currency in {"USD", "JPY"} and exchange_rate is None:
-                exchange_rate = await get_exchange_rate(currency, "KRW")
-                asset_data.exchange_rate = exchange_rate
-
-            existing = await assets.find_one(
-                {"user_id": current_user.id, "symbol": symbol}
-            )
-            existing_quantity = existing.get("quantity", 0) if existing else 0
-            existing_average = existing.get("average_price", 0) if existing else 0
-
-            incoming_quantity = asset_data.quantity
-            incoming_average = asset_data.average_price
-            total_quantity = existing_quantity + incoming_quantity
-            if total_quantity != 0:
-                new_average = (
-                    existing_average * existing_quantity
-                    + incoming_average * incoming_quantity
-                ) / total_quantity
-            else:
-                new_average = 0
-
-            update_fields = {
-                "user_id": current_user.id,
-                "symbol": symbol,
-                "name": asset_data.name,
-                "asset_type": asset_data.asset_type,
-                "quantity": total_quantity,
-                "average_price": new_average,
-                "currency": currency,
-                "updated_at": now,
-            }
+    if assets is None:
+        raise HTTPException(status_code=503, detail="자산 DB에 연결할 수 없습니다.")
 
-            optional_fields = [
-                "exchange_rate",
-                "transaction_type",
-                "transaction_date",
-                "account_name",
-                "memo",
-                "buy_reason",
-            ]
-            for field in optional_fields:
-                value = getattr(asset_data, field)
-                if value is not None:
-                    update_fields[field] = value
-
-            update_doc = {
-                "$set": update_fields,
-                "$setOnInsert": {
-                    "created_at": now,
-                    "current_price": new_average,
-                },
-            }
+    result = await import_assets(assets, user_id, bulk_request.assets)
 
-            operations.append(
-                UpdateOne(
-                    {"user_id": current_user.id, "symbol": symbol},
-                    update_doc,
-                    upsert=True,
-                )
-            )
-            operation_meta.append({"row": row_index, "symbol": symbol})
-        except Exception as exc:
-            failures.append({"row": row_index, "symbol": symbol, "error": str(exc)})
-
-    created_ids = []
-    success_count = len(operations)
-
-    if operations:
-        try:
-            result = await assets.bulk_write(operations, ordered=False)
-            if result.upserted_ids:
-                created_ids = [str(_id) for _id in result.upserted_ids.values()]
-        except BulkWriteError as exc:
-            write_errors = exc.details.get("writeErrors", []) if exc.details else []
-            for error in write_errors:
-                error_index = error.get("index")
-                meta = (
-                    operation_meta[error_index]
-                    if error_index is not None and error_index < len(operation_meta)
-                    else {"row": None, "symbol": None}
-                )
-                failures.append(
-                    {
-                        "row": meta["row"],
-                        "symbol": meta["symbol"],
-                        "error": error.get("errmsg", str(exc)),
-                    }
-                )
-            upserted = exc.details.get("upserted", []) if exc.details else []
-            created_ids = [str(item.get("_id")) for item in upserted if item.get("_id")]
-            success_count = max(0, success_count - len(write_errors))
-        except Exception as exc:
-            for meta in operation_meta:
-                failures.append(
-                    {
-                        "row": meta["row"],
-                        "symbol": meta["symbol"],
-                        "error": str(exc),
-                    }
-                )
-            success_count = 0
-
-    # 罹먯떆 臾댄슚??
+    # 여러 종목이 한 번에 바뀌므로 평가금액은 다음 조회 때 다시 빌드
     await invalidate_portfolio_cache(user_id)
-
-    return BulkAssetResponse(
-        success_count=success_count,
-        failure_count=len(failures),
-        failures=failures,
-        created_ids=created_ids,
-    )
+    return result
 
 
 @router.put("/{asset_id}", response_model=AssetResponse)
@@ -615,8 +451,8 @@ async def update_asset(
     if not result:
         raise HTTPException(status_code=404, detail="?먯궛??李얠쓣 ???놁뒿?덈떎")
 
-    # 罹먯떆 臾댄슚??
-    await invalidate_portfolio_cache(user_id)
+    # 평가금액 엔진에 이 종목만 다시 반영
+    await _refresh_holding(user_id, result)
 
     return AssetResponse(
         id=str(result["_id"]),
@@ -656,8 +492,8 @@ async def delete_asset(
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="?먯궛??李얠쓣 ???놁뒿?덈떎")
 
-        # 罹먯떆 臾댄슚??
-        await invalidate_portfolio_cache(user_id)
+        # 평가금액 엔진에서 이 종목만 제거
+        await remove_portfolio_holding(user_id, asset_id)
 
         return {"message": "자산이 삭제되었습니다"}
     except Exception as e:
@@ -146,4 +146,10 @@ async def chat_bedrock(
 @router.get("/health")
 async def chat_health():
     """Chat service health check."""
-    return {"status": "ok", "service": "chat"}
+    return {
+        "status": "ok",
+        "service": "chat",
+        "embedding_cache": chat_service.embedding_cache_stats(),
+        "retrieval": chat_service.news_retriever.stats() if chat_service.news_retriever else None,
+        "context": chat_service.context_stats(),
+    }
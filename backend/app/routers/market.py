@@ -13,15 +13,21 @@ from typing import Any
 import json
 import asyncio
 import os
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, tzinfo
 from zoneinfo import ZoneInfo
-import httpx
+import numpy as np
 
-from ..services.market_data import kis_client, crypto_client
+from ..services.market_data import get_prices, kis_client, crypto_client
 from ..services.exchange_rate import get_exchange_rate
 from ..services.stock_search import search_stocks_v2
+from ..services.http_clients import http_clients
+from ..services.price_hub import MODE_POLL, MODE_PUSH, PriceHub
+from ..services.single_flight import vendor_flight
 from ..cache import cache_get_with_last_good, cache_set_with_last_good, get_redis
+from ..database import get_candles_collection
 from ..config import get_settings
+from workers import ohlcv
+from workers.candle_codec import packed_key, tail_offset
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -37,7 +43,19 @@ CURRENCY_CODES = {
     "HKD", "SGD", "NZD", "TWD", "THB", "VND", "KRW",
 }
 KST = timezone(timedelta(hours=9))
+KST_DAY_OFFSET_SECONDS = 9 * 3600
+# candle_aggregator가 증분 집계하는 상위 해상도 (분 단위 -> Redis 키 접미사)
+CANDLE_ROLLUP_RESOLUTIONS = {5: "5m", 15: "15m", 60: "1h", 1440: "1d"}
+# Mongo candles_{res} 컬렉션 (분 단위 -> 접미사). 요청 해상도를 나누어 떨어지게 하는 가장 큰 것을 읽는다.
+CANDLE_STORE_RESOLUTIONS = {1: "1m", **CANDLE_ROLLUP_RESOLUTIONS}
+CANDLE_STORE_MAX_BARS = max(100, int(os.getenv("CANDLE_STORE_MAX_BARS", "5000")))
+CANDLE_STORE_QUERY_TIMEOUT_MS = max(100, int(os.getenv("CANDLE_STORE_QUERY_TIMEOUT_MS", "3000")))
 ET = ZoneInfo("America/New_York")
+# 저장 주식 분봉 완결성 판단: KR(09:00~15:30)/US(09:30~16:00) 정규장 길이와 하루 최소 채움 비율
+STOCK_SESSION_MINUTES = 390
+STOCK_SESSION_MIN_COVERAGE = float(os.getenv("STOCK_SESSION_MIN_COVERAGE", "0.9"))
+# 저장 주식 일봉에서 연휴로 보고 넘어가는 최대 연속 평일 공백
+STOCK_DAILY_MAX_MISSING_WEEKDAYS = 4
 PUBLIC_INDEX_TARGETS = [
     {"id": "kospi", "name": "코스피", "symbol": "KOSPI", "yahoo_symbol": "^KS11"},
     {"id": "sp500", "name": "미국 대표 지수", "symbol": "S&P 500", "yahoo_symbol": "^GSPC"},
@@ -131,10 +149,7 @@ async def _fetch_public_index_item(target: dict[str, str]) -> dict[str, Any]:
     cache_hit, cache_is_stale = await cache_get_with_last_good(cache_key)
 
     try:
-        async with httpx.AsyncClient(
-            timeout=10.0,
-            headers={"User-Agent": "Mozilla/5.0 TutumMarketMonitor/1.0"},
-        ) as client:
+        async with http_clients.session("yahoo") as client:
             response = await client.get(
                 YAHOO_CHART_URL.format(symbol=target["yahoo_symbol"]),
                 params={"interval": "1d", "range": "5d"},
@@ -363,39 +378,18 @@ def _aggregate_yearly_ohlcv(history: list[dict[str, Any]], year_count: int) -> l
     if not history:
         return []
 
-    buckets: dict[int, dict[str, Any]] = {}
-
-    for row in history:
-        dt = _parse_history_date(row.get("date"))
-        if dt is None:
-            continue
-
-        year = dt.year
-        open_p = float(row.get("open", 0) or 0)
-        high_p = float(row.get("high", 0) or 0)
-        low_p = float(row.get("low", 0) or 0)
-        close_p = float(row.get("close", 0) or 0)
-        volume_p = float(row.get("volume", 0) or 0)
-
-        if year not in buckets:
-            buckets[year] = {
-                "date": f"{year}-01-01",
-                "open": open_p,
-                "high": high_p,
-                "low": low_p,
-                "close": close_p,
-                "volume": volume_p,
-            }
-            continue
-
-        bucket = buckets[year]
-        bucket["high"] = max(float(bucket["high"]), high_p)
-        bucket["low"] = min(float(bucket["low"]), low_p)
-        bucket["close"] = close_p
-        bucket["volume"] = float(bucket["volume"]) + volume_p
+    # 지원하는 날짜 포맷(YYYY-MM-DD, YYYYMMDD, ISO)은 모두 앞 4자리가 연도다.
+    years_text = np.array([str(row.get("date") or "") for row in history]).astype("U4")
+    valid = np.char.isdigit(years_text)
+    if not valid.any():
+        return []
+    candles = _rows_to_ohlcv([row for row, ok in zip(history, valid.tolist()) if ok], with_buckets=False)
+    years, grouped = ohlcv.group_by_key(candles, years_text[valid].astype(np.int64))
 
-    years = sorted(buckets.keys())
-    aggregated = [buckets[y] for y in years]
+    aggregated = grouped.to_records()
+    for row, year in zip(aggregated, years.tolist()):
+        row.pop("bucket_start", None)
+        row["date"] = f"{year}-01-01"
 
     if year_count > 0 and len(aggregated) > year_count:
         aggregated = aggregated[-year_count:]
@@ -445,50 +439,135 @@ def _is_us_regular_session_open(now_utc: datetime | None = None) -> bool:
     return 9 * 60 + 30 <= hhmm < 16 * 60
 
 
-def _aggregate_intraday_ohlcv(history: list[dict[str, Any]], minute_unit: int) -> list[dict[str, Any]]:
-    if minute_unit <= 1 or not history:
-        return history
+def _rows_to_ohlcv(
+    rows: list[dict[str, Any]],
+    with_buckets: bool = True,
+    naive_tz: timezone = timezone.utc,
+) -> ohlcv.OHLCV:
+    """dict 행(JSON 캔들/벤더 응답)을 컬럼 배열로 바꾼다. bucket_start가 없으면 date로 계산한다."""
+    values = []
+    for row in rows:
+        bucket_start = 0
+        if with_buckets:
+            bucket_start = int(row.get("bucket_start", 0) or 0)
+            if bucket_start <= 0:
+                dt = _parse_history_date(row.get("date"))
+                if dt is None:
+                    continue
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=naive_tz)
+                bucket_start = int(dt.timestamp())
+        values.append(
+            (
+                bucket_start,
+                _safe_float(row.get("open", 0)),
+                _safe_float(row.get("high", 0)),
+                _safe_float(row.get("low", 0)),
+                _safe_float(row.get("close", 0)),
+                _safe_float(row.get("volume", 0)),
+            )
+        )
+    return ohlcv.from_rows(values)
+
+
+def _decode_candle_row(raw: Any) -> dict[str, Any] | None:
+    try:
+        row = json.loads(raw)
+        row["bucket_start"] = int(row.get("bucket_start", 0) or 0)
+        return row
+    except Exception:
+        return None
+
 
+def _clean_history_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    return [
+        {
+            "date": row.get("date"),
+            "open": _safe_float(row.get("open", 0)),
+            "high": _safe_float(row.get("high", 0)),
+            "low": _safe_float(row.get("low", 0)),
+            "close": _safe_float(row.get("close", 0)),
+            "volume": _safe_float(row.get("volume", 0)),
+        }
+        for row in rows
+    ]
+
+
+async def _get_rollup_history(
+    redis_client: Any,
+    base_symbol: str,
+    minute_unit: int,
+    count: int,
+    asset_type: str,
+) -> list[dict[str, Any]]:
+    """candle_aggregator가 미리 집계한 상위 해상도 봉을 count개만 읽는다. 부족하면 빈 배열."""
+    resolution = CANDLE_ROLLUP_RESOLUTIONS.get(minute_unit)
+    if resolution is None or count <= 0:
+        return []
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.getrange(packed_key(base_symbol, resolution), tail_offset(count), -1)
+        pipe.get(f"candles:{base_symbol}:{resolution}:current")
+        pipe.get(f"candles:{base_symbol}:1m:current")
+        packed_raw, current_raw, minute_raw = await pipe.execute()
+        candles = ohlcv.from_packed(packed_raw)
+    except Exception as e:
+        logger.debug("Failed to load rollup candles (%s/%s): %s", base_symbol, resolution, e)
+        return []
+
+    current_row = _decode_candle_row(current_raw) if current_raw else None
+    if current_row and current_row["bucket_start"] > 0:
+        candles = ohlcv.concat(candles, _rows_to_ohlcv([current_row]))
+    candles = ohlcv.dedup(candles)
+    if not len(candles):
+        return []
+    rows = candles.to_records(_bucket_iso_kst)
+
+    # 상위 해상도 current는 확정된 1m까지만 반영하므로 진행 중인 1m 캔들을 합친다.
     bucket_seconds = minute_unit * 60
-    aggregated: list[dict[str, Any]] = []
-    current: dict[str, Any] | None = None
-
-    for row in history:
-        bucket_start = int(row.get("bucket_start", 0) or 0)
-        if bucket_start <= 0:
-            dt = _parse_history_date(row.get("date"))
-            if dt is None:
-                continue
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            bucket_start = int(dt.timestamp())
-        group_start = bucket_start - (bucket_start % bucket_seconds)
-
-        if current is None or int(current["bucket_start"]) != group_start:
-            if current is not None:
-                aggregated.append(current)
-            current = {
-                "bucket_start": group_start,
-                "date": _bucket_iso_kst(group_start),
-                "open": _safe_float(row.get("open", 0)),
-                "high": _safe_float(row.get("high", 0)),
-                "low": _safe_float(row.get("low", 0)),
-                "close": _safe_float(row.get("close", 0)),
-                "volume": _safe_float(row.get("volume", 0)),
-            }
-        else:
-            current["high"] = max(_safe_float(current["high"]), _safe_float(row.get("high", 0)))
-            current["low"] = min(_safe_float(current["low"]), _safe_float(row.get("low", 0)))
-            current["close"] = _safe_float(row.get("close", 0))
-            current["volume"] = _safe_float(current.get("volume", 0)) + _safe_float(row.get("volume", 0))
+    offset = KST_DAY_OFFSET_SECONDS if minute_unit >= 1440 and asset_type != "crypto" else 0
+    minute_row = _decode_candle_row(minute_raw) if minute_raw else None
+    if minute_row and minute_row["bucket_start"] > 0:
+        group_start = ((minute_row["bucket_start"] + offset) // bucket_seconds) * bucket_seconds - offset
+        last = rows[-1]
+        if last["bucket_start"] == group_start:
+            last["high"] = max(_safe_float(last.get("high")), _safe_float(minute_row.get("high")))
+            last["low"] = min(_safe_float(last.get("low")), _safe_float(minute_row.get("low")))
+            last["close"] = _safe_float(minute_row.get("close"))
+            last["volume"] = _safe_float(last.get("volume")) + _safe_float(minute_row.get("volume"))
+        elif last["bucket_start"] < group_start:
+            rows.append({**minute_row, "bucket_start": group_start, "date": _bucket_iso_kst(group_start)})
+
+    if len(rows) < count:
+        return []
 
-    if current is not None:
-        aggregated.append(current)
+    # 너무 오래된 캐시(기동 중단 후 잔존 데이터)는 사용하지 않는다.
+    now_unix = int(datetime.now(timezone.utc).timestamp())
+    if now_unix - (rows[-1]["bucket_start"] + bucket_seconds) > 6 * 60 * 60:
+        return []
 
-    return aggregated
+    history = _clean_history_rows(rows[-count:])
+    if minute_unit >= 1440:
+        for row in history:
+            row["date"] = str(row.get("date") or "")[:10]
+    return history
+
+
+async def _get_cached_daily_history(symbol: str, count: int, asset_type: str) -> list[dict[str, Any]]:
+    redis_client = get_redis()
+    base_symbol = normalize_symbol(symbol)
+    if redis_client is None or not base_symbol:
+        return []
+    return await _get_rollup_history(redis_client, base_symbol, 1440, count, asset_type)
 
 
-async def _get_cached_intraday_history(symbol: str, timeframe: str, count: int) -> list[dict[str, Any]]:
+async def _get_cached_intraday_history(
+    symbol: str,
+    timeframe: str,
+    count: int,
+    asset_type: str = "stock",
+) -> list[dict[str, Any]]:
     minute_unit = _timeframe_to_minute_unit(timeframe)
     if minute_unit <= 0:
         return []
@@ -501,76 +580,294 @@ async def _get_cached_intraday_history(symbol: str, timeframe: str, count: int)
     if not base_symbol:
         return []
 
-    history_key = f"candles:{base_symbol}:1m"
+    rollup_history = await _get_rollup_history(redis_client, base_symbol, minute_unit, count, asset_type)
+    if rollup_history:
+        return rollup_history
+
+    legacy_key = f"candles:{base_symbol}:1m"
     current_key = f"candles:{base_symbol}:1m:current"
 
-    # 5분/60분 집계를 고려해 1분 캔들을 넉넉하게 읽는다.
+    # 롤업이 아직 쌓이지 않았거나 지원하지 않는 분 단위는 1분 캔들을 넉넉하게 읽어 집계한다.
     take = max(120, count * minute_unit * 3)
-    rows: list[dict[str, Any]] = []
     try:
-        history_raw = await redis_client.lrange(history_key, -take, -1)
-        for item in history_raw:
-            try:
-                row = json.loads(item)
-                row["bucket_start"] = int(row.get("bucket_start", 0) or 0)
-                rows.append(row)
-            except Exception:
-                continue
+        candles = ohlcv.from_packed(await redis_client.getrange(packed_key(base_symbol), tail_offset(take), -1))
+        extra_rows: list[dict[str, Any]] = []
+        if not len(candles):
+            # 압축 포맷 전환 이전에 쌓인 JSON 리스트
+            history_raw = await redis_client.lrange(legacy_key, -take, -1)
+            for item in history_raw:
+                row = _decode_candle_row(item)
+                if row is not None:
+                    extra_rows.append(row)
 
         current_raw = await redis_client.get(current_key)
         if current_raw:
-            try:
-                current_row = json.loads(current_raw)
-                current_row["bucket_start"] = int(current_row.get("bucket_start", 0) or 0)
-                rows.append(current_row)
-            except Exception:
-                pass
+            current_row = _decode_candle_row(current_raw)
+            if current_row is not None:
+                extra_rows.append(current_row)
     except Exception as e:
         logger.debug("Failed to load cached intraday candles (%s): %s", base_symbol, e)
         return []
 
-    if not rows:
+    candles = ohlcv.dedup(ohlcv.concat(candles, _rows_to_ohlcv(extra_rows)))
+    if not len(candles):
         return []
 
-    dedup: dict[int, dict[str, Any]] = {}
-    for row in rows:
-        bucket_start = int(row.get("bucket_start", 0) or 0)
-        if bucket_start <= 0:
-            dt = _parse_history_date(row.get("date"))
-            if dt is None:
-                continue
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=timezone.utc)
-            bucket_start = int(dt.timestamp())
-            row["bucket_start"] = bucket_start
-        dedup[bucket_start] = row
-
-    ordered = [dedup[key] for key in sorted(dedup.keys())]
-    aggregated = _aggregate_intraday_ohlcv(ordered, minute_unit)
-    if aggregated:
-        last_bucket = int(aggregated[-1].get("bucket_start", 0) or 0)
-        # 너무 오래된 캐시(기동 중단 후 잔존 데이터)는 사용하지 않는다.
-        if last_bucket > 0:
-            now_unix = int(datetime.now(timezone.utc).timestamp())
-            if now_unix - last_bucket > 6 * 60 * 60:
-                return []
-
-    if count > 0 and len(aggregated) > count:
-        aggregated = aggregated[-count:]
-
-    clean_history = []
-    for row in aggregated:
-        clean_history.append(
+    if minute_unit > 1:
+        candles = ohlcv.resample(candles, minute_unit * 60)
+
+    # 너무 오래된 캐시(기동 중단 후 잔존 데이터)는 사용하지 않는다.
+    last_bucket = int(candles.bucket_start[-1])
+    if last_bucket > 0:
+        now_unix = int(datetime.now(timezone.utc).timestamp())
+        if now_unix - last_bucket > 6 * 60 * 60:
+            return []
+
+    return _clean_history_rows(candles.tail(count).to_records(_bucket_iso_kst))
+
+
+def _history_bucket_minutes(timeframe: str) -> int:
+    if timeframe in ("D", "days"):
+        return 1440
+    return _timeframe_to_minute_unit(timeframe)
+
+
+def _day_offset(bucket_minutes: int, asset_type: str) -> int:
+    # 코인 일봉은 Upbit와 같은 UTC 00:00, 주식 일봉은 KST 자정 (candle_aggregator와 동일 규칙)
+    return KST_DAY_OFFSET_SECONDS if bucket_minutes >= 1440 and asset_type != "crypto" else 0
+
+
+def _parse_range_bound(raw: str | None) -> int | None:
+    """history 조회 구간 경계: epoch 초 또는 ISO 날짜(타임존 없으면 KST)."""
+    text = str(raw or "").strip()
+    if not text:
+        return None
+    if text.isdigit():
+        return int(text)
+    dt = _parse_history_date(text)
+    if dt is None:
+        raise HTTPException(status_code=400, detail=f"Invalid range bound: {text}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=KST)
+    return int(dt.timestamp())
+
+
+async def _load_stored_candles(
+    symbol: str,
+    bucket_minutes: int,
+    count: int,
+    range_start: int | None,
+    range_end: int | None,
+    asset_type: str,
+) -> ohlcv.OHLCV:
+    """Mongo candles_{res}에서 구간을 읽어 서버 측 $group으로 요청 해상도까지 다운샘플링한다."""
+    base_symbol = normalize_symbol(symbol)
+    if bucket_minutes <= 0 or not base_symbol:
+        return ohlcv.empty()
+
+    bucket_seconds = bucket_minutes * 60
+    offset = _day_offset(bucket_minutes, asset_type)
+    end = range_end if range_end is not None else int(datetime.now(timezone.utc).timestamp())
+    if range_start is not None:
+        start = range_start
+    else:
+        # 주식은 장 마감/주말 공백을 감안해 넉넉하게 잡고 마지막 count개만 쓴다.
+        lookback_factor = 1.2 if asset_type == "crypto" else 4
+        start = end - int(max(1, count) * bucket_seconds * lookback_factor)
+    start = (start + offset) // bucket_seconds * bucket_seconds - offset
+
+    sources = [
+        suffix for minutes, suffix in CANDLE_STORE_RESOLUTIONS.items()
+        if bucket_minutes % minutes == 0 and (minutes < 1440 or bucket_minutes == 1440)
+    ]
+    # 가장 거친 해상도부터 읽고, 롤업 도입 이전 구간이 비면 더 촘촘한 컬렉션으로 보충한다.
+    candles = ohlcv.empty()
+    for suffix in reversed(sources):
+        collection = get_candles_collection(suffix)
+        if collection is None:
+            return ohlcv.empty()
+        covered_from = int(candles.bucket_start[0]) if len(candles) else end
+        if covered_from <= start:
+            break
+        pipeline = [
+            {"$match": {"symbol": base_symbol, "bucket_start": {"$gte": start, "$lt": covered_from}}},
             {
-                "date": row.get("date"),
-                "open": _safe_float(row.get("open", 0)),
-                "high": _safe_float(row.get("high", 0)),
-                "low": _safe_float(row.get("low", 0)),
-                "close": _safe_float(row.get("close", 0)),
-                "volume": _safe_float(row.get("volume", 0)),
-            }
-        )
-    return clean_history
+                "$project": {
+                    "_id": 0, "bucket_start": 1, "open": 1, "high": 1, "low": 1, "close": 1,
+                    # 누적 카운터 차분으로 집계된 문서만 거래량을 믿는다 (이전 문서는 누적값/틱 수 합산).
+                    "volume": {"$cond": [{"$eq": ["$volume_kind", "delta"]}, "$volume", 0]},
+                }
+            },
+            {"$sort": {"bucket_start": 1}},
+            {
+                "$group": {
+                    "_id": {
+                        "$subtract": [
+                            "$bucket_start",
+                            {"$mod": [{"$add": ["$bucket_start", offset]}, bucket_seconds]},
+                        ]
+                    },
+                    "open": {"$first": "$open"},
+                    "high": {"$max": "$high"},
+                    "low": {"$min": "$low"},
+                    "close": {"$last": "$close"},
+                    "volume": {"$sum": "$volume"},
+                }
+            },
+            {"$sort": {"_id": 1}},
+        ]
+        try:
+            docs = await collection.aggregate(
+                pipeline,
+                allowDiskUse=True,
+                maxTimeMS=CANDLE_STORE_QUERY_TIMEOUT_MS,
+            ).to_list(length=None)
+        except Exception as e:
+            logger.debug("Stored candle query failed (%s/%s): %s", base_symbol, suffix, e)
+            continue
+        if docs:
+            found = ohlcv.from_columns(
+                (int(doc["_id"]) for doc in docs),
+                (_safe_float(doc.get("open")) for doc in docs),
+                (_safe_float(doc.get("high")) for doc in docs),
+                (_safe_float(doc.get("low")) for doc in docs),
+                (_safe_float(doc.get("close")) for doc in docs),
+                (_safe_float(doc.get("volume")) for doc in docs),
+            )
+            # covered_from은 bucket 경계라 촘촘한 쪽 결과와 겹치는 bucket이 생기지 않는다.
+            candles = ohlcv.concat(found, candles)
+    return candles
+
+
+def _stock_sessions_complete(candles: ohlcv.OHLCV, bucket_minutes: int, session_tz: tzinfo) -> bool:
+    """주식 저장 봉을 거래일 단위로 검사한다.
+
+    - 분봉: 양 끝(부분 구간일 수 있는 날)을 뺀 거래일마다 정규장 봉 수의 STOCK_SESSION_MIN_COVERAGE 이상
+    - 공통: 사이에 빠진 평일이 없어야 한다 (분봉은 하루, 일봉은 연휴 길이까지 허용)
+    휴장일은 구분하지 않으므로 공휴일이 낀 구간은 벤더 보충 쪽으로 빠진다.
+    """
+    local_days = np.array(
+        [datetime.fromtimestamp(bucket, tz=session_tz).date() for bucket in candles.bucket_start.tolist()],
+        dtype="datetime64[D]",
+    )
+    days, counts = np.unique(local_days, return_counts=True)
+    max_missing = STOCK_DAILY_MAX_MISSING_WEEKDAYS if bucket_minutes >= 1440 else 0
+    if len(days) > 1 and (np.busday_count(days[:-1], days[1:]) > max_missing + 1).any():
+        return False
+    if bucket_minutes >= 1440:
+        return True
+    expected = -(-STOCK_SESSION_MINUTES // bucket_minutes)
+    return not (counts[1:-1] < expected * STOCK_SESSION_MIN_COVERAGE).any()
+
+
+def _stored_history_complete(
+    candles: ohlcv.OHLCV,
+    bucket_minutes: int,
+    count: int,
+    range_start: int | None,
+    range_end: int | None,
+    asset_type: str,
+    session_tz: tzinfo = KST,
+) -> bool:
+    """저장 데이터만으로 응답 가능한지 판단한다. 아니면 벤더로 빈 구간을 채운다.
+
+    session_tz: 주식 거래일 경계 (KR은 KST, US는 ET)
+    """
+    if not len(candles):
+        return False
+    bucket_seconds = bucket_minutes * 60
+    if range_start is not None:
+        if int(candles.bucket_start[0]) > range_start + bucket_seconds:
+            return False
+    elif len(candles) < count:
+        return False
+
+    if asset_type != "crypto":
+        # 주식은 장 시간 외 공백이 정상이라 연속 bucket 대신 거래일별 봉 수를 본다.
+        recent = candles.tail(count) if range_start is None else candles
+        return _stock_sessions_complete(recent, bucket_minutes, session_tz)
+
+    now_unix = int(datetime.now(timezone.utc).timestamp())
+    end = min(range_end, now_unix) if range_end is not None else now_unix
+    if int(candles.bucket_start[-1]) < end - bucket_seconds * 2 - 120:
+        return False
+    recent = candles.tail(count) if range_start is None else candles
+    return len(ohlcv.fill_gaps(recent, bucket_seconds)) == len(recent)
+
+
+def _merge_vendor_gaps(
+    stored: ohlcv.OHLCV,
+    vendor_history: list[dict[str, Any]],
+    bucket_minutes: int,
+    asset_type: str,
+) -> ohlcv.OHLCV:
+    """벤더 봉은 저장 데이터에 없는 bucket만 채운다.
+
+    같은 bucket이면 가격은 저장 데이터 우선, 거래량은 거래소 집계값인 벤더 값을 쓴다.
+    """
+    vendor = ohlcv.dedup(_rows_to_ohlcv(vendor_history, naive_tz=KST))
+    vendor = ohlcv.resample(vendor, bucket_minutes * 60, _day_offset(bucket_minutes, asset_type))
+    merged = ohlcv.dedup(ohlcv.concat(vendor, stored))
+    if not len(vendor):
+        return merged
+    volume = merged.volume.copy()
+    volume[np.searchsorted(merged.bucket_start, vendor.bucket_start)] = vendor.volume
+    return ohlcv.OHLCV(merged.bucket_start, merged.open, merged.high, merged.low, merged.close, volume)
+
+
+def _vendor_range_meta(
+    vendor_history: list[dict[str, Any]],
+    range_start: int | None,
+    range_end: int | None,
+) -> dict[str, Any]:
+    """구간 조회에서 벤더 봉(최근 N개)이 구간을 얼마나 덮는지 응답 메타데이터로 알린다.
+
+    벤더 호출은 구간 끝을 받지 않고 최근 봉만 주므로, 구간이 그보다 오래되면 빈 bucket을 채울 수 없다.
+    """
+    vendor = _rows_to_ohlcv(vendor_history, naive_tz=KST)
+    if not len(vendor):
+        return {}
+    window_start = int(vendor.bucket_start.min())
+    if range_end is not None and range_end <= window_start:
+        reason = "range_older_than_vendor_window"
+        fill = "skipped"
+    elif range_start is None or range_start < window_start:
+        reason = "range_starts_before_vendor_window"
+        fill = "partial"
+    else:
+        return {}
+    return {
+        "vendor_gap_fill": fill,
+        "vendor_gap_fill_reason": reason,
+        "vendor_window_start": _bucket_iso_kst(window_start),
+    }
+
+
+def _crypto_vendor_window_start(count: int, bucket_minutes: int) -> int:
+    """Upbit 봉은 24시간 연속이라 최근 count개가 시작하는 시각을 미리 계산할 수 있다."""
+    now_unix = int(datetime.now(timezone.utc).timestamp())
+    return now_unix - max(1, count) * bucket_minutes * 60
+
+
+def _format_stored_history(
+    candles: ohlcv.OHLCV,
+    bucket_minutes: int,
+    count: int,
+    range_start: int | None,
+    range_end: int | None,
+) -> list[dict[str, Any]]:
+    if range_start is not None or range_end is not None:
+        lower = range_start if range_start is not None else np.iinfo(np.int64).min
+        upper = range_end if range_end is not None else np.iinfo(np.int64).max
+        candles = candles.take((candles.bucket_start >= lower) & (candles.bucket_start < upper))
+        candles = candles.tail(CANDLE_STORE_MAX_BARS)
+    else:
+        candles = candles.tail(min(count, CANDLE_STORE_MAX_BARS))
+    history = _clean_history_rows(candles.to_records(_bucket_iso_kst))
+    if bucket_minutes >= 1440:
+        for row in history:
+            row["date"] = str(row.get("date") or "")[:10]
+    return history
 
 
 async def _convert_to_krw(data: dict) -> dict:
@@ -642,6 +939,9 @@ async def get_price_snapshot(symbol: str) -> dict:
         return {"symbol": normalized, "error": str(e), "source": "error"}
 
 
+price_hub = PriceHub(get_price_snapshot)
+
+
 def parse_symbol_list(raw: str | None) -> set[str]:
     if not raw:
         return set()
@@ -822,37 +1122,18 @@ async def get_multiple_crypto_prices(
         raise HTTPException(status_code=422, detail="tickers or symbols query parameter is required")
 
     ticker_list = [t.strip() for t in raw_tickers.split(",") if t.strip()]
+    # 캐시 MGET 한 번 + 캐시 미스만 Upbit 다건 시세 한 요청
+    prices = await get_prices([(ticker, "CRYPTO") for ticker in ticker_list])
     results = []
 
     for ticker in ticker_list:
-        try:
-            symbol = normalize_symbol(ticker)
-            cached = await get_cached_price(symbol)
-            if cached:
-                cached_asset_type = str(cached.get("asset_type", "")).lower()
-                cached_currency = str(cached.get("currency", "")).upper()
-                is_crypto_cache = cached_asset_type in ("", "crypto")
-                is_krw_or_unknown = cached_currency in ("", "KRW")
-                if is_crypto_cache and is_krw_or_unknown:
-                    data = {
-                        "ticker": f"KRW-{symbol}",
-                        "price": cached.get("price"),
-                        "change_percent": cached.get("change_percent", 0),
-                        "volume": cached.get("volume", 0),
-                        "updated_at": cached.get("timestamp") or cached.get("cached_at"),
-                        "asset_type": "crypto",
-                        "currency": "KRW",
-                        "source": "cache",
-                    }
-                else:
-                    data = await crypto_client.get_current_price(ticker)
-            else:
-                data = await crypto_client.get_current_price(ticker)
-            data.setdefault("asset_type", "crypto")
-            data.setdefault("currency", "KRW")
-            results.append(data)
-        except Exception as e:
-            results.append({"ticker": ticker, "error": str(e)})
+        data = prices.get(ticker.upper()) or {"error": "price unavailable"}
+        if "error" in data:
+            results.append({"ticker": ticker, "error": data["error"]})
+            continue
+        data.setdefault("asset_type", "crypto")
+        data.setdefault("currency", "KRW")
+        results.append(data)
 
     return {"prices": results, "count": len(results)}
 
@@ -864,6 +1145,13 @@ async def get_multiple_stock_prices(symbols: str = Query(..., description="?쇳
     - symbols: ?쇳몴濡?援щ텇??醫낅ぉ肄붾뱶 紐⑸줉 (援?궡: 005930, ?댁쇅: AAPL)
     """
     symbol_list = [s.strip() for s in symbols.split(",") if s.strip()]
+    # 통화 코드를 뺀 종목은 get_prices 한 번 (캐시 MGET + 미스만 KIS 동시 조회)
+    stock_requests = [
+        (symbol, "KR" if symbol.isdigit() and len(symbol) == 6 else "US")
+        for symbol in symbol_list
+        if symbol.upper() not in CURRENCY_CODES
+    ]
+    prices = await get_prices(stock_requests)
     results = []
 
     for symbol in symbol_list:
@@ -878,22 +1166,16 @@ async def get_multiple_stock_prices(symbols: str = Query(..., description="?쇳
                     results.append({"code": upper_sym, "price": rate, "currency": "KRW", "source": "exchange_rate"})
                 continue
 
-            cached = await get_cached_price(upper_sym)
-            if _extract_positive_price(cached) is not None:
-                results.append(_build_stock_price_from_cache(upper_sym, cached))
+            data = prices.get(upper_sym) or {"error": "stock price unavailable"}
+            if "error" in data:
+                raise ValueError(data["error"])
+            if data.get("source") in ("cache", "last_good"):
+                results.append(_build_stock_price_from_cache(upper_sym, data))
                 continue
 
             # 숫자 6자리면 국내, 아니면 해외로 간주
-            if symbol.isdigit() and len(symbol) == 6:
-                data = await kis_client.get_current_price(symbol, market="KR")
-                await cache_set_with_last_good(f"price:{upper_sym}", json.dumps(data))
-            else:
-                raw_data = await kis_client.get_current_price(symbol, market="US")
-                await cache_set_with_last_good(f"price:{upper_sym}", json.dumps(raw_data))
-                data = raw_data
+            if not (symbol.isdigit() and len(symbol) == 6):
                 data = await _convert_to_krw(data)
-            if _extract_positive_price(data) is None:
-                raise ValueError("stock price unavailable")
             results.append(data)
         except Exception as e:
             results.append({"code": symbol, "error": str(e)})
@@ -1023,6 +1305,9 @@ async def get_market_status():
             },
             "items": candle_items,
         },
+        "ws_hub": price_hub.stats(),
+        "vendor_single_flight": vendor_flight.stats(),
+        "http_pools": http_clients.stats(),
     }
 
 
@@ -1094,9 +1379,14 @@ async def market_price_ws(
       {"action":"unsubscribe","symbols":["AAPL"]}
       {"action":"set","symbols":["005930","BTC"]}
       {"action":"ping"}
+    - mode=push(기본): price_consumer delta 도착 즉시 바뀐 심볼만 전송,
+      interval_ms 주기에는 값이 바뀐 심볼만 전송 (변경 없으면 전송 생략)
+    - mode=poll: interval_ms 마다 구독 심볼 전체 스냅샷 전송 (기존 동작)
+    - 시세 조회/직렬화는 프로세스 공용 price_hub 가 심볼당 1회만 수행한다.
     """
     params = websocket.query_params
     symbols = parse_symbol_list(params.get("symbols"))
+    mode = MODE_POLL if str(params.get("mode", "")).lower() == MODE_POLL else MODE_PUSH
 
     try:
         interval_ms = int(params.get("interval_ms", "2000"))
@@ -1110,73 +1400,96 @@ async def market_price_ws(
             "type": "connected",
             "symbols": sorted(symbols),
             "interval_ms": int(interval_sec * 1000),
+            "mode": mode,
         }
     )
 
-    try:
+    subscriber = await price_hub.register(symbols, interval_sec, mode)
+
+    async def pump_frames():
+        # 송신은 이 태스크 하나만 담당한다 (제어 응답도 같은 큐를 거친다).
         while True:
-            # Handle client control message with timeout.
-            try:
-                message = await asyncio.wait_for(websocket.receive_text(), timeout=interval_sec)
-                try:
-                    payload = json.loads(message)
-                except json.JSONDecodeError:
-                    await websocket.send_json({"type": "error", "message": "invalid json"})
-                    continue
+            frame = await subscriber.queue.get()
+            await websocket.send_text(frame)
 
-                action = str(payload.get("action", "")).lower()
-                incoming = payload.get("symbols") or []
-                incoming_set = {normalize_symbol(str(s)) for s in incoming if normalize_symbol(str(s))}
-
-                if action == "subscribe":
-                    symbols |= incoming_set
-                    await websocket.send_json({"type": "subscribed", "symbols": sorted(symbols)})
-                elif action == "unsubscribe":
-                    symbols -= incoming_set
-                    await websocket.send_json({"type": "subscribed", "symbols": sorted(symbols)})
-                elif action == "set":
-                    symbols = incoming_set
-                    await websocket.send_json({"type": "subscribed", "symbols": sorted(symbols)})
-                elif action == "ping":
-                    await websocket.send_json({"type": "pong"})
-                else:
-                    await websocket.send_json({"type": "error", "message": "unknown action"})
+    sender = asyncio.create_task(pump_frames())
 
-            except asyncio.TimeoutError:
-                # Periodic push interval
-                pass
+    def reply(payload: dict):
+        subscriber.push(json.dumps(payload))
 
-            if not symbols:
-                await websocket.send_json({"type": "prices", "items": [], "ts": datetime.now(timezone.utc).isoformat()})
+    try:
+        while True:
+            receive = asyncio.create_task(websocket.receive_text())
+            done, _ = await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if sender in done:
+                receive.cancel()
+                break
+            message = receive.result()
+
+            try:
+                payload = json.loads(message)
+            except json.JSONDecodeError:
+                reply({"type": "error", "message": "invalid json"})
                 continue
 
-            tasks = [get_price_snapshot(sym) for sym in sorted(symbols)]
-            items = await asyncio.gather(*tasks)
-            await websocket.send_json(
-                {
-                    "type": "prices",
-                    "items": items,
-                    "ts": datetime.now(timezone.utc).isoformat(),
-                }
-            )
+            action = str(payload.get("action", "")).lower()
+            incoming = payload.get("symbols") or []
+            incoming_set = {normalize_symbol(str(s)) for s in incoming if normalize_symbol(str(s))}
+
+            if action == "subscribe":
+                symbols = symbols | incoming_set
+                price_hub.update_symbols(subscriber, symbols)
+                reply({"type": "subscribed", "symbols": sorted(symbols)})
+            elif action == "unsubscribe":
+                symbols = symbols - incoming_set
+                price_hub.update_symbols(subscriber, symbols)
+                reply({"type": "subscribed", "symbols": sorted(symbols)})
+            elif action == "set":
+                symbols = incoming_set
+                price_hub.update_symbols(subscriber, symbols)
+                reply({"type": "subscribed", "symbols": sorted(symbols)})
+            elif action == "ping":
+                reply({"type": "pong"})
+            else:
+                reply({"type": "error", "message": "unknown action"})
 
     except WebSocketDisconnect:
         logger.info("market websocket client disconnected")
+    finally:
+        price_hub.unregister(subscriber)
+        sender.cancel()
+        try:
+            await sender
+        except (asyncio.CancelledError, Exception):
+            pass
 
 
 @router.get("/history/{market_type}/{symbol}")
-async def get_market_history(market_type: str, symbol: str, timeframe: str = "D", count: int = 30):
+async def get_market_history(
+    market_type: str,
+    symbol: str,
+    timeframe: str = "D",
+    count: int = 30,
+    start: str | None = Query(None, description="조회 시작 (epoch 초 또는 ISO, 타임존 없으면 KST)"),
+    end: str | None = Query(None, description="조회 끝 (미포함)"),
+):
     """
     ?쒖옣 ?곗씠???대젰(OHLCV) 議고쉶
     - market_type: stock, crypto
     - symbol: 醫낅ぉ肄붾뱶 ?먮뒗 ?곗빱
     - timeframe: D(?쇰큺), m(遺꾨큺) - 二쇱떇 / days, minutes/1 ??- 肄붿씤
     """
+    range_start = _parse_range_bound(start)
+    range_end = _parse_range_bound(end)
+    is_range = range_start is not None or range_end is not None
+    bucket_minutes = _history_bucket_minutes(timeframe)
+
     if market_type == "stock":
         # Stock (KIS) timeframe mapping.
         normalized_symbol = normalize_symbol(symbol)
         minute_unit = _timeframe_to_minute_unit(timeframe)
-        if minute_unit > 0:
+        # 구간 조회는 최근 N개 캐시로 답할 수 없으므로 저장소(Mongo)부터 본다.
+        if minute_unit > 0 and not is_range:
             cached_history = await _get_cached_intraday_history(normalized_symbol, timeframe, count)
             if cached_history:
                 return {
@@ -1186,6 +1499,27 @@ async def get_market_history(market_type: str, symbol: str, timeframe: str = "D"
                     "source": "candle_aggregator",
                     "timeframe": timeframe,
                 }
+        elif timeframe == "D" and not is_range:
+            cached_history = await _get_cached_daily_history(normalized_symbol, count, "stock")
+            if cached_history:
+                return {
+                    "code": normalized_symbol or symbol,
+                    "history": cached_history,
+                    "market": "US" if _is_overseas_stock(normalized_symbol) else "KR",
+                    "source": "candle_aggregator",
+                    "timeframe": timeframe,
+                }
+
+        stored = await _load_stored_candles(normalized_symbol, bucket_minutes, count, range_start, range_end, "stock")
+        session_tz = ET if _is_overseas_stock(normalized_symbol) else KST
+        if _stored_history_complete(stored, bucket_minutes, count, range_start, range_end, "stock", session_tz):
+            return {
+                "code": normalized_symbol or symbol,
+                "history": _format_stored_history(stored, bucket_minutes, count, range_start, range_end),
+                "market": "US" if _is_overseas_stock(normalized_symbol) else "KR",
+                "source": "candle_store",
+                "timeframe": timeframe,
+            }
 
         kis_tf = timeframe
         actual_count = count
@@ -1204,6 +1538,23 @@ async def get_market_history(market_type: str, symbol: str, timeframe: str = "D"
             res["history"] = _aggregate_yearly_ohlcv(res.get("history", []), year_count)
 
         history = res.get("history") if isinstance(res, dict) else []
+        range_meta = _vendor_range_meta(history, range_start, range_end) if is_range and not is_yearly else {}
+        if range_meta.get("vendor_gap_fill") == "skipped":
+            # 벤더 봉이 구간에 닿지 않는다 → 최근 봉을 섞지 않고 저장 데이터만으로 답한다.
+            return {
+                "code": normalized_symbol or symbol,
+                "history": _format_stored_history(stored, bucket_minutes, count, range_start, range_end),
+                "market": "US" if _is_overseas_stock(normalized_symbol) else "KR",
+                "source": "candle_store",
+                "timeframe": timeframe,
+                **range_meta,
+            }
+        if (len(stored) or is_range) and history and not is_yearly:
+            # 저장 데이터가 있는 구간은 그대로 쓰고 벤더 봉은 빈 bucket만 채운다 (구간 조회는 구간 밖 벤더 봉을 버린다).
+            merged = _merge_vendor_gaps(stored, history, bucket_minutes, "stock")
+            res["history"] = history = _format_stored_history(merged, bucket_minutes, count, range_start, range_end)
+            res["source"] = "candle_store+vendor"
+            res.update(range_meta)
         is_minute_tf = kis_tf not in ("D", "W", "M")
 
         # V1: 주식 분봉(1/5/60)은 mock fallback을 만들지 않는다.
@@ -1293,8 +1644,18 @@ async def get_market_history(market_type: str, symbol: str, timeframe: str = "D"
         # Upbit timeframe mapping.
         normalized_symbol = normalize_symbol(symbol)
         minute_unit = _timeframe_to_minute_unit(timeframe)
-        if minute_unit > 0:
-            cached_history = await _get_cached_intraday_history(normalized_symbol, timeframe, count)
+        # 구간 조회는 최근 N개 캐시로 답할 수 없으므로 저장소(Mongo)부터 본다.
+        if minute_unit > 0 and not is_range:
+            cached_history = await _get_cached_intraday_history(normalized_symbol, timeframe, count, "crypto")
+            if cached_history:
+                return {
+                    "ticker": f"KRW-{normalized_symbol}",
+                    "history": cached_history,
+                    "source": "candle_aggregator",
+                    "timeframe": timeframe,
+                }
+        elif timeframe in ("D", "days") and not is_range:
+            cached_history = await _get_cached_daily_history(normalized_symbol, count, "crypto")
             if cached_history:
                 return {
                     "ticker": f"KRW-{normalized_symbol}",
@@ -1303,6 +1664,15 @@ async def get_market_history(market_type: str, symbol: str, timeframe: str = "D"
                     "timeframe": timeframe,
                 }
 
+        stored = await _load_stored_candles(normalized_symbol, bucket_minutes, count, range_start, range_end, "crypto")
+        if _stored_history_complete(stored, bucket_minutes, count, range_start, range_end, "crypto"):
+            return {
+                "ticker": f"KRW-{normalized_symbol}",
+                "history": _format_stored_history(stored, bucket_minutes, count, range_start, range_end),
+                "source": "candle_store",
+                "timeframe": timeframe,
+            }
+
         actual_count = count
         year_count = max(1, min(count, 30))
         is_yearly = timeframe == "Y"
@@ -1325,9 +1695,36 @@ async def get_market_history(market_type: str, symbol: str, timeframe: str = "D"
         else:
             upbit_tf = "days"
 
+        def stored_only(range_meta: dict[str, Any]) -> dict[str, Any]:
+            # 벤더 봉이 구간에 닿지 않는다 → 최근 봉을 섞지 않고 저장 데이터만으로 답한다.
+            return {
+                "ticker": f"KRW-{normalized_symbol}",
+                "history": _format_stored_history(stored, bucket_minutes, count, range_start, range_end),
+                "source": "candle_store",
+                "timeframe": timeframe,
+                **range_meta,
+            }
+
+        if (
+            is_range and not is_yearly and bucket_minutes > 0 and range_end is not None
+            and range_end <= _crypto_vendor_window_start(actual_count, bucket_minutes)
+        ):
+            # 구간이 벤더가 줄 최근 봉보다 오래됐다 → 벤더 호출 생략
+            return stored_only(
+                {"vendor_gap_fill": "skipped", "vendor_gap_fill_reason": "range_older_than_vendor_window"}
+            )
+
         res = await crypto_client.get_historical_data(symbol, timeframe=upbit_tf, count=actual_count)
         if is_yearly and isinstance(res, dict) and isinstance(res.get("history"), list):
             res["history"] = _aggregate_yearly_ohlcv(res.get("history", []), year_count)
+        elif (len(stored) or is_range) and isinstance(res, dict) and res.get("history"):
+            range_meta = _vendor_range_meta(res["history"], range_start, range_end) if is_range else {}
+            if range_meta.get("vendor_gap_fill") == "skipped":
+                return stored_only(range_meta)
+            merged = _merge_vendor_gaps(stored, res["history"], bucket_minutes, "crypto")
+            res["history"] = _format_stored_history(merged, bucket_minutes, count, range_start, range_end)
+            res["source"] = "candle_store+vendor"
+            res.update(range_meta)
         return res
     else:
         raise HTTPException(status_code=400, detail="Invalid market type")
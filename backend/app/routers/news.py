@@ -1,5 +1,7 @@
+import hashlib
 import html
 import logging
+import os
 import re
 from datetime import datetime, timezone
 from typing import Any, Iterable, List, Optional
@@ -8,8 +10,10 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from pymongo import DESCENDING
 
+from ..cache import cache_get, cache_set
 from ..database import get_news_collection
 from ..mariadb import get_user_portfolios
+from ..pagination import decode_cursor, keyset_filter, next_cursor
 from .auth import UserResponse, get_current_user
 
 router = APIRouter()
@@ -19,9 +23,9 @@ NEWS_TEXT_FIELDS = ("title", "body", "content", "description", "summary", "artic
 NEWS_BODY_FIELDS = ("body", "content", "description", "summary", "article", "text")
 NEWS_SORT = [
     ("published_at_ts", DESCENDING),
-    ("ingested_at", DESCENDING),
     ("_id", DESCENDING),
 ]
+NEWS_COUNT_CACHE_TTL_SEC = int(os.getenv("NEWS_COUNT_CACHE_TTL_SEC", "60"))
 
 # Lightweight synonym map for common assets. The user's own asset name/code are always included.
 ASSET_TERM_SYNONYMS: dict[str, tuple[str, ...]] = {
@@ -63,10 +67,12 @@ class NewsItem(BaseModel):
 
 class PaginatedNewsResponse(BaseModel):
     items: List[NewsItem]
-    total: int
+    total: Optional[int]
     page: int
     limit: int
-    total_pages: int
+    total_pages: Optional[int]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 
 class RecommendedNewsResponse(BaseModel):
@@ -287,11 +293,24 @@ def _count_term_hits(doc: dict[str, Any], terms: list[str]) -> int:
     return hits
 
 
+async def _cached_news_count(news_col, query_filter: dict[str, Any], query: Optional[str]) -> int:
+    """필터별 count_documents 결과를 NEWS_COUNT_CACHE_TTL_SEC 동안 재사용 (페이지마다 다시 세지 않음)."""
+    key = "news:count:" + hashlib.sha1((query or "").encode("utf-8")).hexdigest()
+    cached = await cache_get(key)
+    if cached is not None:
+        return int(cached)
+    total = await news_col.count_documents(query_filter)
+    await cache_set(key, str(total), NEWS_COUNT_CACHE_TTL_SEC)
+    return total
+
+
 @router.get("", response_model=PaginatedNewsResponse)
 async def get_latest_news(
     query: Optional[str] = Query(None, description="Search query"),
-    page: int = Query(1, ge=1, description="Page number"),
+    page: int = Query(1, ge=1, description="Page number (ignored when cursor is given)"),
     limit: int = Query(5, ge=1, le=50, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous response"),
+    include_total: bool = Query(True, description="Return cached total/total_pages"),
 ):
     news_col = get_news_collection()
 
@@ -303,21 +322,33 @@ async def get_latest_news(
         if query:
             _append_query_filter(query_filter, query)
 
-        total = await news_col.count_documents(query_filter)
-        total_pages = (total + limit - 1) // limit
-        skip = (page - 1) * limit
-
-        cursor = news_col.find(query_filter).sort(NEWS_SORT).skip(skip).limit(limit)
-        items: list[NewsItem] = []
-        async for doc in cursor:
-            items.append(_to_news_item(doc))
+        total = await _cached_news_count(news_col, query_filter, query) if include_total else None
+        total_pages = (total + limit - 1) // limit if total is not None else None
+
+        # cursor: (published_at_ts, _id) keyset → 깊은 페이지도 첫 페이지와 같은 비용
+        # page: 페이지 번호로 바로 이동하는 기존 UI용 (skip)
+        page_filter = {"$and": list(query_filter["$and"])}
+        skip = 0
+        if cursor:
+            try:
+                last_ts, last_id = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            page_filter["$and"].append(keyset_filter("published_at_ts", last_ts, last_id))
+        else:
+            skip = (page - 1) * limit
+
+        found = news_col.find(page_filter).sort(NEWS_SORT).skip(skip).limit(limit + 1)
+        docs, next_page = next_cursor(await found.to_list(length=limit + 1), limit, "published_at_ts")
+        items = [_to_news_item(doc) for doc in docs]
 
         logger.info(
-            "News API page=%s/%s items=%s query=%s",
+            "News API page=%s/%s items=%s query=%s cursor=%s",
             page,
             total_pages,
             len(items),
             bool(query),
+            bool(cursor),
         )
 
         return PaginatedNewsResponse(
@@ -326,7 +357,11 @@ async def get_latest_news(
             page=page,
             limit=limit,
             total_pages=total_pages,
+            next_cursor=next_page,
+            has_more=next_page is not None,
         )
+    except HTTPException:
+        raise
     except Exception as exc:
         logger.error("News API error: %s", exc)
         raise HTTPException(status_code=500, detail="Failed to fetch news data")
@@ -11,6 +11,7 @@ from pydantic import BaseModel, Field, field_validator
 
 from ..mariadb import (
     add_portfolio_item,
+    bulk_upsert_portfolio_items,
     delete_portfolio_item,
     get_user_portfolios,
     update_portfolio_item,
@@ -147,24 +148,33 @@ async def bulk_create_portfolio_items(
     _: None = Depends(verify_csrf_token),
     current_user: UserResponse = Depends(get_current_user),
 ):
+    """한 문장 INSERT ... ON DUPLICATE KEY UPDATE (동일 종목은 SQL에서 가중평균 병합)."""
     user_id = int(current_user.id)
     created_items = []
     errors = []
 
-    for i, item in enumerate(payload.assets):
-        try:
-            created = await add_portfolio_item(
-                user_id=user_id,
-                asset_code=item.asset_code.upper(),
-                asset_name=item.asset_name,
-                asset_type=item.asset_type,
-                quantity=item.quantity,
-                avg_buy_price=item.avg_buy_price,
-                currency=item.currency.upper(),
-            )
-            created_items.append(_to_response(created))
-        except Exception as e:
-            errors.append({"index": i, "asset_code": item.asset_code, "error": str(e)})
+    try:
+        items = await bulk_upsert_portfolio_items(
+            user_id,
+            [
+                {
+                    "asset_code": item.asset_code.upper(),
+                    "asset_name": item.asset_name,
+                    "asset_type": item.asset_type,
+                    "quantity": item.quantity,
+                    "avg_buy_price": item.avg_buy_price,
+                    "currency": item.currency.upper(),
+                }
+                for item in payload.assets
+            ],
+        )
+        created_items = [_to_response(created) for created in items]
+    except Exception as e:
+        logger.exception("MariaDB portfolio bulk upsert failed")
+        errors = [
+            {"index": i, "asset_code": item.asset_code, "error": str(e)}
+            for i, item in enumerate(payload.assets)
+        ]
 
     return {
         "success_count": len(created_items),
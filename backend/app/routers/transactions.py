@@ -5,18 +5,20 @@
 AI 분석용 데이터를 제공합니다.
 """
 
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
 from datetime import datetime
 from typing import Optional, List
 from bson import ObjectId  # noqa: F401
 
 from ..database import get_database
+from ..pagination import decode_cursor, keyset_filter, next_cursor
 from ..models.transaction import (
     TransactionCreate,
     TransactionResponse,
     TradingAnalysis,
     TransactionType,
 )
+from ..services import trading_analytics
 from .auth import get_current_user, UserResponse
 
 router = APIRouter()
@@ -63,6 +65,7 @@ async def create_transaction(
     }
 
     result = await transactions.insert_one(transaction_doc)
+    await trading_analytics.record_transaction(get_database(), transaction_doc)
 
     return TransactionResponse(
         id=str(result.inserted_id),
@@ -85,18 +88,22 @@ async def create_transaction(
 
 @router.get("", response_model=List[TransactionResponse])
 async def list_transactions(
+    response: Response,
     current_user: UserResponse = Depends(get_current_user),
     transaction_type: Optional[str] = Query(
         None, description="거래 유형 필터 (buy/sell)"
     ),
     start_date: Optional[datetime] = Query(None, description="시작 날짜"),
     end_date: Optional[datetime] = Query(None, description="종료 날짜"),
-    limit: int = Query(100, description="최대 결과 수"),
+    limit: int = Query(100, ge=1, le=500, description="최대 결과 수"),
+    cursor: Optional[str] = Query(None, description="이전 응답의 X-Next-Cursor 헤더 값"),
 ):
     """
     거래 이력 조회
 
     사용자의 거래 이력을 조회합니다. 필터링 지원.
+    (transaction_date, _id) 내림차순 keyset 페이지네이션: 다음 페이지가 있으면
+    X-Next-Cursor 응답 헤더로 커서를 돌려주고, 그 값을 cursor로 넘기면 이어서 조회합니다.
     """
     transactions = get_transactions_collection()
     if transactions is None:
@@ -115,8 +122,17 @@ async def list_transactions(
             date_query["$lte"] = end_date
         query["transaction_date"] = date_query
 
-    cursor = transactions.find(query).sort("transaction_date", -1).limit(limit)
-    docs = await cursor.to_list(length=limit)
+    if cursor:
+        try:
+            last_date, last_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="유효하지 않은 커서입니다.")
+        query = {"$and": [query, keyset_filter("transaction_date", last_date, last_id)]}
+
+    found = transactions.find(query).sort([("transaction_date", -1), ("_id", -1)]).limit(limit + 1)
+    docs, next_page = next_cursor(await found.to_list(length=limit + 1), limit, "transaction_date")
+    if next_page:
+        response.headers["X-Next-Cursor"] = next_page
 
     result = []
     for doc in docs:
@@ -149,77 +165,16 @@ async def get_trading_analysis(current_user: UserResponse = Depends(get_current_
     매매 분석 데이터 조회
 
     AI 분석용 집계 데이터를 반환합니다.
+    평균 보유 기간은 종목별 FIFO 매칭(매수 lot을 먼저 산 것부터 소진) 수량 가중 평균입니다.
     """
-    transactions = get_transactions_collection()
-    if transactions is None:
+    db = get_database()
+    if db is None:
         return TradingAnalysis(
             total_buys=0, total_sells=0, avg_holding_days=0,
             realized_return=0, win_rate=0, total_realized_profit=0,
             buy_reasons_distribution={}, sell_reasons_distribution={},
         )
 
-    # 모든 거래 조회
-    cursor = transactions.find({"user_id": current_user.id})
-    docs = await cursor.to_list(length=1000)
-
-    if not docs:
-        return TradingAnalysis(
-            total_buys=0,
-            total_sells=0,
-            avg_holding_days=0,
-            realized_return=0,
-            win_rate=0,
-            total_realized_profit=0,
-            buy_reasons_distribution={},
-            sell_reasons_distribution={},
-        )
-
-    # 집계
-    total_buys = sum(1 for d in docs if d["transaction_type"] == "buy")
-    total_sells = sum(1 for d in docs if d["transaction_type"] == "sell")
-
-    # 실현손익 계산
-    sell_transactions = [d for d in docs if d["transaction_type"] == "sell"]
-    total_realized_profit = sum(d.get("realized_profit", 0) for d in sell_transactions)
-
-    # 승률 계산 (수익 거래 / 전체 매도 거래)
-    profitable_sells = sum(
-        1 for d in sell_transactions if d.get("realized_profit", 0) > 0
-    )
-    win_rate = (profitable_sells / total_sells * 100) if total_sells > 0 else 0
-
-    # 평균 보유 기간 (간단한 추정: 매수-매도 간격)
-    # TODO: 실제로는 asset_id로 매칭 필요
-    avg_holding_days = 30.0  # Placeholder
-
-    # 총 투자금 대비 실현 수익률
-    total_investment = sum(
-        d["total_amount"] for d in docs if d["transaction_type"] == "buy"
-    )
-    realized_return = (
-        (total_realized_profit / total_investment * 100) if total_investment > 0 else 0
-    )
-
-    # 매수/매도 사유 분포
-    buy_reasons = {}
-    for d in docs:
-        if d["transaction_type"] == "buy" and d.get("buy_reason"):
-            reason = d["buy_reason"]
-            buy_reasons[reason] = buy_reasons.get(reason, 0) + 1
-
-    sell_reasons = {}
-    for d in sell_transactions:
-        if d.get("sell_reason"):
-            reason = d["sell_reason"]
-            sell_reasons[reason] = sell_reasons.get(reason, 0) + 1
-
-    return TradingAnalysis(
-        total_buys=total_buys,
-        total_sells=total_sells,
-        avg_holding_days=avg_holding_days,
-        realized_return=realized_return,
-        win_rate=win_rate,
-        total_realized_profit=total_realized_profit,
-        buy_reasons_distribution=buy_reasons,
-        sell_reasons_distribution=sell_reasons,
-    )
+    # 사용자별 롤업 문서 하나만 읽는다 (없거나 dirty면 집계 파이프라인으로 다시 빌드)
+    rollup = await trading_analytics.get_rollup(db, current_user.id)
+    return TradingAnalysis(**trading_analytics.analysis_from_rollup(rollup))
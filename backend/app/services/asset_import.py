@@ -0,0 +1,173 @@
+"""
+============================================
+Asset Import (자산 대량 등록 파이프라인)
+============================================
+
+POST /api/v1/assets/bulk (CSV 업로드, OCR 결과 확인 화면 `confirm-input`)가 함께 쓰는 등록 경로.
+행 수와 무관하게 DB/환율 왕복 횟수가 고정된다.
+
+1. 같은 심볼 행을 하나로 병합 (수량 합산, 가중 평균 매입가) — 원래 행 번호는 모두 보관
+2. 환율: 환율이 비어 있는 USD/JPY 행의 통화별로 get_exchange_rate 한 번씩 (동시)
+3. 기존 보유: find({"user_id", "symbol": {"$in": [...]}}) 한 번
+4. 쓰기: UpdateOne(upsert) 목록을 ordered=False bulk_write 한 번
+5. 실패(환율 조회 실패, writeErrors)는 해당 심볼로 병합된 원래 행 번호들에 매핑
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ..models.asset import AssetCreateExtended, BulkAssetResponse
+from .exchange_rate import get_exchange_rate
+
+logger = logging.getLogger(__name__)
+
+FX_CURRENCIES = {"USD", "JPY"}
+OPTIONAL_FIELDS = (
+    "exchange_rate",
+    "transaction_type",
+    "transaction_date",
+    "account_name",
+    "memo",
+    "buy_reason",
+)
+
+
+def _weighted_average(quantity_a: float, price_a: float, quantity_b: float, price_b: float) -> float:
+    total = quantity_a + quantity_b
+    if total == 0:
+        return 0
+    return (price_a * quantity_a + price_b * quantity_b) / total
+
+
+def merge_rows(rows: list[AssetCreateExtended]) -> tuple[dict[str, AssetCreateExtended], dict[str, list[int]]]:
+    """심볼별 병합. Returns: ({symbol: 병합된 행}, {symbol: 원래 행 번호 목록})."""
+    merged: dict[str, AssetCreateExtended] = {}
+    row_indexes: dict[str, list[int]] = {}
+    for index, row in enumerate(rows):
+        symbol = row.symbol.upper()
+        if symbol in merged:
+            existing = merged[symbol]
+            existing.average_price = _weighted_average(
+                existing.quantity, existing.average_price, row.quantity, row.average_price
+            )
+            existing.quantity = existing.quantity + row.quantity
+            if existing.exchange_rate is None and row.exchange_rate is not None:
+                existing.exchange_rate = row.exchange_rate
+            row_indexes[symbol].append(index)
+        else:
+            merged[symbol] = row.model_copy(update={"symbol": symbol})
+            row_indexes[symbol] = [index]
+    return merged, row_indexes
+
+
+async def resolve_fx_rates(currencies: set[str]) -> dict[str, float | Exception]:
+    """통화별 KRW 환율을 한 번씩 동시 조회. 실패한 통화는 예외 객체."""
+    ordered = sorted(currencies)
+    results = await asyncio.gather(*(get_exchange_rate(c, "KRW") for c in ordered), return_exceptions=True)
+    return dict(zip(ordered, results))
+
+
+def _failure(symbol: str, rows: list[int], error: str) -> dict[str, Any]:
+    return {"row": rows[0] if rows else None, "rows": rows, "symbol": symbol, "error": error}
+
+
+async def import_assets(assets_col, user_id: str, rows: list[AssetCreateExtended]) -> BulkAssetResponse:
+    now = datetime.utcnow()
+    merged, row_indexes = merge_rows(rows)
+    failures: list[dict[str, Any]] = []
+
+    for asset in merged.values():
+        asset.currency = (asset.currency or "KRW").upper()
+    missing_fx = {a.currency for a in merged.values() if a.currency in FX_CURRENCIES and a.exchange_rate is None}
+    fx_rates = await resolve_fx_rates(missing_fx) if missing_fx else {}
+
+    existing_docs: dict[str, dict] = {}
+    if merged:
+        cursor = assets_col.find(
+            {"user_id": user_id, "symbol": {"$in": list(merged)}},
+            {"symbol": 1, "quantity": 1, "average_price": 1},
+        )
+        async for doc in cursor:
+            existing_docs[doc["symbol"]] = doc
+
+    operations: list[UpdateOne] = []
+    operation_symbols: list[str] = []
+    for symbol, asset in merged.items():
+        if asset.currency in missing_fx:
+            rate = fx_rates.get(asset.currency)
+            if isinstance(rate, Exception):
+                failures.append(_failure(symbol, row_indexes[symbol], str(rate)))
+                continue
+            asset.exchange_rate = rate
+
+        existing = existing_docs.get(symbol) or {}
+        existing_quantity = existing.get("quantity", 0)
+        total_quantity = existing_quantity + asset.quantity
+        new_average = _weighted_average(
+            existing_quantity, existing.get("average_price", 0), asset.quantity, asset.average_price
+        )
+
+        update_fields = {
+            "user_id": user_id,
+            "symbol": symbol,
+            "name": asset.name,
+            "asset_type": asset.asset_type,
+            "quantity": total_quantity,
+            "average_price": new_average,
+            "currency": asset.currency,
+            "updated_at": now,
+        }
+        for field in OPTIONAL_FIELDS:
+            value = getattr(asset, field)
+            if value is not None:
+                update_fields[field] = value
+
+        operations.append(
+            UpdateOne(
+                {"user_id": user_id, "symbol": symbol},
+                {
+                    "$set": update_fields,
+                    "$setOnInsert": {"created_at": now, "current_price": new_average},
+                },
+                upsert=True,
+            )
+        )
+        operation_symbols.append(symbol)
+
+    created_ids: list[str] = []
+    success_count = len(operations)
+    if operations:
+        try:
+            result = await assets_col.bulk_write(operations, ordered=False)
+            created_ids = [str(_id) for _id in (result.upserted_ids or {}).values()]
+        except BulkWriteError as exc:
+            details = exc.details or {}
+            write_errors = details.get("writeErrors", [])
+            for error in write_errors:
+                error_index = error.get("index")
+                symbol = (
+                    operation_symbols[error_index]
+                    if error_index is not None and error_index < len(operation_symbols)
+                    else None
+                )
+                failures.append(
+                    _failure(symbol, row_indexes.get(symbol, []), error.get("errmsg", str(exc)))
+                )
+            created_ids = [str(item.get("_id")) for item in details.get("upserted", []) if item.get("_id")]
+            success_count = max(0, success_count - len(write_errors))
+        except Exception as exc:
+            logger.warning("Bulk asset import failed: %s", exc)
+            failures.extend(_failure(symbol, row_indexes[symbol], str(exc)) for symbol in operation_symbols)
+            success_count = 0
+
+    return BulkAssetResponse(
+        success_count=success_count,
+        failure_count=len(failures),
+        failures=failures,
+        created_ids=created_ids,
+    )
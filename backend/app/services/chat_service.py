@@ -3,19 +3,25 @@
 AI Chat Service - AWS Bedrock + RAG (??? + ? + ????
 """
 import asyncio
+import os
+import time
 import uuid
 import json
 import re
 import boto3
 from botocore.config import Config
-from typing import AsyncGenerator, List, Dict, Optional, Tuple
+from collections import Counter, deque
+from typing import AsyncGenerator, Awaitable, List, Dict, Optional, Tuple, TypeVar
 from datetime import datetime
 
-from .market_data import crypto_client, kis_client
+from .market_data import crypto_client, get_prices
+from ..cache import REDIS_OP_TIMEOUT_SEC
 from ..config import get_settings
 from ..database import get_news_collection, get_assets_collection
 from ..services.exchange_rate import get_exchange_rate
+from .news_retrieval import NewsRetriever
 from ..mariadb import get_user_portfolios
+from workers import embedding_cache
 
 try:
     from elasticsearch import AsyncElasticsearch
@@ -23,12 +29,39 @@ try:
 except ImportError:
     _ES_AVAILABLE = False
 
+try:
+    from prometheus_client import Histogram
+    CHAT_TTFT_SECONDS = Histogram(
+        "chat_ttft_seconds",
+        "Chat stream time to first token (request start -> first delta event)",
+        ["backend"],
+        buckets=(0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0),
+    )
+    CHAT_CONTEXT_SECONDS = Histogram(
+        "chat_context_source_seconds",
+        "Chat context source latency by outcome (ok / timeout / error)",
+        ["source", "outcome"],
+        buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 3.0, 5.0),
+    )
+except ImportError:
+    CHAT_TTFT_SECONDS = None
+    CHAT_CONTEXT_SECONDS = None
+
 logger = logging.getLogger(__name__)
+T = TypeVar("T")
 
 RAG_NEWS_LIMIT = 12
+QUERY_EMBED_MODEL_ID = "amazon.titan-embed-text-v2:0"
+QUERY_EMBED_DIMS = 1024
 RAG_NEWS_BODY_MAX_CHARS = 700
 RAG_NEWS_RECENT_DAYS = 14
 PORTFOLIO_KEYWORD_ASSET_LIMIT = 5
+# 컨텍스트 소스별 예산(초). 넘긴 소스는 빈 값으로 두고 바로 답변 스트리밍을 시작한다.
+# 시세는 예산 안에 끝난 종목(캐시 포함)은 살리고 늦은 벤더 호출만 버린다.
+CHAT_PORTFOLIO_BUDGET_SEC = float(os.getenv("CHAT_PORTFOLIO_BUDGET_SEC", "1.5"))
+CHAT_PRICE_BUDGET_SEC = float(os.getenv("CHAT_PRICE_BUDGET_SEC", "2.0"))
+CHAT_NEWS_BUDGET_SEC = float(os.getenv("CHAT_NEWS_BUDGET_SEC", "3.0"))
+CHAT_TTFT_WINDOW = 500
 PORTFOLIO_QUERY_HINTS = (
     "포트폴리오",
     "내 포트폴리오",
@@ -204,6 +237,13 @@ class ChatService:
         self.settings = get_settings()
         self.bedrock_client = None
         self.es_client = None
+        self.news_retriever: Optional[NewsRetriever] = None
+        self._ttft_samples: deque = deque(maxlen=CHAT_TTFT_WINDOW)
+        self._context_timeouts: Counter = Counter()
+        # 같은 질문 텍스트는 쿼리 임베딩을 재사용 (indexer와 같은 캐시 키 규칙)
+        self.query_embedding_cache = embedding_cache.from_env(
+            QUERY_EMBED_MODEL_ID, QUERY_EMBED_DIMS, redis_url=self.settings.REDIS_URL
+        )
 
         # Elasticsearch 클라이언트 초기화
         if _ES_AVAILABLE:
@@ -212,6 +252,7 @@ class ChatService:
                     hosts=[self.settings.ELASTICSEARCH_URL],
                     request_timeout=5,
                 )
+                self.news_retriever = NewsRetriever(self.es_client, self.settings.ELASTICSEARCH_INDEX)
                 logger.info("Elasticsearch client initialized: %s", self.settings.ELASTICSEARCH_URL)
             except Exception as e:
                 logger.warning("Elasticsearch 초기화 실패: %s", e)
@@ -425,43 +466,47 @@ class ChatService:
         self,
         crypto_tickers: List[str],
         market_symbols: Optional[List[Tuple[str, str]]] = None,
+        timeout: Optional[float] = None,
     ) -> Dict[str, dict]:
-        """코인 + 주식/ETF 현재가 컨텍스트 수집"""
+        """코인 + 주식/ETF 현재가 컨텍스트 수집 (get_prices 한 번: 캐시 MGET + 벤더별 묶음 조회)"""
         prices: Dict[str, dict] = {}
+        requests = [(ticker, "CRYPTO") for ticker in crypto_tickers]
+        requests += [(symbol, market) for symbol, market in market_symbols or []]
+        batch = await get_prices(requests, timeout=timeout)
 
         for ticker in crypto_tickers:
-            try:
-                data = await self.crypto_client.get_current_price(ticker)
-                prices[ticker] = {
-                    **data,
-                    "kind": "crypto",
-                    "label": COIN_NAMES.get(ticker, ticker),
-                }
-            except Exception as e:
-                logger.warning("Failed to fetch price for {ticker}: %s", e)
+            data = batch.get(ticker.upper()) or {"error": "price unavailable"}
+            if "error" in data:
+                logger.warning("Failed to fetch price for %s: %s", ticker, data["error"])
+                continue
+            prices[ticker] = {
+                **data,
+                "kind": "crypto",
+                "label": COIN_NAMES.get(ticker, ticker),
+            }
 
         for symbol, market in market_symbols or []:
+            data = batch.get(symbol.upper()) or {"error": "price unavailable"}
+            if "error" in data:
+                logger.warning("Failed to fetch market price for %s (%s): %s", symbol, market, data["error"])
+                continue
+            price = float(data.get("price", 0) or 0)
+            if price <= 0:
+                continue
+            raw_output = data.get("raw", {}).get("output", {}) if isinstance(data.get("raw"), dict) else {}
+            change_percent = raw_output.get("prdy_ctrt") or raw_output.get("rate") or data.get("change_percent")
             try:
-                data = await kis_client.get_current_price(symbol, market=market)
-                price = float(data.get("price", 0) or 0)
-                if price <= 0:
-                    continue
-                raw_output = data.get("raw", {}).get("output", {}) if isinstance(data.get("raw"), dict) else {}
-                change_percent = raw_output.get("prdy_ctrt") or raw_output.get("rate")
-                try:
-                    change_percent = float(change_percent) if change_percent is not None else None
-                except (TypeError, ValueError):
-                    change_percent = None
-
-                prices[symbol] = {
-                    **data,
-                    "kind": "market",
-                    "label": symbol,
-                    "market": market,
-                    "change_percent": change_percent,
-                }
-            except Exception as e:
-                logger.warning("Failed to fetch market price for %s (%s): %s", symbol, market, e)
+                change_percent = float(change_percent) if change_percent is not None else None
+            except (TypeError, ValueError):
+                change_percent = None
+
+            prices[symbol] = {
+                **data,
+                "kind": "market",
+                "label": symbol,
+                "market": market,
+                "change_percent": change_percent,
+            }
 
         return prices
 
@@ -549,138 +594,82 @@ class ChatService:
         """Bedrock Titan으로 쿼리 임베딩 생성 (kNN용)"""
         if not self.bedrock_client:
             return None
+
+        def invoke(text: str) -> Optional[List[float]]:
+            response = self.bedrock_client.invoke_model(
+                modelId=QUERY_EMBED_MODEL_ID,
+                body=json.dumps({"inputText": text, "dimensions": QUERY_EMBED_DIMS, "normalize": True}),
+                contentType="application/json",
+                accept="application/json",
+            )
+            body = json.loads(response["body"].read())
+            return body.get("embedding")
+
+        cache = self.query_embedding_cache
         try:
             loop = asyncio.get_running_loop()
-            response = await loop.run_in_executor(
+            return await loop.run_in_executor(
                 None,
-                lambda: self.bedrock_client.invoke_model(
-                    modelId="amazon.titan-embed-text-v2:0",
-                    body=json.dumps({"inputText": query, "dimensions": 1024, "normalize": True}),
-                    contentType="application/json",
-                    accept="application/json",
-                ),
+                lambda: cache.get_or_embed(query, invoke) if cache is not None else invoke(query),
             )
-            body = json.loads(response["body"].read())
-            return body.get("embedding")
         except Exception as e:
             logger.warning("쿼리 임베딩 생성 실패: %s", e)
             return None
 
-    def _build_es_body(
-        self,
-        expanded_terms: List[str],
-        embedding: Optional[List[float]],
-        limit: int,
-        recent_only: bool = True,
-    ) -> dict:
-        """ES 검색 바디 구성 (BM25 bool/should + 선택적 kNN 하이브리드)"""
-        source_fields = ["title", "content", "summary", "source", "press", "published_at", "url", "finance_origin_link"]
-        recent_range = {"range": {"published_at": {"gte": f"now-{RAG_NEWS_RECENT_DAYS}d/d"}}}
-
-        if not expanded_terms:
-            # 키워드 없음 → 최신순
-            query: dict = {"match_all": {}}
-            if recent_only:
-                query = {"bool": {"filter": [recent_range]}}
-            return {
-                "query": query,
-                "sort": [{"published_at": "desc"}],
-                "size": limit,
-                "_source": source_fields,
-            }
-
-        joined = " ".join(expanded_terms)
-
-        # BM25 bool/should: 정확한 구문 > 단어 > fuzzy
-        bm25_query = {
-            "bool": {
-                "should": [
-                    # 구문 일치 (가장 높은 가중치)
-                    {
-                        "multi_match": {
-                            "query": joined,
-                            "fields": ["title^5", "content^2", "summary^2"],
-                            "type": "phrase",
-                        }
-                    },
-                    # 단어 일치 (BM25 best_fields)
-                    {
-                        "multi_match": {
-                            "query": joined,
-                            "fields": ["title^3", "content", "summary"],
-                            "type": "best_fields",
-                            "operator": "or",
-                        }
-                    },
-                    # fuzzy 오타 허용 (낮은 가중치)
-                    {
-                        "multi_match": {
-                            "query": joined,
-                            "fields": ["title^2", "content", "summary"],
-                            "type": "best_fields",
-                            "fuzziness": "AUTO",
-                            "boost": 0.5,
-                        }
-                    },
-                ],
-                "minimum_should_match": 1,
-            }
+    async def _with_budget(self, source: str, awaitable: Awaitable[T], budget: float, default: T) -> T:
+        """컨텍스트 소스 하나를 예산 안에서 실행. 시간 초과/오류면 default로 두고 답변을 막지 않는다."""
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await asyncio.wait_for(awaitable, timeout=budget)
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            self._context_timeouts[source] += 1
+            logger.warning("Chat context '%s' exceeded %.2fs budget, skipped", source, budget)
+            return default
+        except Exception as e:
+            outcome = "error"
+            logger.warning("Chat context '%s' failed: %s", source, e)
+            return default
+        finally:
+            if CHAT_CONTEXT_SECONDS is not None:
+                CHAT_CONTEXT_SECONDS.labels(source, outcome).observe(time.perf_counter() - started)
+
+    def _record_ttft(self, started: float, backend: str) -> None:
+        ttft = time.perf_counter() - started
+        self._ttft_samples.append(ttft)
+        if CHAT_TTFT_SECONDS is not None:
+            CHAT_TTFT_SECONDS.labels(backend).observe(ttft)
+
+    def context_stats(self) -> dict:
+        """컨텍스트 예산 / 소스별 시간 초과 횟수 / 최근 TTFT 분포 (/chat/health 노출)"""
+        samples = sorted(self._ttft_samples)
+
+        def pct(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * (len(samples) - 1)))] * 1000, 1)
+
+        return {
+            "budgets_sec": {
+                "portfolio": CHAT_PORTFOLIO_BUDGET_SEC,
+                "prices": CHAT_PRICE_BUDGET_SEC,
+                "news": CHAT_NEWS_BUDGET_SEC,
+            },
+            "timeouts": dict(self._context_timeouts),
+            "ttft_ms": {"count": len(samples), "p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0)},
         }
 
-        # kNN: 문서 임베딩이 있을 때만 하이브리드, 없으면 BM25만
-        if embedding:
-            query = bm25_query
-            if recent_only:
-                query = {
-                    "bool": {
-                        "must": [bm25_query],
-                        "filter": [recent_range],
-                        "boost": 0.6,
-                    }
-                }
-            else:
-                query["bool"]["boost"] = 0.6
-
-            knn = {
-                "field": "embedding",
-                "query_vector": embedding,
-                "k": limit,
-                "num_candidates": limit * 4,
-                "boost": 0.4,  # BM25 60% : kNN 40%
-            }
-            if recent_only:
-                knn["filter"] = recent_range
-
-            return {
-                "knn": knn,
-                "query": query,
-                "size": limit,
-                "_source": source_fields,
-            }
-        else:
-            query = bm25_query
-            if recent_only:
-                query = {
-                    "bool": {
-                        "must": [bm25_query],
-                        "filter": [recent_range],
-                    }
-                }
-            return {
-                "query": query,
-                "sort": [{"_score": "desc"}, {"published_at": "desc"}],
-                "size": limit,
-                "_source": source_fields,
-            }
+    def embedding_cache_stats(self) -> Optional[dict]:
+        return self.query_embedding_cache.stats() if self.query_embedding_cache is not None else None
 
     async def _fetch_news_es(
         self,
         keywords: List[str],
         limit: int = RAG_NEWS_LIMIT,
-        recent_only: bool = True,
     ) -> List[dict]:
-        """ES 뉴스 검색: 유사어 확장 + BM25 bool/should + kNN 하이브리드"""
-        if not self.es_client:
+        """ES 뉴스 검색: 유사어 확장 + BM25/kNN 하이브리드 (news_retrieval, 기본 RRF + 시간 감쇠 한 번의 요청)"""
+        if not self.news_retriever:
             return []
         try:
             # 1. 유사어 확장
@@ -692,18 +681,11 @@ class ChatService:
                 query_text = " ".join(expanded)
                 embedding = await self._generate_query_embedding(query_text)
 
-            # 3. ES 검색 바디 구성 및 실행
-            body = self._build_es_body(expanded, embedding, limit, recent_only=recent_only)
-            resp = await self.es_client.search(index=self.settings.ELASTICSEARCH_INDEX, body=body)
-
-            # 4. kNN 사용했지만 결과 없으면 (문서 임베딩 미존재) BM25 단독 재시도
-            if embedding and not resp["hits"]["hits"]:
-                logger.info("kNN 결과 없음 (문서 임베딩 미존재), BM25 단독 재시도")
-                body_bm25 = self._build_es_body(expanded, None, limit, recent_only=recent_only)
-                resp = await self.es_client.search(index=self.settings.ELASTICSEARCH_INDEX, body=body_bm25)
+            # 3. 검색 (kNN 결과가 없어도 BM25 순위로 채워지므로 재검색하지 않는다)
+            hits, mode = await self.news_retriever.search(expanded, embedding, limit)
 
             news_list = []
-            for hit in resp["hits"]["hits"]:
+            for hit in hits:
                 src = hit["_source"]
                 body_text = src.get("summary") or src.get("content") or ""
                 body_truncated = (
@@ -720,15 +702,19 @@ class ChatService:
                     "url": src.get("finance_origin_link") or src.get("url"),
                 })
 
-            mode = "hybrid(BM25+kNN)" if embedding else "BM25"
-            if not news_list and recent_only:
-                return await self._fetch_news_es(keywords, limit=limit, recent_only=False)
             logger.info("ES 뉴스 검색 성공: %d건 | mode=%s | expanded=%s", len(news_list), mode, expanded[:5])
             return news_list
         except Exception as e:
             logger.warning("ES 뉴스 검색 실패, MongoDB fallback: %s", e)
             return []
 
+    async def _fetch_context_news(self, keywords: List[str]) -> List[dict]:
+        """ES 우선 검색, 실패 시 MongoDB fallback"""
+        news_list = await self._fetch_news_es(keywords, limit=RAG_NEWS_LIMIT)
+        if not news_list:
+            news_list = await self._fetch_news(keywords, limit=RAG_NEWS_LIMIT)
+        return news_list
+
     async def _fetch_portfolio(self, user_id: str) -> tuple[List[dict], bool]:
         """MariaDB ???? (MongoDB fallback)"""
         try:
@@ -1005,19 +991,16 @@ class ChatService:
     ) -> AsyncGenerator[str, None]:
         """SSE stream response"""
 
+        request_started = time.perf_counter()
         conv_id = conversation_id or str(uuid.uuid4())
         msg_id = str(uuid.uuid4())
 
         # 1. Start event
         yield f"event: start\ndata: {json.dumps({'conversation_id': conv_id, 'message_id': msg_id})}\n\n"
 
-        # 2. RAG: keywords -> prices/news/portfolio
+        # 2. RAG: 질문 파싱 후 시세 / 포트폴리오 / 뉴스를 소스별 예산으로 동시에 수집
+        #    시세·포트폴리오는 바로 시작, 뉴스는 포트폴리오 키워드가 필요한 질문만 포트폴리오를 기다린다.
         try:
-            portfolio = []
-            portfolio_fetch_failed = False
-            if user_id:
-                portfolio, portfolio_fetch_failed = await self._fetch_portfolio(user_id)
-
             tickers = self._extract_tickers(message)
             market_symbols = self._extract_market_symbols(message)
             query_keywords = self._extract_query_keywords(message)
@@ -1030,18 +1013,40 @@ class ChatService:
                 tickers,
                 market_symbols,
             )
-            keywords = self._extract_keywords(
-                message,
-                portfolio=portfolio,
-                include_portfolio_keywords=include_portfolio_keywords,
-            )
 
-            prices = await self._fetch_prices(tickers, market_symbols)
+            # 시세: 벤더 조회는 예산에서 끊고(캐시 종목은 유지), 바깥 상한에 Redis MGET 시간만 더한다
+            prices_task = asyncio.create_task(self._with_budget(
+                "prices",
+                self._fetch_prices(tickers, market_symbols, timeout=CHAT_PRICE_BUDGET_SEC),
+                CHAT_PRICE_BUDGET_SEC + REDIS_OP_TIMEOUT_SEC,
+                {},
+            ))
+            portfolio_task = asyncio.create_task(self._with_budget(
+                "portfolio",
+                self._fetch_portfolio(user_id),
+                CHAT_PORTFOLIO_BUDGET_SEC,
+                ([], True),
+            )) if user_id else None
+
+            async def collect_news() -> List[dict]:
+                portfolio_for_keywords = []
+                if include_portfolio_keywords and portfolio_task is not None:
+                    portfolio_for_keywords, _ = await portfolio_task
+                keywords = self._extract_keywords(
+                    message,
+                    portfolio=portfolio_for_keywords,
+                    include_portfolio_keywords=include_portfolio_keywords,
+                )
+                return await self._with_budget("news", self._fetch_context_news(keywords), CHAT_NEWS_BUDGET_SEC, [])
 
-            # ES 우선 검색, 실패 시 MongoDB fallback
-            news_list = await self._fetch_news_es(keywords, limit=RAG_NEWS_LIMIT)
-            if not news_list:
-                news_list = await self._fetch_news(keywords, limit=RAG_NEWS_LIMIT)
+            news_task = asyncio.create_task(collect_news())
+            try:
+                prices, news_list = await asyncio.gather(prices_task, news_task)
+                portfolio, portfolio_fetch_failed = (await portfolio_task) if portfolio_task else ([], False)
+            finally:
+                for task in (prices_task, news_task, portfolio_task):
+                    if task is not None and not task.done():
+                        task.cancel()
 
             sources = self._build_sources(prices, news_list, portfolio, portfolio_fetch_failed)
         except Exception as e:
@@ -1058,20 +1063,30 @@ class ChatService:
         portfolio_context = self._build_portfolio_context(portfolio, prices, portfolio_fetch_failed)
         user_message = f"{portfolio_context}\n{price_context}\n{news_context}\n\n??? ??: {message}".strip()
 
-        # 5. Bedrock stream or Mock fallback
+        # 5. Bedrock stream or Mock fallback (첫 delta까지 시간 = TTFT)
+        first_token = False
         if self.bedrock_client:
             try:
                 async for token in self._call_bedrock_stream(user_message):
+                    if not first_token:
+                        first_token = True
+                        self._record_ttft(request_started, "bedrock")
                     yield f"event: delta\ndata: {json.dumps({'content': token})}\n\n"
             except Exception as e:
                 logger.error("Bedrock ?? ??: %s", e)
                 response = self._generate_mock_response(message, prices)
                 for word in response.split(' '):
+                    if not first_token:
+                        first_token = True
+                        self._record_ttft(request_started, "mock")
                     yield f"event: delta\ndata: {json.dumps({'content': word + ' '})}\n\n"
                     await asyncio.sleep(0.03)
         else:
             response = self._generate_mock_response(message, prices)
             for word in response.split(' '):
+                if not first_token:
+                    first_token = True
+                    self._record_ttft(request_started, "mock")
                 yield f"event: delta\ndata: {json.dumps({'content': word + ' '})}\n\n"
                 await asyncio.sleep(0.03)
 
@@ -4,9 +4,8 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict
 
-import httpx
-
 from ..config import get_settings
+from .http_clients import http_clients
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
@@ -29,8 +28,8 @@ async def _fetch_live_rates() -> Dict[str, float] | None:
     timeout = float(settings.EXCHANGE_RATE_TIMEOUT_SECONDS)
 
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(url)
+        async with http_clients.session("fx") as client:
+            response = await client.get(url, timeout=timeout)
             response.raise_for_status()
             payload = response.json()
             rates = payload.get("rates", {})
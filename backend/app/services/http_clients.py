@@ -0,0 +1,182 @@
+"""
+============================================
+Vendor HTTP Client Registry
+============================================
+
+시세 벤더(KIS/Upbit/Binance/Finnhub/Polygon/환율/KRX)별로 앱 수명 동안 유지하는 httpx.AsyncClient.
+
+- 요청마다 AsyncClient를 새로 만들면 TCP+TLS 핸드셰이크를 매번 다시 한다 → 벤더별 커넥션 풀 재사용
+- 벤더별 커넥션 한도 / keep-alive / timeout / 연결 재시도 횟수 / HTTP/2 여부를 VENDOR_PROFILES에서 관리
+- main.py lifespan에서 start()/close(). start 이전 호출(스크립트 등)은 get() 시점에 lazy 생성
+- stats(): 벤더별 진행 중 요청 수(풀 사용률)와 요청/오류 카운터 (/market/status 노출)
+  httpx 내부(_transport._pool)는 읽지 않고 transport를 감싸 직접 센다. 유휴 커넥션 수는 공개 API가 없어 내지 않는다.
+"""
+
+import importlib.util
+import logging
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+HTTP_POOL_SCALE = max(1, int(os.getenv("HTTP_POOL_SCALE", "1")))
+
+
+@dataclass(frozen=True)
+class VendorProfile:
+    timeout: float
+    connect_timeout: float = 3.0
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    retries: int = 1
+    follow_redirects: bool = False
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+VENDOR_PROFILES: dict[str, VendorProfile] = {
+    # KIS는 초당 호출 한도가 낮아 커넥션을 넉넉히 열 이유가 없다.
+    "kis": VendorProfile(timeout=10.0, max_connections=10, max_keepalive=10, keepalive_expiry=60.0),
+    "upbit": VendorProfile(timeout=5.0, max_connections=30, max_keepalive=20, http2=True),
+    "binance": VendorProfile(timeout=5.0, max_connections=20, max_keepalive=10, http2=True),
+    "finnhub": VendorProfile(timeout=10.0, max_connections=10, max_keepalive=5),
+    "polygon": VendorProfile(timeout=12.0, max_connections=10, max_keepalive=5, http2=True),
+    "fx": VendorProfile(timeout=5.0, max_connections=5, max_keepalive=2, follow_redirects=True),
+    "yahoo": VendorProfile(
+        timeout=10.0,
+        max_connections=10,
+        max_keepalive=5,
+        headers={"User-Agent": "Mozilla/5.0 TutumMarketMonitor/1.0"},
+    ),
+    "krx": VendorProfile(timeout=20.0, max_connections=2, max_keepalive=1, retries=2),
+}
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """응답 본문을 다 읽거나 닫을 때 진행 중 카운터를 한 번 내린다."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, counters: dict[str, int]):
+        self._stream = stream
+        self._counters = counters
+        self._done = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._done:
+            self._done = True
+            self._counters["active"] -= 1
+        await self._stream.aclose()
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """요청 시작부터 응답 스트림이 닫힐 때까지를 active로 센다 (HTTP/1.1이면 사용 중인 커넥션 수)."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, counters: dict[str, int]):
+        self._transport = transport
+        self._counters = counters
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._counters["active"] += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._counters["active"] -= 1
+            raise
+        response.stream = _CountedStream(response.stream, self._counters)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class HttpClientRegistry:
+    def __init__(self, profiles: dict[str, VendorProfile]):
+        self.profiles = profiles
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._counters: dict[str, dict[str, int]] = {}
+
+    async def start(self):
+        for vendor in self.profiles:
+            self.get(vendor)
+        logger.info("Vendor HTTP clients ready: %s (http2=%s)", ",".join(self._clients), HTTP2_AVAILABLE)
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for vendor, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as exc:
+                logger.debug("Vendor HTTP client close failed (%s): %s", vendor, exc)
+
+    def get(self, vendor: str) -> httpx.AsyncClient:
+        client = self._clients.get(vendor)
+        if client is None or client.is_closed:
+            client = self._build(vendor)
+            self._clients[vendor] = client
+        return client
+
+    @asynccontextmanager
+    async def session(self, vendor: str) -> AsyncIterator[httpx.AsyncClient]:
+        """`async with httpx.AsyncClient(...)` 자리를 그대로 대체한다 (종료 시 닫지 않음)."""
+        yield self.get(vendor)
+
+    def _build(self, vendor: str) -> httpx.AsyncClient:
+        profile = self.profiles[vendor]
+        limits = httpx.Limits(
+            max_connections=profile.max_connections * HTTP_POOL_SCALE,
+            max_keepalive_connections=profile.max_keepalive * HTTP_POOL_SCALE,
+            keepalive_expiry=profile.keepalive_expiry,
+        )
+        http2 = profile.http2 and HTTP2_AVAILABLE
+        counters = self._counters.setdefault(vendor, {"requests": 0, "errors_5xx": 0, "throttled": 0})
+        # 닫힌 클라이언트를 다시 만들면 이전 클라이언트의 진행 중 요청은 버린다
+        counters["active"] = 0
+
+        async def on_request(request: httpx.Request):
+            counters["requests"] += 1
+
+        async def on_response(response: httpx.Response):
+            if response.status_code == 429:
+                counters["throttled"] += 1
+            elif response.status_code >= 500:
+                counters["errors_5xx"] += 1
+
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(profile.timeout, connect=profile.connect_timeout),
+            # 연결 단계 실패(DNS/TCP/TLS)만 재시도한다. 응답을 받은 요청은 재전송하지 않는다.
+            transport=_CountingTransport(
+                httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=profile.retries), counters
+            ),
+            follow_redirects=profile.follow_redirects,
+            headers=profile.headers or None,
+            event_hooks={"request": [on_request], "response": [on_response]},
+        )
+
+    def stats(self) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for vendor, profile in self.profiles.items():
+            client = self._clients.get(vendor)
+            counters = self._counters.get(vendor, {})
+            active = counters.get("active", 0)
+            max_connections = profile.max_connections * HTTP_POOL_SCALE
+            out[vendor] = {
+                "open": client is not None and not client.is_closed,
+                "http2": profile.http2 and HTTP2_AVAILABLE,
+                "active": active,
+                "max_connections": max_connections,
+                "utilisation": round(active / max_connections, 3) if max_connections else 0.0,
+                **counters,
+            }
+        return out
+
+
+http_clients = HttpClientRegistry(VENDOR_PROFILES)
@@ -9,7 +9,6 @@ Market Data Service
 - Upbit: ?뷀샇?뷀룓 ?쒖꽭 (CCXT ?ъ슜)
 """
 
-import httpx
 import asyncio
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
@@ -25,12 +24,18 @@ import os
 import json
 from pathlib import Path
 from ..config import get_settings
-from ..cache import cache_get, cache_set
+from ..cache import cache_get, cache_mget, cache_set, cache_set_many_with_last_good, mark_portfolio_prices
+from .http_clients import http_clients
+from .single_flight import vendor_flight
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 TOKEN_FILE = str(Path(__file__).resolve().parents[2] / ".cache" / ".kis_token")
 KST = ZoneInfo("Asia/Seoul")
+# get_prices: Upbit 다건 시세 한 요청당 마켓 수 / KIS 동시 호출 수 / 벤더 결과 price:{symbol} TTL(price_consumer와 동일)
+UPBIT_TICKER_BATCH_SIZE = max(1, int(os.getenv("UPBIT_TICKER_BATCH_SIZE", "100")))
+PRICE_BATCH_CONCURRENCY = max(1, int(os.getenv("PRICE_BATCH_CONCURRENCY", "8")))
+PRICE_CACHE_TTL_SEC = max(1, int(os.getenv("PRICE_CACHE_TTL_SEC", "30")))
 
 
 class KISClient:
@@ -105,7 +110,7 @@ class KISClient:
                 "appsecret": self.app_secret,
             }
 
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with http_clients.session("kis") as client:
                 try:
                     response = await client.post(url, headers=headers, json=body)
                     response.raise_for_status()
@@ -144,6 +149,13 @@ class KISClient:
                     raise HTTPException(status_code=500, detail="증권사 API 연동 실패")
 
     async def get_current_price(self, code: str, market: str = "KR"):
+        """동일 종목 동시 요청은 KIS 호출 1회로 병합한다."""
+        return await vendor_flight.do(
+            ("kis", "price", code, market),
+            lambda: self._get_current_price(code, market),
+        )
+
+    async def _get_current_price(self, code: str, market: str = "KR"):
         """????? ??? (???: KR, ???: US)"""
         headers = {
             "content-type": "application/json",
@@ -169,7 +181,7 @@ class KISClient:
         if not self.app_key:
             return {"code": code, "price": 75000, "change": 1.5}
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("kis") as client:
             try:
                 token_retry_codes = {"EGW00121", "EGW00123"}
                 for attempt in range(2):
@@ -250,7 +262,7 @@ class KISClient:
             "token": api_key,
         }
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("finnhub") as client:
             resp = await client.get(url, params=params)
             if resp.status_code != 200:
                 logger.debug("Finnhub intraday status=%s symbol=%s", resp.status_code, symbol)
@@ -303,7 +315,7 @@ class KISClient:
         )
         params = {"adjusted": "true", "sort": "asc", "limit": 50000, "apiKey": api_key}
 
-        async with httpx.AsyncClient(timeout=12.0) as client:
+        async with http_clients.session("polygon") as client:
             resp = await client.get(url, params=params)
             if resp.status_code != 200:
                 logger.debug("Polygon intraday status=%s symbol=%s", resp.status_code, symbol)
@@ -380,7 +392,15 @@ class KISClient:
     async def get_historical_data(
         self, code: str, timeframe: str = "D", market: str = "KR", count: int = 200
     ):
-        """Fetch OHLCV historical data."""
+        """Fetch OHLCV historical data (concurrent identical requests share one vendor call)."""
+        return await vendor_flight.do(
+            ("kis", "history", code, timeframe, market, count),
+            lambda: self._get_historical_data(code, timeframe, market, count),
+        )
+
+    async def _get_historical_data(
+        self, code: str, timeframe: str = "D", market: str = "KR", count: int = 200
+    ):
         token = await self._get_access_token()
         now_kst = datetime.now(KST)
 
@@ -476,7 +496,7 @@ class KISClient:
             "custtype": "P",
         }
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("kis") as client:
             try:
                 if is_overseas:
                     # ?댁쇅: ?щ윭 嫄곕옒???쒕룄 (NAS ??NYS ??AMS)
@@ -648,7 +668,7 @@ class CryptoClient:
         url = "https://api.binance.com/api/v3/ticker/24hr"
         last_error = "unknown"
 
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with http_clients.session("binance") as client:
             for base_symbol, quote_symbol in candidates:
                 response = await client.get(url, params={"symbol": f"{base_symbol}{quote_symbol}"})
                 if response.status_code != 200:
@@ -674,7 +694,55 @@ class CryptoClient:
 
         raise ValueError(f"No Binance market for {ticker_formatted}: {last_error}")
 
+    @staticmethod
+    def _upbit_ticker_result(ticker_formatted: str, ticker_data: dict) -> dict:
+        return {
+            "ticker": ticker_formatted,
+            "price": float(ticker_data["trade_price"]),
+            "change_percent": float(ticker_data["signed_change_rate"]) * 100,
+            "volume": float(ticker_data["acc_trade_volume_24h"]),
+            "updated_at": datetime.fromtimestamp(ticker_data["timestamp"] / 1000).isoformat(),
+        }
+
+    async def get_current_prices(self, tickers: list[str]) -> dict[str, dict]:
+        """
+        Upbit 다건 시세 (/ticker?markets=KRW-BTC,KRW-ETH,...). UPBIT_TICKER_BATCH_SIZE개씩 한 요청.
+        - 반환: {ticker: 결과}. 실패한 묶음/응답에 없는 마켓은 빠진다 (호출 측에서 개별 조회로 폴백)
+        - Upbit는 목록에 없는 마켓이 하나라도 있으면 묶음 전체를 404로 거절한다
+        """
+        chunks = [tickers[i:i + UPBIT_TICKER_BATCH_SIZE] for i in range(0, len(tickers), UPBIT_TICKER_BATCH_SIZE)]
+
+        async def fetch(chunk: list[str]) -> list[dict]:
+            async with http_clients.session("upbit") as client:
+                response = await client.get(f"{self.base_url}/ticker", params={"markets": ",".join(chunk)})
+            if response.status_code != 200:
+                raise ValueError(f"Upbit API Error: status={response.status_code} body={response.text[:200]}")
+            return response.json()
+
+        results: dict[str, dict] = {}
+        payloads = await asyncio.gather(*(fetch(chunk) for chunk in chunks), return_exceptions=True)
+        for chunk, payload in zip(chunks, payloads):
+            if isinstance(payload, Exception):
+                logger.warning("Upbit multi ticker failed (%d markets): %s", len(chunk), payload)
+                continue
+            for row in payload or []:
+                try:
+                    results[row["market"]] = self._upbit_ticker_result(row["market"], row)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning("Upbit ticker parse failed (%s): %s", row.get("market"), e)
+        return results
+
     async def get_current_price(self, ticker: str = "KRW-BTC"):
+        """캐시 만료 직후 동일 티커 동시 요청은 Upbit 호출 1회로 병합한다."""
+        ticker_formatted = ticker.replace("/", "-").upper()
+        if "-" not in ticker_formatted:
+            ticker_formatted = f"KRW-{ticker_formatted}"
+        return await vendor_flight.do(
+            ("upbit", "price", ticker_formatted),
+            lambda: self._get_current_price(ticker_formatted),
+        )
+
+    async def _get_current_price(self, ticker: str = "KRW-BTC"):
         """Upbit ?쒖꽭 議고쉶 (Public API ?곗꽑)"""
         # ?곗빱 ?뺤떇 蹂댁젙 (BTC/KRW -> KRW-BTC)
         ticker_formatted = ticker.replace("/", "-").upper()
@@ -737,7 +805,7 @@ class CryptoClient:
         url = f"{self.base_url}/ticker"
         params = {"markets": ticker_formatted}
 
-        async with httpx.AsyncClient(timeout=5.0) as client:
+        async with http_clients.session("upbit") as client:
             try:
                 response = await client.get(url, params=params)
 
@@ -747,17 +815,7 @@ class CryptoClient:
                     if not data:
                         raise ValueError(f"No data for ticker: {ticker_formatted}")
 
-                    ticker_data = data[0]
-                    result = {
-                        "ticker": ticker_formatted,
-                        "price": float(ticker_data["trade_price"]),
-                        "change_percent": float(ticker_data["signed_change_rate"])
-                        * 100,
-                        "volume": float(ticker_data["acc_trade_volume_24h"]),
-                        "updated_at": datetime.fromtimestamp(
-                            ticker_data["timestamp"] / 1000
-                        ).isoformat(),
-                    }
+                    result = self._upbit_ticker_result(ticker_formatted, data[0])
                     try:
                         await cache_set(cache_key, json.dumps(result), expire_seconds=5)
                     except Exception:
@@ -808,10 +866,16 @@ class CryptoClient:
     async def get_historical_data(
         self, ticker: str = "KRW-BTC", timeframe: str = "days", count: int = 30
     ):
-        """Fetch Upbit OHLCV historical data."""
+        """Fetch Upbit OHLCV historical data (concurrent identical requests share one vendor call)."""
         ticker_formatted = ticker.replace("/", "-")
         if "-" not in ticker_formatted:
             ticker_formatted = f"KRW-{ticker_formatted}"
+        return await vendor_flight.do(
+            ("upbit", "history", ticker_formatted, timeframe, count),
+            lambda: self._get_historical_data(ticker_formatted, timeframe, count),
+        )
+
+    async def _get_historical_data(self, ticker_formatted: str, timeframe: str, count: int):
 
         # Redis 캐시 확인 (분봉: 30초, 일봉 이상: 5분)
         cache_key = f"market:crypto:history:{ticker_formatted}:{timeframe}:{count}"
@@ -828,7 +892,7 @@ class CryptoClient:
         url = f"{self.base_url}{path}"
         params = {"market": ticker_formatted, "count": count}
 
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with http_clients.session("upbit") as client:
             try:
                 response = await client.get(url, params=params)
                 if response.status_code == 200:
@@ -893,7 +957,7 @@ async def get_exchange_rates():
     # 2. ?몃? API ?몄텧 (Open Exchange Rate API - USD Base)
     url = "https://open.er-api.com/v6/latest/USD"
 
-    async with httpx.AsyncClient(timeout=5.0) as client:
+    async with http_clients.session("fx") as client:
         try:
             response = await client.get(url)
             if response.status_code == 200:
@@ -927,3 +991,169 @@ async def get_exchange_rates():
             logger.error("Exchange Rate API Error: %s", e)
 
     return fallback_rates
+
+
+def _crypto_ticker(symbol: str) -> str:
+    ticker = symbol.replace("/", "-").upper()
+    return ticker if "-" in ticker else f"KRW-{ticker}"
+
+
+def _price_from_cache(symbol: str, market: str, raw: str | None) -> dict | None:
+    """price:{symbol} 캐시 값 → 응답 dict. 가격이 없거나 다른 자산(예: 코인 자리에 주식) 캐시면 None."""
+    if not raw:
+        return None
+    try:
+        row = json.loads(raw)
+        price = float(row.get("price", 0) or 0)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if price <= 0:
+        return None
+    if market != "CRYPTO":
+        return row
+    asset_type = str(row.get("asset_type", "")).lower()
+    currency = str(row.get("currency", "")).upper()
+    if asset_type not in ("", "crypto") or currency not in ("", "KRW"):
+        return None
+    return {
+        "ticker": _crypto_ticker(symbol),
+        "price": price,
+        "change_percent": float(row.get("change_percent", 0) or 0),
+        "volume": float(row.get("volume", 0) or 0),
+        "updated_at": row.get("timestamp") or row.get("cached_at") or row.get("updated_at"),
+        "asset_type": "crypto",
+        "currency": "KRW",
+    }
+
+
+async def get_prices(symbols: list[tuple[str, str]], timeout: float | None = None) -> dict[str, dict]:
+    """
+    여러 종목 현재가 일괄 조회 (자산 목록 / 다건 시세 API / 채팅 컨텍스트 공용)
+    - symbols: (symbol, market) 목록. market은 "CRYPTO" | "KR" | "US" (코인은 BTC, KRW-BTC 모두 가능)
+    - 반환: {symbol(대문자): 가격 dict}. 벤더 실패 시 last_good(stale=True), 그것도 없으면 {"error": ...}
+    - US 주식은 KIS 응답 그대로 USD (KRW 환산은 호출 측)
+
+    1) price:{symbol}, price:{symbol}:last_good 전부를 MGET 한 번으로 읽는다
+    2) 신선 캐시가 없는 KRW 코인은 Upbit 다건 시세 한 요청 (실패분만 crypto_client 개별 조회 → Binance 폴백)
+    3) KIS는 다건 시세 API가 없어 PRICE_BATCH_CONCURRENCY개씩 동시에 조회 (vendor_flight로 중복 병합)
+    4) 벤더 결과는 파이프라인 한 번으로 price:{symbol}(+last_good)에 저장하고 보유자 평가금액(portfolio_valuation)에 반영
+    - timeout: 벤더 조회 전체 예산(초). 넘긴 종목은 취소하고 last_good/error로 채운다
+    """
+    wanted: dict[str, tuple[str, str | None]] = {}
+    for symbol, market in symbols:
+        symbol = (symbol or "").strip().upper()
+        if not symbol:
+            continue
+        market = (market or "").strip().upper()
+        if market == "CRYPTO":
+            quote, base = _crypto_ticker(symbol).split("-", 1)
+            # price:{symbol} 실시간 캐시는 KRW 마켓만 base 심볼로 저장된다
+            wanted[symbol] = (market, base if quote == "KRW" else None)
+        else:
+            wanted[symbol] = (market if market in ("KR", "US") else "KR", symbol)
+
+    cache_symbols = sorted({cache_symbol for _, cache_symbol in wanted.values() if cache_symbol})
+    keys = [key for s in cache_symbols for key in (f"price:{s}", f"price:{s}:last_good")]
+    cached = dict(zip(keys, await cache_mget(keys)))
+
+    results: dict[str, dict] = {}
+    last_good: dict[str, dict] = {}
+    upbit: dict[str, str] = {}
+    single: list[str] = []
+    for symbol, (market, cache_symbol) in wanted.items():
+        fresh = _price_from_cache(symbol, market, cached.get(f"price:{cache_symbol}"))
+        if fresh:
+            results[symbol] = {**fresh, "source": "cache"}
+            continue
+        stale = _price_from_cache(symbol, market, cached.get(f"price:{cache_symbol}:last_good"))
+        if stale:
+            last_good[symbol] = {**stale, "stale": True, "source": "last_good"}
+        if market == "CRYPTO" and cache_symbol:
+            upbit[_crypto_ticker(symbol)] = symbol
+        else:
+            single.append(symbol)
+
+    kis_slots = asyncio.Semaphore(PRICE_BATCH_CONCURRENCY)
+
+    async def fetch_one(symbol: str) -> dict[str, dict | Exception]:
+        market = wanted[symbol][0]
+        try:
+            if market == "CRYPTO":
+                return {symbol: await crypto_client.get_current_price(symbol)}
+            async with kis_slots:
+                return {symbol: await kis_client.get_current_price(symbol, market=market)}
+        except Exception as e:
+            return {symbol: e}
+
+    async def fetch_upbit() -> dict[str, dict | Exception]:
+        try:
+            found = await crypto_client.get_current_prices(list(upbit))
+        except Exception as e:
+            logger.warning("Upbit batch price lookup failed: %s", e)
+            found = {}
+        return {upbit[ticker]: data for ticker, data in found.items() if ticker in upbit}
+
+    tasks = {asyncio.create_task(fetch_one(symbol)): [symbol] for symbol in single}
+    upbit_task = asyncio.create_task(fetch_upbit()) if upbit else None
+    if upbit_task is not None:
+        tasks[upbit_task] = list(upbit.values())
+    fetched: dict[str, dict | Exception] = {}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+    pending = set(tasks)
+    while pending:
+        remaining = max(0.0, deadline - loop.time()) if deadline is not None else None
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break
+        for task in done:
+            found = task.result()
+            fetched.update(found)
+            if task is upbit_task:
+                # 배치 결과는 바로 쓰고, 배치에서 빠진 코인만 개별 task로 같은 예산 안에서 조회한다.
+                for symbol in upbit.values():
+                    if symbol not in found:
+                        fallback = asyncio.create_task(fetch_one(symbol))
+                        tasks[fallback] = [symbol]
+                        pending.add(fallback)
+    for task in pending:
+        task.cancel()
+        for symbol in tasks[task]:
+            fetched[symbol] = TimeoutError(f"vendor lookup exceeded {timeout}s budget")
+
+    to_cache: dict[str, str] = {}
+    ticks: dict[str, float] = {}
+    for symbol, outcome in fetched.items():
+        market, cache_symbol = wanted[symbol]
+        if isinstance(outcome, Exception) or not isinstance(outcome, dict):
+            logger.warning("Price lookup failed (%s/%s): %s", symbol, market, outcome)
+            continue
+        try:
+            price = float(outcome.get("price", 0) or 0)
+        except (TypeError, ValueError):
+            price = 0.0
+        if price <= 0:
+            continue
+        data = dict(outcome)
+        if market == "CRYPTO" and cache_symbol:
+            data.setdefault("asset_type", "crypto")
+            data.setdefault("currency", "KRW")
+        data.setdefault("source", "api")
+        results[symbol] = data
+        if cache_symbol and not data.get("mock"):
+            to_cache[f"price:{cache_symbol}"] = json.dumps(data)
+            ticks[cache_symbol] = price
+    await cache_set_many_with_last_good(to_cache, expire_seconds=PRICE_CACHE_TTL_SEC)
+    # price_consumer tick과 같이 보유자 평가금액에도 반영 (실시간 피드가 없는 종목)
+    await mark_portfolio_prices(ticks)
+
+    ordered: dict[str, dict] = {}
+    for symbol in wanted:
+        if symbol in results:
+            ordered[symbol] = results[symbol]
+        elif symbol in last_good:
+            ordered[symbol] = last_good[symbol]
+        else:
+            outcome = fetched.get(symbol)
+            ordered[symbol] = {"error": str(outcome) if isinstance(outcome, Exception) else "price unavailable"}
+    return ordered
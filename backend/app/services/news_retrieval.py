@@ -0,0 +1,292 @@
+"""
+============================================
+News Retrieval (BM25 + kNN 하이브리드 검색)
+============================================
+
+chat RAG의 ES 뉴스 검색 엔진. 검색 방식과 kNN 파라미터를 환경변수로 조정한다.
+
+- RAG_FUSION_MODE
+  - rrf        : BM25 / kNN을 `_msearch` 한 번으로 따로 검색 → 클라이언트에서 Reciprocal Rank Fusion (기본)
+  - native_rrf : ES `retriever.rrf` (라이선스/버전 미지원이면 이후 rrf로 고정, 일시 오류면 그 요청만 rrf)
+  - linear     : 예전 방식 (BM25 0.6 + kNN 0.4 점수 합)
+- 시간 가중은 같은 요청 안에서 처리한다.
+  - 두 검색 모두 RAG_MAX_AGE_DAYS 이내만 (0이면 제한 없음)
+  - BM25는 function_score gauss decay(published_at, RAG_DECAY_SCALE_DAYS에서 0.5배)
+  - kNN 순위는 시간을 모르므로 rrf 합산 때 같은 gauss 계수를 곱한다
+  → 최근 기사가 없을 때 기간 제한 없이 다시 검색하던 두 번째 쿼리, kNN 0건 시 BM25 재검색이 필요 없다.
+- kNN: k = RAG_RRF_WINDOW, num_candidates = RAG_KNN_NUM_CANDIDATES (int8 양자화 인덱스는 크게 잡는다)
+- scripts/bench_news_retrieval.py로 설정별 p50/p95 지연과 recall@k를 비교한다.
+"""
+
+import logging
+import os
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+RAG_FUSION_MODE = os.getenv("RAG_FUSION_MODE", "rrf").strip().lower()
+RAG_KNN_NUM_CANDIDATES = max(10, int(os.getenv("RAG_KNN_NUM_CANDIDATES", "100")))
+RAG_RRF_WINDOW = max(1, int(os.getenv("RAG_RRF_WINDOW", "50")))
+RAG_RRF_RANK_CONSTANT = max(1, int(os.getenv("RAG_RRF_RANK_CONSTANT", "60")))
+RAG_DECAY_SCALE_DAYS = max(0.0, float(os.getenv("RAG_DECAY_SCALE_DAYS", "14")))
+RAG_MAX_AGE_DAYS = max(0, int(os.getenv("RAG_MAX_AGE_DAYS", "180")))
+
+FUSION_MODES = ("rrf", "native_rrf", "linear")
+SOURCE_FIELDS = ["title", "content", "summary", "source", "press", "published_at", "url", "finance_origin_link"]
+LINEAR_BM25_WEIGHT = 0.6
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    mode: str = RAG_FUSION_MODE if RAG_FUSION_MODE in FUSION_MODES else "rrf"
+    num_candidates: int = RAG_KNN_NUM_CANDIDATES
+    window: int = RAG_RRF_WINDOW
+    rank_constant: int = RAG_RRF_RANK_CONSTANT
+    decay_scale_days: float = RAG_DECAY_SCALE_DAYS
+    max_age_days: int = RAG_MAX_AGE_DAYS
+
+    def with_overrides(self, **kwargs: Any) -> "RetrievalConfig":
+        return replace(self, **{k: v for k, v in kwargs.items() if v is not None})
+
+
+def time_decay(published_at: Any, scale_days: float, now: Optional[datetime] = None) -> float:
+    """ES gauss decay(offset 0, decay 0.5)와 같은 계수. 날짜를 모르면 1."""
+    if not scale_days or not published_at:
+        return 1.0
+    try:
+        published = datetime.fromisoformat(str(published_at).replace("Z", "+00:00"))
+    except ValueError:
+        return 1.0
+    if published.tzinfo is None:
+        published = published.replace(tzinfo=timezone.utc)
+    age_days = max(0.0, ((now or datetime.now(timezone.utc)) - published).total_seconds() / 86400)
+    return 0.5 ** ((age_days / scale_days) ** 2)
+
+
+def rrf_fuse(
+    rankings: Sequence[Sequence[dict]],
+    rank_constant: int,
+    limit: int,
+    weights: Optional[Sequence[Callable[[dict], float]]] = None,
+) -> list[dict]:
+    """
+    Reciprocal Rank Fusion: score(d) = Σ w(d) / (rank_constant + rank).
+    rankings는 ES hit 목록들 (같은 문서는 _id로 합친다). weights[i](hit)로 목록별 가중(시간 감쇠 등)을 준다.
+    """
+    scores: dict[str, float] = {}
+    hits: dict[str, dict] = {}
+    for i, ranking in enumerate(rankings):
+        weight_fn = weights[i] if weights else None
+        for rank, hit in enumerate(ranking, start=1):
+            doc_id = hit.get("_id") or hit.get("_source", {}).get("url")
+            weight = weight_fn(hit) if weight_fn else 1.0
+            scores[doc_id] = scores.get(doc_id, 0.0) + weight / (rank_constant + rank)
+            hits.setdefault(doc_id, hit)
+    ordered = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [{**hits[doc_id], "_score": scores[doc_id]} for doc_id in ordered]
+
+
+def bm25_query(terms: list[str]) -> dict:
+    """BM25 bool/should: 정확한 구문 > 단어 > fuzzy"""
+    joined = " ".join(terms)
+    return {
+        "bool": {
+            "should": [
+                # 구문 일치 (가장 높은 가중치)
+                {"multi_match": {"query": joined, "fields": ["title^5", "content^2", "summary^2"], "type": "phrase"}},
+                # 단어 일치 (BM25 best_fields)
+                {
+                    "multi_match": {
+                        "query": joined,
+                        "fields": ["title^3", "content", "summary"],
+                        "type": "best_fields",
+                        "operator": "or",
+                    }
+                },
+                # fuzzy 오타 허용 (낮은 가중치)
+                {
+                    "multi_match": {
+                        "query": joined,
+                        "fields": ["title^2", "content", "summary"],
+                        "type": "best_fields",
+                        "fuzziness": "AUTO",
+                        "boost": 0.5,
+                    }
+                },
+            ],
+            "minimum_should_match": 1,
+        }
+    }
+
+
+def age_filter(cfg: RetrievalConfig) -> list[dict]:
+    if not cfg.max_age_days:
+        return []
+    return [{"range": {"published_at": {"gte": f"now-{cfg.max_age_days}d/d"}}}]
+
+
+def decayed_query(query: dict, cfg: RetrievalConfig) -> dict:
+    """기간 filter + published_at gauss decay를 같은 쿼리에 건다."""
+    filtered = {"bool": {"must": [query], "filter": age_filter(cfg)}} if cfg.max_age_days else query
+    if not cfg.decay_scale_days:
+        return filtered
+    return {
+        "function_score": {
+            "query": filtered,
+            "functions": [
+                {"gauss": {"published_at": {"origin": "now", "scale": f"{cfg.decay_scale_days:g}d", "decay": 0.5}}}
+            ],
+            "boost_mode": "multiply",
+        }
+    }
+
+
+def knn_clause(embedding: list[float], cfg: RetrievalConfig, k: int) -> dict:
+    knn: dict[str, Any] = {
+        "field": "embedding",
+        "query_vector": embedding,
+        "k": k,
+        "num_candidates": max(k, cfg.num_candidates),
+    }
+    if cfg.max_age_days:
+        knn["filter"] = age_filter(cfg)
+    return knn
+
+
+def latest_body(limit: int) -> dict:
+    # 키워드 없음 → 최신순 (기간 filter 없이 정렬만: 최근 기사가 없어도 다시 검색할 필요가 없다)
+    return {"query": {"match_all": {}}, "sort": [{"published_at": "desc"}], "size": limit, "_source": SOURCE_FIELDS}
+
+
+def bm25_body(terms: list[str], size: int, cfg: RetrievalConfig) -> dict:
+    return {
+        "query": decayed_query(bm25_query(terms), cfg),
+        "sort": [{"_score": "desc"}, {"published_at": "desc"}],
+        "size": size,
+        "_source": SOURCE_FIELDS,
+    }
+
+
+def knn_body(embedding: list[float], size: int, cfg: RetrievalConfig) -> dict:
+    return {"knn": knn_clause(embedding, cfg, size), "size": size, "_source": SOURCE_FIELDS}
+
+
+def linear_body(terms: list[str], embedding: list[float], limit: int, cfg: RetrievalConfig) -> dict:
+    query = decayed_query(bm25_query(terms), cfg)
+    knn = knn_clause(embedding, cfg, limit)
+    knn["boost"] = 1 - LINEAR_BM25_WEIGHT
+    return {
+        "knn": knn,
+        "query": {"bool": {"must": [query], "boost": LINEAR_BM25_WEIGHT}},
+        "size": limit,
+        "_source": SOURCE_FIELDS,
+    }
+
+
+def native_rrf_body(terms: list[str], embedding: list[float], limit: int, cfg: RetrievalConfig) -> dict:
+    return {
+        "retriever": {
+            "rrf": {
+                "retrievers": [
+                    {"standard": {"query": decayed_query(bm25_query(terms), cfg)}},
+                    {"knn": knn_clause(embedding, cfg, cfg.window)},
+                ],
+                "rank_window_size": max(limit, cfg.window),
+                "rank_constant": cfg.rank_constant,
+            }
+        },
+        "size": limit,
+        "_source": SOURCE_FIELDS,
+    }
+
+
+def _native_rrf_rejected(error: Exception) -> bool:
+    """ES가 retriever.rrf 자체를 거절했는지 (400: 미지원 문법, 403: 라이선스)."""
+    status = getattr(error, "status_code", None)
+    if status == 400:
+        return True
+    return status == 403 and "license" in str(error).lower()
+
+
+class NewsRetriever:
+    def __init__(self, es_client: Any, index: str, config: Optional[RetrievalConfig] = None):
+        self.es_client = es_client
+        self.index = index
+        self.config = config or RetrievalConfig()
+        self._native_rrf_supported = True
+        self._stats = {"searches": 0, "errors": 0, "native_fallbacks": 0}
+
+    async def search(
+        self,
+        terms: list[str],
+        embedding: Optional[list[float]],
+        limit: int,
+        config: Optional[RetrievalConfig] = None,
+    ) -> tuple[list[dict], str]:
+        """(ES hit 목록, 사용한 방식). ES 요청은 항상 한 번 (native_rrf 미지원 시에만 rrf로 한 번 더)."""
+        cfg = config or self.config
+        self._stats["searches"] += 1
+        if not terms:
+            resp = await self.es_client.search(index=self.index, body=latest_body(limit))
+            return resp["hits"]["hits"], "latest"
+        if not embedding:
+            resp = await self.es_client.search(index=self.index, body=bm25_body(terms, limit, cfg))
+            return resp["hits"]["hits"], "bm25"
+
+        if cfg.mode == "linear":
+            resp = await self.es_client.search(index=self.index, body=linear_body(terms, embedding, limit, cfg))
+            return resp["hits"]["hits"], "linear"
+        if cfg.mode == "native_rrf" and self._native_rrf_supported:
+            try:
+                resp = await self.es_client.search(
+                    index=self.index, body=native_rrf_body(terms, embedding, limit, cfg)
+                )
+                return resp["hits"]["hits"], "native_rrf"
+            except Exception as e:
+                self._stats["native_fallbacks"] += 1
+                if _native_rrf_rejected(e):
+                    # 버전/라이선스로 retriever.rrf를 거절하면 이후로는 클라이언트 rrf만 쓴다.
+                    self._native_rrf_supported = False
+                    logger.warning("ES native RRF unavailable, falling back to client-side RRF: %s", e)
+                else:
+                    # 타임아웃/일시 장애는 이번 요청만 클라이언트 rrf로 처리한다.
+                    self._stats["errors"] += 1
+                    logger.warning("ES native RRF search failed, using client-side RRF for this request: %s", e)
+        return await self._client_rrf(terms, embedding, limit, cfg), "rrf"
+
+    async def _client_rrf(
+        self, terms: list[str], embedding: list[float], limit: int, cfg: RetrievalConfig
+    ) -> list[dict]:
+        window = max(limit, cfg.window)
+        resp = await self.es_client.msearch(searches=[
+            {"index": self.index}, bm25_body(terms, window, cfg),
+            {"index": self.index}, knn_body(embedding, window, cfg),
+        ])
+        rankings = []
+        for name, result in zip(("bm25", "knn"), resp["responses"]):
+            if "error" in result:
+                # 한쪽이 실패해도 나머지 결과로 답한다 (kNN: 임베딩 필드 없는 인덱스 등)
+                self._stats["errors"] += 1
+                logger.warning("ES %s search failed in msearch: %s", name, str(result["error"])[:300])
+                rankings.append([])
+                continue
+            rankings.append(result["hits"]["hits"])
+
+        now = datetime.now(timezone.utc)
+
+        def knn_decay(hit: dict) -> float:
+            return time_decay(hit.get("_source", {}).get("published_at"), cfg.decay_scale_days, now)
+
+        # BM25 순위는 이미 ES에서 decay가 반영돼 있다.
+        return rrf_fuse(rankings, cfg.rank_constant, limit, weights=[lambda hit: 1.0, knn_decay])
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.config.mode,
+            "num_candidates": self.config.num_candidates,
+            "window": self.config.window,
+            "native_rrf_supported": self._native_rrf_supported,
+            **self._stats,
+        }
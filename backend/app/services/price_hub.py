@@ -0,0 +1,369 @@
+"""
+============================================
+Price Hub - /market/ws 시세 fan-out 허브
+============================================
+
+프로세스당 하나의 허브가 모든 WebSocket 연결의 구독 심볼을 모아
+심볼당 한 번만 시세를 조회/직렬화하고 구독자 큐로 fan-out 한다.
+
+- price_consumer 가 Redis `price_delta:{shard}` 채널로 발행한 delta 로 스냅샷 갱신
+  (구독 중인 심볼이 속한 shard 채널만 SUBSCRIBE)
+- push 모드 구독자에게는 delta 도착 즉시 해당 심볼만 전송
+- 채널로 들어오지 않는 심볼(캐시 miss, 통화 등)은 tick 마다 프로세스 단위로 1회만 조회
+- 연결 수가 늘어도 Redis 조회 수는 "구독 심볼 수"에만 비례한다.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+import redis.asyncio as redis
+
+from ..config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+PRICE_DELTA_CHANNEL_PREFIX = os.getenv("PRICE_DELTA_CHANNEL_PREFIX", "price_delta")
+PRICE_DELTA_SHARDS = max(1, int(os.getenv("PRICE_DELTA_SHARDS", "16")))
+PRICE_HUB_TICK_SECONDS = 0.5
+PRICE_HUB_QUEUE_SIZE = max(2, int(os.getenv("PRICE_HUB_QUEUE_SIZE", "8")))
+
+MODE_POLL = "poll"
+MODE_PUSH = "push"
+
+SnapshotFetcher = Callable[[str], Awaitable[dict[str, Any]]]
+
+
+def price_delta_channel(symbol: str) -> str:
+    """workers/price_consumer.py 의 shard 규칙과 동일해야 한다."""
+    shard = zlib.crc32(symbol.encode("utf-8")) % PRICE_DELTA_SHARDS
+    return f"{PRICE_DELTA_CHANNEL_PREFIX}:{shard}"
+
+
+class PriceSubscriber:
+    """WebSocket 연결 1개에 대응하는 구독 상태 + 송신 큐."""
+
+    def __init__(self, symbols: set[str], interval_sec: float, mode: str = MODE_PUSH):
+        self.symbols = set(symbols)
+        self.interval_sec = interval_sec
+        self.mode = mode
+        self.next_due = 0.0
+        # push 모드: symbol -> 마지막으로 보낸 스냅샷 version
+        self.sent_versions: dict[str, int] = {}
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=PRICE_HUB_QUEUE_SIZE)
+        self.dropped = 0
+
+    def push(self, frame: str):
+        """큐가 가득 차면 가장 오래된 프레임을 버린다 (느린 클라이언트가 허브를 막지 않도록)."""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(frame)
+
+
+class _Snapshot:
+    __slots__ = ("payload", "encoded", "version", "updated_at", "seq")
+
+    def __init__(self, payload: dict[str, Any], version: int, seq: int = 0):
+        self.payload = payload
+        self.encoded = json.dumps(payload, default=str)
+        self.version = version
+        self.updated_at = time.monotonic()
+        self.seq = seq
+
+
+class PriceHub:
+    def __init__(self, snapshot_fetcher: SnapshotFetcher):
+        self._fetch_snapshot = snapshot_fetcher
+        self._subscribers: set[PriceSubscriber] = set()
+        self._symbol_subscribers: dict[str, set[PriceSubscriber]] = {}
+        self._snapshots: dict[str, _Snapshot] = {}
+        self._tick_task: asyncio.Task | None = None
+        self._listen_task: asyncio.Task | None = None
+        self._pubsub_client: redis.Redis | None = None
+        self._subscribed_channels: set[str] = set()
+        self.pubsub_messages = 0
+        self.polled_snapshots = 0
+
+    # ------------------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        if self._tick_task is None or self._tick_task.done():
+            self._tick_task = asyncio.create_task(self._tick_loop())
+        if self._listen_task is None or self._listen_task.done():
+            self._listen_task = asyncio.create_task(self._listen_loop())
+
+    async def stop(self):
+        for task in (self._tick_task, self._listen_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tick_task = None
+        self._listen_task = None
+
+        if self._pubsub_client is not None:
+            try:
+                await self._pubsub_client.aclose()
+            except Exception:
+                pass
+            self._pubsub_client = None
+
+    # ------------------------------------------------------------------
+    # subscription management
+    # ------------------------------------------------------------------
+
+    async def register(self, symbols: set[str], interval_sec: float, mode: str = MODE_PUSH) -> PriceSubscriber:
+        await self.start()
+        subscriber = PriceSubscriber(symbols, interval_sec, mode)
+        self._subscribers.add(subscriber)
+        self._retain(subscriber, subscriber.symbols)
+        return subscriber
+
+    def update_symbols(self, subscriber: PriceSubscriber, symbols: set[str]):
+        self._release(subscriber, subscriber.symbols)
+        subscriber.symbols = set(symbols)
+        subscriber.sent_versions = {
+            symbol: version for symbol, version in subscriber.sent_versions.items() if symbol in symbols
+        }
+        self._retain(subscriber, subscriber.symbols)
+        # 구독 변경 직후 다음 tick 에서 바로 스냅샷을 보낸다.
+        subscriber.next_due = 0.0
+
+    def unregister(self, subscriber: PriceSubscriber):
+        if subscriber not in self._subscribers:
+            return
+        self._subscribers.discard(subscriber)
+        self._release(subscriber, subscriber.symbols)
+
+    def _retain(self, subscriber: PriceSubscriber, symbols: set[str]):
+        for symbol in symbols:
+            self._symbol_subscribers.setdefault(symbol, set()).add(subscriber)
+
+    def _release(self, subscriber: PriceSubscriber, symbols: set[str]):
+        for symbol in symbols:
+            subscribers = self._symbol_subscribers.get(symbol)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._symbol_subscribers.pop(symbol, None)
+                self._snapshots.pop(symbol, None)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "symbols": len(self._symbol_subscribers),
+            "pubsub_connected": self._pubsub_client is not None,
+            "pubsub_channels": len(self._subscribed_channels),
+            "pubsub_messages": self.pubsub_messages,
+            "polled_snapshots": self.polled_snapshots,
+            "dropped_frames": sum(sub.dropped for sub in self._subscribers),
+        }
+
+    # ------------------------------------------------------------------
+    # snapshot store
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _fingerprint(payload: dict[str, Any]) -> tuple:
+        return tuple(payload.get(field) for field in ("price", "change", "change_percent", "status", "error"))
+
+    def _store(self, symbol: str, payload: dict[str, Any], seq: int = 0) -> _Snapshot | None:
+        """시세 값이 바뀐 경우에만 version 을 올린다. 변경 없으면 None."""
+        previous = self._snapshots.get(symbol)
+        if previous is not None and self._fingerprint(previous.payload) == self._fingerprint(payload):
+            previous.updated_at = time.monotonic()
+            previous.seq = max(previous.seq, seq)
+            return None
+        version = 1 if previous is None else previous.version + 1
+        snapshot = _Snapshot(payload, version, seq)
+        self._snapshots[symbol] = snapshot
+        return snapshot
+
+    async def _refresh(self, symbols: set[str], max_age: float):
+        now = time.monotonic()
+        targets = sorted(
+            symbol for symbol in symbols
+            if symbol not in self._snapshots or now - self._snapshots[symbol].updated_at >= max_age
+        )
+        if not targets:
+            return
+
+        results = await asyncio.gather(
+            *[self._fetch_snapshot(symbol) for symbol in targets],
+            return_exceptions=True,
+        )
+        for symbol, result in zip(targets, results):
+            if isinstance(result, Exception):
+                result = {"symbol": symbol, "error": str(result), "source": "error"}
+            if symbol in self._symbol_subscribers:
+                previous = self._snapshots.get(symbol)
+                self._store(symbol, result, seq=previous.seq if previous else 0)
+        self.polled_snapshots += len(targets)
+
+    @staticmethod
+    def _frame(encoded_items: list[str], ts: str, seq: int | None = None) -> str:
+        seq_part = f', "seq": {seq}' if seq is not None else ""
+        return f'{{"type": "prices", "items": [{",".join(encoded_items)}], "ts": {json.dumps(ts)}{seq_part}}}'
+
+    # ------------------------------------------------------------------
+    # producer loops
+    # ------------------------------------------------------------------
+
+    async def _tick_loop(self):
+        while True:
+            try:
+                now = time.monotonic()
+                due = [sub for sub in self._subscribers if sub.next_due <= now]
+                if due:
+                    wanted: set[str] = set()
+                    for sub in due:
+                        wanted |= sub.symbols
+                    min_interval = min(sub.interval_sec for sub in due)
+                    await self._refresh(wanted, max_age=min_interval)
+
+                    ts = datetime.now(timezone.utc).isoformat()
+                    frames: dict[frozenset[str], str] = {}
+                    for sub in due:
+                        sub.next_due = now + sub.interval_sec
+                        if sub.mode == MODE_PUSH:
+                            symbols = {
+                                symbol for symbol in sub.symbols
+                                if symbol in self._snapshots
+                                and self._snapshots[symbol].version != sub.sent_versions.get(symbol)
+                            }
+                            if not symbols:
+                                # 바뀐 심볼이 없으면 보내지 않는다.
+                                continue
+                        else:
+                            symbols = sub.symbols
+
+                        key = frozenset(symbols)
+                        if key not in frames:
+                            frames[key] = self._frame(
+                                [self._snapshots[s].encoded for s in sorted(symbols) if s in self._snapshots],
+                                ts,
+                            )
+                        sub.push(frames[key])
+                        if sub.mode == MODE_PUSH:
+                            for symbol in symbols:
+                                sub.sent_versions[symbol] = self._snapshots[symbol].version
+            except Exception as e:
+                logger.warning("price hub tick failed: %s", e)
+
+            await asyncio.sleep(PRICE_HUB_TICK_SECONDS)
+
+    def _apply_delta(self, raw: str):
+        try:
+            delta = json.loads(raw)
+        except (TypeError, ValueError):
+            return
+        symbol = str(delta.get("s") or "").strip().upper()
+        subscribers = self._symbol_subscribers.get(symbol)
+        if not subscribers:
+            return
+
+        seq = int(delta.get("q") or 0)
+        previous = self._snapshots.get(symbol)
+        if previous is not None and seq and seq <= previous.seq:
+            # 중복/역순 메시지
+            return
+
+        payload = dict(previous.payload) if previous is not None else {}
+        payload.pop("error", None)
+        payload.update(
+            {
+                "symbol": symbol,
+                "price": delta.get("p"),
+                "change": delta.get("c", 0),
+                "change_percent": delta.get("cp", 0),
+                "timestamp": delta.get("t"),
+                "source": "stream",
+            }
+        )
+        for short_key, field in (("a", "asset_type"), ("u", "currency"), ("m", "market")):
+            if delta.get(short_key):
+                payload[field] = delta[short_key]
+
+        self.pubsub_messages += 1
+        snapshot = self._store(symbol, payload, seq=seq)
+        if snapshot is None:
+            return
+
+        frame = self._frame([snapshot.encoded], datetime.now(timezone.utc).isoformat(), seq=seq)
+        for sub in subscribers:
+            if sub.mode != MODE_PUSH:
+                continue
+            sub.push(frame)
+            sub.sent_versions[symbol] = snapshot.version
+
+    async def _sync_channels(self, pubsub):
+        wanted = {price_delta_channel(symbol) for symbol in self._symbol_subscribers}
+        added = wanted - self._subscribed_channels
+        removed = self._subscribed_channels - wanted
+        if added:
+            await pubsub.subscribe(*sorted(added))
+        if removed:
+            await pubsub.unsubscribe(*sorted(removed))
+        self._subscribed_channels = wanted
+
+    async def _listen_loop(self):
+        """price_consumer delta 채널 구독. Redis 장애 시 재연결하며, 그동안은 polling 만으로 동작한다."""
+        delay = 1
+        while True:
+            pubsub = None
+            self._subscribed_channels = set()
+            try:
+                if self._pubsub_client is None:
+                    self._pubsub_client = redis.from_url(
+                        settings.REDIS_URL,
+                        encoding="utf-8",
+                        decode_responses=True,
+                        socket_connect_timeout=1,
+                    )
+                    await self._pubsub_client.ping()
+                pubsub = self._pubsub_client.pubsub(ignore_subscribe_messages=True)
+                delay = 1
+                while True:
+                    await self._sync_channels(pubsub)
+                    if not self._subscribed_channels and not pubsub.subscribed:
+                        await asyncio.sleep(PRICE_HUB_TICK_SECONDS)
+                        continue
+                    message = await pubsub.get_message(timeout=PRICE_HUB_TICK_SECONDS)
+                    while message is not None:
+                        if message.get("type") == "message":
+                            self._apply_delta(message.get("data"))
+                        message = await pubsub.get_message(timeout=0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("price hub pubsub disconnected (retry in %ss): %s", delay, e)
+                if self._pubsub_client is not None:
+                    try:
+                        await self._pubsub_client.aclose()
+                    except Exception:
+                        pass
+                    self._pubsub_client = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
@@ -0,0 +1,131 @@
+"""
+============================================
+Single-flight (요청 병합)
+============================================
+
+같은 키(vendor, endpoint, params)로 동시에 들어온 외부 API 호출을 한 번으로 합친다.
+
+- 프로세스 내: 첫 호출만 실제로 실행하고 나머지는 같은 Task를 기다린다.
+  (첫 호출자가 취소돼도 Task는 끝까지 실행되어 나머지 호출자와 캐시를 채운다)
+- 클러스터(옵션, SINGLE_FLIGHT_REDIS_LOCK=true): Redis SET NX 락을 잡은 pod만 호출하고,
+  나머지 pod는 락 보유자가 남긴 결과 키를 잠시 기다렸다가 재사용한다. 시간 안에 결과가 없으면 직접 호출한다.
+- 결과는 호출자마다 복사본을 돌려준다 (호출 측에서 dict를 수정하는 코드가 많다).
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from ..cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_REDIS_LOCK = os.getenv("SINGLE_FLIGHT_REDIS_LOCK", "false").lower() in {"1", "true", "yes", "on"}
+SINGLE_FLIGHT_LOCK_TTL_MS = max(500, int(os.getenv("SINGLE_FLIGHT_LOCK_TTL_MS", "5000")))
+SINGLE_FLIGHT_WAIT_MS = max(100, int(os.getenv("SINGLE_FLIGHT_WAIT_MS", "2000")))
+SINGLE_FLIGHT_RESULT_TTL_MS = max(500, int(os.getenv("SINGLE_FLIGHT_RESULT_TTL_MS", "3000")))
+POLL_INTERVAL_SECONDS = 0.05
+
+# 내 토큰일 때만 락을 지운다 (GET과 DEL 사이에 TTL 만료 → 다른 pod가 잡은 락을 지우는 경합 방지)
+RELEASE_LOCK_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    def __init__(self, name: str, distributed: bool = SINGLE_FLIGHT_REDIS_LOCK):
+        self.name = name
+        self.distributed = distributed
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._stats = {"calls": 0, "executed": 0, "coalesced": 0, "remote_hits": 0}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        self._stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, func))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._forget(k, _t))
+        else:
+            self._stats["coalesced"] += 1
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def stats(self) -> dict[str, Any]:
+        return {"name": self.name, "inflight": len(self._inflight), "distributed": self.distributed, **self._stats}
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            # 기다리던 호출자가 모두 취소된 경우 "exception never retrieved" 경고 방지
+            logger.debug("single-flight %s failed key=%s: %s", self.name, key, task.exception())
+
+    async def _run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        redis_client = get_redis() if self.distributed else None
+        if redis_client is None:
+            self._stats["executed"] += 1
+            return await func()
+
+        digest = hashlib.sha1(repr((self.name, key)).encode("utf-8")).hexdigest()
+        lock_key = f"singleflight:lock:{digest}"
+        result_key = f"singleflight:result:{digest}"
+        token = f"{os.getpid()}:{id(self)}:{time.monotonic_ns()}"
+
+        try:
+            acquired = bool(await redis_client.set(lock_key, token, nx=True, px=SINGLE_FLIGHT_LOCK_TTL_MS))
+        except Exception as exc:
+            logger.debug("single-flight lock unavailable (%s): %s", self.name, exc)
+            self._stats["executed"] += 1
+            return await func()
+
+        if not acquired:
+            cached = await self._wait_remote_result(redis_client, result_key)
+            if cached is not None:
+                self._stats["remote_hits"] += 1
+                return cached
+
+        self._stats["executed"] += 1
+        try:
+            result = await func()
+            if acquired:
+                # 락을 풀기 전에 결과를 남겨야 대기 중인 pod가 재호출하지 않는다.
+                try:
+                    await redis_client.set(result_key, json.dumps(result), px=SINGLE_FLIGHT_RESULT_TTL_MS)
+                except Exception as exc:
+                    logger.debug("single-flight result publish failed (%s): %s", self.name, exc)
+            return result
+        finally:
+            if acquired:
+                try:
+                    # register_script: EVALSHA로 보내고 스크립트 캐시에 없을 때만 본문을 다시 보낸다.
+                    await redis_client.register_script(RELEASE_LOCK_LUA)(keys=[lock_key], args=[token])
+                except Exception:
+                    pass
+
+    async def _wait_remote_result(self, redis_client, result_key: str) -> Any | None:
+        deadline = time.monotonic() + SINGLE_FLIGHT_WAIT_MS / 1000
+        while time.monotonic() < deadline:
+            try:
+                raw = await redis_client.get(result_key)
+            except Exception:
+                return None
+            if raw:
+                try:
+                    return json.loads(raw)
+                except Exception:
+                    return None
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        return None
+
+
+# 외부 시세 벤더(KIS/Upbit) 호출 공용 인스턴스
+vendor_flight = SingleFlight("vendor")
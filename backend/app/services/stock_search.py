@@ -20,6 +20,7 @@ from typing import Any
 import httpx
 
 from ..cache import cache_get, cache_set
+from .http_clients import http_clients
 
 logger = logging.getLogger(__name__)
 
@@ -277,7 +278,7 @@ _CRYPTO_LIST: list[dict] = [
 async def _fetch_krx_list() -> list[dict] | None:
     """KRX 공공 API에서 전체 상장 종목 조회"""
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
+        async with http_clients.session("krx") as client:
             resp = await client.post(
                 "https://data.krx.co.kr/comm/bldAttendant/getJsonData.cmd",
                 data={
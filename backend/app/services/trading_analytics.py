@@ -0,0 +1,458 @@
+"""
+============================================
+Trading Analytics (매매 분석 롤업)
+============================================
+
+GET /api/v1/transactions/analysis 의 집계 엔진. 거래 문서를 Python으로 읽지 않는다.
+
+- trading_rollups: 사용자당 문서 1개 (매수/매도 건수, 매수 금액, 실현손익, 수익 매도 건수,
+  FIFO 매칭 수량·수량×보유일, 매수/매도 사유 분포). 분석 API는 이 문서 하나만 읽는다.
+- trading_lots: (사용자, 종목)별 아직 매도되지 않은 매수 lot 큐 [{q, t}] (t = epoch 일수)
+- 전체 빌드: 집계 파이프라인 한 번
+  - $setWindowFields로 종목별 시간순 누적 순매수량(매수 +, 매도 -)과 그 누적 최솟값 계산
+  - 보유량이 음수가 되는 만큼(매수 기록 없이 등록한 자산의 매도)은 매칭하지 않고 버린다
+    → 매도 매칭 수량 = 수량 - 이번에 늘어난 버린 양, 매수 매칭 수량 = 누적 매수 구간 ∩ [0, 매칭된 매도 총량]
+  - Σ(매칭×보유일) = Σ매도(매칭×t) - Σ매수(매칭×t) → 매수/매도 쌍을 만들지 않고 선형으로 계산
+  - 남은 매수 수량은 trading_lots로 저장해 이후 증분 반영에 사용
+- 증분 반영: 거래 저장 직후 record_transaction
+  - 카운터는 $inc, 매도는 lot 큐 앞에서부터 소진 (version 낙관적 잠금)
+  - 해당 종목 마지막 거래보다 과거 날짜(소급 입력)거나 충돌이 계속되면 dirty 표시 → 다음 조회 때 전체 빌드
+- 동시성: 롤업 문서의 generation
+  - 빌드는 시작할 때 dirty + generation 증가로 선점하고, 끝날 때 generation이 그대로일 때만 dirty를 푼다
+  - 증분 반영도 읽은 generation 조건으로 $inc 하면서 generation을 올린다 → 빌드 도중 끼어든 거래는 dirty로 남아 다시 빌드
+  - lot 문서는 삭제 후 재삽입 대신 문서별 upsert라 동시 빌드끼리 키 충돌이 없다
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from pymongo import DeleteMany, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "trading_rollups"
+LOTS_COLLECTION = "trading_lots"
+ROLLUP_SCHEMA_VERSION = 1
+FIFO_RETRIES = 3
+QTY_EPSILON = 1e-12
+MS_PER_DAY = 86400000
+EPOCH = datetime(1970, 1, 1)
+
+COUNTER_FIELDS = (
+    "total_buys",
+    "total_sells",
+    "total_buy_amount",
+    "total_realized_profit",
+    "profitable_sells",
+    "matched_quantity",
+    "holding_quantity_days",
+)
+
+
+class OutOfOrderTransaction(Exception):
+    """증분 FIFO로 반영할 수 없는 거래 (소급 입력/동시 수정 충돌)."""
+
+
+def epoch_days(value: datetime) -> float:
+    """Mongo $toLong(date)/86400000 과 같은 기준 (naive datetime은 UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH).total_seconds() / 86400
+
+
+def lots_id(user_id: str, symbol: str) -> str:
+    return f"{user_id}|{symbol}"
+
+
+def _is(kind: str) -> dict:
+    return {"$eq": ["$transaction_type", kind]}
+
+
+def _signed_qty() -> dict:
+    return {"$cond": [_is("buy"), "$quantity", {"$multiply": ["$quantity", -1]}]}
+
+
+def rollup_pipeline(user_id: str) -> list[dict]:
+    """사용자 거래 전체를 롤업 값 + 종목별 남은 lot으로 집계."""
+    return [
+        {"$match": {"user_id": user_id}},
+        {
+            "$setWindowFields": {
+                "partitionBy": "$symbol",
+                "sortBy": {"transaction_date": 1, "_id": 1},
+                "output": {
+                    "net_qty": {"$sum": _signed_qty(), "window": {"documents": ["unbounded", "current"]}},
+                    "cum_buy": {
+                        "$sum": {"$cond": [_is("buy"), "$quantity", 0]},
+                        "window": {"documents": ["unbounded", "current"]},
+                    },
+                },
+            }
+        },
+        {
+            "$setWindowFields": {
+                "partitionBy": "$symbol",
+                "sortBy": {"transaction_date": 1, "_id": 1},
+                "output": {
+                    "min_net": {"$min": "$net_qty", "window": {"documents": ["unbounded", "current"]}},
+                    "prev_min_net": {"$min": "$net_qty", "window": {"documents": ["unbounded", -1]}},
+                },
+            }
+        },
+        {
+            "$addFields": {
+                "dropped": {"$max": [0, {"$multiply": ["$min_net", -1]}]},
+                "prev_dropped": {"$max": [0, {"$multiply": [{"$ifNull": ["$prev_min_net", 0]}, -1]}]},
+            }
+        },
+        {
+            "$setWindowFields": {
+                "partitionBy": "$symbol",
+                "output": {
+                    "symbol_sell_qty": {"$sum": {"$cond": [_is("sell"), "$quantity", 0]}},
+                    "symbol_dropped": {"$max": "$dropped"},
+                },
+            }
+        },
+        {
+            "$addFields": {
+                "t": {"$divide": [{"$toLong": "$transaction_date"}, MS_PER_DAY]},
+                "matched": {
+                    "$cond": [
+                        _is("buy"),
+                        {
+                            "$max": [
+                                0,
+                                {
+                                    "$subtract": [
+                                        {
+                                            "$min": [
+                                                "$cum_buy",
+                                                {"$subtract": ["$symbol_sell_qty", "$symbol_dropped"]},
+                                            ]
+                                        },
+                                        {"$subtract": ["$cum_buy", "$quantity"]},
+                                    ]
+                                },
+                            ]
+                        },
+                        {"$subtract": ["$quantity", {"$subtract": ["$dropped", "$prev_dropped"]}]},
+                    ]
+                },
+            }
+        },
+        {
+            "$facet": {
+                "totals": [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "total_buys": {"$sum": {"$cond": [_is("buy"), 1, 0]}},
+                            "total_sells": {"$sum": {"$cond": [_is("sell"), 1, 0]}},
+                            "total_buy_amount": {"$sum": {"$cond": [_is("buy"), "$total_amount", 0]}},
+                            "total_realized_profit": {
+                                "$sum": {"$cond": [_is("sell"), {"$ifNull": ["$realized_profit", 0]}, 0]}
+                            },
+                            "profitable_sells": {
+                                "$sum": {
+                                    "$cond": [
+                                        {"$and": [_is("sell"), {"$gt": [{"$ifNull": ["$realized_profit", 0]}, 0]}]},
+                                        1,
+                                        0,
+                                    ]
+                                }
+                            },
+                            "matched_quantity": {"$sum": {"$cond": [_is("sell"), "$matched", 0]}},
+                            "holding_quantity_days": {
+                                "$sum": {"$multiply": ["$matched", "$t", {"$cond": [_is("sell"), 1, -1]}]}
+                            },
+                        }
+                    }
+                ],
+                "buy_reasons": [
+                    {"$match": {"transaction_type": "buy", "buy_reason": {"$nin": [None, ""]}}},
+                    {"$group": {"_id": "$buy_reason", "count": {"$sum": 1}}},
+                ],
+                "sell_reasons": [
+                    {"$match": {"transaction_type": "sell", "sell_reason": {"$nin": [None, ""]}}},
+                    {"$group": {"_id": "$sell_reason", "count": {"$sum": 1}}},
+                ],
+                "lots": [
+                    {"$sort": {"symbol": 1, "transaction_date": 1, "_id": 1}},
+                    {
+                        "$group": {
+                            "_id": "$symbol",
+                            "last_t": {"$max": "$t"},
+                            "lots": {
+                                "$push": {
+                                    "q": {"$cond": [_is("buy"), {"$subtract": ["$quantity", "$matched"]}, 0]},
+                                    "t": "$t",
+                                }
+                            },
+                        }
+                    },
+                    {
+                        "$project": {
+                            "last_t": 1,
+                            "lots": {"$filter": {"input": "$lots", "cond": {"$gt": ["$$this.q", QTY_EPSILON]}}},
+                        }
+                    },
+                ],
+            }
+        },
+    ]
+
+
+def empty_rollup(user_id: str) -> dict:
+    return {
+        "_id": user_id,
+        "schema": ROLLUP_SCHEMA_VERSION,
+        **{field: 0 for field in COUNTER_FIELDS},
+        "buy_reasons": [],
+        "sell_reasons": [],
+        "dirty": False,
+    }
+
+
+async def _claim_rebuild(rollups, user_id: str) -> int:
+    """빌드 선점: dirty 표시 + generation 증가. 이후 끼어든 빌드/증분 반영은 generation을 다시 올린다."""
+    claim = (
+        {"_id": user_id},
+        {"$set": {"dirty": True}, "$inc": {"generation": 1}},
+    )
+    options = {"projection": {"generation": 1}, "upsert": True, "return_document": ReturnDocument.AFTER}
+    try:
+        claimed = await rollups.find_one_and_update(*claim, **options)
+    except DuplicateKeyError:
+        # 첫 빌드가 동시에 upsert → 다시 시도하면 기존 문서를 갱신한다
+        claimed = await rollups.find_one_and_update(*claim, **options)
+    return claimed["generation"]
+
+
+async def rebuild_rollup(db, user_id: str) -> dict:
+    """집계 파이프라인으로 롤업과 lot 큐를 다시 만든다.
+
+    선점한 generation이 끝까지 유지된 경우에만 롤업을 저장한다. 아니면 문서는 dirty로 남고
+    이번 빌드 결과는 응답에만 쓴다.
+    """
+    rollups = db[ROLLUP_COLLECTION]
+    generation = await _claim_rebuild(rollups, user_id)
+    cursor = db["transactions"].aggregate(rollup_pipeline(user_id), allowDiskUse=True)
+    result = (await cursor.to_list(length=1) or [{}])[0]
+
+    now = datetime.utcnow()
+    rollup = empty_rollup(user_id)
+    for totals in result.get("totals") or []:
+        rollup.update({field: totals.get(field) or 0 for field in COUNTER_FIELDS})
+    for side in ("buy_reasons", "sell_reasons"):
+        rollup[side] = [{"reason": r["_id"], "count": r["count"]} for r in result.get(side) or []]
+    rollup["built_at"] = now
+    rollup["updated_at"] = now
+    rollup["generation"] = generation
+
+    # version은 0으로 되돌리지 않고 올린다 → 진행 중인 _consume_sell의 낙관적 잠금이 실패하고 재시도
+    lot_ids = []
+    requests = []
+    for row in result.get("lots") or []:
+        key = lots_id(user_id, row["_id"])
+        lot_ids.append(key)
+        requests.append(
+            UpdateOne(
+                {"_id": key},
+                {
+                    "$set": {"user_id": user_id, "symbol": row["_id"], "lots": row["lots"], "last_t": row["last_t"]},
+                    "$inc": {"version": 1},
+                },
+                upsert=True,
+            )
+        )
+    requests.append(DeleteMany({"user_id": user_id, "_id": {"$nin": lot_ids}}))
+    await db[LOTS_COLLECTION].bulk_write(requests, ordered=False)
+
+    saved = await rollups.replace_one({"_id": user_id, "generation": generation}, rollup)
+    if not saved.matched_count:
+        logger.info("Trading rollup rebuild superseded (user=%s, generation=%s)", user_id, generation)
+    return rollup
+
+
+def consume_lots(lots: list[dict], quantity: float, t: float) -> tuple[list[dict], float, float]:
+    """FIFO로 quantity만큼 lot 소진. Returns: (남은 lot, 매칭 수량, Σ매칭×보유일)."""
+    remaining = list(lots)
+    matched = 0.0
+    quantity_days = 0.0
+    need = quantity
+    while remaining and need > QTY_EPSILON:
+        lot = remaining[0]
+        take = min(lot["q"], need)
+        matched += take
+        quantity_days += take * (t - lot["t"])
+        need -= take
+        if lot["q"] - take > QTY_EPSILON:
+            remaining[0] = {"q": lot["q"] - take, "t": lot["t"]}
+        else:
+            remaining.pop(0)
+    return remaining, matched, quantity_days
+
+
+async def _push_buy_lot(lots, user_id: str, symbol: str, quantity: float, t: float):
+    key = lots_id(user_id, symbol)
+    result = await lots.update_one(
+        {"_id": key, "last_t": {"$lte": t}},
+        {"$push": {"lots": {"q": quantity, "t": t}}, "$set": {"last_t": t}, "$inc": {"version": 1}},
+    )
+    if result.matched_count:
+        return
+    try:
+        await lots.insert_one(
+            {
+                "_id": key,
+                "user_id": user_id,
+                "symbol": symbol,
+                "lots": [{"q": quantity, "t": t}],
+                "last_t": t,
+                "version": 0,
+            }
+        )
+    except DuplicateKeyError:
+        # 문서는 있는데 last_t가 더 최근 → 소급 입력
+        raise OutOfOrderTransaction(symbol)
+
+
+async def _consume_sell(lots, user_id: str, symbol: str, quantity: float, t: float) -> tuple[float, float]:
+    key = lots_id(user_id, symbol)
+    for _ in range(FIFO_RETRIES):
+        current = await lots.find_one({"_id": key})
+        if current is not None and t < current.get("last_t", t):
+            raise OutOfOrderTransaction(symbol)
+        remaining, matched, quantity_days = consume_lots((current or {}).get("lots") or [], quantity, t)
+        if current is None:
+            try:
+                await lots.insert_one(
+                    {"_id": key, "user_id": user_id, "symbol": symbol, "lots": [], "last_t": t, "version": 0}
+                )
+                return matched, quantity_days
+            except DuplicateKeyError:
+                continue
+        result = await lots.update_one(
+            {"_id": key, "version": current.get("version", 0)},
+            {"$set": {"lots": remaining, "last_t": t}, "$inc": {"version": 1}},
+        )
+        if result.matched_count:
+            return matched, quantity_days
+    raise OutOfOrderTransaction(symbol)
+
+
+async def _bump_reason(rollups, user_id: str, generation: int, field: str, reason: str) -> bool:
+    for _ in range(2):
+        result = await rollups.update_one(
+            {"_id": user_id, "generation": generation, f"{field}.reason": reason},
+            {"$inc": {f"{field}.$.count": 1}},
+        )
+        if result.matched_count:
+            return True
+        result = await rollups.update_one(
+            {"_id": user_id, "generation": generation, f"{field}.reason": {"$ne": reason}},
+            {"$push": {field: {"reason": reason, "count": 1}}},
+        )
+        if result.matched_count:
+            return True
+    return False
+
+
+async def mark_dirty(db, user_id: str):
+    """다음 조회 때 전체 빌드. generation도 올려 진행 중인 빌드가 dirty를 풀지 못하게 한다."""
+    await db[ROLLUP_COLLECTION].update_one({"_id": user_id}, {"$set": {"dirty": True}, "$inc": {"generation": 1}})
+
+
+async def record_transaction(db, doc: dict):
+    """저장된 거래 하나를 롤업에 반영. 롤업이 아직 없으면 다음 조회 때 빌드되므로 건너뛴다."""
+    user_id = doc["user_id"]
+    rollups = db[ROLLUP_COLLECTION]
+    try:
+        rollup = await rollups.find_one({"_id": user_id}, {"dirty": 1, "schema": 1, "generation": 1})
+        if rollup is None:
+            return
+        if rollup.get("dirty") or rollup.get("schema") != ROLLUP_SCHEMA_VERSION:
+            # 빌드 중일 수 있다 → 이 거래가 집계에 빠졌을 수 있으므로 빌드 결과가 저장되지 않게 한다
+            await mark_dirty(db, user_id)
+            return
+        generation = rollup.get("generation", 0)
+
+        is_buy = doc["transaction_type"] == "buy"
+        quantity = float(doc["quantity"])
+        t = epoch_days(doc["transaction_date"])
+        lots = db[LOTS_COLLECTION]
+        if is_buy:
+            await _push_buy_lot(lots, user_id, doc["symbol"], quantity, t)
+            matched, quantity_days = 0.0, 0.0
+        else:
+            matched, quantity_days = await _consume_sell(lots, user_id, doc["symbol"], quantity, t)
+
+        realized = doc.get("realized_profit") or 0
+        inc = {
+            "total_buys": 1 if is_buy else 0,
+            "total_sells": 0 if is_buy else 1,
+            "total_buy_amount": doc["total_amount"] if is_buy else 0,
+            "total_realized_profit": 0 if is_buy else realized,
+            "profitable_sells": 1 if not is_buy and realized > 0 else 0,
+            "matched_quantity": matched,
+            "holding_quantity_days": quantity_days,
+        }
+        updated = await rollups.update_one(
+            {"_id": user_id, "generation": generation, "dirty": {"$ne": True}},
+            {"$inc": {**inc, "generation": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        )
+        if not updated.matched_count:
+            # 사이에 빌드가 선점했다 → lot 반영이 빌드 결과와 겹쳤을 수 있음
+            raise OutOfOrderTransaction(doc["symbol"])
+
+        reason_field = "buy_reasons" if is_buy else "sell_reasons"
+        reason = doc.get("buy_reason") if is_buy else doc.get("sell_reason")
+        if reason and not await _bump_reason(rollups, user_id, generation + 1, reason_field, reason):
+            raise OutOfOrderTransaction(doc["symbol"])
+    except OutOfOrderTransaction as e:
+        logger.info("Trading rollup needs rebuild (user=%s, symbol=%s)", user_id, e)
+        await mark_dirty(db, user_id)
+    except Exception as e:
+        logger.warning("Trading rollup update failed: %s", e)
+        await mark_dirty(db, user_id)
+
+
+async def get_rollup(db, user_id: str) -> dict:
+    rollup = await db[ROLLUP_COLLECTION].find_one({"_id": user_id})
+    if rollup is None or rollup.get("dirty") or rollup.get("schema") != ROLLUP_SCHEMA_VERSION:
+        rollup = await rebuild_rollup(db, user_id)
+    return rollup
+
+
+def analysis_from_rollup(rollup: Optional[dict]) -> dict[str, Any]:
+    """롤업 문서 → TradingAnalysis 필드."""
+    rollup = rollup or {}
+    total_sells = int(rollup.get("total_sells") or 0)
+    total_buy_amount = float(rollup.get("total_buy_amount") or 0)
+    total_realized_profit = float(rollup.get("total_realized_profit") or 0)
+    matched_quantity = float(rollup.get("matched_quantity") or 0)
+    return {
+        "total_buys": int(rollup.get("total_buys") or 0),
+        "total_sells": total_sells,
+        "avg_holding_days": (
+            float(rollup.get("holding_quantity_days") or 0) / matched_quantity
+            if matched_quantity > QTY_EPSILON
+            else 0
+        ),
+        "realized_return": (total_realized_profit / total_buy_amount * 100) if total_buy_amount > 0 else 0,
+        "win_rate": (int(rollup.get("profitable_sells") or 0) / total_sells * 100) if total_sells > 0 else 0,
+        "total_realized_profit": total_realized_profit,
+        "buy_reasons_distribution": {r["reason"]: r["count"] for r in rollup.get("buy_reasons") or []},
+        "sell_reasons_distribution": {r["reason"]: r["count"] for r in rollup.get("sell_reasons") or []},
+    }
+
+
+async def ensure_indexes(db):
+    await db["transactions"].create_index(
+        [("user_id", 1), ("symbol", 1), ("transaction_date", 1), ("_id", 1)],
+        name="idx_user_symbol_date",
+    )
+    await db[LOTS_COLLECTION].create_index([("user_id", 1)], name="idx_user")
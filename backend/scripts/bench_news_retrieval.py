@@ -0,0 +1,193 @@
+"""
+뉴스 하이브리드 검색 벤치마크 (app/services/news_retrieval.py)
+
+- 고정 쿼리 셋(scripts/bench_news_queries.json)을 설정 조합(fusion mode x num_candidates)마다 반복 실행
+- 지연: 클라이언트 측 p50 / p95 / max (ms, 쿼리 임베딩 시간 제외)
+- recall@k
+  - knn    : 근사 kNN top-k 중 정확한 kNN(script_score cosine 전수 계산) top-k에 든 비율
+             (num_candidates / int8 양자화의 정확도 손실을 본다)
+  - hybrid : 쿼리에 relevant(url 목록)가 있으면 그 기준, 없으면 기준 결과(BM25 + 정확 kNN, 같은 RRF) 대비
+- 쿼리 임베딩은 Bedrock(+ EMBED_CACHE_BACKEND 캐시)으로 한 번만 만든다. 쿼리 셋에 embedding이 있으면 그대로 쓴다.
+
+실행: python scripts/bench_news_retrieval.py --es-url http://localhost:9200 --k 10 \
+        --modes rrf,linear,native_rrf --num-candidates 50,100,200 --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "workers"))
+
+from elasticsearch import AsyncElasticsearch  # noqa: E402
+
+import embedding_cache  # noqa: E402
+from app.services.news_retrieval import (  # noqa: E402
+    NewsRetriever,
+    RetrievalConfig,
+    age_filter,
+    bm25_body,
+    knn_clause,
+    rrf_fuse,
+    time_decay,
+)
+
+DEFAULT_QUERIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_news_queries.json")
+
+
+def load_queries(path: str) -> list[dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [item if isinstance(item, dict) else {"query": str(item)} for item in data]
+
+
+def embed_queries(queries: list[dict[str, Any]], model_id: str, dims: int, region: str) -> None:
+    pending = [q for q in queries if not q.get("embedding")]
+    if not pending:
+        return
+    import boto3
+
+    client = boto3.client("bedrock-runtime", region_name=region)
+    cache = embedding_cache.from_env(model_id, dims)
+
+    def invoke(text: str) -> Optional[list[float]]:
+        response = client.invoke_model(
+            modelId=model_id,
+            body=json.dumps({"inputText": text, "dimensions": dims, "normalize": True}),
+            contentType="application/json",
+            accept="application/json",
+        )
+        return json.loads(response["body"].read()).get("embedding")
+
+    for q in pending:
+        q["embedding"] = cache.get_or_embed(q["query"], invoke) if cache is not None else invoke(q["query"])
+
+
+def exact_knn_body(embedding: list[float], size: int, cfg: RetrievalConfig) -> dict:
+    """정답 기준: 기간 filter 안의 임베딩 있는 문서 전부에 cosine을 계산한다 (HNSW/양자화 미사용)."""
+    return {
+        "size": size,
+        "_source": ["published_at", "url"],
+        "query": {
+            "script_score": {
+                "query": {"bool": {"filter": [{"exists": {"field": "embedding"}}, *age_filter(cfg)]}},
+                "script": {
+                    "source": "cosineSimilarity(params.v, 'embedding') + 1.0",
+                    "params": {"v": embedding},
+                },
+            }
+        },
+    }
+
+
+def doc_key(hit: dict) -> str:
+    return hit.get("_id") or hit.get("_source", {}).get("url")
+
+
+def recall(found: list[dict], expected: set[str], k: int) -> Optional[float]:
+    if not expected:
+        return None
+    top = {doc_key(hit) for hit in found[:k]}
+    return len(top & expected) / min(k, len(expected))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def ground_truth(
+    es: AsyncElasticsearch, index: str, query: dict[str, Any], k: int, cfg: RetrievalConfig
+) -> tuple[set[str], set[str]]:
+    """(정확 kNN top-k, 기준 hybrid top-k 또는 relevant url)"""
+    terms = query["query"].split()
+    window = max(k, cfg.window)
+    exact = (await es.search(index=index, body=exact_knn_body(query["embedding"], window, cfg)))["hits"]["hits"]
+    if query.get("relevant"):
+        return {doc_key(hit) for hit in exact[:k]}, set(query["relevant"])
+    bm25 = (await es.search(index=index, body=bm25_body(terms, window, cfg)))["hits"]["hits"]
+
+    def knn_decay(hit: dict) -> float:
+        return time_decay(hit.get("_source", {}).get("published_at"), cfg.decay_scale_days)
+
+    fused = rrf_fuse([bm25, exact], cfg.rank_constant, k, weights=[lambda hit: 1.0, knn_decay])
+    return {doc_key(hit) for hit in exact[:k]}, {doc_key(hit) for hit in fused}
+
+
+async def run(args: argparse.Namespace) -> None:
+    queries = load_queries(args.queries)
+    embed_queries(queries, args.model_id, args.dims, args.region)
+    es = AsyncElasticsearch(hosts=[args.es_url], request_timeout=30)
+    base = RetrievalConfig()
+    try:
+        truths = [await ground_truth(es, args.index, q, args.k, base) for q in queries]
+        print(f"queries={len(queries)} k={args.k} index={args.index} repeat={args.repeat}")
+        print(f"{'mode':<11} {'used':<15} {'num_cand':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+              f"{'knn@k':>7} {'hybrid@k':>9}")
+
+        for mode in args.modes.split(","):
+            for num_candidates in (int(n) for n in args.num_candidates.split(",")):
+                cfg = base.with_overrides(mode=mode.strip(), num_candidates=num_candidates)
+                # 설정마다 새로 만든다: native_rrf 미지원 판정이 다음 설정 측정에 번지지 않게
+                retriever = NewsRetriever(es, args.index, cfg)
+                used_modes: set[str] = set()
+                latencies: list[float] = []
+                knn_recalls: list[float] = []
+                hybrid_recalls: list[float] = []
+                for query, (exact_top, expected) in zip(queries, truths):
+                    terms = query["query"].split()
+                    await retriever.search(terms, query["embedding"], args.k, cfg)  # warm-up
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        hits, used = await retriever.search(terms, query["embedding"], args.k, cfg)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        used_modes.add(used)
+                    ann = await es.search(
+                        index=args.index,
+                        body={"knn": knn_clause(query["embedding"], cfg, args.k), "size": args.k, "_source": False},
+                    )
+                    knn_recall = recall(ann["hits"]["hits"], exact_top, args.k)
+                    hybrid_recall = recall(hits, expected, args.k)
+                    if knn_recall is not None:
+                        knn_recalls.append(knn_recall)
+                    if hybrid_recall is not None:
+                        hybrid_recalls.append(hybrid_recall)
+                # 실제로 쓴 방식 (native_rrf가 rrf로 내려가면 used에 rrf가 찍힌다)
+                used_label = "/".join(sorted(used_modes))
+                print(
+                    f"{cfg.mode:<11} {used_label:<15} {num_candidates:>8} {percentile(latencies, 50):>8.1f} "
+                    f"{percentile(latencies, 95):>8.1f} {max(latencies):>8.1f} "
+                    f"{statistics.mean(knn_recalls) if knn_recalls else 0:>7.3f} "
+                    f"{statistics.mean(hybrid_recalls) if hybrid_recalls else 0:>9.3f}"
+                )
+                if retriever.stats()["native_fallbacks"]:
+                    print(f"  retriever stats: {retriever.stats()}")
+    finally:
+        await es.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="News hybrid retrieval benchmark (latency / recall@k)")
+    parser.add_argument("--es-url", default=os.getenv("ELASTICSEARCH_URL", "http://localhost:9200"))
+    parser.add_argument("--index", default=os.getenv("ELASTICSEARCH_INDEX", "news"))
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", default="rrf,linear")
+    parser.add_argument("--num-candidates", default="50,100,200")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model-id", default="amazon.titan-embed-text-v2:0")
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--region", default=os.getenv("AWS_REGION", "ap-northeast-2"))
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
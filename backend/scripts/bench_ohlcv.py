@@ -0,0 +1,182 @@
+"""
+OHLCV 집계 벤치마크 (dict 루프 vs workers/ohlcv.py)
+
+- intraday: 1분 캔들 N행 → 60분봉 (Redis JSON 리스트 디코드 + dedup + 루프 집계 vs packed 디코드 + NumPy)
+- yearly: 일봉 N행 → 연봉 (날짜 파싱 루프 vs 연도 키 group_by_key)
+
+실행: python scripts/bench_ohlcv.py --rows 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workers"))
+
+import numpy as np  # noqa: E402
+
+import ohlcv  # noqa: E402
+from candle_codec import encode_candles  # noqa: E402
+
+KST = timezone(timedelta(hours=9))
+
+
+def _safe_float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except Exception:
+        return default
+
+
+def _bucket_iso_kst(bucket_start: int) -> str:
+    return datetime.fromtimestamp(bucket_start, tz=timezone.utc).astimezone(KST).isoformat(timespec="seconds")
+
+
+def legacy_intraday(raw_rows: list[str], minute_unit: int) -> list[dict[str, Any]]:
+    """기존 market.py 경로: 행마다 json.loads → bucket dedup → dict 루프 집계."""
+    dedup: dict[int, dict[str, Any]] = {}
+    for item in raw_rows:
+        row = json.loads(item)
+        dedup[int(row.get("bucket_start", 0) or 0)] = row
+    ordered = [dedup[key] for key in sorted(dedup.keys())]
+
+    bucket_seconds = minute_unit * 60
+    aggregated: list[dict[str, Any]] = []
+    current: dict[str, Any] | None = None
+    for row in ordered:
+        bucket_start = int(row.get("bucket_start", 0) or 0)
+        group_start = bucket_start - (bucket_start % bucket_seconds)
+        if current is None or int(current["bucket_start"]) != group_start:
+            if current is not None:
+                aggregated.append(current)
+            current = {
+                "bucket_start": group_start,
+                "date": _bucket_iso_kst(group_start),
+                "open": _safe_float(row.get("open", 0)),
+                "high": _safe_float(row.get("high", 0)),
+                "low": _safe_float(row.get("low", 0)),
+                "close": _safe_float(row.get("close", 0)),
+                "volume": _safe_float(row.get("volume", 0)),
+            }
+        else:
+            current["high"] = max(_safe_float(current["high"]), _safe_float(row.get("high", 0)))
+            current["low"] = min(_safe_float(current["low"]), _safe_float(row.get("low", 0)))
+            current["close"] = _safe_float(row.get("close", 0))
+            current["volume"] = _safe_float(current.get("volume", 0)) + _safe_float(row.get("volume", 0))
+    if current is not None:
+        aggregated.append(current)
+    return aggregated
+
+
+def engine_intraday(packed: str, minute_unit: int) -> list[dict[str, Any]]:
+    candles = ohlcv.resample(ohlcv.dedup(ohlcv.from_packed(packed)), minute_unit * 60)
+    return candles.to_records(_bucket_iso_kst)
+
+
+def legacy_yearly(history: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    buckets: dict[int, dict[str, Any]] = {}
+    for row in history:
+        year = datetime.strptime(row["date"], "%Y-%m-%d").year
+        open_p = float(row.get("open", 0) or 0)
+        high_p = float(row.get("high", 0) or 0)
+        low_p = float(row.get("low", 0) or 0)
+        close_p = float(row.get("close", 0) or 0)
+        volume_p = float(row.get("volume", 0) or 0)
+        if year not in buckets:
+            buckets[year] = {
+                "date": f"{year}-01-01", "open": open_p, "high": high_p,
+                "low": low_p, "close": close_p, "volume": volume_p,
+            }
+            continue
+        bucket = buckets[year]
+        bucket["high"] = max(float(bucket["high"]), high_p)
+        bucket["low"] = min(float(bucket["low"]), low_p)
+        bucket["close"] = close_p
+        bucket["volume"] = float(bucket["volume"]) + volume_p
+    return [buckets[y] for y in sorted(buckets.keys())]
+
+
+def engine_yearly(history: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    years = np.array([row["date"] for row in history]).astype("U4").astype(np.int64)
+    candles = ohlcv.from_columns(
+        (0 for _ in history),
+        (row["open"] for row in history),
+        (row["high"] for row in history),
+        (row["low"] for row in history),
+        (row["close"] for row in history),
+        (row["volume"] for row in history),
+    )
+    keys, grouped = ohlcv.group_by_key(candles, years)
+    return [{**row, "date": f"{year}-01-01"} for row, year in zip(grouped.to_records(), keys.tolist())]
+
+
+def _timed(label: str, func, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    print(f"  {label:<8} {best * 1000:9.1f} ms  ({len(result)} bars)")
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OHLCV aggregation benchmark")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--minute-unit", type=int, default=60)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    start = 1_700_000_000 - 1_700_000_000 % 86400
+    price = 100_000.0
+    rows = []
+    for i in range(args.rows):
+        open_p = price
+        price = max(1.0, price * (1 + rng.uniform(-0.002, 0.002)))
+        high_p = max(open_p, price) * (1 + rng.uniform(0, 0.001))
+        low_p = min(open_p, price) * (1 - rng.uniform(0, 0.001))
+        rows.append((start + i * 60, open_p, high_p, low_p, price, rng.uniform(0.1, 5.0)))
+
+    raw_json = [
+        json.dumps({
+            "symbol": "BTC", "asset_type": "crypto", "bucket_start": b, "date": _bucket_iso_kst(b),
+            "open": o, "high": h, "low": lo, "close": c, "volume": v,
+            "updated_at": "2026-01-01T00:00:00+00:00",
+        })
+        for b, o, h, lo, c, v in rows
+    ]
+    packed = encode_candles(rows)
+    print(f"intraday 1m -> {args.minute_unit}m, rows={args.rows}")
+    print(f"  redis bytes: json={sum(len(r) for r in raw_json):,} packed={len(packed):,}")
+    legacy_sec, legacy_result = _timed("legacy", legacy_intraday, raw_json, args.minute_unit)
+    engine_sec, engine_result = _timed("numpy", engine_intraday, packed, args.minute_unit)
+    assert len(legacy_result) == len(engine_result)
+    assert all(
+        abs(a["close"] - b["close"]) < 1e-9 and abs(a["volume"] - b["volume"]) < 1e-6
+        for a, b in zip(legacy_result, engine_result)
+    )
+    print(f"  speedup  {legacy_sec / engine_sec:9.1f}x")
+
+    day0 = datetime(1900, 1, 1)
+    daily = [
+        {
+            "date": (day0 + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "open": o, "high": h, "low": lo, "close": c, "volume": v,
+        }
+        for i, (_, o, h, lo, c, v) in enumerate(rows)
+    ]
+    print(f"yearly D -> Y, rows={args.rows}")
+    legacy_sec, legacy_result = _timed("legacy", legacy_yearly, daily)
+    engine_sec, engine_result = _timed("numpy", engine_yearly, daily)
+    assert [r["close"] for r in legacy_result] == [r["close"] for r in engine_result]
+    print(f"  speedup  {legacy_sec / engine_sec:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,18 +7,37 @@ MongoDB tutum.news 컬렉션의 전체 문서를 Elasticsearch에 bulk upsert.
 이미 인덱싱된 문서는 덮어쓰지 않음 (doc_as_upsert).
 K8s Job으로 실행 - 완료 후 파드 자동 종료.
 
+병렬/재개:
+  - _id 기준 $bucketAuto로 컬렉션을 BACKFILL_WORKERS개 구간으로 나눠 동시에 스캔
+  - 구간마다 bulk 요청을 최대 BACKFILL_INFLIGHT개까지 겹쳐 보낸다 (Mongo 읽기와 ES 쓰기 파이프라이닝)
+  - 구간별 진행 위치(마지막으로 확인된 _id)를 Mongo 체크포인트 문서에 저장 → 중단 후 다시 실행하면 이어서 진행
+  - bulk 응답에서 실패한 문서만 backoff 후 다시 보낸다 (429/es_rejected_execution/5xx, 연결 오류)
+  - 끝내 실패한 문서의 _id는 구간 체크포인트(failed_ids)에 남기고, 다시 실행하면 그 문서부터 재시도
+  - 매핑 변경 등으로 처음부터 다시 넣으려면 BACKFILL_RESET=true
+
 환경변수:
   MONGO_URI           - MongoDB 연결 문자열
   MONGO_DB            - DB명 (기본: tutum)
   MONGO_COLL          - 컬렉션명 (기본: news)
   ELASTICSEARCH_URL   - ES URL (기본: http://localhost:9200)
-  ES_INDEX            - 인덱스명 (기본: news)
+  ES_INDEX            - 인덱스 이름 접두어 (기본: news → news_v{N})
+  ES_WRITE_ALIAS      - 색인 대상 write alias (기본: news-write, reindex 중이면 옛/새 인덱스에 모두 씀)
   BATCH_SIZE          - 배치 크기 (기본: 100)
+  BACKFILL_EMBED      - embedding 없는 문서를 Bedrock으로 채움 (기본: false, 임베딩 캐시 사용)
+  EMBED_CONCURRENCY   - 임베딩 동시 호출 수 (기본: 8)
+  BACKFILL_WORKERS    - 병렬 구간 수 (기본: 4)
+  BACKFILL_INFLIGHT   - 구간당 동시 bulk 요청 수 (기본: 2)
+  BACKFILL_CHECKPOINT_COLL - 체크포인트 컬렉션 (기본: backfill_es_checkpoints)
+  BACKFILL_RESET      - 체크포인트를 지우고 처음부터 (기본: false)
 """
 
 import json
 import os
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
 from urllib.parse import quote
@@ -26,14 +45,25 @@ from urllib.parse import quote
 import requests
 from pymongo import MongoClient
 
+import es_index
+
 MONGO_URI = os.getenv("MONGO_URI") or os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 MONGO_DB = os.getenv("MONGO_DB", "tutum")
 MONGO_COLL = os.getenv("MONGO_COLL", "news")
 
 ES_URL = (os.getenv("ELASTICSEARCH_URL") or os.getenv("ES_URL", "http://localhost:9200")).rstrip("/")
-ES_INDEX = os.getenv("ES_INDEX", "news")
 ES_TIMEOUT = int(os.getenv("ES_TIMEOUT_SEC", "30"))
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "100"))
+BACKFILL_EMBED = os.getenv("BACKFILL_EMBED", "false").strip().lower() in {"1", "true", "yes", "on"}
+EMBED_CONCURRENCY = max(1, int(os.getenv("EMBED_CONCURRENCY", "8")))
+BACKFILL_WORKERS = max(1, int(os.getenv("BACKFILL_WORKERS", "4")))
+BACKFILL_INFLIGHT = max(1, int(os.getenv("BACKFILL_INFLIGHT", "2")))
+BACKFILL_CHECKPOINT_COLL = os.getenv("BACKFILL_CHECKPOINT_COLL", "backfill_es_checkpoints")
+BACKFILL_RESET = os.getenv("BACKFILL_RESET", "false").strip().lower() in {"1", "true", "yes", "on"}
+BULK_MAX_ATTEMPTS = 3
+
+# main()에서 write alias를 확인한 뒤 설정 (dual-write 대상 목록)
+WRITE_TARGETS: Optional[es_index.WriteTargets] = None
 
 KST = timezone(timedelta(hours=9))
 
@@ -108,15 +138,25 @@ def normalize_doc(raw: dict[str, Any]) -> Optional[dict[str, Any]]:
 
 # ── ES bulk upsert ────────────────────────────────────────────────────────────
 
-def bulk_upsert(session: requests.Session, docs: list[dict[str, Any]]) -> tuple[int, int]:
-    """bulk API로 upsert. (성공 수, 실패 수) 반환."""
+def _retryable(status: Any) -> bool:
+    # 429(es_rejected_execution 등 큐 포화)와 5xx는 다시 보내면 성공할 수 있다. 매핑 오류 같은 4xx는 재시도하지 않는다.
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+def bulk_upsert(session: requests.Session, docs: list[dict[str, Any]]) -> tuple[list[int], list[int]]:
+    """
+    bulk API로 upsert. (재시도할 문서 위치, 재시도해도 안 되는 문서 위치) 반환.
+    dual-write 중이면 모든 대상에 성공해야 성공으로 센다.
+    """
+    targets = WRITE_TARGETS.get() if WRITE_TARGETS else [(es_index.ES_WRITE_ALIAS, None)]
     lines = []
     for doc in docs:
         doc_id = quote(str(doc["url"]), safe="")
-        action = json.dumps({"update": {"_index": ES_INDEX, "_id": doc_id, "retry_on_conflict": 3}})
-        body = json.dumps({"doc": doc, "doc_as_upsert": True}, ensure_ascii=False)
-        lines.append(action)
-        lines.append(body)
+        for index, dims in targets:
+            action = json.dumps({"update": {"_index": index, "_id": doc_id, "retry_on_conflict": 3}})
+            body = json.dumps({"doc": es_index.doc_for_target(doc, dims), "doc_as_upsert": True}, ensure_ascii=False)
+            lines.append(action)
+            lines.append(body)
 
     payload = "\n".join(lines) + "\n"
     resp = session.post(
@@ -127,24 +167,296 @@ def bulk_upsert(session: requests.Session, docs: list[dict[str, Any]]) -> tuple[
     )
     if resp.status_code >= 400:
         print(f"[bulk] HTTP {resp.status_code}: {resp.text[:300]}", flush=True)
-        return 0, len(docs)
+        # 요청 단위 오류는 배치 전체를 재시도하고, 끝내 실패하면 post_batch가 구간을 멈춘다.
+        return list(range(len(docs))), []
+
+    items = resp.json().get("items", [])
+    per_doc = len(targets)
+    retry: list[int] = []
+    rejected: list[int] = []
+    for i in range(len(docs)):
+        chunk = items[i * per_doc:(i + 1) * per_doc]
+        statuses = [item.get("update", {}).get("status") for item in chunk]
+        if len(chunk) == per_doc and all(status in (200, 201) for status in statuses):
+            continue
+        if len(chunk) < per_doc or any(_retryable(status) for status in statuses):
+            retry.append(i)
+        else:
+            rejected.append(i)
+            errors = [item.get("update", {}).get("error") for item in chunk]
+            print(f"[bulk] rejected {docs[i].get('url')}: {str([e for e in errors if e])[:200]}", flush=True)
+    return retry, rejected
+
+
+# ── 임베딩 (BACKFILL_EMBED=true) ─────────────────────────────────────────────
+
+class BatchEmbedder:
+    """elastic_consumer와 같은 모델/입력 텍스트로 임베딩하고, 본문 해시 캐시로 중복 호출을 건너뛴다."""
+
+    def __init__(self):
+        import elastic_consumer
+        import embedding_cache
+
+        self.build_text = elastic_consumer.build_embedding_text
+        self.embed = elastic_consumer.embed_with_bedrock
+        self.cache = embedding_cache.from_env(elastic_consumer.BEDROCK_EMBED_MODEL_ID,
+                                              elastic_consumer.BEDROCK_EMBED_DIMS)
+        self.executor = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+
+    def _embed_one(self, text: str) -> Optional[list[float]]:
+        if self.cache is None:
+            return self.embed(text)
+        return self.cache.get_or_embed(text, self.embed)
+
+    def fill(self, docs: list[dict[str, Any]]) -> int:
+        targets = [doc for doc in docs if not doc.get("embedding")]
+        filled = 0
+        for doc, vector in zip(targets, self.executor.map(self._embed_one, map(self.build_text, targets))):
+            if vector:
+                doc["embedding"] = vector
+                filled += 1
+        return filled
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        if self.cache is not None:
+            print(f"[embed-cache] {self.cache.stats()}", flush=True)
+
+
+# ── 병렬 구간 스캔 + 체크포인트 ─────────────────────────────────────────────────
+
+class Checkpoint:
+    """구간 계획과 구간별 진행 위치를 Mongo 문서 하나에 저장한다 (Job 파드가 재시작돼도 유지)."""
+
+    def __init__(self, client: MongoClient, target_index: str):
+        self.coll = client[MONGO_DB][BACKFILL_CHECKPOINT_COLL]
+        # 버전 인덱스별로 따로 진행 (새 버전으로 reindex한 뒤 다시 돌리면 처음부터)
+        self.run_id = f"{MONGO_DB}.{MONGO_COLL}->{target_index}"
+
+    def load_or_plan(self, coll, workers: int) -> list[dict[str, Any]]:
+        if BACKFILL_RESET:
+            self.coll.delete_one({"_id": self.run_id})
+        saved = self.coll.find_one({"_id": self.run_id})
+        if saved and saved.get("slices"):
+            print(f"[checkpoint] resume run={self.run_id} slices={len(saved['slices'])}", flush=True)
+            return saved["slices"]
+
+        # $bucketAuto: 문서 수가 비슷한 _id 구간 (max는 마지막 구간만 포함)
+        buckets = list(coll.aggregate(
+            [{"$bucketAuto": {"groupBy": "$_id", "buckets": workers}}],
+            allowDiskUse=True,
+        ))
+        slices = [
+            {
+                "index": i,
+                "lo": bucket["_id"]["min"],
+                "hi": bucket["_id"]["max"],
+                "last_inclusive": i == len(buckets) - 1,
+                "last_id": None,
+                "done": False,
+                "count": int(bucket.get("count", 0)),
+            }
+            for i, bucket in enumerate(buckets)
+        ]
+        self.coll.replace_one(
+            {"_id": self.run_id},
+            {"_id": self.run_id, "slices": slices, "created_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+        print(f"[checkpoint] new run={self.run_id} slices={len(slices)}", flush=True)
+        return slices
+
+    def advance(self, index: int, last_id: Any, failed_ids: Optional[list[Any]] = None) -> None:
+        update: dict[str, Any] = {"$set": {f"slices.{index}.last_id": last_id}}
+        if failed_ids:
+            update["$addToSet"] = {f"slices.{index}.failed_ids": {"$each": failed_ids}}
+        self.coll.update_one({"_id": self.run_id}, update)
+
+    def set_failed(self, index: int, failed_ids: list[Any]) -> None:
+        self.coll.update_one({"_id": self.run_id}, {"$set": {f"slices.{index}.failed_ids": failed_ids}})
+
+    def finish(self, index: int) -> None:
+        self.coll.update_one({"_id": self.run_id}, {"$set": {f"slices.{index}.done": True}})
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.processed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, ok: int = 0, failed: int = 0, skipped: int = 0, processed: int = 0) -> None:
+        with self._lock:
+            self.ok += ok
+            self.failed += failed
+            self.skipped += skipped
+            self.processed += processed
+            processed_total = self.processed
+        if processed and processed_total // (BATCH_SIZE * 10) != (processed_total - processed) // (BATCH_SIZE * 10):
+            elapsed = time.monotonic() - self.started
+            pct = round(processed_total / self.total * 100) if self.total else 0
+            print(
+                f"[progress] {processed_total:,}/{self.total:,} ({pct}%) — OK:{self.ok:,} FAIL:{self.failed:,} "
+                f"rate={processed_total / elapsed if elapsed else 0:,.0f}/s",
+                flush=True,
+            )
+
+
+def post_batch(session: requests.Session, docs: list[dict[str, Any]]) -> list[int]:
+    """
+    실패한 문서만 골라 backoff 후 재시도하고, 끝내 실패한 문서의 docs 내 위치를 반환한다.
+    배치 전체가 한 번도 성공하지 못하면(ES 장애) 예외 → 구간을 멈추고 체크포인트부터 다시 진행.
+    """
+    pending = list(range(len(docs)))
+    failed: list[int] = []
+    for attempt in range(BULK_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(2 ** (attempt - 1))
+        try:
+            retry, rejected = bulk_upsert(session, [docs[i] for i in pending])
+        except requests.RequestException as e:
+            print(f"[bulk] request error (attempt {attempt + 1}): {e!r}", flush=True)
+            continue
+        failed.extend(pending[i] for i in rejected)
+        pending = [pending[i] for i in retry]
+        if not pending:
+            return failed
+        print(f"[bulk] {len(pending)} docs to retry (attempt {attempt + 1})", flush=True)
+    if len(pending) == len(docs):
+        raise RuntimeError(f"bulk request failed after {BULK_MAX_ATTEMPTS} attempts ({len(docs)} docs)")
+    return sorted(failed + pending)
+
+
+def redrive_failed(
+    session: requests.Session,
+    coll,
+    plan: dict[str, Any],
+    checkpoint: Checkpoint,
+    progress: Progress,
+    embedder: Optional["BatchEmbedder"],
+) -> list[Any]:
+    """이전 실행에서 끝내 실패한 문서(failed_ids)를 다시 보낸다. 아직 실패한 _id 목록을 반환."""
+    failed_ids = plan.get("failed_ids") or []
+    if not failed_ids:
+        return []
+    print(f"[slice {plan['index']}] redrive {len(failed_ids)} failed docs", flush=True)
+    still_failed: list[Any] = []
+    for start in range(0, len(failed_ids), BATCH_SIZE):
+        ids: list[Any] = []
+        docs: list[dict[str, Any]] = []
+        for raw in coll.find({"_id": {"$in": failed_ids[start:start + BATCH_SIZE]}}):
+            doc_id = raw.pop("_id", None)
+            doc = normalize_doc(raw)
+            if doc:
+                ids.append(doc_id)
+                docs.append(doc)
+        if not docs:
+            continue
+        if embedder:
+            embedder.fill(docs)
+        failed = post_batch(session, docs)
+        still_failed.extend(ids[i] for i in failed)
+        progress.add(ok=len(docs) - len(failed), failed=len(failed))
+    checkpoint.set_failed(plan["index"], still_failed)
+    return still_failed
+
+
+def run_slice(
+    coll,
+    plan: dict[str, Any],
+    checkpoint: Checkpoint,
+    progress: Progress,
+    embedder: Optional["BatchEmbedder"],
+) -> bool:
+    """한 구간을 _id 순으로 스캔. bulk는 최대 BACKFILL_INFLIGHT개 동시에, 체크포인트는 앞에서부터 완료된 배치까지만."""
+    index = plan["index"]
+    if plan.get("done") and not plan.get("failed_ids"):
+        return True
+
+    id_filter: dict[str, Any] = {"$lte" if plan["last_inclusive"] else "$lt": plan["hi"]}
+    if plan.get("last_id") is not None:
+        id_filter["$gt"] = plan["last_id"]
+    else:
+        id_filter["$gte"] = plan["lo"]
+
+    session = requests.Session()
+    pool = ThreadPoolExecutor(max_workers=BACKFILL_INFLIGHT, thread_name_prefix=f"bulk-{index}")
+    inflight: deque[tuple[Future, Any, list[Any]]] = deque()
+    failed_total = 0
+
+    def drain(limit: int) -> None:
+        # 앞쪽 배치부터 완료를 기다려야 체크포인트가 건너뛰지 않는다. 실패 문서는 _id를 남기고 넘어간다.
+        nonlocal failed_total
+        while len(inflight) > limit:
+            future, last_id, ids = inflight.popleft()
+            failed_ids = [ids[i] for i in future.result()]
+            failed_total += len(failed_ids)
+            progress.add(ok=len(ids) - len(failed_ids), failed=len(failed_ids), processed=len(ids))
+            checkpoint.advance(index, last_id, failed_ids)
+
+    cursor = None
+    try:
+        failed_total = len(redrive_failed(session, coll, plan, checkpoint, progress, embedder))
+        if plan.get("done"):
+            return failed_total == 0
+
+        cursor = coll.find({"_id": id_filter}, no_cursor_timeout=True).sort("_id", 1).batch_size(BATCH_SIZE)
+        batch: list[dict[str, Any]] = []
+        batch_ids: list[Any] = []
+        last_id = None
+        for raw in cursor:
+            last_id = raw.pop("_id", None)  # ObjectId는 JSON 직렬화 불가 → 제거
+            doc = normalize_doc(raw)
+            if not doc:
+                progress.add(skipped=1)
+                continue
+            batch.append(doc)
+            batch_ids.append(last_id)
+            if len(batch) >= BATCH_SIZE:
+                if embedder:
+                    embedder.fill(batch)
+                inflight.append((pool.submit(post_batch, session, batch), last_id, batch_ids))
+                batch, batch_ids = [], []
+                drain(BACKFILL_INFLIGHT)
 
-    result = resp.json()
-    ok = sum(1 for item in result.get("items", []) if item.get("update", {}).get("status") in (200, 201))
-    failed = len(result.get("items", [])) - ok
-    return ok, failed
+        if batch:
+            if embedder:
+                embedder.fill(batch)
+            inflight.append((pool.submit(post_batch, session, batch), last_id, batch_ids))
+        drain(0)
+        checkpoint.finish(index)
+        if failed_total:
+            print(f"[slice {index}] done with {failed_total} failed docs (다시 실행하면 재시도)", flush=True)
+        else:
+            print(f"[slice {index}] done", flush=True)
+        return True
+    except Exception as e:
+        print(f"[slice {index}] stopped: {e!r} (다시 실행하면 체크포인트부터 이어서 진행)", flush=True)
+        return False
+    finally:
+        if cursor is not None:
+            cursor.close()
+        pool.shutdown(wait=True, cancel_futures=True)
+        session.close()
 
 
 # ── 메인 ─────────────────────────────────────────────────────────────────────
 
 def main() -> None:
+    global WRITE_TARGETS
     session = requests.Session()
 
     # ES 연결 확인
     try:
         ping = session.get(ES_URL, timeout=10)
         ping.raise_for_status()
-        print(f"[es] connected: {ES_URL}", flush=True)
+        write_index = es_index.ensure_aliases(session)
+        WRITE_TARGETS = es_index.WriteTargets(session)
+        print(f"[es] connected: {ES_URL} write={es_index.ES_WRITE_ALIAS}->{write_index}", flush=True)
     except Exception as e:
         print(f"[es] connection failed: {e}", flush=True)
         sys.exit(1)
@@ -162,53 +474,34 @@ def main() -> None:
 
     # 현재 ES 문서 수 확인
     try:
-        count_resp = session.get(f"{ES_URL}/{ES_INDEX}/_count", timeout=10)
+        count_resp = session.get(f"{ES_URL}/{write_index}/_count", timeout=10)
         es_before = count_resp.json().get("count", 0) if count_resp.ok else 0
         print(f"[es] 기존 인덱싱 수: {es_before:,}건 ({round(es_before/total*100) if total else 0}%)", flush=True)
     except Exception:
         es_before = 0
 
-    # 배치 처리
-    total_ok = 0
-    total_fail = 0
-    total_skip = 0
-    batch: list[dict[str, Any]] = []
-    processed = 0
+    # 구간별 병렬 처리
+    checkpoint = Checkpoint(client, write_index)
+    slices = checkpoint.load_or_plan(coll, BACKFILL_WORKERS)
+    progress = Progress(total)
+    embedder = BatchEmbedder() if BACKFILL_EMBED else None
+    print(f"[backfill] workers={len(slices)} inflight={BACKFILL_INFLIGHT} batch={BATCH_SIZE}", flush=True)
 
-    cursor = coll.find({}, no_cursor_timeout=True).batch_size(BATCH_SIZE)
     try:
-        for raw in cursor:
-            raw.pop("_id", None)  # ObjectId는 JSON 직렬화 불가 → 제거
-            doc = normalize_doc(raw)
-            if not doc:
-                total_skip += 1
-                continue
-
-            batch.append(doc)
-            if len(batch) >= BATCH_SIZE:
-                ok, fail = bulk_upsert(session, batch)
-                total_ok += ok
-                total_fail += fail
-                processed += len(batch)
-                batch = []
-                pct = round(processed / total * 100) if total else 0
-                print(f"[progress] {processed:,}/{total:,} ({pct}%) — OK:{total_ok:,} FAIL:{total_fail:,}", flush=True)
-
-        # 남은 배치
-        if batch:
-            ok, fail = bulk_upsert(session, batch)
-            total_ok += ok
-            total_fail += fail
-            processed += len(batch)
-
+        with ThreadPoolExecutor(max_workers=max(1, len(slices)), thread_name_prefix="slice") as workers:
+            results = list(workers.map(lambda plan: run_slice(coll, plan, checkpoint, progress, embedder), slices))
     finally:
-        cursor.close()
         client.close()
+        if embedder:
+            embedder.close()
+
+    total_ok, total_fail, total_skip = progress.ok, progress.failed, progress.skipped
+    incomplete = results.count(False)
 
     # 완료 후 ES 문서 수 재확인
     try:
-        session.post(f"{ES_URL}/{ES_INDEX}/_refresh", timeout=10)
-        count_resp = session.get(f"{ES_URL}/{ES_INDEX}/_count", timeout=10)
+        session.post(f"{ES_URL}/{write_index}/_refresh", timeout=10)
+        count_resp = session.get(f"{ES_URL}/{write_index}/_count", timeout=10)
         es_after = count_resp.json().get("count", 0) if count_resp.ok else 0
     except Exception:
         es_after = total_ok
@@ -220,9 +513,10 @@ def main() -> None:
     print(f"  upsert 실패 : {total_fail:,}건", flush=True)
     print(f"  필드 누락 스킵: {total_skip:,}건", flush=True)
     print(f"  ES 최종 문서 수: {es_after:,}건 ({round(es_after/total*100) if total else 0}%)", flush=True)
+    print(f"  소요 시간    : {time.monotonic() - progress.started:,.0f}초 (미완료 구간 {incomplete}개)", flush=True)
     print("=" * 50, flush=True)
 
-    if total_fail > 0:
+    if total_fail > 0 or incomplete:
         sys.exit(1)
 
 
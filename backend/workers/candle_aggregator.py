@@ -5,14 +5,34 @@ Candle Aggregator - 1분 캔들 집계 서비스 (V2)
 
 - Kafka `price_tick` 토픽 소비
 - 심볼별 1분 OHLCV 캔들 생성
-- Redis: 최근 캔들 저장 (REST 초기 로드용)
+- Redis: 최근 캔들 저장 (REST 초기 로드용, candle_codec 압축 포맷)
 - MongoDB: 장기 저장(upsert) - 복구/백필 기반
+
+영속화는 틱마다 하지 않고 flush 스케줄러가 CANDLE_FLUSH_INTERVAL_MS 주기로 묶어서 처리한다.
+- dirty 상태인 current 캔들만 단일 Redis 파이프라인으로 SET
+- 확정 캔들은 키별 APPEND+자르기 스크립트 1회(candles:{symbol}:{res}:packed) + Mongo bulk_write 1회
+- 분 경계 + 유예 시간을 피드(asset_type) 전체의 이벤트 시간 워터마크(받은 틱 중 가장 늦은 체결시각)가 넘으면 확정한다.
+  피드가 밀려도(Kafka lag) 체결시각 기준으로 닫으므로 뒤늦게 도착한 같은 분 틱이 버려지지 않고,
+  거래가 드문 심볼도 다른 심볼 틱으로 워터마크가 넘어가면 유예 시간 안에 확정된다.
+- 피드 전체가 최대 틱 허용 나이보다 오래 멈췄을 때(장 마감 등)만 벽시계 기준으로 확정한다.
+
+상위 해상도(5m/15m/1h/1d)는 1m 캔들이 확정될 때마다 증분으로 갱신한다.
+- Redis: candles:{symbol}:{res}:packed (확정 캔들) + candles:{symbol}:{res}:current (JSON)
+- MongoDB: candles_{res} (symbol + bucket_start unique)
+- 상위 해상도 current는 확정된 1m만 반영하므로, 조회 측에서 1m current를 합쳐 최신 봉을 만든다.
+- 일봉 경계: 코인은 Upbit 일봉과 같은 UTC 00:00(KST 09:00), 주식은 KST 자정.
+
+거래량: 틱의 `acc_volume`(당일 누적 거래량)을 심볼별 직전 값과의 차분으로 구간에 더한다.
+- 누적값이 줄면 일봉 경계를 넘은 경우에만 초기화로 보고 현재 누적값을 더한다 (그 외에는 0).
+- 누적값이 없는 피드(Finnhub/mock)와 심볼의 첫 틱은 거래량 0.
+- 저장 문서에 `volume_kind: "delta"`를 남겨 조회 측이 이전 방식(누적값/틱 수 합산) 문서와 구분한다.
 """
 
 import asyncio
 import json
 import logging
 import os
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any
@@ -21,6 +41,9 @@ from zoneinfo import ZoneInfo
 import redis.asyncio as redis
 from aiokafka import AIOKafkaConsumer
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from candle_codec import APPEND_TRIM_LUA, RECORD_CHARS, encode_candles, packed_key
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -33,13 +56,26 @@ MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "clouddx")
 
 CANDLE_KEEP = max(200, int(os.getenv("CANDLE_KEEP", "2000")))
+# packed 키는 APPEND만 하므로 CANDLE_KEEP를 이만큼 넘으면 한 번에 잘라낸다.
+CANDLE_TRIM_SLACK = max(1, CANDLE_KEEP // 4)
 CURRENT_TTL_SECONDS = max(300, int(os.getenv("CANDLE_CURRENT_TTL_SECONDS", "7200")))
 LIST_TTL_SECONDS = max(3600, int(os.getenv("CANDLE_LIST_TTL_SECONDS", "1209600")))  # 14 days
 MAX_TICK_AGE_SECONDS_STOCK = max(60, int(os.getenv("MAX_TICK_AGE_SECONDS_STOCK", "900")))
 MAX_TICK_AGE_SECONDS_CRYPTO = max(60, int(os.getenv("MAX_TICK_AGE_SECONDS_CRYPTO", "180")))
+FLUSH_INTERVAL_SECONDS = max(50, int(os.getenv("CANDLE_FLUSH_INTERVAL_MS", "500"))) / 1000
+# 분 경계 이후 지연 도착 틱을 받아주는 유예 시간
+CLOSE_GRACE_SECONDS = max(0, int(os.getenv("CANDLE_CLOSE_GRACE_SECONDS", "2")))
+# flush 실패 시 재시도 버퍼 상한 (Redis/Mongo 장기 장애 시 메모리 보호)
+MAX_PENDING_FINALIZED = max(1000, int(os.getenv("CANDLE_MAX_PENDING_FINALIZED", "20000")))
 
 KST = ZoneInfo("Asia/Seoul")
 
+# 1m 확정 시 증분 갱신하는 상위 해상도 (라벨 -> 초)
+ROLLUP_RESOLUTIONS: dict[str, int] = {"5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+KST_DAY_OFFSET_SECONDS = 9 * 3600
+# 거래량이 누적 카운터 차분임을 표시 (이전 문서는 누적값/틱 수를 합산해 부풀려져 있다)
+VOLUME_KIND = "delta"
+
 
 def _safe_float(value: Any, default: float = 0.0) -> float:
     try:
@@ -80,6 +116,17 @@ def _minute_bucket_start(dt_utc: datetime) -> int:
     return unix_sec - (unix_sec % 60)
 
 
+def _max_tick_age(asset_type: str) -> int:
+    return MAX_TICK_AGE_SECONDS_STOCK if asset_type == "stock" else MAX_TICK_AGE_SECONDS_CRYPTO
+
+
+def _rollup_bucket_start(bucket_start: int, seconds: int, asset_type: str) -> int:
+    offset = 0
+    if seconds >= 86400 and asset_type != "crypto":
+        offset = KST_DAY_OFFSET_SECONDS
+    return ((bucket_start + offset) // seconds) * seconds - offset
+
+
 def _bucket_to_kst_iso(bucket_start: int) -> str:
     return datetime.fromtimestamp(bucket_start, tz=timezone.utc).astimezone(KST).isoformat(timespec="seconds")
 
@@ -94,6 +141,10 @@ class CandleState:
     low: float
     close: float
     volume: float
+    resolution: str = "1m"
+
+    def to_row(self) -> tuple[int, float, float, float, float, float]:
+        return (self.bucket_start, self.open, self.high, self.low, self.close, self.volume)
 
     def to_payload(self) -> dict[str, Any]:
         return {
@@ -106,6 +157,7 @@ class CandleState:
             "low": self.low,
             "close": self.close,
             "volume": self.volume,
+            "volume_kind": VOLUME_KIND,
             "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
         }
 
@@ -114,9 +166,24 @@ class CandleAggregator:
     def __init__(self):
         self.consumer: AIOKafkaConsumer | None = None
         self.redis_client: redis.Redis | None = None
+        self.append_script = None
         self.mongo_client: AsyncIOMotorClient | None = None
-        self.mongo_collection = None
+        self.mongo_collections: dict[str, Any] = {}
         self.states: dict[str, CandleState] = {}
+        # symbol -> (마지막 확정 bucket_start, 종가): 타이머 확정 이후 시가 연속성/late tick 판별용
+        self.last_closed: dict[str, tuple[int, float]] = {}
+        # (symbol, resolution) -> 진행 중인 상위 해상도 캔들 / 마지막 확정 bucket_start
+        self.rollups: dict[tuple[str, str], CandleState] = {}
+        self.rollup_last_closed: dict[tuple[str, str], int] = {}
+        # asset_type(피드) -> 받은 틱 중 가장 늦은 체결시각(unix, 미래 시각은 현재로 제한) / 마지막 틱 수신 벽시계
+        self.watermarks: dict[str, float] = {}
+        self.last_seen: dict[str, float] = {}
+        # symbol -> (일봉 bucket_start, 마지막 누적 거래량)
+        self.acc_volumes: dict[str, tuple[int, float]] = {}
+        # (symbol, resolution): current 키를 다시 써야 하는 캔들
+        self.dirty: set[tuple[str, str]] = set()
+        self.pending_redis: list[CandleState] = []
+        self.pending_mongo: list[CandleState] = []
         self.running = False
 
     async def connect(self):
@@ -133,47 +200,161 @@ class CandleAggregator:
 
         self.redis_client = redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
         await self.redis_client.ping()
+        self.append_script = self.redis_client.register_script(APPEND_TRIM_LUA)
         logger.info("Redis connected url=%s", REDIS_URL)
+        await self._restore_current()
 
         try:
             self.mongo_client = AsyncIOMotorClient(MONGODB_URL, serverSelectionTimeoutMS=3000)
             await self.mongo_client.admin.command("ping")
             db = self.mongo_client[MONGODB_DB_NAME]
-            self.mongo_collection = db["candles_1m"]
-            await self.mongo_collection.create_index(
-                [("symbol", 1), ("bucket_start", 1)],
-                unique=True,
-                name="uq_symbol_bucket",
-            )
-            await self.mongo_collection.create_index([("updated_at", -1)], name="idx_updated_at")
-            logger.info("Mongo connected db=%s collection=candles_1m", MONGODB_DB_NAME)
+            collections = {}
+            for resolution in ("1m", *ROLLUP_RESOLUTIONS):
+                collection = db[f"candles_{resolution}"]
+                await collection.create_index(
+                    [("symbol", 1), ("bucket_start", 1)],
+                    unique=True,
+                    name="uq_symbol_bucket",
+                )
+                await collection.create_index([("updated_at", -1)], name="idx_updated_at")
+                collections[resolution] = collection
+            self.mongo_collections = collections
+            logger.info("Mongo connected db=%s collections=%s", MONGODB_DB_NAME, ",".join(collections))
         except Exception as exc:
             logger.warning("Mongo disabled (connect/index failed): %s", exc)
-            self.mongo_collection = None
-
-    async def _persist_current(self, state: CandleState):
-        if self.redis_client is None:
+            self.mongo_collections = {}
+
+    async def _restore_current(self):
+        """재시작 시 아직 끝나지 않은 current 캔들을 이어받는다 (상위 해상도 봉이 부분 데이터로 덮이지 않도록)."""
+        now_unix = time.time()
+        restored = 0
+        for resolution, seconds in (("1m", 60), *ROLLUP_RESOLUTIONS.items()):
+            try:
+                keys = [key async for key in self.redis_client.scan_iter(match=f"candles:*:{resolution}:current")]
+                values = await self.redis_client.mget(keys) if keys else []
+            except Exception as exc:
+                logger.warning("Restore current candles failed (%s): %s", resolution, exc)
+                continue
+
+            for raw in values:
+                try:
+                    row = json.loads(raw) if raw else None
+                    if not row:
+                        continue
+                    state = CandleState(
+                        symbol=_normalize_symbol(row.get("symbol")),
+                        asset_type=str(row.get("asset_type") or "unknown").lower(),
+                        bucket_start=int(row.get("bucket_start", 0) or 0),
+                        open=_safe_float(row.get("open")),
+                        high=_safe_float(row.get("high")),
+                        low=_safe_float(row.get("low")),
+                        close=_safe_float(row.get("close")),
+                        volume=_safe_float(row.get("volume")),
+                        resolution=resolution,
+                    )
+                except Exception:
+                    continue
+                # 이미 끝난 구간은 확정 여부를 알 수 없으므로 이어받지 않는다 (중복 합산 방지).
+                if not state.symbol or state.bucket_start + seconds + CLOSE_GRACE_SECONDS <= now_unix:
+                    continue
+                if resolution == "1m":
+                    self.states[state.symbol] = state
+                else:
+                    self.rollups[(state.symbol, resolution)] = state
+                restored += 1
+        if restored:
+            logger.info("Restored %d open candles from Redis", restored)
+
+    def _finalize(self, state: CandleState):
+        self.pending_redis.append(state)
+        self.pending_mongo.append(state)
+        if state.resolution != "1m":
+            self.rollup_last_closed[(state.symbol, state.resolution)] = state.bucket_start
             return
-        key = f"candles:{state.symbol}:1m:current"
-        await self.redis_client.setex(key, CURRENT_TTL_SECONDS, json.dumps(state.to_payload()))
-
-    async def _persist_finalized(self, state: CandleState):
-        payload = state.to_payload()
-
-        if self.redis_client is not None:
-            key = f"candles:{state.symbol}:1m"
-            await self.redis_client.rpush(key, json.dumps(payload))
-            await self.redis_client.ltrim(key, -CANDLE_KEEP, -1)
-            await self.redis_client.expire(key, LIST_TTL_SECONDS)
-
-        if self.mongo_collection is not None:
-            await self.mongo_collection.update_one(
-                {"symbol": state.symbol, "bucket_start": state.bucket_start},
-                {"$set": payload},
-                upsert=True,
-            )
-
-    async def process_tick(self, message: dict[str, Any]):
+        self.last_closed[state.symbol] = (state.bucket_start, state.close)
+        self._roll_up(state)
+
+    def _roll_up(self, minute: CandleState):
+        """확정된 1m 캔들을 상위 해상도 캔들에 반영한다."""
+        for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+            key = (minute.symbol, resolution)
+            bucket_start = _rollup_bucket_start(minute.bucket_start, seconds, minute.asset_type)
+            rollup = self.rollups.get(key)
+            if rollup is not None and bucket_start > rollup.bucket_start:
+                self._finalize(self.rollups.pop(key))
+                rollup = None
+
+            if rollup is None:
+                if bucket_start <= self.rollup_last_closed.get(key, -1):
+                    continue
+                self.rollups[key] = CandleState(
+                    symbol=minute.symbol,
+                    asset_type=minute.asset_type,
+                    bucket_start=bucket_start,
+                    open=minute.open,
+                    high=minute.high,
+                    low=minute.low,
+                    close=minute.close,
+                    volume=minute.volume,
+                    resolution=resolution,
+                )
+            elif bucket_start == rollup.bucket_start:
+                rollup.high = max(rollup.high, minute.high)
+                rollup.low = min(rollup.low, minute.low)
+                rollup.close = minute.close
+                rollup.volume += minute.volume
+            else:
+                continue
+            self.dirty.add(key)
+
+    def _is_closable(self, state: CandleState, seconds: int, now_unix: float) -> bool:
+        """구간 끝 + 유예를 피드 워터마크가 넘었거나, 피드가 최대 틱 나이 이상 멈췄으면 확정 가능."""
+        close_at = state.bucket_start + seconds + CLOSE_GRACE_SECONDS
+        watermark = self.watermarks.get(state.asset_type)
+        if watermark is not None and watermark >= close_at:
+            return True
+        # 재시작 직후 아직 틱이 없는 피드도 멈춘 피드로 보고 벽시계 기준을 따른다.
+        idle = now_unix - self.last_seen.get(state.asset_type, float("-inf"))
+        return idle >= _max_tick_age(state.asset_type) and now_unix >= close_at
+
+    def close_expired(self, now_unix: float | None = None) -> int:
+        """끝난 구간의 캔들을 확정한다. 기준은 피드 이벤트 시간 워터마크, 멈춘 피드만 벽시계."""
+        now_unix = time.time() if now_unix is None else now_unix
+        expired = [
+            symbol for symbol, state in self.states.items()
+            if self._is_closable(state, 60, now_unix)
+        ]
+        for symbol in expired:
+            self._finalize(self.states.pop(symbol))
+
+        # 1m을 먼저 확정해야 마지막 분이 상위 해상도 봉에 반영된다.
+        expired_rollups = [
+            key for key, state in self.rollups.items()
+            if self._is_closable(state, ROLLUP_RESOLUTIONS[key[1]], now_unix)
+        ]
+        for key in expired_rollups:
+            self._finalize(self.rollups.pop(key))
+        return len(expired) + len(expired_rollups)
+
+    def _volume_delta(self, symbol: str, asset_type: str, bucket_start: int, raw: Any) -> float:
+        """누적 거래량 카운터의 직전 틱 대비 증가분."""
+        if raw is None:
+            return 0.0
+        acc_volume = _safe_float(raw, -1.0)
+        if acc_volume < 0:
+            return 0.0
+        day = _rollup_bucket_start(bucket_start, 86400, asset_type)
+        previous = self.acc_volumes.get(symbol)
+        self.acc_volumes[symbol] = (day, acc_volume)
+        if previous is None:
+            return 0.0
+        previous_day, previous_volume = previous
+        if acc_volume >= previous_volume:
+            return acc_volume - previous_volume
+        # 새 거래일이면 카운터 초기화. 같은 날 감소(벤더 초기화 시각이 일봉 경계와 다른 경우 등)는 기준만 다시 잡는다.
+        return acc_volume if day > previous_day else 0.0
+
+    def process_tick(self, message: dict[str, Any]):
         symbol = _normalize_symbol(
             message.get("symbol") or message.get("ticker") or message.get("code")
         )
@@ -190,31 +371,35 @@ class CandleAggregator:
         tick_age = (now_utc - ts).total_seconds()
 
         # 세션 종료 후 과거 체결시각이 긴 틱은 집계하지 않는다.
-        if asset_type == "stock":
-            if tick_age > MAX_TICK_AGE_SECONDS_STOCK:
-                return
-        elif tick_age > MAX_TICK_AGE_SECONDS_CRYPTO:
+        if tick_age > _max_tick_age(asset_type):
             return
 
+        now_unix = now_utc.timestamp()
+        event_unix = min(ts.timestamp(), now_unix)
+        self.watermarks[asset_type] = max(self.watermarks.get(asset_type, event_unix), event_unix)
+        self.last_seen[asset_type] = now_unix
+
         bucket_start = _minute_bucket_start(ts)
-        volume = _safe_float(message.get("volume"), 0.0)
-        if volume <= 0:
-            volume = 1.0  # tick count fallback
+        volume = self._volume_delta(symbol, asset_type, bucket_start, message.get("acc_volume"))
 
         current = self.states.get(symbol)
         if current is None:
-            current = CandleState(
+            closed = self.last_closed.get(symbol)
+            if closed is not None and bucket_start <= closed[0]:
+                # 이미 확정된 분에 대한 late tick
+                return
+            open_price = closed[1] if closed is not None else price
+            self.states[symbol] = CandleState(
                 symbol=symbol,
                 asset_type=asset_type,
                 bucket_start=bucket_start,
-                open=price,
-                high=price,
-                low=price,
+                open=open_price,
+                high=max(open_price, price),
+                low=min(open_price, price),
                 close=price,
                 volume=volume,
             )
-            self.states[symbol] = current
-            await self._persist_current(current)
+            self.dirty.add((symbol, "1m"))
             return
 
         if bucket_start < current.bucket_start:
@@ -226,13 +411,13 @@ class CandleAggregator:
             current.low = min(current.low, price)
             current.close = price
             current.volume += volume
-            await self._persist_current(current)
+            self.dirty.add((symbol, "1m"))
             return
 
         # New minute started -> finalize previous candle and start new state
-        await self._persist_finalized(current)
+        self._finalize(current)
 
-        next_state = CandleState(
+        self.states[symbol] = CandleState(
             symbol=symbol,
             asset_type=asset_type,
             bucket_start=bucket_start,
@@ -242,26 +427,122 @@ class CandleAggregator:
             close=price,
             volume=volume,
         )
-        self.states[symbol] = next_state
-        await self._persist_current(next_state)
+        self.dirty.add((symbol, "1m"))
+
+    async def _flush_redis(self):
+        dirty = []
+        for symbol, resolution in self.dirty:
+            state = self.states.get(symbol) if resolution == "1m" else self.rollups.get((symbol, resolution))
+            if state is not None:
+                dirty.append(state)
+        finalized = self.pending_redis
+        if not dirty and not finalized:
+            return
+        self.dirty = set()
+        self.pending_redis = []
+
+        if self.redis_client is None:
+            return
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for state in dirty:
+            pipe.set(
+                f"candles:{state.symbol}:{state.resolution}:current",
+                json.dumps(state.to_payload()),
+                ex=max(CURRENT_TTL_SECONDS, ROLLUP_RESOLUTIONS.get(state.resolution, 0) * 2),
+            )
+
+        by_key: dict[str, list[tuple]] = {}
+        for state in finalized:
+            by_key.setdefault(packed_key(state.symbol, state.resolution), []).append(state.to_row())
+        # APPEND와 보관 개수 자르기는 스크립트 하나로 원자적으로 (replay_candles_to_redis도 같은 키에 쓴다)
+        trim_args = [(CANDLE_KEEP + CANDLE_TRIM_SLACK) * RECORD_CHARS, CANDLE_KEEP * RECORD_CHARS, LIST_TTL_SECONDS]
+        for key, rows in by_key.items():
+            await self.append_script(keys=[key], args=[encode_candles(rows), *trim_args], client=pipe)
+
+        try:
+            await pipe.execute()
+        except Exception:
+            self.dirty.update((state.symbol, state.resolution) for state in dirty)
+            self.pending_redis = (finalized + self.pending_redis)[-MAX_PENDING_FINALIZED:]
+            raise
+
+    async def _flush_mongo(self):
+        finalized = self.pending_mongo
+        if not finalized:
+            return
+        self.pending_mongo = []
+
+        if not self.mongo_collections:
+            return
+
+        operations: dict[str, list[UpdateOne]] = {}
+        for state in finalized:
+            operations.setdefault(state.resolution, []).append(
+                UpdateOne(
+                    {"symbol": state.symbol, "bucket_start": state.bucket_start},
+                    {"$set": state.to_payload()},
+                    upsert=True,
+                )
+            )
+
+        failed: list[CandleState] = []
+        error: Exception | None = None
+        for resolution, ops in operations.items():
+            collection = self.mongo_collections.get(resolution)
+            if collection is None:
+                continue
+            try:
+                await collection.bulk_write(ops, ordered=False)
+            except Exception as exc:
+                failed.extend(state for state in finalized if state.resolution == resolution)
+                error = exc
+        if error is not None:
+            self.pending_mongo = (failed + self.pending_mongo)[-MAX_PENDING_FINALIZED:]
+            raise error
+
+    async def flush(self):
+        try:
+            await self._flush_redis()
+        except Exception as exc:
+            logger.warning("Redis candle flush failed: %s", exc)
+        try:
+            await self._flush_mongo()
+        except Exception as exc:
+            logger.warning("Mongo candle flush failed: %s", exc)
+
+    async def _flush_loop(self):
+        while self.running:
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            self.close_expired()
+            await self.flush()
 
     async def run(self):
         self.running = True
-        logger.info("Candle Aggregator started")
+        logger.info("Candle Aggregator started flush_interval=%.2fs", FLUSH_INTERVAL_SECONDS)
+        flush_task = asyncio.create_task(self._flush_loop())
         try:
             async for msg in self.consumer:
                 if not self.running:
                     break
                 try:
-                    await self.process_tick(msg.value)
+                    self.process_tick(msg.value)
                 except Exception as exc:
                     logger.warning("Tick process failed: %s", exc)
         finally:
+            flush_task.cancel()
+            try:
+                await flush_task
+            except asyncio.CancelledError:
+                pass
             await self.stop()
 
     async def stop(self):
         self.running = False
 
+        # 남은 current/확정 캔들을 마지막으로 기록한다.
+        await self.flush()
+
         if self.consumer is not None:
             await self.consumer.stop()
             self.consumer = None
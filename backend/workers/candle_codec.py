@@ -0,0 +1,65 @@
+"""
+============================================
+Candle Codec - 캔들 압축 저장 포맷
+============================================
+
+candle_aggregator / replay_candles_to_redis / 백엔드 history API가 같이 쓰는 포맷.
+
+- 1행 = bucket_start(int64) + open/high/low/close/volume(float64) = 48 bytes (little-endian)
+- 48 bytes는 3의 배수라 base64 인코딩 시 행마다 정확히 64자 → 행 단위로 이어 붙이거나 잘라도 유효하다.
+- Redis: `candles:{symbol}:{res}:packed` 문자열 키에 APPEND, 조회는 GETRANGE로 마지막 N행만 읽는다.
+  (Redis 클라이언트가 decode_responses=True여도 그대로 사용 가능)
+  쓰는 쪽(aggregator, replay)은 APPEND_TRIM_LUA로 APPEND + 보관 개수 자르기 + TTL을 원자적으로 처리한다.
+- symbol/asset_type/date는 키와 bucket_start로 복원하므로 저장하지 않는다.
+"""
+
+import base64
+import struct
+from typing import Iterable, Sequence
+
+RECORD = struct.Struct("<q5d")
+RECORD_CHARS = RECORD.size // 3 * 4
+
+CandleRow = tuple[int, float, float, float, float, float]
+
+# KEYS[1]: packed 키, ARGV: 붙일 문자열, 자르기 시작 길이, 남길 길이, TTL(초) → 최종 길이
+# 여러 워커가 같은 키에 써도 APPEND와 자르기 사이에 다른 쓰기가 끼지 않는다.
+APPEND_TRIM_LUA = """
+local length = redis.call('APPEND', KEYS[1], ARGV[1])
+local keep = tonumber(ARGV[3])
+if length > tonumber(ARGV[2]) then
+  redis.call('SET', KEYS[1], redis.call('GETRANGE', KEYS[1], -keep, -1))
+  length = keep
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return length
+"""
+
+
+def packed_key(symbol: str, resolution: str = "1m") -> str:
+    return f"candles:{symbol}:{resolution}:packed"
+
+
+def tail_offset(count: int) -> int:
+    """GETRANGE 시작 오프셋 (마지막 count행)."""
+    return -max(1, int(count)) * RECORD_CHARS
+
+
+def encode_candles(rows: Iterable[Sequence[float]]) -> str:
+    """(bucket_start, open, high, low, close, volume) 행들을 base64 문자열로 인코딩한다."""
+    raw = b"".join(
+        RECORD.pack(int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]))
+        for row in rows
+    )
+    return base64.b64encode(raw).decode("ascii")
+
+
+def decode_candles(blob: str | bytes | None) -> list[CandleRow]:
+    """인코딩된 문자열을 행 튜플 리스트로 복원한다. 앞부분이 잘린 blob은 완전한 행만 읽는다."""
+    if not blob:
+        return []
+    if isinstance(blob, str):
+        blob = blob.encode("ascii")
+    partial = len(blob) % RECORD_CHARS
+    raw = base64.b64decode(blob[partial:])
+    return list(RECORD.iter_unpack(raw))
@@ -3,11 +3,13 @@
 
 import os
 import json
+import time
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from typing import Any, Optional
 
-from kafka import KafkaConsumer
+from kafka import KafkaConsumer, TopicPartition
+from kafka.errors import KafkaError
 from pymongo import MongoClient, UpdateOne, errors
 
 try:
@@ -45,6 +47,13 @@ GROUP_ID = os.getenv("KAFKA_GROUP_ID", "clouddx-news-consumer-v1")
 MONGO_URI = os.getenv("MONGO_URI") or os.getenv("MONGODB_URL")
 MONGO_DB = os.getenv("MONGO_DB", "clouddx")
 MONGO_COLL = os.getenv("MONGO_COLL", "news")
+
+# 배치 크기 / 최대 대기(ms): poll 한 번에 최대 NEWS_BATCH_SIZE건, 없으면 NEWS_BATCH_LINGER_MS까지 기다린다.
+NEWS_BATCH_SIZE = max(1, int(os.getenv("NEWS_BATCH_SIZE", "200")))
+NEWS_BATCH_LINGER_MS = max(10, int(os.getenv("NEWS_BATCH_LINGER_MS", "500")))
+NEWS_RETRY_BACKOFF_SEC = float(os.getenv("NEWS_RETRY_BACKOFF_SEC", "2"))
+NEWS_METRICS_INTERVAL_SEC = max(5, int(os.getenv("NEWS_METRICS_INTERVAL_SEC", "60")))
+DUPLICATE_KEY_ERROR = 11000
 KST = timezone(timedelta(hours=9))
 
 
@@ -157,6 +166,112 @@ def backfill_time_fields(coll) -> None:
     print(f"[mongo] backfill done: modified={updated}")
 
 
+def normalize_item(item: Any) -> Optional[dict[str, Any]]:
+    if not isinstance(item, dict):
+        return None
+    link = item.get("url") or item.get("link")
+    title = item.get("title")
+    if not link or not title:
+        return None
+
+    # clouddx-project(url) + legacy(link) 스키마 동시 호환
+    item["url"] = link
+    item["link"] = link
+
+    # 스키마 보강/정규화
+    ingested_at = datetime.now(timezone.utc)
+
+    # published_at 정규화 (원본은 유지)
+    published_at_dt = (
+        parse_published_at(item.get("published_at"))
+        or parse_published_at(item.get("published_at_dt"))
+    )
+
+    # Mongo/JSON 공통 필드 보강
+    item["ingested_at"] = ingested_at.isoformat()
+    item.setdefault("id", link)
+    if published_at_dt:
+        item["published_at_dt"] = to_utc_iso(published_at_dt)
+        item["published_at_ts"] = float(published_at_dt.timestamp())
+        item["sort_ts"] = float(published_at_dt.timestamp())
+        item["published_at"] = to_utc_iso(published_at_dt)
+    else:
+        item["published_at_ts"] = float(ingested_at.timestamp())
+        item["sort_ts"] = float(ingested_at.timestamp())
+        item["published_at_dt"] = to_utc_iso(ingested_at)
+        item["published_at"] = to_utc_iso(ingested_at)
+
+    # 최소 필드 기본값(없어도 저장은 되지만 일관성 위해)
+    item.setdefault("source", "unknown")
+    item.setdefault("section", "unknown")
+    return item
+
+
+def to_upsert(item: dict[str, Any]) -> UpdateOne:
+    return UpdateOne(
+        {"url": item["url"]},
+        {
+            "$set": item,
+            "$setOnInsert": {"created_at": item["ingested_at"]},
+        },
+        upsert=True,
+    )
+
+
+def backfill_canonical_url(coll) -> None:
+    """
+    upsert 키를 url 하나로 통일하기 전에, link만 있는 구버전 문서에 url을 채운다.
+    (안 채우면 같은 기사가 url 기준으로 새로 insert되면서 link unique 인덱스와 충돌)
+    """
+    result = coll.update_many(
+        {"url": {"$exists": False}, "link": {"$exists": True}},
+        [{"$set": {"url": "$link"}}],
+    )
+    if result.modified_count:
+        print(f"[mongo] canonical url backfill: modified={result.modified_count}")
+
+
+def write_batch(coll, items: list[dict[str, Any]]) -> dict[str, int]:
+    """
+    bulk_write(ordered=False) 1회. 동시 upsert 경합으로 난 중복 키 오류는 update로 한 번 더 시도하고,
+    그 외 문서 단위 오류(검증 실패 등)는 재시도해도 같으므로 로그만 남긴다.
+    연결/타임아웃 등 배치 단위 오류는 예외로 올려 호출 측이 offset을 되감게 한다.
+    """
+    result = {"upserted": 0, "modified": 0, "matched": 0, "failed": 0}
+    ops = [to_upsert(item) for item in items]
+    try:
+        res = coll.bulk_write(ops, ordered=False)
+        result["upserted"] += res.upserted_count
+        result["modified"] += res.modified_count
+        result["matched"] += res.matched_count
+        return result
+    except errors.BulkWriteError as e:
+        details = e.details or {}
+        result["upserted"] += int(details.get("nUpserted", 0))
+        result["modified"] += int(details.get("nModified", 0))
+        result["matched"] += int(details.get("nMatched", 0))
+        write_errors = details.get("writeErrors", [])
+
+    retry_ops = []
+    for err in write_errors:
+        op = ops[err["index"]]
+        if err.get("code") == DUPLICATE_KEY_ERROR:
+            retry_ops.append(op)
+        else:
+            result["failed"] += 1
+            print(f"[mongo] write error url={items[err['index']].get('url')} code={err.get('code')} "
+                  f"msg={str(err.get('errmsg'))[:200]}")
+    if retry_ops:
+        try:
+            res = coll.bulk_write(retry_ops, ordered=False)
+            result["modified"] += res.modified_count
+            result["matched"] += res.matched_count
+        except errors.BulkWriteError as e:
+            result["failed"] += len((e.details or {}).get("writeErrors", []))
+            print("[mongo] duplicate retry failed:", str(e.details)[:300])
+    return result
+
+
 def main():
     if not MONGO_URI:
         raise RuntimeError("MONGO_URI/MONGODB_URL 환경변수가 없습니다. (.env/Secret/ConfigMap 설정 확인)")
@@ -189,6 +304,7 @@ def main():
 
     try:
         backfill_time_fields(coll)
+        backfill_canonical_url(coll)
     except errors.PyMongoError as e:
         print("[mongo] backfill warning:", repr(e))
 
@@ -197,67 +313,84 @@ def main():
         bootstrap_servers=[KAFKA_BOOTSTRAP],
         group_id=GROUP_ID,
         auto_offset_reset="earliest",
-        enable_auto_commit=True,
+        # 배치를 Mongo에 쓴 뒤에만 commit (at-least-once, url 기준 upsert라 재처리해도 안전)
+        enable_auto_commit=False,
         value_deserializer=lambda m: json.loads(m.decode("utf-8")),
     )
 
-    print(f"[kafka] consumer started: {KAFKA_BOOTSTRAP} topic={TOPIC} group={GROUP_ID}")
+    print(
+        f"[kafka] consumer started: {KAFKA_BOOTSTRAP} topic={TOPIC} group={GROUP_ID} "
+        f"batch_size={NEWS_BATCH_SIZE} linger_ms={NEWS_BATCH_LINGER_MS}"
+    )
 
-    for msg in consumer:
-        item = msg.value
+    metrics = {"batches": 0, "messages": 0, "skipped": 0, "upserted": 0, "modified": 0, "failed": 0,
+               "retries": 0, "commit_failed": 0, "write_ms": 0.0}
+    last_report = time.monotonic()
+
+    while True:
+        polled = consumer.poll(timeout_ms=NEWS_BATCH_LINGER_MS, max_records=NEWS_BATCH_SIZE)
+
+        now = time.monotonic()
+        if now - last_report >= NEWS_METRICS_INTERVAL_SEC:
+            elapsed = now - last_report
+            avg_ms = metrics["write_ms"] / metrics["batches"] if metrics["batches"] else 0.0
+            print(
+                f"[metrics] {elapsed:.0f}s batches={metrics['batches']} messages={metrics['messages']} "
+                f"rate={metrics['messages'] / elapsed:.1f}/s upserted={metrics['upserted']} "
+                f"modified={metrics['modified']} skipped={metrics['skipped']} failed={metrics['failed']} "
+                f"retries={metrics['retries']} commit_failed={metrics['commit_failed']} avg_write_ms={avg_ms:.1f}"
+            )
+            metrics = dict.fromkeys(metrics, 0)
+            metrics["write_ms"] = 0.0
+            last_report = now
 
-        link = item.get("url") or item.get("link")
-        title = item.get("title")
-        if not link or not title:
-            print("[skip] missing url(link)/title")
+        if not polled:
             continue
 
-        # clouddx-project(url) + legacy(link) 스키마 동시 호환
-        item["url"] = link
-        item["link"] = link
-
-        # 스키마 보강/정규화
-        ingested_at = datetime.now(timezone.utc)
-
-        # published_at 정규화 (원본은 유지)
-        published_at_dt = (
-            parse_published_at(item.get("published_at"))
-            or parse_published_at(item.get("published_at_dt"))
-        )
-
-        # Mongo/JSON 공통 필드 보강
-        item["ingested_at"] = ingested_at.isoformat()
-        item.setdefault("id", link)
-        if published_at_dt:
-            item["published_at_dt"] = to_utc_iso(published_at_dt)
-            item["published_at_ts"] = float(published_at_dt.timestamp())
-            item["sort_ts"] = float(published_at_dt.timestamp())
-            item["published_at"] = to_utc_iso(published_at_dt)
-        else:
-            item["published_at_ts"] = float(ingested_at.timestamp())
-            item["sort_ts"] = float(ingested_at.timestamp())
-            item["published_at_dt"] = to_utc_iso(ingested_at)
-            item["published_at"] = to_utc_iso(ingested_at)
-
-        # 최소 필드 기본값(없어도 저장은 되지만 일관성 위해)
-        item.setdefault("source", "unknown")
-        item.setdefault("section", "unknown")
-
+        first_offsets: dict[TopicPartition, int] = {}
+        latest: dict[str, dict[str, Any]] = {}
+        count = 0
+        for tp, records in polled.items():
+            if records:
+                first_offsets[tp] = records[0].offset
+            for record in records:
+                count += 1
+                item = normalize_item(record.value)
+                if item is None:
+                    metrics["skipped"] += 1
+                    continue
+                # 배치 안에서 같은 기사는 마지막 메시지만 쓴다 (같은 키 upsert 경합 방지)
+                latest[item["url"]] = item
+
+        started = time.monotonic()
         try:
-            coll.update_one(
-                {"$or": [{"url": link}, {"link": link}]},
-                {
-                    "$set": item,
-                    "$setOnInsert": {"created_at": ingested_at.isoformat()},
-                },
-                upsert=True,
-            )
-            print("[saved]", title[:80])
-        except errors.DuplicateKeyError:
-            # 아주 드물게 경합이 생기면 update_one이 아닌 insert 상황에서 발생 가능
-            print("[dup]", title[:80])
+            result = write_batch(coll, list(latest.values())) if latest else {}
         except errors.PyMongoError as e:
-            print("[mongo] upsert failed:", repr(e))
+            # 배치 전체를 되감아 다시 처리 (commit 하지 않음)
+            print("[mongo] batch write failed; rewind:", repr(e))
+            metrics["retries"] += 1
+            for tp, offset in first_offsets.items():
+                consumer.seek(tp, offset)
+            time.sleep(NEWS_RETRY_BACKOFF_SEC)
+            continue
+
+        try:
+            consumer.commit()
+        except KafkaError as e:
+            # 리밸런스 등으로 commit 실패(CommitFailedError 포함) → 이 배치는 재전달되지만
+            # url 기준 멱등 upsert라 다시 써도 안전하다. 워커는 계속 돈다.
+            print("[kafka] commit failed; batch will be redelivered:", repr(e))
+            metrics["commit_failed"] += 1
+        write_ms = (time.monotonic() - started) * 1000
+        metrics["batches"] += 1
+        metrics["messages"] += count
+        metrics["write_ms"] += write_ms
+        for key in ("upserted", "modified", "failed"):
+            metrics[key] += result.get(key, 0)
+        print(
+            f"[saved] batch messages={count} docs={len(latest)} upserted={result.get('upserted', 0)} "
+            f"modified={result.get('modified', 0)} failed={result.get('failed', 0)} write_ms={write_ms:.0f}"
+        )
 
 
 if __name__ == "__main__":
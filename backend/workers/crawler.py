@@ -0,0 +1,268 @@
+"""
+============================================
+Async Crawler - 호스트별 동시성/속도 제한 HTTP 수집기
+============================================
+
+producer_news가 쓰는 asyncio 크롤러 코어.
+
+- 하나의 httpx.AsyncClient(keep-alive)로 모든 요청을 보낸다.
+- 호스트별 동시 요청 수(Semaphore) + 토큰 버킷(초당 요청 수, burst)으로 사이트 부담을 제한한다.
+- 429: Retry-After(초/HTTP-date)만큼 해당 호스트 전체를 쉬게 한 뒤 재시도. 5xx/연결 오류는 지수 backoff 재시도
+- HTML/XML 파싱(BeautifulSoup + lxml)은 스레드 풀에서 실행해 이벤트 루프를 막지 않는다.
+- fetch_parsed(): URL별 ETag/Last-Modified를 기억해 조건부 GET. 304이거나 본문 해시가 같으면
+  지난 파싱 결과를 그대로 돌려준다 (목록 페이지/sitemap 재다운로드·재파싱 방지)
+- stats(): 호스트별 요청/429/오류/304(not_modified)/본문 동일(unchanged) 카운터
+"""
+
+import asyncio
+import copy
+import hashlib
+import os
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+from urllib.parse import urlencode, urlparse
+
+import httpx
+
+CRAWLER_TIMEOUT_SEC = float(os.getenv("CRAWLER_TIMEOUT_SEC", "10"))
+CRAWLER_MAX_CONNECTIONS = max(1, int(os.getenv("CRAWLER_MAX_CONNECTIONS", "32")))
+CRAWLER_HOST_CONCURRENCY = max(1, int(os.getenv("CRAWLER_HOST_CONCURRENCY", "4")))
+CRAWLER_HOST_RATE = max(0.1, float(os.getenv("CRAWLER_HOST_RATE", "3")))
+CRAWLER_HOST_BURST = max(1, int(os.getenv("CRAWLER_HOST_BURST", "3")))
+CRAWLER_MAX_RETRIES = max(0, int(os.getenv("CRAWLER_MAX_RETRIES", "2")))
+CRAWLER_PARSE_WORKERS = max(1, int(os.getenv("CRAWLER_PARSE_WORKERS", "4")))
+# Retry-After가 너무 길면 이번 주기는 포기한다 (다음 poll에서 다시 시도)
+CRAWLER_MAX_RETRY_AFTER_SEC = float(os.getenv("CRAWLER_MAX_RETRY_AFTER_SEC", "30"))
+# 조건부 GET 검증값 + 파싱 결과를 기억할 URL 수 (RUN_FOREVER 프로세스 수명 동안 유지)
+CRAWLER_PAGE_CACHE_SIZE = max(0, int(os.getenv("CRAWLER_PAGE_CACHE_SIZE", "512")))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class HostPolicy:
+    concurrency: int = CRAWLER_HOST_CONCURRENCY
+    rate: float = CRAWLER_HOST_RATE
+    burst: int = CRAWLER_HOST_BURST
+
+
+class TokenBucket:
+    """초당 rate개 토큰, 최대 burst개 적립. pause()로 429 cooldown 동안 토큰 지급을 멈춘다."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    self.updated = time.monotonic()
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class _CachedPage:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: str
+    result: Any
+
+
+class _HostState:
+    def __init__(self, policy: HostPolicy):
+        self.policy = policy
+        self.semaphore = asyncio.Semaphore(policy.concurrency)
+        self.bucket = TokenBucket(policy.rate, policy.burst)
+        self.stats = {"requests": 0, "throttled": 0, "errors": 0, "retries": 0, "not_modified": 0, "unchanged": 0}
+
+
+def parse_retry_after(value: Optional[str], default: float) -> float:
+    if not value:
+        return default
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return default
+
+
+class AsyncCrawler:
+    def __init__(
+        self,
+        headers: Optional[dict[str, str]] = None,
+        host_policies: Optional[dict[str, HostPolicy]] = None,
+        default_policy: Optional[HostPolicy] = None,
+    ):
+        self.headers = headers or {}
+        # 키는 도메인 suffix (예: "naver.com"은 n.news.naver.com / finance.naver.com 모두에 적용)
+        self.host_policies = host_policies or {}
+        self.default_policy = default_policy or HostPolicy()
+        self._hosts: dict[str, _HostState] = {}
+        self._pages: OrderedDict[str, _CachedPage] = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._parser_pool = ThreadPoolExecutor(max_workers=CRAWLER_PARSE_WORKERS, thread_name_prefix="parse")
+
+    async def __aenter__(self) -> "AsyncCrawler":
+        self._client = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(CRAWLER_TIMEOUT_SEC, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=CRAWLER_MAX_CONNECTIONS,
+                max_keepalive_connections=CRAWLER_MAX_CONNECTIONS,
+            ),
+            follow_redirects=True,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._parser_pool.shutdown(wait=False)
+
+    def _host(self, url: str) -> _HostState:
+        host = (urlparse(url).hostname or "").lower()
+        state = self._hosts.get(host)
+        if state is None:
+            policy = self.default_policy
+            for suffix, candidate in self.host_policies.items():
+                if host == suffix or host.endswith("." + suffix):
+                    policy = candidate
+                    break
+            state = self._hosts[host] = _HostState(policy)
+        return state
+
+    async def fetch(self, url: str, params: Optional[dict[str, Any]] = None, **kwargs) -> httpx.Response:
+        """호스트 제한을 지켜 GET. 재시도 후에도 실패하면 httpx.HTTPStatusError / httpx.HTTPError를 올린다."""
+        if self._client is None:
+            raise RuntimeError("AsyncCrawler is not started")
+        state = self._host(url)
+        attempt = 0
+        while True:
+            async with state.semaphore:
+                await state.bucket.acquire()
+                state.stats["requests"] += 1
+                try:
+                    response = await self._client.get(url, params=params, **kwargs)
+                except httpx.TransportError:
+                    state.stats["errors"] += 1
+                    if attempt >= CRAWLER_MAX_RETRIES:
+                        raise
+                    response = None
+
+            if response is not None and response.status_code not in RETRYABLE_STATUSES:
+                # 304(조건부 GET)는 호출 측에서 처리하므로 4xx 이상만 예외로 올린다.
+                if response.status_code >= 400:
+                    response.raise_for_status()
+                return response
+
+            backoff = (2 ** attempt) + random.random()
+            if response is not None:
+                if response.status_code == 429:
+                    state.stats["throttled"] += 1
+                    backoff = parse_retry_after(response.headers.get("Retry-After"), backoff)
+                    # 같은 호스트로 가는 다른 요청도 함께 쉬게 한다.
+                    state.bucket.pause(min(backoff, CRAWLER_MAX_RETRY_AFTER_SEC))
+                else:
+                    state.stats["errors"] += 1
+                if attempt >= CRAWLER_MAX_RETRIES or backoff > CRAWLER_MAX_RETRY_AFTER_SEC:
+                    response.raise_for_status()
+
+            attempt += 1
+            state.stats["retries"] += 1
+            await asyncio.sleep(min(backoff, CRAWLER_MAX_RETRY_AFTER_SEC))
+
+    async def fetch_text(self, url: str, params: Optional[dict[str, Any]] = None) -> str:
+        return self._decode(await self.fetch(url, params=params))
+
+    @staticmethod
+    def _decode(response: httpx.Response) -> str:
+        if not response.charset_encoding or response.charset_encoding.lower() in ("iso-8859-1", "ascii"):
+            return response.content.decode("utf-8", errors="replace")
+        return response.text
+
+    async def fetch_parsed(
+        self,
+        url: str,
+        parse_fn: Callable[..., Any],
+        *args: Any,
+        params: Optional[dict[str, Any]] = None,
+        binary: bool = False,
+    ) -> tuple[Any, bool]:
+        """
+        조건부 GET 후 parse_fn(본문, *args). (파싱 결과, 변경 여부)를 반환한다.
+        304이거나 검증값을 주지 않는 서버라도 본문 해시가 같으면 파싱을 건너뛰고 지난 결과(복사본)를 쓴다.
+        binary=True면 parse_fn에 bytes를 넘긴다 (euc-kr 페이지 등 인코딩을 파서가 처리할 때).
+        """
+        key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+        cached = self._pages.get(key)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        response = await self.fetch(url, params=params, headers=headers)
+        state = self._host(url)
+        if cached is not None and response.status_code == 304:
+            state.stats["not_modified"] += 1
+            self._pages.move_to_end(key)
+            return copy.deepcopy(cached.result), False
+        if response.status_code == 304:
+            # 캐시가 밀려난 뒤 304를 받으면 검증값 없이 다시 받는다.
+            response = await self.fetch(url, params=params)
+
+        digest = hashlib.sha1(response.content).hexdigest()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if cached is not None and cached.digest == digest:
+            state.stats["unchanged"] += 1
+            cached.etag, cached.last_modified = etag, last_modified
+            self._pages.move_to_end(key)
+            return copy.deepcopy(cached.result), False
+
+        result = await self.parse(parse_fn, response.content if binary else self._decode(response), *args)
+        if CRAWLER_PAGE_CACHE_SIZE:
+            self._pages[key] = _CachedPage(etag, last_modified, digest, copy.deepcopy(result))
+            self._pages.move_to_end(key)
+            while len(self._pages) > CRAWLER_PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+        return result, True
+
+    async def parse(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """CPU 작업(파싱)을 스레드 풀에서 실행한다."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._parser_pool, fn, *args)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {host: dict(state.stats) for host, state in self._hosts.items()}
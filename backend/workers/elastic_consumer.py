@@ -3,12 +3,18 @@
 
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
 from urllib.parse import quote
 
 import requests
-from kafka import KafkaConsumer
+from kafka import KafkaConsumer, TopicPartition
+
+import embedding_cache
+import es_index
 
 
 def env_bool(name: str, default: bool = False) -> bool:
@@ -24,7 +30,6 @@ GROUP_ID = os.getenv("KAFKA_INDEXER_GROUP_ID", "indexer-consumer-group")
 
 ES_URL = os.getenv("ELASTICSEARCH_URL") or os.getenv("ES_URL", "http://localhost:9200")
 ES_URL = ES_URL.rstrip("/")
-ES_INDEX = os.getenv("ES_INDEX", "news")
 ES_TIMEOUT_SEC = int(os.getenv("ES_TIMEOUT_SEC", "10"))
 
 ENABLE_BEDROCK_EMBEDDING = env_bool("ENABLE_BEDROCK_EMBEDDING", default=False)
@@ -33,6 +38,17 @@ BEDROCK_EMBED_MODEL_ID = os.getenv("BEDROCK_EMBED_MODEL_ID", "amazon.titan-embed
 BEDROCK_INPUT_MAX_CHARS = int(os.getenv("BEDROCK_INPUT_MAX_CHARS", "8000"))
 BEDROCK_EMBED_DIMS = int(os.getenv("BEDROCK_EMBED_DIMS", "1024"))
 
+# bulk 모드: Kafka 배치 poll → 임베딩 병렬 → _bulk 1회 → 항목별 결과 확인 후 offset commit
+INDEXER_BULK_MODE = env_bool("INDEXER_BULK_MODE", default=True)
+INDEXER_BATCH_SIZE = max(1, int(os.getenv("INDEXER_BATCH_SIZE", "200")))
+INDEXER_POLL_TIMEOUT_MS = max(100, int(os.getenv("INDEXER_POLL_TIMEOUT_MS", "1000")))
+INDEXER_MAX_RETRIES = max(0, int(os.getenv("INDEXER_MAX_RETRIES", "3")))
+INDEXER_RETRY_BACKOFF_SEC = float(os.getenv("INDEXER_RETRY_BACKOFF_SEC", "2"))
+EMBED_CONCURRENCY = max(1, int(os.getenv("EMBED_CONCURRENCY", "8")))
+
+# ES가 일시적으로 거절한 항목 (재시도 대상). 그 외 4xx는 재시도해도 같은 결과라 건너뛴다.
+RETRYABLE_BULK_STATUSES = {429, 500, 502, 503, 504}
+
 KST = timezone(timedelta(hours=9))
 
 
@@ -122,18 +138,38 @@ def build_embedding_text(doc: dict[str, Any]) -> str:
     return text[:BEDROCK_INPUT_MAX_CHARS]
 
 
+_bedrock_client = None
+_bedrock_client_lock = threading.Lock()
+
+
+def get_bedrock_client():
+    """bedrock-runtime 클라이언트는 스레드 안전하므로 프로세스에서 하나만 만든다."""
+    global _bedrock_client
+    if _bedrock_client is None:
+        with _bedrock_client_lock:
+            if _bedrock_client is None:
+                import boto3  # type: ignore
+                from botocore.config import Config  # type: ignore
+
+                _bedrock_client = boto3.client(
+                    "bedrock-runtime",
+                    region_name=BEDROCK_REGION,
+                    config=Config(max_pool_connections=max(10, EMBED_CONCURRENCY)),
+                )
+    return _bedrock_client
+
+
 def embed_with_bedrock(text: str) -> Optional[list[float]]:
     if not text:
         return None
 
     try:
-        import boto3  # type: ignore
-    except Exception:
-        print("[embed] boto3 not installed; skip embedding")
+        client = get_bedrock_client()
+    except Exception as e:
+        print("[embed] bedrock client unavailable; skip embedding:", repr(e))
         return None
 
     try:
-        client = boto3.client("bedrock-runtime", region_name=BEDROCK_REGION)
         payload = {"inputText": text}
         resp = client.invoke_model(
             modelId=BEDROCK_EMBED_MODEL_ID,
@@ -157,62 +193,178 @@ def embed_with_bedrock(text: str) -> Optional[list[float]]:
         return None
 
 
-def ensure_index_exists(session: requests.Session) -> None:
-    index_url = f"{ES_URL}/{ES_INDEX}"
-    resp = session.head(index_url, timeout=ES_TIMEOUT_SEC)
-    if resp.status_code == 200:
-        return
-    if resp.status_code not in (404,):
-        raise RuntimeError(f"index check failed: status={resp.status_code} body={resp.text[:200]}")
-
-    # keyword + text + date + dense_vector(1024) 기본 매핑
-    mapping = {
-        "settings": {"number_of_shards": 1, "number_of_replicas": 0},
-        "mappings": {
-            "properties": {
-                "url": {"type": "keyword"},
-                "title": {"type": "text"},
-                "content": {"type": "text"},
-                "summary": {"type": "text"},
-                "source": {"type": "keyword"},
-                "published_at": {"type": "date"},
-                "tags": {"type": "keyword"},
-                "related_assets": {"type": "keyword"},
-                "ingested_at": {"type": "date"},
-                "embedding": {
-                    "type": "dense_vector",
-                    "dims": 1024,
-                    "index": True,
-                    "similarity": "cosine",
-                },
-            }
-        },
-    }
-    create_resp = session.put(
-        index_url,
-        headers={"Content-Type": "application/json"},
-        data=json.dumps(mapping),
-        timeout=ES_TIMEOUT_SEC,
-    )
-    if create_resp.status_code not in (200, 201):
-        raise RuntimeError(
-            f"index create failed: status={create_resp.status_code} body={create_resp.text[:300]}"
-        )
+EMBED_CACHE = (
+    embedding_cache.from_env(BEDROCK_EMBED_MODEL_ID, BEDROCK_EMBED_DIMS) if ENABLE_BEDROCK_EMBEDDING else None
+)
+
+
+def embed_cached(text: str) -> Optional[list[float]]:
+    """같은 본문(재전송 기사)은 캐시된 벡터를 쓰고, 없을 때만 Bedrock을 호출한다."""
+    if EMBED_CACHE is None:
+        return embed_with_bedrock(text)
+    return EMBED_CACHE.get_or_embed(text, embed_with_bedrock)
+
+
+def ensure_index_exists(session: requests.Session) -> str:
+    """버전 인덱스 + read/write alias 준비 (매핑은 es_index.build_mapping). 현재 write index 이름을 반환한다."""
+    return es_index.ensure_aliases(session)
+
+
+_write_targets: Optional[es_index.WriteTargets] = None
+
+
+def get_write_targets(session: requests.Session) -> es_index.WriteTargets:
+    """write alias 뒤 인덱스 목록 (reindex 중이면 옛/새 인덱스 둘 다 → dual-write)."""
+    global _write_targets
+    if _write_targets is None:
+        _write_targets = es_index.WriteTargets(session)
+    return _write_targets
 
 
 def upsert_document(session: requests.Session, doc: dict[str, Any]) -> None:
     doc_id = quote(str(doc["url"]), safe="")
-    update_url = f"{ES_URL}/{ES_INDEX}/_update/{doc_id}"
-    payload = {"doc": doc, "doc_as_upsert": True}
-
-    resp = session.post(
-        update_url,
-        headers={"Content-Type": "application/json"},
-        data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
-        timeout=ES_TIMEOUT_SEC,
-    )
-    if resp.status_code not in (200, 201):
-        raise RuntimeError(f"es upsert failed: status={resp.status_code} body={resp.text[:300]}")
+    for index, dims in get_write_targets(session).get():
+        update_url = f"{ES_URL}/{index}/_update/{doc_id}"
+        payload = {"doc": es_index.doc_for_target(doc, dims), "doc_as_upsert": True}
+
+        resp = session.post(
+            update_url,
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            timeout=ES_TIMEOUT_SEC,
+        )
+        if resp.status_code not in (200, 201):
+            raise RuntimeError(f"es upsert failed: index={index} status={resp.status_code} body={resp.text[:300]}")
+
+
+def bulk_upsert(session: requests.Session, docs: list[dict[str, Any]]) -> list[int]:
+    """
+    _bulk API로 upsert하고 항목별 status를 입력 순서대로 반환한다 (요청 자체 실패 시 전부 503).
+    dual-write 중이면 문서마다 대상 인덱스 수만큼 action을 보내고, 하나라도 실패하면 그 문서는 실패로 본다
+    (재시도는 모든 대상에 다시 upsert하므로 멱등).
+    """
+    targets = get_write_targets(session).get()
+    lines = []
+    for doc in docs:
+        doc_id = quote(str(doc["url"]), safe="")
+        for index, dims in targets:
+            lines.append(json.dumps({"update": {"_index": index, "_id": doc_id, "retry_on_conflict": 3}}))
+            lines.append(json.dumps({"doc": es_index.doc_for_target(doc, dims), "doc_as_upsert": True},
+                                    ensure_ascii=False))
+
+    try:
+        resp = session.post(
+            f"{ES_URL}/_bulk",
+            headers={"Content-Type": "application/x-ndjson"},
+            data=("\n".join(lines) + "\n").encode("utf-8"),
+            timeout=ES_TIMEOUT_SEC,
+        )
+    except requests.RequestException as e:
+        print("[bulk] request failed:", repr(e))
+        return [503] * len(docs)
+    if resp.status_code >= 400:
+        print(f"[bulk] HTTP {resp.status_code}: {resp.text[:300]}")
+        return [resp.status_code if resp.status_code in RETRYABLE_BULK_STATUSES else 503] * len(docs)
+
+    items = resp.json().get("items", [])
+    for item in items:
+        update = item.get("update", {})
+        if int(update.get("status", 503)) not in (200, 201):
+            print(f"[bulk] item failed index={update.get('_index')} id={update.get('_id')} "
+                  f"status={update.get('status')} "
+                  f"error={json.dumps(update.get('error'), ensure_ascii=False)[:300]}")
+
+    statuses = []
+    per_doc = len(targets)
+    for i in range(len(docs)):
+        chunk = [int(item.get("update", {}).get("status", 503)) for item in items[i * per_doc:(i + 1) * per_doc]]
+        # 응답 항목 수가 모자라면 나머지는 재시도 대상으로 본다.
+        chunk += [503] * (per_doc - len(chunk))
+        failed = [status for status in chunk if status not in (200, 201)]
+        statuses.append(failed[0] if failed else chunk[0])
+    return statuses
+
+
+def index_batch(session: requests.Session, docs: list[dict[str, Any]]) -> tuple[int, int, int]:
+    """재시도 가능한 실패는 backoff 후 해당 항목만 다시 보낸다. (성공, 영구 실패, 재시도 소진) 반환."""
+    pending = docs
+    ok = rejected = 0
+    for attempt in range(INDEXER_MAX_RETRIES + 1):
+        statuses = bulk_upsert(session, pending)
+        retry = []
+        for doc, status in zip(pending, statuses):
+            if status in (200, 201):
+                ok += 1
+            elif status in RETRYABLE_BULK_STATUSES:
+                retry.append(doc)
+            else:
+                rejected += 1
+        if not retry:
+            return ok, rejected, 0
+        pending = retry
+        if attempt < INDEXER_MAX_RETRIES:
+            time.sleep(INDEXER_RETRY_BACKOFF_SEC * (2 ** attempt))
+    return ok, rejected, len(pending)
+
+
+def embed_batch(executor: ThreadPoolExecutor, docs: list[dict[str, Any]]) -> int:
+    targets = [doc for doc in docs if not doc.get("embedding")]
+    if not targets:
+        return 0
+    embedded = 0
+    for doc, embedding in zip(targets, executor.map(embed_cached, map(build_embedding_text, targets))):
+        if embedding:
+            doc["embedding"] = embedding
+            embedded += 1
+    return embedded
+
+
+def run_bulk(session: requests.Session, consumer: KafkaConsumer) -> None:
+    executor = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+    print(f"[bulk] mode on batch={INDEXER_BATCH_SIZE} embed_concurrency={EMBED_CONCURRENCY}")
+    try:
+        while True:
+            polled = consumer.poll(timeout_ms=INDEXER_POLL_TIMEOUT_MS, max_records=INDEXER_BATCH_SIZE)
+            if not polled:
+                continue
+
+            started = time.monotonic()
+            first_offsets: dict[TopicPartition, int] = {}
+            docs: list[dict[str, Any]] = []
+            skipped = 0
+            for tp, records in polled.items():
+                if records:
+                    first_offsets[tp] = records[0].offset
+                for record in records:
+                    doc = normalize_message(record.value) if isinstance(record.value, dict) else None
+                    if doc is None:
+                        skipped += 1
+                        continue
+                    docs.append(doc)
+
+            embedded = embed_batch(executor, docs) if ENABLE_BEDROCK_EMBEDDING else 0
+            ok, rejected, exhausted = index_batch(session, docs) if docs else (0, 0, 0)
+
+            if exhausted:
+                # ES가 계속 거절하면 commit하지 않고 배치 처음으로 되감아 다시 처리한다.
+                print(f"[bulk] {exhausted} docs still failing; rewind batch")
+                for tp, offset in first_offsets.items():
+                    consumer.seek(tp, offset)
+                time.sleep(INDEXER_RETRY_BACKOFF_SEC)
+                continue
+
+            consumer.commit()
+            elapsed = time.monotonic() - started
+            print(
+                f"[bulk] indexed={ok} rejected={rejected} skipped={skipped} embedded={embedded} "
+                f"elapsed={elapsed:.2f}s rate={(ok / elapsed) if elapsed > 0 else 0:.1f}/s"
+            )
+            if EMBED_CACHE is not None and embedded:
+                cache_stats = EMBED_CACHE.stats()
+                print(f"[embed-cache] hits={cache_stats['hits']} misses={cache_stats['misses']} "
+                      f"hit_ratio={cache_stats['hit_ratio']}")
+    finally:
+        executor.shutdown(wait=False)
 
 
 def main() -> None:
@@ -222,19 +374,23 @@ def main() -> None:
     ping = session.get(ES_URL, timeout=ES_TIMEOUT_SEC)
     if ping.status_code >= 400:
         raise RuntimeError(f"elasticsearch ping failed: status={ping.status_code} body={ping.text[:200]}")
-    ensure_index_exists(session)
-    print(f"[es] ready: {ES_URL}/{ES_INDEX}")
+    write_index = ensure_index_exists(session)
+    print(f"[es] ready: {ES_URL} read={es_index.ES_READ_ALIAS} write={es_index.ES_WRITE_ALIAS}->{write_index}")
 
     consumer = KafkaConsumer(
         TOPIC,
         bootstrap_servers=[KAFKA_BOOTSTRAP],
         group_id=GROUP_ID,
         auto_offset_reset="earliest",
-        enable_auto_commit=True,
+        enable_auto_commit=not INDEXER_BULK_MODE,
         value_deserializer=lambda m: json.loads(m.decode("utf-8")),
     )
     print(f"[kafka] indexer started: {KAFKA_BOOTSTRAP} topic={TOPIC} group={GROUP_ID}")
 
+    if INDEXER_BULK_MODE:
+        run_bulk(session, consumer)
+        return
+
     for msg in consumer:
         item = msg.value
         doc = normalize_message(item)
@@ -245,7 +401,7 @@ def main() -> None:
         try:
             if ENABLE_BEDROCK_EMBEDDING and not doc.get("embedding"):
                 emb_text = build_embedding_text(doc)
-                embedding = embed_with_bedrock(emb_text)
+                embedding = embed_cached(emb_text)
                 if embedding:
                     doc["embedding"] = embedding
             upsert_document(session, doc)
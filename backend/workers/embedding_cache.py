@@ -0,0 +1,257 @@
+"""
+============================================
+Embedding Cache - 본문 해시 기반 임베딩 캐시
+============================================
+
+elastic_consumer / backfill_es / 백엔드 chat RAG(쿼리 임베딩)가 같이 쓰는 캐시.
+
+- 키 = sha256(model_id | dims | 정규화 텍스트). 정규화: NFKC + 공백 압축 + strip
+  (producer_news가 같은 기사를 다시 보내거나 같은 질문이 반복되면 Bedrock을 다시 호출하지 않는다)
+- 값 = float32 벡터를 base64로 저장 (1024차원 = 5,464자, JSON 대비 1/4 수준)
+- 저장소 (EMBED_CACHE_BACKEND)
+  - redis : `embcache:{key}` 문자열 + TTL. 조회 시 GETEX로 TTL을 연장해 자주 쓰는 항목이 남는다.
+  - disk  : 로컬 SQLite 파일. TTL + 최대 항목 수 초과 시 오래 안 쓴 항목부터 삭제 (LRU)
+  - memory: 프로세스 내 LRU만 사용 / off: 비활성
+- 모든 저장소 앞에 프로세스 내 LRU(EMBED_CACHE_MEMORY_SIZE)를 둔다.
+- 저장소 오류는 캐시 miss로 처리한다 (임베딩 생성 자체는 막지 않음).
+- 스레드 안전 (elastic_consumer의 임베딩 스레드 풀, 백엔드 run_in_executor에서 호출)
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Protocol, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBED_CACHE_BACKEND = os.getenv("EMBED_CACHE_BACKEND", "redis").strip().lower()
+EMBED_CACHE_REDIS_URL = os.getenv("EMBED_CACHE_REDIS_URL") or os.getenv("REDIS_URL", "redis://localhost:6379")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "/tmp/embedding_cache.sqlite3")
+EMBED_CACHE_TTL_SEC = max(60, int(os.getenv("EMBED_CACHE_TTL_SEC", str(30 * 86400))))
+EMBED_CACHE_MAX_ENTRIES = max(100, int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000")))
+EMBED_CACHE_MEMORY_SIZE = max(0, int(os.getenv("EMBED_CACHE_MEMORY_SIZE", "2048")))
+
+KEY_PREFIX = "embcache:"
+# disk 저장소에서 최대 항목 수를 넘으면 한 번에 이만큼 더 지워 매 put마다 정리하지 않게 한다.
+DISK_PRUNE_SLACK = 0.1
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+def cache_key(text: str, model_id: str, dims: int) -> str:
+    material = f"{model_id}|{int(dims)}|{normalize_text(text)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: Sequence[float]) -> str:
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_vector(blob: str | bytes) -> list[float]:
+    if isinstance(blob, str):
+        blob = blob.encode("ascii")
+    return np.frombuffer(base64.b64decode(blob), dtype="<f4").astype(np.float64).tolist()
+
+
+class EmbeddingStore(Protocol):
+    name: str
+
+    def get(self, key: str) -> Optional[str]: ...
+
+    def put(self, key: str, value: str) -> None: ...
+
+
+class RedisEmbeddingStore:
+    name = "redis"
+
+    def __init__(self, url: str = EMBED_CACHE_REDIS_URL, ttl_sec: int = EMBED_CACHE_TTL_SEC):
+        import redis  # type: ignore
+
+        self.ttl_sec = ttl_sec
+        self.client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.getex(KEY_PREFIX + key, ex=self.ttl_sec)
+
+    def put(self, key: str, value: str) -> None:
+        self.client.set(KEY_PREFIX + key, value, ex=self.ttl_sec)
+
+
+class DiskEmbeddingStore:
+    name = "disk"
+
+    def __init__(
+        self,
+        path: str = EMBED_CACHE_PATH,
+        ttl_sec: int = EMBED_CACHE_TTL_SEC,
+        max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT value, created_at FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_sec:
+                self.conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        self.conn.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.ttl_sec,))
+        total = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if total > self.max_entries:
+            excess = total - self.max_entries + int(self.max_entries * DISK_PRUNE_SLACK)
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        store: Optional[EmbeddingStore],
+        model_id: str,
+        dims: int,
+        memory_size: int = EMBED_CACHE_MEMORY_SIZE,
+    ):
+        self.store = store
+        self.model_id = model_id
+        self.dims = int(dims)
+        self.memory_size = memory_size
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "misses": 0, "store_errors": 0}
+
+    def get(self, text: str) -> Optional[list[float]]:
+        vector = self._lookup(cache_key(text, self.model_id, self.dims))
+        self._count("hits" if vector is not None else "misses")
+        return vector
+
+    def put(self, text: str, vector: Sequence[float]) -> None:
+        self._save(cache_key(text, self.model_id, self.dims), vector)
+
+    def get_or_embed(self, text: str, embed_fn: Callable[[str], Optional[list[float]]]) -> Optional[list[float]]:
+        """캐시에 있으면 그대로, 없으면 embed_fn(text)를 호출해 저장한다. embed_fn 실패(None)는 저장하지 않는다."""
+        if not text:
+            return None
+        key = cache_key(text, self.model_id, self.dims)
+        vector = self._lookup(key)
+        if vector is not None:
+            self._count("hits")
+            return vector
+        self._count("misses")
+        vector = embed_fn(text)
+        if vector:
+            self._save(key, vector)
+        return vector
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            memory_entries = len(self._memory)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "backend": self.store.name if self.store else "memory",
+            "model_id": self.model_id,
+            "memory_entries": memory_entries,
+            **stats,
+            "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _lookup(self, key: str) -> Optional[list[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return list(vector)
+        if self.store is None:
+            return None
+        try:
+            raw = self.store.get(key)
+        except Exception as exc:
+            self._count("store_errors")
+            logger.debug("embedding cache get failed (%s): %s", self.store.name, exc)
+            return None
+        if not raw:
+            return None
+        vector = decode_vector(raw)
+        if len(vector) != self.dims:
+            return None
+        self._remember(key, vector)
+        return vector
+
+    def _save(self, key: str, vector: Sequence[float]) -> None:
+        self._remember(key, list(vector))
+        if self.store is None:
+            return
+        try:
+            self.store.put(key, encode_vector(vector))
+        except Exception as exc:
+            self._count("store_errors")
+            logger.debug("embedding cache put failed (%s): %s", self.store.name, exc)
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        if self.memory_size <= 0:
+            return
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+
+def from_env(model_id: str, dims: int, redis_url: Optional[str] = None) -> Optional[EmbeddingCache]:
+    """EMBED_CACHE_BACKEND 설정으로 캐시를 만든다. off면 None, 저장소 초기화 실패 시 메모리 LRU만 사용."""
+    if EMBED_CACHE_BACKEND in {"off", "none", "false", "0"}:
+        return None
+    store: Optional[EmbeddingStore] = None
+    try:
+        if EMBED_CACHE_BACKEND == "redis":
+            store = RedisEmbeddingStore(redis_url or EMBED_CACHE_REDIS_URL)
+        elif EMBED_CACHE_BACKEND == "disk":
+            store = DiskEmbeddingStore()
+    except Exception as exc:
+        logger.warning("embedding cache store unavailable (%s); memory only: %s", EMBED_CACHE_BACKEND, exc)
+    return EmbeddingCache(store, model_id, dims)
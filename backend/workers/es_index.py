@@ -0,0 +1,236 @@
+"""
+============================================
+ES Index - 버전별 뉴스 인덱스 + read/write alias
+============================================
+
+elastic_consumer / backfill_es / reindex_es가 같이 쓰는 인덱스 관리 모듈.
+
+- 물리 인덱스는 `{ES_INDEX}_v{N}` (예: news_v1). 매핑(dims/analyzer/HNSW)을 바꿀 때마다 버전을 올린다.
+- 검색은 read alias(ES_READ_ALIAS, 기본 `news`), 색인은 write alias(ES_WRITE_ALIAS, 기본 `news-write`)로만 한다.
+  → 백엔드(chat RAG)는 인덱스 이름이 바뀌어도 설정 변경 없이 계속 `news`를 조회한다.
+- 예전 고정 인덱스(`news`가 실제 인덱스)인 클러스터는 그대로 두고 write alias만 붙인다.
+  첫 reindex_es 실행 때 `news_v2`로 옮기면서 alias로 바뀐다.
+- dual-write: reindex 중에는 write alias에 새 인덱스를 is_write_index=false로 추가한다.
+  writer는 WriteTargets로 alias 뒤의 모든 인덱스를 찾아 각각에 bulk action을 보낸다
+  (ES는 alias로 쓰면 write index 하나에만 쓰므로 writer가 직접 나눠 보낸다).
+  대상 목록은 ES_ALIAS_REFRESH_SEC마다 다시 읽는다.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
+
+import requests
+
+ES_URL = (os.getenv("ELASTICSEARCH_URL") or os.getenv("ES_URL", "http://localhost:9200")).rstrip("/")
+ES_INDEX = os.getenv("ES_INDEX", "news")
+ES_READ_ALIAS = os.getenv("ES_READ_ALIAS", ES_INDEX)
+ES_WRITE_ALIAS = os.getenv("ES_WRITE_ALIAS", f"{ES_INDEX}-write")
+ES_INDEX_VERSION = max(1, int(os.getenv("ES_INDEX_VERSION", "1")))
+ES_TIMEOUT_SEC = int(os.getenv("ES_TIMEOUT_SEC", "10"))
+# writer가 write alias 대상(dual-write 여부)을 다시 읽는 주기. reindex_es는 이보다 오래 기다린 뒤 복사를 시작한다.
+ES_ALIAS_REFRESH_SEC = max(1.0, float(os.getenv("ES_ALIAS_REFRESH_SEC", "30")))
+
+ES_EMBED_DIMS = int(os.getenv("BEDROCK_EMBED_DIMS", "1024"))
+ES_HNSW_M = int(os.getenv("ES_HNSW_M", "16"))
+ES_HNSW_EF_CONSTRUCTION = int(os.getenv("ES_HNSW_EF_CONSTRUCTION", "100"))
+# hnsw(float32) | int8_hnsw(스칼라 양자화, 벡터 메모리 약 1/4) | int4_hnsw
+ES_VECTOR_INDEX_TYPE = os.getenv("ES_VECTOR_INDEX_TYPE", "hnsw").strip().lower()
+ES_NUMBER_OF_SHARDS = int(os.getenv("ES_NUMBER_OF_SHARDS", "1"))
+ES_NUMBER_OF_REPLICAS = int(os.getenv("ES_NUMBER_OF_REPLICAS", "0"))
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def versioned_name(version: int) -> str:
+    return f"{ES_INDEX}_v{int(version)}"
+
+
+def parse_version(index: str) -> int:
+    """`news_v3` → 3. 버전 없는 예전 인덱스(`news`)는 0."""
+    prefix = f"{ES_INDEX}_v"
+    if index.startswith(prefix) and index[len(prefix):].isdigit():
+        return int(index[len(prefix):])
+    return 0
+
+
+def build_mapping(
+    dims: int = ES_EMBED_DIMS,
+    m: int = ES_HNSW_M,
+    ef_construction: int = ES_HNSW_EF_CONSTRUCTION,
+    vector_type: str = ES_VECTOR_INDEX_TYPE,
+) -> dict[str, Any]:
+    # keyword + text + date + dense_vector 기본 매핑
+    return {
+        "settings": {"number_of_shards": ES_NUMBER_OF_SHARDS, "number_of_replicas": ES_NUMBER_OF_REPLICAS},
+        "mappings": {
+            "properties": {
+                "url": {"type": "keyword"},
+                "title": {"type": "text"},
+                "content": {"type": "text"},
+                "summary": {"type": "text"},
+                "source": {"type": "keyword"},
+                "published_at": {"type": "date"},
+                "tags": {"type": "keyword"},
+                "related_assets": {"type": "keyword"},
+                "ingested_at": {"type": "date"},
+                "embedding": {
+                    "type": "dense_vector",
+                    "dims": int(dims),
+                    "index": True,
+                    "similarity": "cosine",
+                    "index_options": {"type": vector_type, "m": int(m), "ef_construction": int(ef_construction)},
+                },
+            }
+        },
+    }
+
+
+def check_response(resp: requests.Response, what: str) -> dict[str, Any]:
+    if resp.status_code >= 400:
+        raise RuntimeError(f"{what} failed: status={resp.status_code} body={resp.text[:300]}")
+    return resp.json() if resp.content else {}
+
+
+def index_exists(session: requests.Session, name: str) -> bool:
+    resp = session.head(f"{ES_URL}/{name}", timeout=ES_TIMEOUT_SEC)
+    if resp.status_code not in (200, 404):
+        raise RuntimeError(f"index check failed: name={name} status={resp.status_code}")
+    return resp.status_code == 200
+
+
+def alias_targets(session: requests.Session, alias: str) -> dict[str, bool]:
+    """alias가 가리키는 {인덱스: is_write_index}. alias가 없으면 빈 dict."""
+    resp = session.get(f"{ES_URL}/_alias/{alias}", timeout=ES_TIMEOUT_SEC)
+    if resp.status_code == 404:
+        return {}
+    data = check_response(resp, f"alias lookup {alias}")
+    out = {}
+    for index, info in data.items():
+        conf = info.get("aliases", {}).get(alias, {})
+        out[index] = bool(conf.get("is_write_index", len(data) == 1))
+    return out
+
+
+def is_concrete_index(session: requests.Session, name: str) -> bool:
+    """이름이 alias가 아닌 실제 인덱스인지 (예전 고정 `news` 인덱스 판별)."""
+    resp = session.get(f"{ES_URL}/{name}/_settings", timeout=ES_TIMEOUT_SEC)
+    if resp.status_code == 404:
+        return False
+    return name in check_response(resp, f"settings {name}")
+
+
+def embedding_fields(session: requests.Session, target: str) -> dict[str, dict[str, Any]]:
+    """인덱스(또는 alias 뒤 인덱스들)별 embedding 필드 매핑."""
+    data = check_response(session.get(f"{ES_URL}/{target}/_mapping", timeout=ES_TIMEOUT_SEC), f"mapping {target}")
+    return {
+        index: info.get("mappings", {}).get("properties", {}).get("embedding") or {}
+        for index, info in data.items()
+    }
+
+
+def embedding_dims(session: requests.Session, target: str) -> dict[str, Optional[int]]:
+    """인덱스(또는 alias 뒤 인덱스들)별 embedding dims."""
+    return {
+        index: int(field["dims"]) if field.get("dims") else None
+        for index, field in embedding_fields(session, target).items()
+    }
+
+
+def create_index(session: requests.Session, name: str, mapping: Optional[dict[str, Any]] = None) -> None:
+    resp = session.put(
+        f"{ES_URL}/{name}",
+        headers=JSON_HEADERS,
+        data=json.dumps(mapping or build_mapping()),
+        timeout=ES_TIMEOUT_SEC,
+    )
+    check_response(resp, f"index create {name}")
+
+
+def update_aliases(session: requests.Session, actions: list[dict[str, Any]]) -> None:
+    """_aliases 요청 하나로 처리한다 (ES가 원자적으로 적용: 검색이 빈 alias를 보는 순간이 없다)."""
+    resp = session.post(
+        f"{ES_URL}/_aliases",
+        headers=JSON_HEADERS,
+        data=json.dumps({"actions": actions}),
+        timeout=ES_TIMEOUT_SEC,
+    )
+    check_response(resp, "alias update")
+
+
+def ensure_aliases(session: requests.Session) -> str:
+    """
+    read/write alias를 준비하고 현재 write index 이름을 반환한다.
+    - alias가 이미 있으면 그대로 사용
+    - 예전 고정 인덱스(ES_READ_ALIAS 이름의 실제 인덱스)면 write alias만 붙인다
+    - 아무것도 없으면 `{ES_INDEX}_v{ES_INDEX_VERSION}`을 만들고 두 alias를 건다
+    """
+    writes = alias_targets(session, ES_WRITE_ALIAS)
+    if writes:
+        return next((index for index, is_write in writes.items() if is_write), next(iter(writes)))
+
+    if is_concrete_index(session, ES_READ_ALIAS):
+        update_aliases(session, [{"add": {"index": ES_READ_ALIAS, "alias": ES_WRITE_ALIAS, "is_write_index": True}}])
+        return ES_READ_ALIAS
+
+    reads = alias_targets(session, ES_READ_ALIAS)
+    if reads:
+        index = next(iter(reads))
+    else:
+        index = versioned_name(ES_INDEX_VERSION)
+        if not index_exists(session, index):
+            create_index(session, index)
+        update_aliases(session, [{"add": {"index": index, "alias": ES_READ_ALIAS}}])
+    update_aliases(session, [{"add": {"index": index, "alias": ES_WRITE_ALIAS, "is_write_index": True}}])
+    return index
+
+
+class WriteTargets:
+    """
+    write alias 뒤의 인덱스 목록(dual-write 대상)과 각 인덱스의 embedding dims를 캐시한다.
+    조회 실패 시 마지막으로 알던 목록을 계속 쓰고, 처음부터 실패하면 write alias 자체로 보낸다.
+    """
+
+    def __init__(self, session: requests.Session, alias: str = ES_WRITE_ALIAS):
+        self.session = session
+        self.alias = alias
+        self._targets: list[tuple[str, Optional[int]]] = []
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> list[tuple[str, Optional[int]]]:
+        with self._lock:
+            if not self._targets or time.monotonic() - self._loaded_at >= ES_ALIAS_REFRESH_SEC:
+                self._reload()
+            return list(self._targets)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def _reload(self) -> None:
+        self._loaded_at = time.monotonic()
+        try:
+            targets = alias_targets(self.session, self.alias)
+            dims = embedding_dims(self.session, self.alias) if targets else {}
+        except Exception as e:
+            print(f"[es] write alias lookup failed ({self.alias}): {e!r}")
+            if not self._targets:
+                self._targets = [(self.alias, None)]
+            return
+        # write index를 앞에 둔다 (항목 결과/로그 기준)
+        ordered = sorted(targets, key=lambda index: not targets[index])
+        new_targets = [(index, dims.get(index)) for index in ordered] or [(self.alias, None)]
+        if [t[0] for t in new_targets] != [t[0] for t in self._targets]:
+            print(f"[es] write targets: {[t[0] for t in new_targets]}")
+        self._targets = new_targets
+
+
+def doc_for_target(doc: dict[str, Any], dims: Optional[int]) -> dict[str, Any]:
+    """대상 인덱스와 dims가 다른 embedding은 빼고 보낸다 (re-embed reindex 중 옛 모델 벡터가 새 인덱스로 가지 않게)."""
+    embedding = doc.get("embedding")
+    if dims is None or not isinstance(embedding, list) or len(embedding) == dims:
+        return doc
+    return {k: v for k, v in doc.items() if k != "embedding"}
@@ -0,0 +1,194 @@
+"""
+============================================
+OHLCV Engine - 컬럼 기반 캔들 집계
+============================================
+
+history API(app/routers/market.py) / replay_candles_to_redis / scripts/bench_ohlcv.py 가 같이 쓰는 NumPy 집계 모듈.
+
+- 캔들 묶음은 bucket_start(int64) + open/high/low/close/volume(float64) 컬럼 배열로 다룬다.
+- dedup: 같은 bucket_start는 마지막 행만 남긴다 (재전송/replay 중복 제거)
+- resample: 임의 초 단위(+ 정렬 offset)로 묶는다. 그룹 경계는 reduceat 한 번으로 계산
+- group_by_key: 연도처럼 초 단위가 아닌 키로 묶는다.
+- fill_gaps: 빈 구간을 직전 종가 / 거래량 0 봉으로 채운다.
+"""
+
+import base64
+from typing import Any, Callable, Iterable, NamedTuple, Sequence
+
+import numpy as np
+
+# candle_codec.RECORD("<q5d")와 같은 레이아웃 (백엔드에서도 import 경로와 무관하게 쓰도록 독립 정의)
+PACKED_DTYPE = np.dtype(
+    [
+        ("bucket_start", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<f8"),
+    ]
+)
+PACKED_CHARS = PACKED_DTYPE.itemsize // 3 * 4
+
+# 일봉을 KST 자정에 맞출 때 쓰는 offset (코인 일봉은 Upbit와 같이 UTC 00:00 → offset 0)
+KST_DAY_OFFSET_SECONDS = 9 * 3600
+
+
+class OHLCV(NamedTuple):
+    bucket_start: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.bucket_start.shape[0])
+
+    def take(self, index: Any) -> "OHLCV":
+        return OHLCV(*(column[index] for column in self))
+
+    def tail(self, count: int) -> "OHLCV":
+        if count <= 0 or len(self) <= count:
+            return self
+        return self.take(slice(-count, None))
+
+    def rows(self) -> list[tuple[int, float, float, float, float, float]]:
+        """candle_codec.encode_candles 입력 형태의 튜플 리스트."""
+        return list(zip(*(column.tolist() for column in self)))
+
+    def to_records(self, date_fn: Callable[[int], str] | None = None) -> list[dict[str, Any]]:
+        columns = [column.tolist() for column in self]
+        records = []
+        for bucket_start, open_p, high_p, low_p, close_p, volume_p in zip(*columns):
+            records.append(
+                {
+                    "bucket_start": bucket_start,
+                    "date": date_fn(bucket_start) if date_fn else bucket_start,
+                    "open": open_p,
+                    "high": high_p,
+                    "low": low_p,
+                    "close": close_p,
+                    "volume": volume_p,
+                }
+            )
+        return records
+
+
+def empty() -> OHLCV:
+    return OHLCV(np.empty(0, dtype=np.int64), *(np.empty(0, dtype=np.float64) for _ in range(5)))
+
+
+def from_rows(rows: Sequence[Sequence[float]]) -> OHLCV:
+    """(bucket_start, open, high, low, close, volume) 행 목록 → 컬럼 배열."""
+    if not len(rows):
+        return empty()
+    matrix = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+    return OHLCV(matrix[:, 0].astype(np.int64), *(np.ascontiguousarray(matrix[:, i]) for i in range(1, 6)))
+
+
+def from_columns(
+    bucket_start: Iterable[int],
+    open_p: Iterable[float],
+    high_p: Iterable[float],
+    low_p: Iterable[float],
+    close_p: Iterable[float],
+    volume_p: Iterable[float],
+) -> OHLCV:
+    return OHLCV(
+        np.asarray(list(bucket_start), dtype=np.int64),
+        *(np.asarray(list(column), dtype=np.float64) for column in (open_p, high_p, low_p, close_p, volume_p)),
+    )
+
+
+def from_packed(blob: str | bytes | None) -> OHLCV:
+    """candle_codec 포맷을 행 단위 파싱 없이 한 번에 배열로 읽는다."""
+    if not blob:
+        return empty()
+    if isinstance(blob, str):
+        blob = blob.encode("ascii")
+    partial = len(blob) % PACKED_CHARS
+    records = np.frombuffer(base64.b64decode(blob[partial:]), dtype=PACKED_DTYPE)
+    return OHLCV(*(np.ascontiguousarray(records[name]) for name in PACKED_DTYPE.names))
+
+
+def concat(*parts: OHLCV) -> OHLCV:
+    parts = tuple(part for part in parts if len(part))
+    if not parts:
+        return empty()
+    if len(parts) == 1:
+        return parts[0]
+    return OHLCV(*(np.concatenate(columns) for columns in zip(*parts)))
+
+
+def dedup(candles: OHLCV) -> OHLCV:
+    """bucket_start 오름차순 정렬 + 같은 bucket은 마지막 입력 행만 남긴다."""
+    if len(candles) <= 1:
+        return candles
+    order = np.argsort(candles.bucket_start, kind="stable")
+    ordered = candles.bucket_start[order]
+    keep = np.empty(ordered.shape[0], dtype=bool)
+    keep[:-1] = ordered[1:] != ordered[:-1]
+    keep[-1] = True
+    if keep.all() and (order[1:] > order[:-1]).all():
+        return candles
+    return candles.take(order[keep])
+
+
+def _reduce_groups(candles: OHLCV, keys: np.ndarray, bucket_start: np.ndarray) -> OHLCV:
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:] - 1, len(keys) - 1]
+    return OHLCV(
+        bucket_start[starts],
+        candles.open[starts],
+        np.maximum.reduceat(candles.high, starts),
+        np.minimum.reduceat(candles.low, starts),
+        candles.close[ends],
+        np.add.reduceat(candles.volume, starts),
+    )
+
+
+def resample(candles: OHLCV, seconds: int, offset: int = 0) -> OHLCV:
+    """bucket_start 기준 정렬된 캔들을 seconds 단위 봉으로 묶는다 (offset: 일봉 KST 자정 정렬 등)."""
+    if len(candles) == 0 or seconds <= 0:
+        return candles
+    groups = (candles.bucket_start + offset) // seconds * seconds - offset
+    return _reduce_groups(candles, groups, groups)
+
+
+def group_by_key(candles: OHLCV, keys: np.ndarray) -> tuple[np.ndarray, OHLCV]:
+    """임의 정수 키(예: 연도)로 묶는다. 같은 키 안에서는 입력 순서를 유지한다."""
+    if len(candles) == 0:
+        return np.empty(0, dtype=np.int64), candles
+    keys = np.asarray(keys, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    ordered_keys = keys[order]
+    grouped = _reduce_groups(candles.take(order), ordered_keys, candles.bucket_start[order])
+    return np.unique(ordered_keys), grouped
+
+
+def fill_gaps(candles: OHLCV, seconds: int) -> OHLCV:
+    """비어 있는 봉을 직전 종가(OHLC 동일) + 거래량 0으로 채운다."""
+    if len(candles) <= 1 or seconds <= 0:
+        return candles
+    first = int(candles.bucket_start[0])
+    grid = np.arange(first, int(candles.bucket_start[-1]) + 1, seconds, dtype=np.int64)
+    if grid.shape[0] == len(candles):
+        return candles
+    slots = (candles.bucket_start - first) // seconds
+    present = np.zeros(grid.shape[0], dtype=bool)
+    present[slots] = True
+    # 각 grid 칸에서 가장 최근에 존재한 원본 행
+    source = np.maximum.accumulate(np.where(present, np.cumsum(present) - 1, -1))
+    previous_close = candles.close[source]
+    filled = OHLCV(
+        grid,
+        previous_close.copy(),
+        previous_close.copy(),
+        previous_close.copy(),
+        previous_close.copy(),
+        np.zeros(grid.shape[0], dtype=np.float64),
+    )
+    for target, column in zip(filled[1:], candles[1:]):
+        target[slots] = column
+    return filled
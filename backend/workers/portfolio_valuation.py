@@ -0,0 +1,370 @@
+"""
+============================================
+Portfolio Valuation - 사용자별 평가금액 증분 갱신
+============================================
+
+자산 목록(GET /api/v1/assets) 응답을 사용자별 Redis hash로 유지하고, 시세 tick이 오면 그 종목 보유자만 다시 계산한다.
+price_consumer(tick)와 백엔드(assets 라우터 / market_data.get_prices)가 같이 쓴다.
+
+키 구조 (PORTFOLIO_VALUATION_PREFIX, 기본 `pv`)
+- pv:{user_id}         hash  field=자산 id → 보유 종목 JSON (AssetResponse 필드 + 계산용 tick/mult)
+                             _built_at / _marked_at / _total_value / _total_cost
+- pv:holders:{symbol}  set   member=`{user_id}|{자산 id}` (symbol → users 역색인)
+
+- 빌드: list_assets가 DB + get_prices로 계산한 결과를 replace_portfolio로 통째로 기록 (역색인 포함)
+- tick: apply_ticks({symbol: price})가 보유자 hash의 해당 종목만
+        current_price / profit / profit_percent를 다시 계산하고 _total_value를 차액만큼 고친다.
+        price는 price:{symbol}과 같은 원 통화 가격이고, 원화 환산은 종목별 mult(빌드 시점 환율)를 곱한다.
+        1) 역색인 SMEMBERS를 파이프라인 한 번으로 읽고
+        2) 보유자를 PORTFOLIO_VALUATION_TICK_CHUNK개씩 나눠, 건드리는 pv:{user_id}를 KEYS로 선언한 스크립트를
+           EVALSHA(register_script)로 보낸다 (청크들은 파이프라인 한 번). 보유자가 많은 종목(BTC 등)도
+           스크립트 한 번이 Redis를 오래 잡지 않는다.
+- 쓰기: 자산 생성/수정/매도는 upsert_holding, 전량 매도/삭제는 remove_holding으로 그 종목만 반영
+- 환율(mult, 현금 자산)은 tick으로 오지 않으므로 빌드 후 PORTFOLIO_VALUATION_MAX_AGE_SEC가 지나면 다시 빌드한다.
+- 역색인에 남은 삭제/만료 종목은 tick 때 HGET이 비면 스크립트가 알려주고 SREM으로 지운다.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+PORTFOLIO_VALUATION_PREFIX = os.getenv("PORTFOLIO_VALUATION_PREFIX", "pv")
+PORTFOLIO_VALUATION_MAX_AGE_SEC = max(1, int(os.getenv("PORTFOLIO_VALUATION_MAX_AGE_SEC", "600")))
+# 조회가 없는 사용자 hash는 이 시간 뒤 만료 (tick 갱신은 TTL을 늘리지 않는다)
+PORTFOLIO_VALUATION_TTL_SEC = max(60, int(os.getenv("PORTFOLIO_VALUATION_TTL_SEC", "86400")))
+# 스크립트 한 번에 갱신하는 보유 종목 수 상한
+PORTFOLIO_VALUATION_TICK_CHUNK = max(1, int(os.getenv("PORTFOLIO_VALUATION_TICK_CHUNK", "200")))
+
+CASH_SYMBOLS = {"USD", "KRW", "JPY"}
+INTERNAL_FIELDS = ("tick", "mult")
+
+# KEYS[i]: pv:{user_id}, ARGV[1]: now, ARGV[3i-1..3i+1]: 자산 id, tick 심볼, 가격
+# → {갱신한 종목 수, 역색인에서 지울 항목 번호...}
+APPLY_TICKS_LUA = """
+local now = ARGV[1]
+local result = {0}
+for i = 1, #KEYS do
+  local key = KEYS[i]
+  local field = ARGV[3 * i - 1]
+  local symbol = ARGV[3 * i]
+  local price = tonumber(ARGV[3 * i + 1])
+  local raw = redis.call('HGET', key, field)
+  local ok, h = false, nil
+  if raw then
+    ok, h = pcall(cjson.decode, raw)
+  end
+  if ok and type(h) == 'table' and h.tick == symbol then
+    local qty = tonumber(h.quantity) or 0
+    local avg = tonumber(h.average_price) or 0
+    local old_value = (tonumber(h.current_price) or 0) * qty
+    local current = price * (tonumber(h.mult) or 1)
+    h.current_price = current
+    h.profit = (current - avg) * qty
+    if avg > 0 then
+      h.profit_percent = (current - avg) / avg * 100
+    else
+      h.profit_percent = 0
+    end
+    redis.call('HSET', key, field, cjson.encode(h), '_marked_at', now)
+    redis.call('HINCRBYFLOAT', key, '_total_value', current * qty - old_value)
+    result[1] = result[1] + 1
+  else
+    result[#result + 1] = i
+  end
+end
+return result
+"""
+# register_script 결과 (첫 apply_ticks 때 만든다)
+_apply_ticks_script = None
+
+
+def portfolio_key(user_id: Any) -> str:
+    return f"{PORTFOLIO_VALUATION_PREFIX}:{user_id}"
+
+
+def holders_key(symbol: str) -> str:
+    return f"{PORTFOLIO_VALUATION_PREFIX}:holders:{symbol}"
+
+
+def holder_member(user_id: Any, asset_id: str) -> str:
+    return f"{user_id}|{asset_id}"
+
+
+def classify(doc: dict) -> tuple[str, Optional[tuple[str, str]]]:
+    """
+    자산 문서 → (kind, get_prices 요청). list_assets 시세 조회 규칙과 같다.
+    kind: fx(현금, 환율) | stock_usd | stock_kr | crypto | other(시세 없음)
+    """
+    symbol = doc["symbol"]
+    asset_type = doc["asset_type"]
+    if asset_type == "stock":
+        currency = (doc.get("currency") or "KRW").upper()
+        if symbol in CASH_SYMBOLS:
+            return "fx", None
+        if currency == "USD" or (not symbol.isdigit()):
+            return "stock_usd", (symbol, "US")
+        return "stock_kr", (symbol, "KR")
+    if asset_type == "crypto":
+        return "crypto", (symbol, "CRYPTO")
+    return "other", None
+
+
+def tick_symbol(kind: str, symbol: str) -> Optional[str]:
+    """price:{symbol} / price_consumer tick에서 쓰는 심볼. 구독하지 않는 종목은 None."""
+    symbol = (symbol or "").strip().upper()
+    if kind in ("stock_usd", "stock_kr"):
+        return symbol
+    if kind == "crypto":
+        ticker = symbol.replace("/", "-")
+        if "-" not in ticker:
+            return ticker
+        quote, base = ticker.split("-", 1)
+        return base if quote == "KRW" else None
+    return None
+
+
+def build_holding(doc: dict, kind: str, price_data: Any, usd_to_krw: float) -> dict:
+    """
+    자산 문서 + 시세 → 응답용 보유 종목 (원화 환산, 평가손익 포함).
+    tick/mult는 tick 갱신용 내부 필드 (raw 가격 × mult = current_price).
+    """
+    current_price = doc.get("current_price", doc["average_price"])
+    avg_price = doc["average_price"]
+    original_currency = (doc.get("currency") or "KRW").upper()
+    display_currency = original_currency
+    mult = 1.0
+
+    if isinstance(price_data, dict) and "price" in price_data:
+        current_price = price_data["price"]
+
+    # FX cash (USD/JPY/KRW) -> KRW base
+    if kind == "fx":
+        if price_data and not isinstance(price_data, (Exception, dict)):
+            current_price = float(price_data)
+        display_currency = "KRW"
+
+    # USD assets -> convert to KRW for display/analysis
+    if original_currency == "USD" and kind == "stock_usd":
+        # Heuristic: if avg_price is very large, assume it's already KRW
+        if avg_price < 10000:
+            avg_price = avg_price * usd_to_krw
+        current_price = current_price * usd_to_krw
+        mult = usd_to_krw
+        display_currency = "KRW"
+
+    quantity = doc["quantity"]
+    return {
+        "id": str(doc["_id"]),
+        "symbol": doc["symbol"],
+        "name": doc["name"],
+        "asset_type": doc["asset_type"],
+        "quantity": quantity,
+        "average_price": avg_price,
+        "current_price": current_price,
+        "profit": (current_price - avg_price) * quantity,
+        "profit_percent": ((current_price - avg_price) / avg_price * 100) if avg_price > 0 else 0,
+        "currency": display_currency,
+        "memo": doc.get("memo"),
+        "buy_reason": doc.get("buy_reason"),
+        "ai_analysis": doc.get("ai_analysis"),
+        "created_at": doc["created_at"],
+        "updated_at": doc["updated_at"],
+        "tick": tick_symbol(kind, doc["symbol"]),
+        "mult": mult,
+    }
+
+
+def public_view(holding: dict) -> dict:
+    return {k: v for k, v in holding.items() if k not in INTERNAL_FIELDS}
+
+
+def _encode(holding: dict) -> str:
+    return json.dumps(holding, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+
+
+def _value(holding: dict) -> float:
+    return float(holding.get("current_price") or 0) * float(holding.get("quantity") or 0)
+
+
+def _cost(holding: dict) -> float:
+    return float(holding.get("average_price") or 0) * float(holding.get("quantity") or 0)
+
+
+async def replace_portfolio(client, user_id: Any, holdings: list[dict]) -> None:
+    """사용자 보유 종목 전체를 새로 기록한다 (이전 역색인 항목 정리 포함, MULTI 한 번)."""
+    if client is None:
+        return
+    key = portfolio_key(user_id)
+    previous = await client.hgetall(key)
+    pipe = client.pipeline(transaction=True)
+    for field, raw in previous.items():
+        if field.startswith("_"):
+            continue
+        try:
+            old_tick = json.loads(raw).get("tick")
+        except ValueError:
+            continue
+        if old_tick:
+            pipe.srem(holders_key(old_tick), holder_member(user_id, field))
+    pipe.delete(key)
+    now = str(time.time())
+    mapping = {h["id"]: _encode(h) for h in holdings}
+    mapping.update({
+        "_built_at": now,
+        "_marked_at": now,
+        "_total_value": repr(sum(_value(h) for h in holdings)),
+        "_total_cost": repr(sum(_cost(h) for h in holdings)),
+    })
+    pipe.hset(key, mapping=mapping)
+    pipe.expire(key, PORTFOLIO_VALUATION_TTL_SEC)
+    for h in holdings:
+        if h.get("tick"):
+            pipe.sadd(holders_key(h["tick"]), holder_member(user_id, h["id"]))
+    await pipe.execute()
+
+
+async def read_portfolio(client, user_id: Any, max_age_sec: float = PORTFOLIO_VALUATION_MAX_AGE_SEC) -> Optional[dict]:
+    """
+    빌드된 평가 결과. 없거나 빌드 후 max_age_sec가 지났으면 None (호출 측에서 다시 빌드).
+    반환: {"assets": [...], "total": n, "total_value", "total_cost", "built_at", "marked_at"}
+    """
+    if client is None:
+        return None
+    data = await client.hgetall(portfolio_key(user_id))
+    built_at = float(data.get("_built_at") or 0)
+    if not built_at or time.time() - built_at > max_age_sec:
+        return None
+    holdings = []
+    for field, raw in data.items():
+        if field.startswith("_"):
+            continue
+        try:
+            holdings.append(public_view(json.loads(raw)))
+        except ValueError:
+            return None
+    holdings.sort(key=lambda h: (str(h.get("created_at") or ""), h["id"]))
+    return {
+        "assets": holdings,
+        "total": len(holdings),
+        "total_value": float(data.get("_total_value") or 0),
+        "total_cost": float(data.get("_total_cost") or 0),
+        "built_at": built_at,
+        "marked_at": float(data.get("_marked_at") or built_at),
+    }
+
+
+async def upsert_holding(client, user_id: Any, holding: dict) -> bool:
+    """
+    종목 하나만 반영 (자산 생성/수정/매도). 빌드된 hash가 없으면 아무것도 하지 않는다 (다음 조회 때 빌드).
+    반환: 반영 여부
+    """
+    if client is None:
+        return False
+    key = portfolio_key(user_id)
+    built_at, old_raw = await client.hmget(key, ["_built_at", holding["id"]])
+    if not built_at:
+        return False
+    old = json.loads(old_raw) if old_raw else {}
+    pipe = client.pipeline(transaction=True)
+    if old.get("tick") and old.get("tick") != holding.get("tick"):
+        pipe.srem(holders_key(old["tick"]), holder_member(user_id, holding["id"]))
+    pipe.hset(key, holding["id"], _encode(holding))
+    pipe.hincrbyfloat(key, "_total_value", _value(holding) - _value(old))
+    pipe.hincrbyfloat(key, "_total_cost", _cost(holding) - _cost(old))
+    if holding.get("tick"):
+        pipe.sadd(holders_key(holding["tick"]), holder_member(user_id, holding["id"]))
+    await pipe.execute()
+    return True
+
+
+async def remove_holding(client, user_id: Any, asset_id: str) -> None:
+    """종목 하나를 뺀다 (전량 매도 / 삭제). 합계도 그만큼 줄인다."""
+    if client is None:
+        return
+    key = portfolio_key(user_id)
+    old_raw = await client.hget(key, asset_id)
+    if not old_raw:
+        return
+    old = json.loads(old_raw)
+    pipe = client.pipeline(transaction=True)
+    pipe.hdel(key, asset_id)
+    pipe.hincrbyfloat(key, "_total_value", -_value(old))
+    pipe.hincrbyfloat(key, "_total_cost", -_cost(old))
+    if old.get("tick"):
+        pipe.srem(holders_key(old["tick"]), holder_member(user_id, asset_id))
+    await pipe.execute()
+
+
+async def invalidate(client, user_id: Any) -> None:
+    """다음 조회 때 다시 빌드하게 한다 (bulk 등록처럼 여러 종목이 한 번에 바뀔 때). 역색인은 tick 때 정리된다."""
+    if client is None:
+        return
+    await client.delete(portfolio_key(user_id))
+
+
+def tick_prices(prices: dict[str, Any]) -> list[tuple[str, str]]:
+    out = []
+    for symbol, price in prices.items():
+        try:
+            value = float(price)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            out.append((symbol, repr(value)))
+    return out
+
+
+def _script(client):
+    # 실행할 때마다 client(파이프라인)를 넘기므로 인스턴스 하나를 공유한다 (sha만 보관).
+    global _apply_ticks_script
+    if _apply_ticks_script is None:
+        _apply_ticks_script = client.register_script(APPLY_TICKS_LUA)
+    return _apply_ticks_script
+
+
+async def apply_ticks(client, prices: dict[str, Any]) -> int:
+    """{symbol: 원 통화 가격} tick을 보유자 평가금액에 반영. 반환: 갱신한 보유 종목 수"""
+    if client is None or not prices:
+        return 0
+    ticks = tick_prices(prices)
+    if not ticks:
+        return 0
+
+    pipe = client.pipeline(transaction=False)
+    for symbol, _ in ticks:
+        pipe.smembers(holders_key(symbol))
+    entries = [
+        (symbol, price, member)
+        for (symbol, price), members in zip(ticks, await pipe.execute())
+        for member in members
+    ]
+    if not entries:
+        return 0
+
+    script = _script(client)
+    now = str(time.time())
+    size = PORTFOLIO_VALUATION_TICK_CHUNK
+    chunks = [entries[i:i + size] for i in range(0, len(entries), size)]
+    pipe = client.pipeline(transaction=False)
+    for chunk in chunks:
+        keys, args = [], [now]
+        for symbol, price, member in chunk:
+            user_id, _, asset_id = member.partition("|")
+            keys.append(portfolio_key(user_id))
+            args.extend([asset_id, symbol, price])
+        await script(keys=keys, args=args, client=pipe)
+    results = await pipe.execute()
+
+    updated = 0
+    stale: list[tuple[str, str]] = []
+    for chunk, result in zip(chunks, results):
+        updated += int(result[0])
+        stale.extend(chunk[int(i) - 1][::2] for i in result[1:])
+    if stale:
+        pipe = client.pipeline(transaction=False)
+        for symbol, member in stale:
+            pipe.srem(holders_key(symbol), member)
+        await pipe.execute()
+    return updated
@@ -12,22 +12,53 @@ Producer: Price Producer (외부 API -> Kafka)
 
 캐시 구조:
 - price:{symbol} -> 현재가 데이터 (TTL: 30초)
+
+처리 방식:
+- getmany 로 최대 PRICE_BATCH_MAX_SIZE 건 / PRICE_BATCH_LINGER_MS 동안 micro-batch 수집
+- 배치 내 심볼별 최신 시세로 coalesce 후 단일 Redis 파이프라인으로 기록
+- flush 성공 후에만 offset commit (실패 시 배치 시작 offset 으로 seek → 재처리)
+- 배치 크기 / coalesce 비율 / flush 지연은 [STATS] 로그로 주기 출력
+
+보유자 평가금액 (portfolio_valuation):
+- flush 후 배치의 심볼별 가격을 apply_ticks(역색인 SMEMBERS + 청크별 EVALSHA)로 pv:holders:{symbol} 보유자의 평가금액에 반영
+- 실패해도 시세 기록/offset commit에는 영향 없음 (평가금액은 다음 tick 또는 재빌드 때 맞춰진다)
+
+발행 채널:
+- price_delta:{shard} -> 가격이 바뀐 경우에만 압축 delta 메시지 PUBLISH
+  shard = crc32(symbol) % PRICE_DELTA_SHARDS (API 서버 price_hub 와 동일 규칙)
+  메시지: {"s": 심볼, "q": seq, "p": 가격, "c": 변동, "cp": 변동률, "t": 체결시각, "a"/"u"/"m"}
+  seq 는 심볼별 단조 증가 (max(이전+1, 현재 epoch ms)) → 재기동 후에도 역행하지 않는다.
 """
 
 import asyncio
 import json
 import os
+import time
+import zlib
 from datetime import datetime
 
 from aiokafka import AIOKafkaConsumer
 import redis.asyncio as redis
 
+import portfolio_valuation
+
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 TOPIC = "prices"
 GROUP_ID = "price-consumer-group"
 PRICE_TTL_SECONDS = 30
 PRICE_LAST_GOOD_TTL_SECONDS = 24 * 60 * 60
+PRICE_DELTA_CHANNEL_PREFIX = os.getenv("PRICE_DELTA_CHANNEL_PREFIX", "price_delta")
+PRICE_DELTA_SHARDS = max(1, int(os.getenv("PRICE_DELTA_SHARDS", "16")))
+PRICE_BATCH_MAX_SIZE = max(1, int(os.getenv("PRICE_BATCH_MAX_SIZE", "500")))
+PRICE_BATCH_LINGER_MS = max(0, int(os.getenv("PRICE_BATCH_LINGER_MS", "50")))
+IDLE_POLL_TIMEOUT_MS = 1000
+STATS_LOG_INTERVAL_SECONDS = max(5, int(os.getenv("PRICE_CONSUMER_STATS_INTERVAL_SECONDS", "60")))
+
+
+def price_delta_channel(symbol: str) -> str:
+    shard = zlib.crc32(symbol.encode("utf-8")) % PRICE_DELTA_SHARDS
+    return f"{PRICE_DELTA_CHANNEL_PREFIX}:{shard}"
 
 
 class PriceConsumer:
@@ -37,6 +68,11 @@ class PriceConsumer:
         self.consumer = None
         self.redis_client = None
         self.running = False
+        # symbol -> (price, change, change_percent) 마지막 발행값
+        self.last_published: dict[str, tuple] = {}
+        self.seq: dict[str, int] = {}
+        self.stats = self._new_stats()
+        self._stats_logged_at = time.monotonic()
 
     async def connect(self):
         """Kafka 및 Redis 연결"""
@@ -47,6 +83,7 @@ class PriceConsumer:
             group_id=GROUP_ID,
             value_deserializer=lambda v: json.loads(v.decode("utf-8")),
             auto_offset_reset="latest",
+            enable_auto_commit=False,
         )
         await self.consumer.start()
         print(f"[OK] Kafka Consumer 연결 성공: {TOPIC}")
@@ -64,48 +101,191 @@ class PriceConsumer:
             print(f"[WARNING] Redis 연결 실패: {e}")
             self.redis_client = None
 
-    async def cache_price(self, price_data: dict):
-        """Redis에 시세 캐싱"""
-        if self.redis_client is None:
+    @staticmethod
+    def build_payload(price_data: dict) -> dict | None:
+        symbol = price_data.get("symbol")
+        if not symbol:
+            return None
+        return {
+            "symbol": symbol,
+            "price": price_data.get("price"),
+            "change": price_data.get("change", 0),
+            "change_percent": price_data.get("change_percent", 0),
+            "asset_type": price_data.get("asset_type"),
+            "currency": price_data.get("currency", "USD"),
+            "market": price_data.get("market"),
+            "timestamp": price_data.get("timestamp"),
+            "cached_at": datetime.utcnow().isoformat()
+        }
+
+    @staticmethod
+    def coalesce(records: list[dict]) -> dict[str, dict]:
+        """배치 내 심볼별 마지막 시세만 남긴다 (메시지 순서 기준)."""
+        latest: dict[str, dict] = {}
+        for price_data in records:
+            if not isinstance(price_data, dict):
+                continue
+            symbol = price_data.get("symbol")
+            if symbol:
+                latest[symbol] = price_data
+        return latest
+
+    async def flush(self, latest: dict[str, dict]):
+        """심볼별 최신 시세를 단일 파이프라인(SET EX x2 + PUBLISH)으로 기록"""
+        if self.redis_client is None or not latest:
             return
 
+        pipe = self.redis_client.pipeline(transaction=False)
+        deltas: list[tuple[str, str]] = []
+        ticks: dict[str, float] = {}
+        for price_data in latest.values():
+            payload = self.build_payload(price_data)
+            if payload is None:
+                continue
+            key = f"price:{payload['symbol']}"
+            value = json.dumps(payload)
+            pipe.set(key, value, ex=PRICE_TTL_SECONDS)
+            pipe.set(f"{key}:last_good", value, ex=PRICE_LAST_GOOD_TTL_SECONDS)
+            ticks[payload["symbol"]] = payload.get("price")
+
+            delta = self.build_delta(payload)
+            if delta is not None:
+                deltas.append((payload["symbol"], delta))
+                pipe.publish(price_delta_channel(payload["symbol"]), delta)
+
         try:
-            symbol = price_data.get("symbol")
-            if not symbol:
-                return
-
-            key = f"price:{symbol}"
-            value = json.dumps({
-                "symbol": symbol,
-                "price": price_data.get("price"),
-                "change": price_data.get("change", 0),
-                "change_percent": price_data.get("change_percent", 0),
-                "asset_type": price_data.get("asset_type"),
-                "currency": price_data.get("currency", "USD"),
-                "market": price_data.get("market"),
-                "timestamp": price_data.get("timestamp"),
-                "cached_at": datetime.utcnow().isoformat()
-            })
-
-            await self.redis_client.setex(key, PRICE_TTL_SECONDS, value)
-            await self.redis_client.setex(f"{key}:last_good", PRICE_LAST_GOOD_TTL_SECONDS, value)
-            print(f"[CACHE] {symbol} = {price_data.get('price')}")
+            await pipe.execute()
+        except Exception:
+            # 발행 실패 시 다음 배치에서 같은 값도 다시 발행되도록 되돌린다.
+            for symbol, _ in deltas:
+                self.last_published.pop(symbol, None)
+            raise
+
+        await self.mark_portfolios(ticks)
 
+    async def mark_portfolios(self, ticks: dict[str, float]):
+        """보유자 평가금액 증분 갱신. 시세 기록과 분리해 실패해도 배치를 재처리하지 않는다."""
+        try:
+            self.stats["holdings_marked"] += await portfolio_valuation.apply_ticks(self.redis_client, ticks)
         except Exception as e:
-            print(f"[ERROR] Redis 캐싱 실패: {e}")
+            self.stats["valuation_errors"] += 1
+            print(f"[WARNING] 평가금액 갱신 실패: {e}")
+
+    def build_delta(self, payload: dict) -> str | None:
+        """가격/변동값이 직전 발행과 같으면 None (불필요한 push 방지)."""
+        symbol = payload["symbol"]
+        fingerprint = (payload.get("price"), payload.get("change"), payload.get("change_percent"))
+        if self.last_published.get(symbol) == fingerprint:
+            return None
+        self.last_published[symbol] = fingerprint
+
+        seq = max(self.seq.get(symbol, 0) + 1, int(time.time() * 1000))
+        self.seq[symbol] = seq
+
+        delta = {
+            "s": symbol,
+            "q": seq,
+            "p": fingerprint[0],
+            "c": fingerprint[1],
+            "cp": fingerprint[2],
+            "t": payload.get("timestamp"),
+        }
+        for short_key, field in (("a", "asset_type"), ("u", "currency"), ("m", "market")):
+            if payload.get(field):
+                delta[short_key] = payload.get(field)
+        return json.dumps(delta, separators=(",", ":"))
+
+    async def _collect_batch(self) -> dict:
+        """최대 PRICE_BATCH_MAX_SIZE 건 또는 PRICE_BATCH_LINGER_MS 까지 모아 파티션별로 반환"""
+        batch = await self.consumer.getmany(timeout_ms=IDLE_POLL_TIMEOUT_MS, max_records=PRICE_BATCH_MAX_SIZE)
+        size = sum(len(messages) for messages in batch.values())
+        if size == 0:
+            return batch
+
+        deadline = time.monotonic() + PRICE_BATCH_LINGER_MS / 1000
+        while size < PRICE_BATCH_MAX_SIZE:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            more = await self.consumer.getmany(timeout_ms=remaining_ms, max_records=PRICE_BATCH_MAX_SIZE - size)
+            for tp, messages in more.items():
+                batch.setdefault(tp, []).extend(messages)
+                size += len(messages)
+        return batch
+
+    def _record_stats(self, records: int, symbols: int, flush_ms: float):
+        self.stats["batches"] += 1
+        self.stats["records"] += records
+        self.stats["symbols_written"] += symbols
+        self.stats["flush_ms_total"] += flush_ms
+        self.stats["flush_ms_max"] = max(self.stats["flush_ms_max"], flush_ms)
+
+        now = time.monotonic()
+        if now - self._stats_logged_at < STATS_LOG_INTERVAL_SECONDS:
+            return
+        batches = max(1, self.stats["batches"])
+        written = max(1, self.stats["symbols_written"])
+        print(
+            "[STATS] "
+            f"batches={self.stats['batches']} "
+            f"records={self.stats['records']} "
+            f"avg_batch={self.stats['records'] / batches:.1f} "
+            f"coalesce_ratio={self.stats['records'] / written:.2f} "
+            f"avg_flush_ms={self.stats['flush_ms_total'] / batches:.1f} "
+            f"max_flush_ms={self.stats['flush_ms_max']:.1f} "
+            f"flush_errors={self.stats['flush_errors']} "
+            f"holdings_marked={self.stats['holdings_marked']} "
+            f"valuation_errors={self.stats['valuation_errors']}"
+        )
+        self.stats = self._new_stats()
+        self._stats_logged_at = now
+
+    @staticmethod
+    def _new_stats() -> dict:
+        return {
+            "batches": 0,
+            "records": 0,
+            "symbols_written": 0,
+            "flush_ms_total": 0.0,
+            "flush_ms_max": 0.0,
+            "flush_errors": 0,
+            "holdings_marked": 0,
+            "valuation_errors": 0,
+        }
 
     async def run(self):
-        """메인 소비 루프"""
+        """메인 소비 루프 (micro-batch → coalesce → pipeline flush → offset commit)"""
         self.running = True
-        print("[START] Price Consumer 시작")
+        print(
+            "[START] Price Consumer 시작 "
+            f"(batch_max={PRICE_BATCH_MAX_SIZE}, linger_ms={PRICE_BATCH_LINGER_MS})"
+        )
 
         try:
-            async for message in self.consumer:
-                if not self.running:
-                    break
+            while self.running:
+                batch = await self._collect_batch()
+                if not batch:
+                    continue
+
+                records = [message.value for messages in batch.values() for message in messages]
+                latest = self.coalesce(records)
+
+                started = time.perf_counter()
+                try:
+                    await self.flush(latest)
+                except Exception as e:
+                    # 커밋하지 않고 배치 시작 오프셋으로 되감아 재처리 (at-least-once)
+                    self.stats["flush_errors"] += 1
+                    print(f"[ERROR] Redis 배치 기록 실패: {e}")
+                    for tp, messages in batch.items():
+                        if messages:
+                            self.consumer.seek(tp, messages[0].offset)
+                    await asyncio.sleep(1)
+                    continue
 
-                price_data = message.value
-                await self.cache_price(price_data)
+                flush_ms = (time.perf_counter() - started) * 1000
+                await self.consumer.commit()
+                self._record_stats(len(records), len(latest), flush_ms)
 
         except Exception as e:
             print(f"[ERROR] Consumer 오류: {e}")
@@ -163,6 +163,8 @@ def _parse_upbit_ws_message(raw: dict) -> dict[str, Any] | None:
         "source":         "upbit",
         "change_percent": _safe_float(raw.get("signed_change_rate"), 0.0) * 100.0,
         "volume":         _safe_float(raw.get("acc_trade_volume_24h"), 0.0),
+        # UTC 00:00에 초기화되는 누적 거래량 (캔들 집계기가 틱 간 차분으로 분봉 거래량을 만든다)
+        "acc_volume":     _safe_float(raw.get("acc_trade_volume"), 0.0),
     }
 
 
@@ -290,6 +292,7 @@ def _parse_kis_domestic_tick(raw: str) -> dict[str, Any] | None:
         "source":         "kis_ws",
         "change_percent": change_pct,
         "volume":         volume,
+        "acc_volume":     volume,
     }
 
 
@@ -418,6 +421,7 @@ async def _fetch_stock_polygon(symbols: list[str]) -> list[dict[str, Any]]:
                     "source": "polygon",
                     "change": change, "change_percent": change_pct,
                     "volume": _safe_float(day.get("v"), 0.0),
+                    "acc_volume": _safe_float(day.get("v"), 0.0),
                 })
             except Exception as exc:
                 logger.debug("Polygon fetch 실패 (%s): %s", symbol, exc)
@@ -4,14 +4,17 @@
 import os
 import json
 import time
-import random
+import asyncio
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urljoin, urlparse, parse_qs, quote_plus
 
-import requests
+import httpx
 from bs4 import BeautifulSoup
 from kafka import KafkaProducer
 
+from crawler import AsyncCrawler, HostPolicy
+from seen_store import SeenLinks, open_seen_store
+
 
 NAVER_FINANCE_BASE = "https://finance.naver.com"
 NAVER_FINANCE_MAINNEWS_URL = "https://finance.naver.com/news/mainnews.naver"
@@ -89,6 +92,7 @@ def env_int(*keys: str, default: int) -> int:
 # 하위 호환용 기본값: source별 limit이 없으면 LIMIT 사용
 LIMIT = env_int("LIMIT", "PRODUCER_LIMIT", default=5)
 PAGES = env_int("PAGES", "PRODUCER_PAGES", default=3)        # ✅ 여러 페이지 훑기
+# 예전 JSON 중복 방지 파일 (있으면 seen_store로 한 번 옮긴다)
 SEEN_FILE = os.getenv("SEEN_FILE", "/home/kafka/seen_finance_mainnews.json")
 ENABLE_NAVER = env_bool("ENABLE_NAVER", default=True)
 ENABLE_COINNESS = env_bool("ENABLE_COINNESS", default=True)
@@ -124,8 +128,24 @@ COIN_FILTER_KEYWORDS = [
     if kw.strip()
 ]
 
-session = requests.Session()
-session.headers.update(HEADERS)
+# 도메인별 동시 요청 수 / 초당 요청 수 (Naver는 상세 페이지 연속 호출 시 429를 자주 준다)
+CRAWLER_HOST_POLICIES = {
+    "naver.com": HostPolicy(
+        concurrency=env_int("NAVER_HOST_CONCURRENCY", default=3),
+        rate=float(env_int("NAVER_HOST_RATE", default=3)),
+        burst=3,
+    ),
+    "coinness.com": HostPolicy(
+        concurrency=env_int("COINNESS_HOST_CONCURRENCY", default=4),
+        rate=float(env_int("COINNESS_HOST_RATE", default=4)),
+        burst=4,
+    ),
+    "einfomax.co.kr": HostPolicy(
+        concurrency=env_int("EINFOMAX_HOST_CONCURRENCY", default=2),
+        rate=float(env_int("EINFOMAX_HOST_RATE", default=2)),
+        burst=2,
+    ),
+}
 
 producer = KafkaProducer(
     bootstrap_servers=[KAFKA_BOOTSTRAP],
@@ -135,7 +155,7 @@ KST = timezone(timedelta(hours=9))
 
 
 def is_http_status(exc: Exception, status_code: int) -> bool:
-    return isinstance(exc, requests.HTTPError) and getattr(exc.response, "status_code", None) == status_code
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == status_code
 
 
 def parse_published_at(value):
@@ -203,31 +223,6 @@ def apply_event_time_fields(event: dict) -> dict:
     return event
 
 
-def load_seen() -> set[str]:
-    try:
-        with open(SEEN_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if isinstance(data, list):
-            return set(data)
-        return set()
-    except FileNotFoundError:
-        return set()
-    except Exception:
-        return set()
-
-
-def save_seen(seen: set[str], max_keep: int = 5000) -> None:
-    # 너무 커지지 않게 최근 것만 유지
-    data = list(seen)
-    if len(data) > max_keep:
-        data = data[-max_keep:]
-    try:
-        with open(SEEN_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
-
-
 def make_soup(markup: str | bytes, parser: str = "lxml", **kwargs) -> BeautifulSoup:
     try:
         return BeautifulSoup(markup, parser, **kwargs)
@@ -237,18 +232,57 @@ def make_soup(markup: str | bytes, parser: str = "lxml", **kwargs) -> BeautifulS
         return BeautifulSoup(markup, "html.parser", **fallback_kwargs)
 
 
-def get_finance_soup(url: str, timeout: int = 10) -> BeautifulSoup:
-    res = session.get(url, timeout=timeout)
-    res.raise_for_status()
-    return make_soup(res.content, "lxml", from_encoding="euc-kr")
+def dedupe_items(items: list[dict], key=lambda it: it["link"]) -> list[dict]:
+    seen = set()
+    uniq: list[dict] = []
+    for it in items:
+        k = key(it)
+        if k in seen:
+            continue
+        seen.add(k)
+        uniq.append(it)
+    return uniq
+
+
+async def all_seen(items: list[dict], seen_links: SeenLinks) -> bool:
+    return bool(items) and await seen_links.contains_all([it["link"] for it in items])
 
 
-def safe_get_text(url: str, timeout: int = 10) -> str:
-    res = session.get(url, timeout=timeout)
-    res.raise_for_status()
-    if not res.encoding or res.encoding.lower() in ("iso-8859-1", "ascii"):
-        res.encoding = "utf-8"
-    return res.text
+async def fetch_pages(
+    crawler: AsyncCrawler,
+    urls: list[str],
+    parse_fn,
+    *args,
+    label: str,
+    seen_links: SeenLinks | None = None,
+    binary: bool = False,
+) -> list[dict]:
+    """
+    목록 페이지를 parse_fn(본문, url, *args)로 파싱해 urls 순서대로 이어 붙인다.
+    - 조건부 GET: 지난 poll 이후 바뀌지 않은 페이지는 재파싱하지 않는다.
+    - seen_links를 주면 최신 페이지부터 순서대로 받고, 전부 이미 본 링크뿐인 페이지에서 멈춘다.
+      (없으면 모든 페이지를 동시에 받는다)
+    """
+    async def one(url: str) -> list[dict]:
+        try:
+            items, _ = await crawler.fetch_parsed(url, parse_fn, url, *args, binary=binary)
+        except Exception as e:
+            print(f"[debug] {label} list fetch fail: {url} err={e!r}")
+            return []
+        return items
+
+    if seen_links is None:
+        pages = await asyncio.gather(*(one(url) for url in urls))
+        return [it for page in pages for it in page]
+
+    all_items: list[dict] = []
+    for url in urls:
+        items = await one(url)
+        all_items.extend(items)
+        if await all_seen(items, seen_links):
+            print(f"[debug] {label} page has no new links; stop paging at {url}")
+            break
+    return all_items
 
 
 def normalize_href(href: str) -> str | None:
@@ -329,53 +363,50 @@ def coinness_sitemap_urls() -> list[str]:
     return list(dict.fromkeys(urls))
 
 
-def crawl_naver_coin_items_multi_pages(keywords: list[str], pages: int) -> list[dict]:
-    all_items: list[dict] = []
-    for kw in keywords:
-        for page in range(1, pages + 1):
-            start = 1 + (page - 1) * 10
-            url = (
-                f"{NAVER_NEWS_SEARCH_URL}?where=news&query={quote_plus(kw)}"
-                f"&sm=tab_pge&start={start}"
-            )
-            try:
-                html = safe_get_text(url)
-            except Exception as e:
-                print(f"[debug] coin fallback list fetch fail: kw={kw} page={page} err={e!r}")
-                continue
-
-            soup = make_soup(html, "lxml")
-            nodes = soup.select("a.news_tit[href], a[href*='n.news.naver.com/mnews/article/']")
-            print(f"[debug] coin fallback kw={kw} page={page} nodes={len(nodes)}")
-
-            for a in nodes:
-                raw_href = a.get("href", "")
-                link = normalize_coinness_href(raw_href)
-                if not link:
-                    continue
-                if "n.news.naver.com/mnews/article/" not in link:
-                    continue
-
-                title = a.get("title") or a.get_text(" ", strip=True) or None
-                all_items.append(
-                    {
-                        "link": link,
-                        "title": title,
-                        "source_list_url": url,
-                        "keyword": kw,
-                    }
-                )
-            time.sleep(0.12)
+def parse_naver_coin_list(html: str, url: str, kw: str) -> list[dict]:
+    soup = make_soup(html, "lxml")
+    nodes = soup.select("a.news_tit[href], a[href*='n.news.naver.com/mnews/article/']")
+    print(f"[debug] coin fallback kw={kw} url={url} nodes={len(nodes)}")
 
-    seen = set()
-    uniq: list[dict] = []
-    for it in all_items:
-        link = it["link"]
-        if link in seen:
+    items: list[dict] = []
+    for a in nodes:
+        raw_href = a.get("href", "")
+        link = normalize_coinness_href(raw_href)
+        if not link:
+            continue
+        if "n.news.naver.com/mnews/article/" not in link:
             continue
-        seen.add(link)
-        uniq.append(it)
 
+        title = a.get("title") or a.get_text(" ", strip=True) or None
+        items.append(
+            {
+                "link": link,
+                "title": title,
+                "source_list_url": url,
+                "keyword": kw,
+            }
+        )
+    return items
+
+
+async def crawl_naver_coin_items_multi_pages(
+    crawler: AsyncCrawler,
+    keywords: list[str],
+    pages: int,
+    seen_links: SeenLinks | None = None,
+) -> list[dict]:
+    all_items: list[dict] = []
+    for kw in keywords:
+        urls = [
+            f"{NAVER_NEWS_SEARCH_URL}?where=news&query={quote_plus(kw)}"
+            f"&sm=tab_pge&start={1 + (page - 1) * 10}"
+            for page in range(1, pages + 1)
+        ]
+        all_items.extend(
+            await fetch_pages(crawler, urls, parse_naver_coin_list, kw, label="coin fallback", seen_links=seen_links)
+        )
+
+    uniq = dedupe_items(all_items)
     print("[debug] coin fallback uniq_items_total=", len(uniq))
     return uniq
 
@@ -391,68 +422,69 @@ def to_mobile_news_url(url: str) -> str:
     return url
 
 
-def crawl_mainnews_items_multi_pages(pages: int) -> list[dict]:
-    """
-    mainnews.naver?page=1..pages 를 훑어서 목록을 최대한 많이 모음
-    """
-    all_items: list[dict] = []
+def parse_mainnews_page(content: bytes, url: str) -> list[dict]:
+    soup = make_soup(content, "lxml", from_encoding="euc-kr")
 
-    for page in range(1, pages + 1):
-        url = f"{NAVER_FINANCE_MAINNEWS_URL}?page={page}"
-        soup = get_finance_soup(url)
+    nodes = soup.select("ul.newsList dd.articleSubject a[href]")
+    print(f"[debug] {url} nodes={len(nodes)}")
 
-        nodes = soup.select("ul.newsList dd.articleSubject a[href]")
-        print(f"[debug] page={page} nodes={len(nodes)}")
+    items: list[dict] = []
+    for a in nodes:
+        raw_href = a.get("href", "")
+        finance_origin_link = normalize_href(raw_href)
+        if not finance_origin_link:
+            continue
 
-        for a in nodes:
-            raw_href = a.get("href", "")
-            finance_origin_link = normalize_href(raw_href)
-            if not finance_origin_link:
-                continue
+        mobile_link = to_mobile_news_url(finance_origin_link)
+        if "n.news.naver.com/mnews/article/" not in mobile_link:
+            continue
 
-            mobile_link = to_mobile_news_url(finance_origin_link)
-            if "n.news.naver.com/mnews/article/" not in mobile_link:
-                continue
+        title = a.get_text(strip=True)
 
-            title = a.get_text(strip=True)
+        li = a.find_parent("li")
+        summary_dd = li.select_one("dd.articleSummary") if li else None
+        press = (
+            summary_dd.select_one("span.press").get_text(strip=True)
+            if summary_dd and summary_dd.select_one("span.press")
+            else None
+        )
+        wdate = (
+            summary_dd.select_one("span.wdate").get_text(strip=True)
+            if summary_dd and summary_dd.select_one("span.wdate")
+            else None
+        )
+        summary = summary_dd.get_text(" ", strip=True) if summary_dd else None
 
-            li = a.find_parent("li")
-            summary_dd = li.select_one("dd.articleSummary") if li else None
-            press = (
-                summary_dd.select_one("span.press").get_text(strip=True)
-                if summary_dd and summary_dd.select_one("span.press")
-                else None
-            )
-            wdate = (
-                summary_dd.select_one("span.wdate").get_text(strip=True)
-                if summary_dd and summary_dd.select_one("span.wdate")
-                else None
-            )
-            summary = summary_dd.get_text(" ", strip=True) if summary_dd else None
+        items.append(
+            {
+                "finance_origin_link": finance_origin_link,
+                "link": mobile_link,
+                "title": title,
+                "press": press,
+                "wdate": wdate,
+                "summary": summary,
+                "source_list_url": url,
+            }
+        )
+    return items
 
-            all_items.append(
-                {
-                    "finance_origin_link": finance_origin_link,
-                    "link": mobile_link,
-                    "title": title,
-                    "press": press,
-                    "wdate": wdate,
-                    "summary": summary,
-                    "source_list_url": url,
-                }
-            )
 
-        time.sleep(0.15)
+async def crawl_mainnews_items_multi_pages(
+    crawler: AsyncCrawler,
+    pages: int,
+    seen_links: SeenLinks | None = None,
+) -> list[dict]:
+    """
+    mainnews.naver?page=1..pages 를 훑어서 목록을 최대한 많이 모음 (이미 본 기사만 있는 페이지에서 중단)
+    """
+    urls = [f"{NAVER_FINANCE_MAINNEWS_URL}?page={page}" for page in range(1, pages + 1)]
+    # euc-kr 페이지라 bytes 그대로 파서에 넘긴다.
+    items = await fetch_pages(
+        crawler, urls, parse_mainnews_page, label="mainnews", seen_links=seen_links, binary=True
+    )
 
     # dedupe keep order by link
-    seen = set()
-    uniq = []
-    for it in all_items:
-        if it["link"] in seen:
-            continue
-        seen.add(it["link"])
-        uniq.append(it)
-
+    uniq = dedupe_items(items)
     print("[debug] uniq_items_total=", len(uniq))
     return uniq
 
@@ -547,8 +579,7 @@ def _looks_like_full_article(body: str | None, summary: str | None = None, title
     return len(body_text) >= max(120, baseline + 60)
 
 
-def crawl_generic_article_detail(url: str) -> dict | None:
-    html = safe_get_text(url)
+def parse_generic_article_detail(html: str) -> dict | None:
     soup = make_soup(html, "lxml")
     json_ld = parse_json_ld_article(soup)
 
@@ -599,25 +630,50 @@ def crawl_generic_article_detail(url: str) -> dict | None:
     }
 
 
-def crawl_article_detail(url: str) -> dict | None:
+async def crawl_detail(crawler: AsyncCrawler, url: str, parse_fn) -> dict | None:
+    html = await crawler.fetch_text(url)
+    return await crawler.parse(parse_fn, html)
+
+
+async def crawl_article_detail(crawler: AsyncCrawler, url: str) -> dict | None:
     hostname = (urlparse(url).hostname or "").lower()
 
     if "naver.com" in hostname:
-        return crawl_mobile_article_detail(to_mobile_news_url(url))
+        return await crawl_detail(crawler, to_mobile_news_url(url), parse_mobile_article_detail)
     if hostname.endswith("coinness.com"):
-        return crawl_coinness_article_detail(url)
+        return await crawl_detail(crawler, url, parse_coinness_article_detail)
     if hostname.endswith("einfomax.co.kr"):
-        return crawl_einfomax_article_detail(url)
-    return crawl_generic_article_detail(url)
+        return await crawl_detail(crawler, url, parse_einfomax_article_detail)
+    return await crawl_detail(crawler, url, parse_generic_article_detail)
 
 
-def crawl_coinness_items_multi_pages(pages: int) -> list[dict]:
+def parse_coinness_list_page(html: str, url: str) -> list[dict]:
+    soup = make_soup(html, "lxml")
+    nodes = soup.select("a[href]")
+    print(f"[debug] coinness list={url} nodes={len(nodes)}")
+    items: list[dict] = []
+    for a in nodes:
+        raw_href = a.get("href", "")
+        link = normalize_coinness_href(raw_href)
+        if not link or not is_coinness_article_url(link):
+            continue
+        title = a.get_text(" ", strip=True) or None
+        items.append({"link": link, "title": title, "source_list_url": url})
+    return items
+
+
+async def crawl_coinness_items_multi_pages(
+    crawler: AsyncCrawler,
+    pages: int,
+    seen_links: SeenLinks | None = None,
+) -> list[dict]:
     api_url = f"{COINNESS_API_BASE}/feed/v1/articles"
     items: list[dict] = []
     last_id = None
     last_at = None
     last_view = None
 
+    # API는 lastId 커서 방식이라 페이지를 순서대로 받는다.
     for page in range(1, max(pages, 1) + 1):
         params = {
             "limit": COINNESS_API_PAGE_LIMIT,
@@ -633,8 +689,7 @@ def crawl_coinness_items_multi_pages(pages: int) -> list[dict]:
             params["lastView"] = str(last_view)
 
         try:
-            raw = session.get(api_url, params=params, timeout=10).text
-            data = json.loads(raw)
+            data, _ = await crawler.fetch_parsed(api_url, json.loads, params=params)
         except Exception as e:
             print(f"[debug] coinness api fetch fail: page={page} err={e!r}")
             break
@@ -646,6 +701,7 @@ def crawl_coinness_items_multi_pages(pages: int) -> list[dict]:
             break
 
         print(f"[debug] coinness api page={page} items={len(data)}")
+        page_items: list[dict] = []
         for row in data:
             if not isinstance(row, dict):
                 continue
@@ -663,7 +719,7 @@ def crawl_coinness_items_multi_pages(pages: int) -> list[dict]:
             published_at = row.get("publishAt")
             article_id = row.get("id")
             view_count = row.get("view")
-            items.append(
+            page_items.append(
                 {
                     "link": link,
                     "title": title,
@@ -676,6 +732,11 @@ def crawl_coinness_items_multi_pages(pages: int) -> list[dict]:
                 }
             )
 
+        items.extend(page_items)
+        if seen_links is not None and await all_seen(page_items, seen_links):
+            print(f"[debug] coinness api page={page} has no new links; stop paging")
+            break
+
         tail = data[-1]
         last_id = tail.get("id")
         last_at = tail.get("publishAt")
@@ -683,93 +744,61 @@ def crawl_coinness_items_multi_pages(pages: int) -> list[dict]:
         if last_id is None:
             break
 
-    seen = set()
-    uniq: list[dict] = []
-    for it in items:
-        key = it.get("coinness_id") or it["link"]
-        if key in seen:
-            continue
-        seen.add(key)
-        uniq.append(it)
-
+    uniq = dedupe_items(items, key=lambda it: it.get("coinness_id") or it["link"])
     print("[debug] coinness api_items_total=", len(uniq))
     if uniq:
         return uniq
 
     # API 실패 시에만 구 방식 fallback
-    all_items: list[dict] = []
-    failed_pages = 0
     page_urls = coinness_article_page_urls(pages)
-    for url in page_urls:
-        try:
-            html = safe_get_text(url)
-        except Exception as e:
-            failed_pages += 1
-            print(f"[debug] coinness list fetch fail: {url} err={e!r}")
-            continue
-        soup = make_soup(html, "lxml")
-        nodes = soup.select("a[href]")
-        print(f"[debug] coinness list={url} nodes={len(nodes)}")
-        for a in nodes:
-            raw_href = a.get("href", "")
-            link = normalize_coinness_href(raw_href)
-            if not link or not is_coinness_article_url(link):
-                continue
-            title = a.get_text(" ", strip=True) or None
-            all_items.append({"link": link, "title": title, "source_list_url": url})
-        time.sleep(0.15)
-
-    seen2 = set()
-    uniq2: list[dict] = []
-    for it in all_items:
-        link = it["link"]
-        if link in seen2:
-            continue
-        seen2.add(link)
-        uniq2.append(it)
+    uniq2 = dedupe_items(
+        await fetch_pages(crawler, page_urls, parse_coinness_list_page, label="coinness", seen_links=seen_links)
+    )
     print("[debug] coinness html_items_total=", len(uniq2))
     if uniq2:
         return uniq2
 
-    sitemap_items = crawl_coinness_items_from_sitemap(COINNESS_SITEMAP_LIMIT)
+    sitemap_items = await crawl_coinness_items_from_sitemap(crawler, COINNESS_SITEMAP_LIMIT)
     print("[debug] coinness sitemap_items_total=", len(sitemap_items))
-    if failed_pages == len(page_urls):
-        print("[debug] coinness all list pages failed; check DNS/network for coinness domain")
+    if not sitemap_items:
+        print("[debug] coinness list pages returned nothing; check DNS/network for coinness domain")
     return sitemap_items
 
 
-def crawl_coinness_items_from_sitemap(limit: int) -> list[dict]:
+def parse_sitemap(xml_text: str) -> tuple[list[str], list[str]]:
+    """(하위 sitemap URL 목록, 기사 URL 목록)"""
+    soup = make_soup(xml_text, "xml")
+
+    index_nodes = soup.select("sitemap > loc")
+    if index_nodes:
+        children = [(loc.get_text(strip=True) or "").strip() for loc in index_nodes]
+        return [url for url in children if url.startswith("http")], []
+
+    links = [(loc.get_text(strip=True) or "").strip() for loc in soup.select("url > loc")]
+    return [], [link for link in links if is_coinness_article_url(link)]
+
+
+async def crawl_coinness_items_from_sitemap(crawler: AsyncCrawler, limit: int) -> list[dict]:
     sitemap_queue = coinness_sitemap_urls()
     visited = set()
     urls: list[str] = []
 
-    while sitemap_queue and len(urls) < max(limit, 1) * 4:
-        sitemap_url = sitemap_queue.pop(0)
-        if sitemap_url in visited:
-            continue
-        visited.add(sitemap_url)
-
+    async def one(sitemap_url: str) -> tuple[list[str], list[str]]:
         try:
-            xml_text = safe_get_text(sitemap_url)
+            parsed, _ = await crawler.fetch_parsed(sitemap_url, parse_sitemap)
         except Exception as e:
             print(f"[debug] coinness sitemap fetch fail: {sitemap_url} err={e!r}")
-            continue
-
-        soup = make_soup(xml_text, "xml")
-
-        index_nodes = soup.select("sitemap > loc")
-        if index_nodes:
-            for loc in index_nodes:
-                child_url = (loc.get_text(strip=True) or "").strip()
-                if child_url.startswith("http"):
-                    sitemap_queue.append(child_url)
-            continue
+            return [], []
+        return parsed
 
-        for loc in soup.select("url > loc"):
-            link = (loc.get_text(strip=True) or "").strip()
-            if not is_coinness_article_url(link):
-                continue
-            urls.append(link)
+    # 같은 깊이의 sitemap은 동시에 받는다.
+    while sitemap_queue and len(urls) < max(limit, 1) * 4:
+        level = [url for url in dict.fromkeys(sitemap_queue) if url not in visited]
+        sitemap_queue = []
+        visited.update(level)
+        for children, links in await asyncio.gather(*(one(url) for url in level)):
+            sitemap_queue.extend(children)
+            urls.extend(links)
 
     # sitemap은 오래된 항목부터 오는 경우가 많아 최신 가능성이 큰 뒤쪽부터 사용
     urls = list(dict.fromkeys(urls))  # dedupe keep order
@@ -787,8 +816,7 @@ def crawl_coinness_items_from_sitemap(limit: int) -> list[dict]:
     return items
 
 
-def crawl_mobile_article_detail(url: str) -> dict | None:
-    html = safe_get_text(url)
+def parse_mobile_article_detail(html: str) -> dict | None:
     soup = make_soup(html, "lxml")
 
     title_tag = soup.select_one("h2#title_area")
@@ -805,8 +833,7 @@ def crawl_mobile_article_detail(url: str) -> dict | None:
     }
 
 
-def crawl_coinness_article_detail(url: str) -> dict | None:
-    html = safe_get_text(url)
+def parse_coinness_article_detail(html: str) -> dict | None:
     soup = make_soup(html, "lxml")
 
     json_ld = parse_json_ld_article(soup)
@@ -855,72 +882,63 @@ def crawl_coinness_article_detail(url: str) -> dict | None:
     }
 
 
-def crawl_einfomax_items_multi_pages(query: str, pages: int) -> list[dict]:
-    all_items: list[dict] = []
+def parse_einfomax_list(html: str, url: str) -> list[dict]:
+    soup = make_soup(html, "lxml")
+    nodes = soup.select("#section-list ul.type2 > li")
+    print(f"[debug] einfomax url={url} nodes={len(nodes)}")
 
-    for page in range(1, pages + 1):
-        url = (
-            f"{EINFOMAX_ARTICLE_LIST_URL}?sc_word={quote_plus(query)}"
-            f"&view_type=sm&page={page}"
-        )
-        try:
-            html = safe_get_text(url)
-        except Exception as e:
-            print(f"[debug] einfomax list fetch fail: page={page} err={e!r}")
+    items: list[dict] = []
+    for li in nodes:
+        a = li.select_one("h4.titles a[href]")
+        if not a:
             continue
 
-        soup = make_soup(html, "lxml")
-        nodes = soup.select("#section-list ul.type2 > li")
-        print(f"[debug] einfomax query={query} page={page} nodes={len(nodes)}")
-
-        for li in nodes:
-            a = li.select_one("h4.titles a[href]")
-            if not a:
-                continue
-
-            link = normalize_einfomax_href(a.get("href", ""))
-            if not link or "articleView.html?idxno=" not in link:
-                continue
+        link = normalize_einfomax_href(a.get("href", ""))
+        if not link or "articleView.html?idxno=" not in link:
+            continue
 
-            title = a.get_text(" ", strip=True) or None
-            if EINFOMAX_FILTER_COINS and not is_coin_related_title(title):
-                continue
+        title = a.get_text(" ", strip=True) or None
+        if EINFOMAX_FILTER_COINS and not is_coin_related_title(title):
+            continue
 
-            em_nodes = li.select("span.byline em")
-            press = em_nodes[0].get_text(" ", strip=True) if em_nodes else None
-            published_at = em_nodes[-1].get_text(" ", strip=True) if em_nodes else None
+        em_nodes = li.select("span.byline em")
+        press = em_nodes[0].get_text(" ", strip=True) if em_nodes else None
+        published_at = em_nodes[-1].get_text(" ", strip=True) if em_nodes else None
 
-            summary_node = li.select_one("p.lead a")
-            summary = summary_node.get_text(" ", strip=True) if summary_node else None
+        summary_node = li.select_one("p.lead a")
+        summary = summary_node.get_text(" ", strip=True) if summary_node else None
 
-            all_items.append(
-                {
-                    "link": link,
-                    "title": title,
-                    "press": press,
-                    "published_at": published_at,
-                    "summary": summary,
-                    "source_list_url": url,
-                }
-            )
+        items.append(
+            {
+                "link": link,
+                "title": title,
+                "press": press,
+                "published_at": published_at,
+                "summary": summary,
+                "source_list_url": url,
+            }
+        )
+    return items
 
-        time.sleep(0.15)
-
-    seen = set()
-    uniq = []
-    for it in all_items:
-        link = it["link"]
-        if link in seen:
-            continue
-        seen.add(link)
-        uniq.append(it)
 
+async def crawl_einfomax_items_multi_pages(
+    crawler: AsyncCrawler,
+    query: str,
+    pages: int,
+    seen_links: SeenLinks | None = None,
+) -> list[dict]:
+    urls = [
+        f"{EINFOMAX_ARTICLE_LIST_URL}?sc_word={quote_plus(query)}&view_type=sm&page={page}"
+        for page in range(1, pages + 1)
+    ]
+    uniq = dedupe_items(
+        await fetch_pages(crawler, urls, parse_einfomax_list, label="einfomax", seen_links=seen_links)
+    )
     print("[debug] einfomax uniq_items_total=", len(uniq))
     return uniq
 
 
-def crawl_einfomax_article_detail(url: str) -> dict | None:
-    html = safe_get_text(url)
+def parse_einfomax_article_detail(html: str) -> dict | None:
     soup = make_soup(html, "lxml")
 
     title = (
@@ -950,271 +968,298 @@ def crawl_einfomax_article_detail(url: str) -> dict | None:
     }
 
 
-def run_once() -> tuple[int, dict[str, int]]:
-    # ✅ 실행 간 중복 전송 줄이기(크론에서도 효과)
-    seen_links = load_seen()
-    produced_by_source: dict[str, int] = {}
-    total_produced = 0
-    pending_events: list[dict] = []
-
-    if ENABLE_NAVER and NAVER_LIMIT > 0:
-        items = crawl_mainnews_items_multi_pages(PAGES)
-        for it in items:
-            if produced_by_source.get("naver_finance", 0) >= NAVER_LIMIT:
-                break
-
-            link = it["link"]
-            if link in seen_links:
-                continue
-
-            print("fetch:", link)
-            try:
-                detail = crawl_mobile_article_detail(link)
-            except Exception as e:
-                if is_http_status(e, 429):
-                    print(f"  warn: naver detail rate-limited, skip: {link}")
-                    time.sleep(1.5 + random.random() * 1.5)
-                else:
-                    print(f"  warn: naver detail fetch fail err={e!r}")
-                continue
-            if not detail:
-                print("  skip: no title/body")
+async def collect_events(items: list[dict], limit: int, seen_links: SeenLinks, build_event) -> list[dict]:
+    """
+    seen이 아닌 후보를 목록 순서대로 limit개가 찰 때까지 수집.
+    남은 개수만큼씩 묶어 동시에 가져오므로 limit보다 많이 요청하지 않는다.
+    다른 replica가 수집 중인 링크(claim 실패)는 건너뛴다. claim은 모자란 개수만큼 묶어서 한 번에 요청한다.
+    """
+    events: list[dict] = []
+    idx = 0
+    while len(events) < limit and idx < len(items):
+        wave: list[dict] = []
+        while idx < len(items) and len(wave) < limit - len(events):
+            batch = items[idx:idx + limit - len(events) - len(wave)]
+            idx += len(batch)
+            claimed = set(await seen_links.claim_many([it["link"] for it in batch]))
+            for it in batch:
+                if it["link"] in claimed:
+                    claimed.discard(it["link"])
+                    wave.append(it)
+        if not wave:
+            break
+        results = await asyncio.gather(*(build_event(it) for it in wave))
+        await seen_links.release(it["link"] for it, event in zip(wave, results) if not event)
+        for it, event in zip(wave, results):
+            if not event:
                 continue
+            events.append(event)
+            seen_links.add(it["link"])
+            print("queue:", (event.get("title") or "")[:60])
+    return events
 
-            event = {
-                "source": "naver_finance",
-                "section": "증권/주요뉴스",
-                "source_list_url": it.get("source_list_url"),
-                "finance_origin_link": it.get("finance_origin_link"),
-                "url": link,
-                "link": link,  # legacy alias
-                "title": detail["title"],
-                "published_at": detail["published_at"] or it.get("wdate"),
-                "content": detail["body"],
-                "body": detail["body"],  # legacy alias
-                "press": it.get("press"),
-                "summary": it.get("summary"),
-                "crawled_at": datetime.now(timezone.utc).isoformat(),
-            }
-            event = apply_event_time_fields(event)
 
-            pending_events.append(event)
-            print("queue:", detail["title"][:60])
+async def build_naver_event(crawler: AsyncCrawler, it: dict) -> dict | None:
+    link = it["link"]
+    print("fetch:", link)
+    try:
+        detail = await crawl_detail(crawler, link, parse_mobile_article_detail)
+    except Exception as e:
+        if is_http_status(e, 429):
+            print(f"  warn: naver detail rate-limited, skip: {link}")
+        else:
+            print(f"  warn: naver detail fetch fail err={e!r}")
+        return None
+    if not detail:
+        print("  skip: no title/body")
+        return None
 
-            seen_links.add(link)
-            produced_by_source["naver_finance"] = produced_by_source.get("naver_finance", 0) + 1
-            total_produced += 1
-            time.sleep(0.35 + random.random() * 0.55)
+    event = {
+        "source": "naver_finance",
+        "section": "증권/주요뉴스",
+        "source_list_url": it.get("source_list_url"),
+        "finance_origin_link": it.get("finance_origin_link"),
+        "url": link,
+        "link": link,  # legacy alias
+        "title": detail["title"],
+        "published_at": detail["published_at"] or it.get("wdate"),
+        "content": detail["body"],
+        "body": detail["body"],  # legacy alias
+        "press": it.get("press"),
+        "summary": it.get("summary"),
+        "crawled_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return apply_event_time_fields(event)
 
-    if ENABLE_COINNESS and COINNESS_LIMIT > 0:
-        items = crawl_coinness_items_multi_pages(COINNESS_PAGES)
-        for it in items:
-            if produced_by_source.get("coinness", 0) >= COINNESS_LIMIT:
-                break
 
-            link = it["link"]
-            if link in seen_links:
-                continue
+async def build_coinness_event(crawler: AsyncCrawler, it: dict) -> dict | None:
+    link = it["link"]
+    print("fetch:", link)
+    detail = None
 
-            print("fetch:", link)
-            detail = None
+    try:
+        detail = await crawl_article_detail(crawler, link)
+    except Exception as e:
+        print(f"  warn: coinness origin detail fetch fail err={e!r}")
 
+    if (
+        not detail
+        or not _looks_like_full_article(
+            detail.get("body"),
+            it.get("summary"),
+            it.get("title"),
+        )
+    ):
+        coinness_article_id = it.get("coinness_id")
+        if coinness_article_id is not None:
+            coinness_detail_url = f"{COINNESS_BASE}/article/{coinness_article_id}"
             try:
-                detail = crawl_article_detail(link)
-            except Exception as e:
-                print(f"  warn: coinness origin detail fetch fail err={e!r}")
-
-            if (
-                not detail
-                or not _looks_like_full_article(
-                    detail.get("body"),
+                coinness_detail = await crawl_detail(crawler, coinness_detail_url, parse_coinness_article_detail)
+                if coinness_detail and _looks_like_full_article(
+                    coinness_detail.get("body"),
                     it.get("summary"),
                     it.get("title"),
-                )
-            ):
-                coinness_article_id = it.get("coinness_id")
-                if coinness_article_id is not None:
-                    coinness_detail_url = f"{COINNESS_BASE}/article/{coinness_article_id}"
-                    try:
-                        coinness_detail = crawl_coinness_article_detail(coinness_detail_url)
-                        if coinness_detail and _looks_like_full_article(
-                            coinness_detail.get("body"),
-                            it.get("summary"),
-                            it.get("title"),
-                        ):
-                            detail = coinness_detail
-                    except Exception as e:
-                        print(f"  warn: coinness detail page fetch fail err={e!r}")
-
-            if not detail:
-                fallback_body = it.get("body_hint") or it.get("summary") or it.get("title")
-                if not fallback_body:
-                    print("  skip: no title/body")
-                    continue
-                detail = {
-                    "title": it.get("title"),
-                    "published_at": it.get("published_at"),
-                    "body": fallback_body,
-                }
-
-            event = {
-                "source": "coinness",
-                "section": "코인/전체뉴스",
-                "source_list_url": it.get("source_list_url"),
-                "url": link,
-                "link": link,  # legacy alias
-                "title": detail.get("title") or it.get("title"),
-                "published_at": detail.get("published_at") or it.get("published_at"),
-                "content": detail["body"],
-                "body": detail["body"],  # legacy alias
-                "press": "coinness",
-                "summary": it.get("summary") or it.get("title"),
-                "coinness_id": it.get("coinness_id"),
-                "crawled_at": datetime.now(timezone.utc).isoformat(),
-            }
-            event = apply_event_time_fields(event)
-
-            pending_events.append(event)
-            print("queue:", detail["title"][:60])
-
-            seen_links.add(link)
-            produced_by_source["coinness"] = produced_by_source.get("coinness", 0) + 1
-            total_produced += 1
-            time.sleep(0.35 + random.random() * 0.55)
+                ):
+                    detail = coinness_detail
+            except Exception as e:
+                print(f"  warn: coinness detail page fetch fail err={e!r}")
+
+    if not detail:
+        fallback_body = it.get("body_hint") or it.get("summary") or it.get("title")
+        if not fallback_body:
+            print("  skip: no title/body")
+            return None
+        detail = {
+            "title": it.get("title"),
+            "published_at": it.get("published_at"),
+            "body": fallback_body,
+        }
 
-    if ENABLE_EINFOMAX and EINFOMAX_LIMIT > 0:
-        items = crawl_einfomax_items_multi_pages(EINFOMAX_QUERY, EINFOMAX_PAGES)
-        for it in items:
-            if produced_by_source.get("einfomax_coin", 0) >= EINFOMAX_LIMIT:
-                break
+    event = {
+        "source": "coinness",
+        "section": "코인/전체뉴스",
+        "source_list_url": it.get("source_list_url"),
+        "url": link,
+        "link": link,  # legacy alias
+        "title": detail.get("title") or it.get("title"),
+        "published_at": detail.get("published_at") or it.get("published_at"),
+        "content": detail["body"],
+        "body": detail["body"],  # legacy alias
+        "press": "coinness",
+        "summary": it.get("summary") or it.get("title"),
+        "coinness_id": it.get("coinness_id"),
+        "crawled_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return apply_event_time_fields(event)
 
-            link = it["link"]
-            if link in seen_links:
-                continue
 
-            print("fetch:", link)
-            try:
-                detail = crawl_einfomax_article_detail(link)
-            except Exception as e:
-                print(f"  skip: einfomax detail fetch fail err={e!r}")
-                continue
-            if not detail:
-                print("  skip: no title/body")
-                continue
-
-            event = {
-                "source": "einfomax_coin",
-                "section": "코인/연합인포맥스",
-                "source_list_url": it.get("source_list_url"),
-                "url": link,
-                "link": link,  # legacy alias
-                "title": detail["title"],
-                "published_at": detail.get("published_at") or it.get("published_at"),
-                "content": detail["body"],
-                "body": detail["body"],  # legacy alias
-                "press": it.get("press") or "연합인포맥스",
-                "summary": it.get("summary"),
-                "crawled_at": datetime.now(timezone.utc).isoformat(),
-            }
-            event = apply_event_time_fields(event)
+async def build_einfomax_event(crawler: AsyncCrawler, it: dict) -> dict | None:
+    link = it["link"]
+    print("fetch:", link)
+    try:
+        detail = await crawl_detail(crawler, link, parse_einfomax_article_detail)
+    except Exception as e:
+        print(f"  skip: einfomax detail fetch fail err={e!r}")
+        return None
+    if not detail:
+        print("  skip: no title/body")
+        return None
 
-            pending_events.append(event)
-            print("queue:", detail["title"][:60])
+    event = {
+        "source": "einfomax_coin",
+        "section": "코인/연합인포맥스",
+        "source_list_url": it.get("source_list_url"),
+        "url": link,
+        "link": link,  # legacy alias
+        "title": detail["title"],
+        "published_at": detail.get("published_at") or it.get("published_at"),
+        "content": detail["body"],
+        "body": detail["body"],  # legacy alias
+        "press": it.get("press") or "연합인포맥스",
+        "summary": it.get("summary"),
+        "crawled_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return apply_event_time_fields(event)
 
-            seen_links.add(link)
-            produced_by_source["einfomax_coin"] = produced_by_source.get("einfomax_coin", 0) + 1
-            total_produced += 1
-            time.sleep(0.35 + random.random() * 0.55)
 
-    if (
-        ENABLE_COIN_FALLBACK
-        and COIN_FALLBACK_LIMIT > 0
-        and produced_by_source.get("coinness", 0) < COINNESS_LIMIT
-    ):
-        fallback_items = crawl_naver_coin_items_multi_pages(COIN_KEYWORDS, COIN_FALLBACK_PAGES)
-        for it in fallback_items:
-            if produced_by_source.get("coin_fallback", 0) >= COIN_FALLBACK_LIMIT:
-                break
+async def build_coin_fallback_event(crawler: AsyncCrawler, it: dict) -> dict | None:
+    link = it["link"]
+    print("fetch:", link)
+    try:
+        detail = await crawl_detail(crawler, link, parse_mobile_article_detail)
+    except Exception as e:
+        if is_http_status(e, 429):
+            print(f"  warn: naver coin fallback rate-limited, skip: {link}")
+        else:
+            print(f"  warn: naver coin fallback detail fail err={e!r}")
+        return None
+    if not detail:
+        print("  skip: no title/body")
+        return None
 
-            link = it["link"]
-            if link in seen_links:
-                continue
+    event = {
+        "source": "naver_coin_fallback",
+        "section": "코인/검색뉴스",
+        "source_list_url": it.get("source_list_url"),
+        "url": link,
+        "link": link,  # legacy alias
+        "title": detail["title"],
+        "published_at": detail.get("published_at"),
+        "content": detail["body"],
+        "body": detail["body"],  # legacy alias
+        "press": "naver",
+        "summary": it.get("title"),
+        "keyword": it.get("keyword"),
+        "crawled_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return apply_event_time_fields(event)
 
-            print("fetch:", link)
-            try:
-                detail = crawl_mobile_article_detail(link)
-            except Exception as e:
-                if is_http_status(e, 429):
-                    print(f"  warn: naver coin fallback rate-limited, skip: {link}")
-                    time.sleep(1.5 + random.random() * 1.5)
-                else:
-                    print(f"  warn: naver coin fallback detail fail err={e!r}")
-                continue
-            if not detail:
-                print("  skip: no title/body")
-                continue
 
-            event = {
-                "source": "naver_coin_fallback",
-                "section": "코인/검색뉴스",
-                "source_list_url": it.get("source_list_url"),
-                "url": link,
-                "link": link,  # legacy alias
-                "title": detail["title"],
-                "published_at": detail.get("published_at"),
-                "content": detail["body"],
-                "body": detail["body"],  # legacy alias
-                "press": "naver",
-                "summary": it.get("title"),
-                "keyword": it.get("keyword"),
-                "crawled_at": datetime.now(timezone.utc).isoformat(),
-            }
-            event = apply_event_time_fields(event)
+async def run_once(crawler: AsyncCrawler, seen_links: SeenLinks) -> tuple[int, dict[str, int]]:
+    # ✅ 실행 간 중복 전송 줄이기(크론에서도 효과)
+    started = time.monotonic()
+
+    async def naver() -> dict[str, list[dict]]:
+        if not (ENABLE_NAVER and NAVER_LIMIT > 0):
+            return {}
+        items = await crawl_mainnews_items_multi_pages(crawler, PAGES, seen_links)
+        return {
+            "naver_finance": await collect_events(
+                items, NAVER_LIMIT, seen_links, lambda it: build_naver_event(crawler, it)
+            )
+        }
 
-            pending_events.append(event)
-            print("queue:", detail["title"][:60])
+    async def coin() -> dict[str, list[dict]]:
+        out: dict[str, list[dict]] = {}
+        if ENABLE_COINNESS and COINNESS_LIMIT > 0:
+            items = await crawl_coinness_items_multi_pages(crawler, COINNESS_PAGES, seen_links)
+            out["coinness"] = await collect_events(
+                items, COINNESS_LIMIT, seen_links, lambda it: build_coinness_event(crawler, it)
+            )
+        if ENABLE_COIN_FALLBACK and COIN_FALLBACK_LIMIT > 0 and len(out.get("coinness", [])) < COINNESS_LIMIT:
+            items = await crawl_naver_coin_items_multi_pages(
+                crawler, COIN_KEYWORDS, COIN_FALLBACK_PAGES, seen_links
+            )
+            out["coin_fallback"] = await collect_events(
+                items, COIN_FALLBACK_LIMIT, seen_links, lambda it: build_coin_fallback_event(crawler, it)
+            )
+        return out
+
+    async def einfomax() -> dict[str, list[dict]]:
+        if not (ENABLE_EINFOMAX and EINFOMAX_LIMIT > 0):
+            return {}
+        items = await crawl_einfomax_items_multi_pages(crawler, EINFOMAX_QUERY, EINFOMAX_PAGES, seen_links)
+        return {
+            "einfomax_coin": await collect_events(
+                items, EINFOMAX_LIMIT, seen_links, lambda it: build_einfomax_event(crawler, it)
+            )
+        }
 
-            seen_links.add(link)
-            produced_by_source["coin_fallback"] = produced_by_source.get("coin_fallback", 0) + 1
-            total_produced += 1
-            time.sleep(0.35 + random.random() * 0.55)
+    # 소스별 수집은 서로 다른 호스트라 동시에 진행 (호스트별 제한은 crawler가 관리)
+    pending_events: list[dict] = []
+    produced_by_source: dict[str, int] = {}
+    try:
+        results = await asyncio.gather(naver(), coin(), einfomax())
+    except BaseException:
+        await seen_links.abort()
+        raise
+    for result in results:
+        for source, events in result.items():
+            if events:
+                produced_by_source[source] = len(events)
+                pending_events.extend(events)
+
+    # 소스끼리 같은 기사 링크가 겹칠 수 있어 url 기준으로 한 번 더 거른다.
+    pending_events = dedupe_items(pending_events, key=lambda ev: ev["url"])
+    total_produced = len(pending_events)
 
     # 소스별 수집 완료 후, 한 번에 시간순 정렬해서 반영
-    if pending_events:
-        pending_events.sort(key=news_sort_key, reverse=True)
-        for event in pending_events:
-            producer.send(TOPIC, value=event)
-        for event in pending_events:
-            print("produce:", event.get("title", "")[:60])
-
-    producer.flush()
-    save_seen(seen_links)
+    try:
+        if pending_events:
+            pending_events.sort(key=news_sort_key, reverse=True)
+            for event in pending_events:
+                producer.send(TOPIC, value=event)
+            for event in pending_events:
+                print("produce:", event.get("title", "")[:60])
+
+        await asyncio.to_thread(producer.flush)
+    except BaseException:
+        await seen_links.abort()
+        raise
+    # Kafka 발행이 끝난 링크만 seen으로 기록
+    await seen_links.commit()
     print(
-        f"done. produced_total={total_produced} "
+        f"done. produced_total={total_produced} elapsed={time.monotonic() - started:.1f}s "
         f"naver_limit={NAVER_LIMIT} coinness_limit={COINNESS_LIMIT} einfomax_limit={EINFOMAX_LIMIT} "
         f"naver_pages={PAGES} coinness_pages={COINNESS_PAGES} einfomax_pages={EINFOMAX_PAGES} "
-        f"by_source={produced_by_source}"
+        f"by_source={produced_by_source} hosts={crawler.stats()}"
     )
     return total_produced, produced_by_source
 
 
-def main():
-    if not RUN_FOREVER:
-        run_once()
-        return
+async def run() -> None:
+    seen_links = await open_seen_store(SEEN_FILE)
+    async with AsyncCrawler(HEADERS, CRAWLER_HOST_POLICIES) as crawler:
+        if not RUN_FOREVER:
+            await run_once(crawler, seen_links)
+            return
 
-    print(f"run_forever=1 poll_interval_sec={POLL_INTERVAL_SEC}")
-    while True:
-        started = datetime.now(timezone.utc).isoformat()
-        try:
-            total_produced, produced_by_source = run_once()
-            print(
-                f"[loop] started={started} produced_total={total_produced} "
-                f"by_source={produced_by_source}"
-            )
-        except Exception as e:
-            print(f"[loop] started={started} error={e!r}")
-        time.sleep(max(POLL_INTERVAL_SEC, 5))
+        print(f"run_forever=1 poll_interval_sec={POLL_INTERVAL_SEC}")
+        while True:
+            started = datetime.now(timezone.utc).isoformat()
+            try:
+                total_produced, produced_by_source = await run_once(crawler, seen_links)
+                print(
+                    f"[loop] started={started} produced_total={total_produced} "
+                    f"by_source={produced_by_source}"
+                )
+            except Exception as e:
+                print(f"[loop] started={started} error={e!r}")
+            await asyncio.sleep(max(POLL_INTERVAL_SEC, 5))
+
+
+def main():
+    asyncio.run(run())
 
 
 if __name__ == "__main__":
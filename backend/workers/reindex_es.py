@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Elasticsearch 뉴스 인덱스 무중단 재색인 (alias swap)
+
+dense_vector dims / analyzer / HNSW 파라미터를 바꿀 때 인덱스를 지우지 않고 새 버전으로 옮긴다.
+검색(read alias)은 swap 직전까지 옛 인덱스를, swap 이후 새 인덱스를 본다.
+
+reindex 순서:
+  1. 새 버전 인덱스 생성 (`news_v{N+1}`, 새 매핑)
+  2. dual-write 시작: write alias에 새 인덱스 추가 (is_write_index=false)
+     → elastic_consumer/backfill_es가 ES_ALIAS_REFRESH_SEC 안에 옛/새 인덱스 모두에 쓰기 시작
+  3. 복사
+     - copy   : 서버 측 _reindex (op_type=create: dual-write로 먼저 들어온 문서는 덮지 않음). 매핑만 바뀔 때
+     - reembed: 옛 인덱스를 PIT로 스캔해 새 모델/dims로 임베딩 후 bulk. 이후 embedding 없는 문서를 채움
+  4. 검증: 새 인덱스 문서 수 >= 옛 인덱스 문서 수 x --min-ratio (미달이면 swap하지 않고 종료)
+  5. _aliases 한 번으로 read/write alias 전환 (원자적). 옛 인덱스는 grace 동안 dual-write 대상으로 남긴다
+  6. grace(ES_ALIAS_REFRESH_SEC) 후 옛 인덱스를 write alias에서 제거, --delete-old면 삭제
+
+사용:
+  python reindex_es.py status
+  python reindex_es.py reindex [--mode copy|reembed] [--version N] [--dims D] [--hnsw-m M] [--hnsw-ef EF]
+                               [--vector-type hnsw|int8_hnsw|int4_hnsw]
+  python reindex_es.py fill --index news_v2      # embedding 없는 문서만 임베딩
+  python reindex_es.py swap --to news_v1         # 롤백 (옛 인덱스를 지우지 않았을 때)
+
+예전 고정 인덱스(`news`가 실제 인덱스)에서 처음 옮길 때는 alias 이름을 비우기 위해
+swap 요청 안에서 옛 인덱스를 삭제하므로 --delete-old가 필요하다.
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Iterator, Optional
+
+import requests
+
+import es_index
+from es_index import ES_READ_ALIAS, ES_URL, ES_WRITE_ALIAS
+
+BATCH_SIZE = 200
+PIT_KEEP_ALIVE = "5m"
+TASK_POLL_SEC = 5
+BULK_MAX_ATTEMPTS = 3
+MISSING_EMBEDDING = {"bool": {"must_not": {"exists": {"field": "embedding"}}}}
+
+
+def count(session: requests.Session, index: str) -> int:
+    session.post(f"{ES_URL}/{index}/_refresh", timeout=30)
+    resp = session.get(f"{ES_URL}/{index}/_count", timeout=30)
+    return int(es_index.check_response(resp, f"count {index}").get("count", 0))
+
+
+def wait_for_writers(reason: str) -> None:
+    wait = es_index.ES_ALIAS_REFRESH_SEC + 5
+    print(f"[reindex] {reason}: writer가 write alias를 다시 읽도록 {wait:.0f}초 대기", flush=True)
+    time.sleep(wait)
+
+
+# ── 스캔 / bulk ─────────────────────────────────────────────────────────────
+
+def scan(session: requests.Session, index: str, query: Optional[dict[str, Any]] = None) -> Iterator[list[dict]]:
+    """PIT + search_after로 스캔 (스캔 중 들어오는 dual-write는 보지 않는 스냅샷)."""
+    resp = session.post(f"{ES_URL}/{index}/_pit", params={"keep_alive": PIT_KEEP_ALIVE}, timeout=30)
+    pit_id = es_index.check_response(resp, f"open pit {index}")["id"]
+    search_after = None
+    try:
+        while True:
+            body: dict[str, Any] = {
+                "size": BATCH_SIZE,
+                "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                "sort": [{"_shard_doc": "asc"}],
+                "query": query or {"match_all": {}},
+                "_source": {"excludes": ["embedding"]},
+            }
+            if search_after is not None:
+                body["search_after"] = search_after
+            data = es_index.check_response(session.post(f"{ES_URL}/_search", json=body, timeout=60), "scan")
+            pit_id = data.get("pit_id", pit_id)
+            hits = data.get("hits", {}).get("hits", [])
+            if not hits:
+                return
+            yield hits
+            search_after = hits[-1]["sort"]
+    finally:
+        session.delete(f"{ES_URL}/_pit", json={"id": pit_id}, timeout=30)
+
+
+def bulk_update(session: requests.Session, index: str, items: list[tuple[str, dict[str, Any]]]) -> tuple[int, int]:
+    """(_id, 부분 문서) 목록을 upsert. 요청 자체 실패는 backoff 후 재시도. (성공 수, 실패 수) 반환."""
+    lines = []
+    for doc_id, doc in items:
+        lines.append(json.dumps({"update": {"_index": index, "_id": doc_id, "retry_on_conflict": 3}}))
+        lines.append(json.dumps({"doc": doc, "doc_as_upsert": True}, ensure_ascii=False))
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+
+    for attempt in range(BULK_MAX_ATTEMPTS):
+        try:
+            resp = session.post(
+                f"{ES_URL}/_bulk",
+                headers={"Content-Type": "application/x-ndjson"},
+                data=payload,
+                timeout=60,
+            )
+            if resp.status_code < 400:
+                results = resp.json().get("items", [])
+                ok = sum(1 for item in results if item.get("update", {}).get("status") in (200, 201))
+                return ok, len(items) - ok
+            print(f"[bulk] HTTP {resp.status_code}: {resp.text[:300]}", flush=True)
+        except requests.RequestException as e:
+            print(f"[bulk] request error (attempt {attempt + 1}): {e!r}", flush=True)
+        time.sleep(2 ** attempt)
+    raise RuntimeError(f"bulk request failed after {BULK_MAX_ATTEMPTS} attempts ({len(items)} docs)")
+
+
+# ── 복사 ─────────────────────────────────────────────────────────────────────
+
+def copy_with_reindex(session: requests.Session, source: str, target: str) -> None:
+    """서버 측 _reindex를 비동기 task로 실행하고 끝날 때까지 진행률을 출력한다."""
+    body = {
+        "conflicts": "proceed",
+        "source": {"index": source, "size": 1000},
+        "dest": {"index": target, "op_type": "create"},
+    }
+    resp = session.post(
+        f"{ES_URL}/_reindex",
+        params={"wait_for_completion": "false", "slices": "auto"},
+        json=body,
+        timeout=30,
+    )
+    task_id = es_index.check_response(resp, "reindex start")["task"]
+    print(f"[reindex] task={task_id}", flush=True)
+    while True:
+        time.sleep(TASK_POLL_SEC)
+        task = es_index.check_response(session.get(f"{ES_URL}/_tasks/{task_id}", timeout=30), "task status")
+        status = task.get("task", {}).get("status", {})
+        print(
+            f"[reindex] created={status.get('created', 0):,} version_conflicts={status.get('version_conflicts', 0):,}"
+            f" total={status.get('total', 0):,}",
+            flush=True,
+        )
+        if task.get("completed"):
+            failures = (task.get("response") or {}).get("failures") or []
+            if task.get("error") or failures:
+                raise RuntimeError(f"reindex failed: {json.dumps(task.get('error') or failures[:3])[:500]}")
+            return
+
+
+def copy_with_reembed(session: requests.Session, source: str, target: str) -> None:
+    """옛 인덱스 문서를 새 모델로 임베딩해 옮긴다 (옛 벡터는 읽지 않음). 끝나면 embedding 없는 문서를 채운다."""
+    from backfill_es import BatchEmbedder
+
+    embedder = BatchEmbedder()
+    ok = failed = 0
+    try:
+        for hits in scan(session, source):
+            docs = [hit["_source"] for hit in hits]
+            embedder.fill(docs)
+            batch_ok, batch_failed = bulk_update(session, target, [(hit["_id"], doc) for hit, doc in zip(hits, docs)])
+            ok += batch_ok
+            failed += batch_failed
+            if (ok + failed) % (BATCH_SIZE * 10) < len(hits):
+                print(f"[reembed] copied={ok:,} failed={failed:,}", flush=True)
+        print(f"[reembed] copy done copied={ok:,} failed={failed:,}", flush=True)
+        fill_missing(session, target, embedder)
+    finally:
+        embedder.close()
+
+
+def fill_missing(session: requests.Session, index: str, embedder: Any = None) -> int:
+    """embedding이 없는 문서(dual-write 중 dims가 달라 벡터를 뺀 문서 등)를 임베딩한다."""
+    from backfill_es import BatchEmbedder
+
+    own = embedder is None
+    embedder = embedder or BatchEmbedder()
+    session.post(f"{ES_URL}/{index}/_refresh", timeout=30)
+    filled = 0
+    try:
+        for hits in scan(session, index, MISSING_EMBEDDING):
+            docs = [hit["_source"] for hit in hits]
+            embedder.fill(docs)
+            updates = [(hit["_id"], {"embedding": doc["embedding"]}) for hit, doc in zip(hits, docs)
+                       if doc.get("embedding")]
+            if updates:
+                filled += bulk_update(session, index, updates)[0]
+        print(f"[fill] index={index} embedded={filled:,}", flush=True)
+        return filled
+    finally:
+        if own:
+            embedder.close()
+
+
+# ── alias 전환 ───────────────────────────────────────────────────────────────
+
+def current_source(session: requests.Session) -> tuple[str, bool]:
+    """(현재 검색 인덱스, 예전 고정 인덱스 여부)."""
+    es_index.ensure_aliases(session)
+    if es_index.is_concrete_index(session, ES_READ_ALIAS):
+        return ES_READ_ALIAS, True
+    reads = es_index.alias_targets(session, ES_READ_ALIAS)
+    if len(reads) != 1:
+        raise RuntimeError(f"read alias {ES_READ_ALIAS} must point to one index: {sorted(reads)}")
+    return next(iter(reads)), False
+
+
+def swap(session: requests.Session, source: str, target: str, legacy: bool) -> None:
+    """read alias를 target으로, write index도 target으로. source는 dual-write 대상으로 남긴다 (grace)."""
+    actions: list[dict[str, Any]] = [
+        {"add": {"index": target, "alias": ES_READ_ALIAS}},
+        {"add": {"index": target, "alias": ES_WRITE_ALIAS, "is_write_index": True}},
+    ]
+    if legacy:
+        # `news` 이름을 alias로 쓰려면 같은 요청에서 옛 인덱스를 지워야 한다.
+        # writer가 캐시한 `news`로 보내는 문서는 이제 alias를 통해 새 인덱스로 간다.
+        actions.append({"remove_index": {"index": source}})
+    else:
+        actions.append({"remove": {"index": source, "alias": ES_READ_ALIAS}})
+        actions.append({"add": {"index": source, "alias": ES_WRITE_ALIAS, "is_write_index": False}})
+    es_index.update_aliases(session, actions)
+    print(f"[swap] {ES_READ_ALIAS}: {source} → {target}", flush=True)
+
+
+def finish_cutover(session: requests.Session, source: str, delete_old: bool) -> None:
+    wait_for_writers("swap 완료")
+    es_index.update_aliases(session, [{"remove": {"index": source, "alias": ES_WRITE_ALIAS}}])
+    print(f"[swap] dual-write 종료: {source} 를 {ES_WRITE_ALIAS}에서 제거", flush=True)
+    if delete_old:
+        es_index.check_response(session.delete(f"{ES_URL}/{source}", timeout=60), f"delete {source}")
+        print(f"[swap] {source} 삭제", flush=True)
+    else:
+        print(f"[swap] {source} 유지 (롤백: python reindex_es.py swap --to {source})", flush=True)
+
+
+# ── 명령 ─────────────────────────────────────────────────────────────────────
+
+def cmd_status(session: requests.Session, args: argparse.Namespace) -> None:
+    reads = es_index.alias_targets(session, ES_READ_ALIAS)
+    writes = es_index.alias_targets(session, ES_WRITE_ALIAS)
+    if not reads and es_index.is_concrete_index(session, ES_READ_ALIAS):
+        print(f"{ES_READ_ALIAS}: 예전 고정 인덱스 (alias 아님)")
+        reads = {ES_READ_ALIAS: True}
+    for index in sorted(set(reads) | set(writes)):
+        field = es_index.embedding_fields(session, index).get(index, {})
+        dims = field.get("dims")
+        vector_type = field.get("index_options", {}).get("type", "-")
+        roles = [name for name, aliases in (("read", reads), ("write", writes)) if index in aliases]
+        if index in writes and not writes[index]:
+            roles[-1] = "dual-write"
+        print(f"{index}: docs={count(session, index):,} dims={dims} vector={vector_type} aliases={','.join(roles)}")
+
+
+def cmd_reindex(session: requests.Session, args: argparse.Namespace) -> None:
+    source, legacy = current_source(session)
+    if legacy and not args.delete_old:
+        raise SystemExit(
+            f"{source}는 예전 고정 인덱스입니다. alias로 바꾸려면 swap 때 삭제해야 하므로 --delete-old를 지정하세요."
+        )
+    version = args.version or es_index.parse_version(source) + 1
+    target = es_index.versioned_name(version)
+    if target == source:
+        raise SystemExit(f"target {target} is the current index")
+
+    source_dims = es_index.embedding_dims(session, source).get(source)
+    dims = args.dims or es_index.ES_EMBED_DIMS
+    if args.mode == "copy" and source_dims and source_dims != dims:
+        raise SystemExit(f"dims 변경({source_dims} → {dims})은 옛 벡터를 쓸 수 없습니다. --mode reembed")
+
+    if es_index.index_exists(session, target):
+        print(f"[reindex] {target} 이미 존재 → 이어서 진행", flush=True)
+    else:
+        mapping = es_index.build_mapping(dims, args.hnsw_m, args.hnsw_ef, args.vector_type)
+        es_index.create_index(session, target, mapping)
+        print(f"[reindex] created {target} dims={dims} vector={args.vector_type} m={args.hnsw_m} "
+              f"ef_construction={args.hnsw_ef}", flush=True)
+
+    es_index.update_aliases(session, [{"add": {"index": target, "alias": ES_WRITE_ALIAS, "is_write_index": False}}])
+    wait_for_writers("dual-write 시작")
+
+    started = time.monotonic()
+    if args.mode == "reembed":
+        copy_with_reembed(session, source, target)
+    else:
+        copy_with_reindex(session, source, target)
+
+    source_count, target_count = count(session, source), count(session, target)
+    print(f"[verify] {source}={source_count:,} {target}={target_count:,} "
+          f"elapsed={time.monotonic() - started:,.0f}s", flush=True)
+    if target_count < source_count * args.min_ratio:
+        print("[verify] 문서 수 부족 → swap하지 않음 (dual-write는 유지, 다시 실행하면 이어서 복사)", flush=True)
+        sys.exit(1)
+    if args.no_swap:
+        print(f"[reindex] --no-swap: 준비 완료. python reindex_es.py swap --to {target}", flush=True)
+        return
+
+    swap(session, source, target, legacy)
+    if legacy:
+        print(f"[swap] 예전 고정 인덱스 {source} 삭제됨", flush=True)
+        return
+    finish_cutover(session, source, args.delete_old)
+
+
+def cmd_fill(session: requests.Session, args: argparse.Namespace) -> None:
+    fill_missing(session, args.index or es_index.ensure_aliases(session))
+
+
+def cmd_swap(session: requests.Session, args: argparse.Namespace) -> None:
+    source, legacy = current_source(session)
+    if legacy:
+        raise SystemExit("예전 고정 인덱스에서는 reindex 명령을 사용하세요.")
+    if source == args.to:
+        print(f"[swap] {ES_READ_ALIAS} already → {args.to}")
+        return
+    if not es_index.index_exists(session, args.to):
+        raise SystemExit(f"{args.to} 인덱스가 없습니다.")
+    # 롤백도 같은 순서: 대상에 dual-write → 대기 → 원자 전환 → grace 후 정리
+    es_index.update_aliases(session, [{"add": {"index": args.to, "alias": ES_WRITE_ALIAS, "is_write_index": False}}])
+    wait_for_writers("dual-write 시작")
+    swap(session, source, args.to, legacy=False)
+    finish_cutover(session, source, delete_old=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Zero-downtime reindex for the news index (read/write aliases)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("status", help="show aliases, versions and doc counts")
+
+    reindex = sub.add_parser("reindex", help="copy or re-embed into a new versioned index and swap aliases")
+    reindex.add_argument("--mode", choices=("copy", "reembed"), default="copy")
+    reindex.add_argument("--version", type=int, default=0, help="target version (default: current + 1)")
+    reindex.add_argument("--dims", type=int, default=0, help="embedding dims (default: BEDROCK_EMBED_DIMS)")
+    reindex.add_argument("--hnsw-m", type=int, default=es_index.ES_HNSW_M)
+    reindex.add_argument("--hnsw-ef", type=int, default=es_index.ES_HNSW_EF_CONSTRUCTION)
+    reindex.add_argument("--vector-type", choices=("hnsw", "int8_hnsw", "int4_hnsw"),
+                         default=es_index.ES_VECTOR_INDEX_TYPE, help="dense_vector index_options.type")
+    reindex.add_argument("--min-ratio", type=float, default=1.0, help="target/source doc count needed to swap")
+    reindex.add_argument("--no-swap", action="store_true", help="stop after copy + verify (swap later)")
+    reindex.add_argument("--delete-old", action="store_true", help="delete the old index after cutover")
+
+    fill = sub.add_parser("fill", help="embed documents without an embedding")
+    fill.add_argument("--index", default="", help="index to fill (default: current write index)")
+
+    swap_cmd = sub.add_parser("swap", help="point read/write aliases at an existing index (rollback)")
+    swap_cmd.add_argument("--to", required=True)
+
+    args = parser.parse_args()
+    session = requests.Session()
+    try:
+        {"status": cmd_status, "reindex": cmd_reindex, "fill": cmd_fill, "swap": cmd_swap}[args.command](session, args)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
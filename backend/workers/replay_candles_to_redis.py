@@ -3,8 +3,10 @@
 Replay Candles -> Redis (V3 Backfill)
 ============================================
 
-- MongoDB `candles_1m` 데이터를 Redis 캔들 키로 복원한다.
+- MongoDB `candles_1m` 및 상위 해상도(`candles_5m`/`15m`/`1h`/`1d`) 데이터를 Redis 캔들 키로 복원한다.
 - 장애/재기동 후 캔들 캐시 복구용 스크립트
+- 확정 캔들은 candle_codec 포맷으로 `candles:{symbol}:{res}:packed` 에 기록한다.
+- --rebuild-rollups: 상위 해상도를 `candles_1m` 에서 다시 집계한다 (롤업 도입 이전 구간 백필용).
 """
 
 import argparse
@@ -13,16 +15,23 @@ import json
 import os
 from datetime import datetime, timedelta, timezone
 from typing import Any
+from zoneinfo import ZoneInfo
 
 import redis.asyncio as redis
 from motor.motor_asyncio import AsyncIOMotorClient
 
+import ohlcv
+from candle_codec import APPEND_TRIM_LUA, RECORD_CHARS, encode_candles, packed_key
+
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "clouddx")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 CANDLE_KEEP = max(200, int(os.getenv("CANDLE_KEEP", "2000")))
 LIST_TTL_SECONDS = max(3600, int(os.getenv("CANDLE_LIST_TTL_SECONDS", "1209600")))
 CURRENT_TTL_SECONDS = max(300, int(os.getenv("CANDLE_CURRENT_TTL_SECONDS", "7200")))
+KST = ZoneInfo("Asia/Seoul")
+RESOLUTIONS = ("1m", "5m", "15m", "1h", "1d")
+RESOLUTION_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
 
 
 def _normalize_symbol(token: str) -> str:
@@ -45,12 +54,15 @@ async def replay_symbol(
     symbol: str,
     from_bucket: int,
     reset: bool,
+    resolution: str = "1m",
+    rebuild: bool = False,
 ):
-    key = f"candles:{symbol}:1m"
-    current_key = f"candles:{symbol}:1m:current"
+    key = packed_key(symbol, resolution)
+    legacy_key = f"candles:{symbol}:{resolution}"
+    current_key = f"candles:{symbol}:{resolution}:current"
 
     if reset:
-        await redis_client.delete(key, current_key)
+        await redis_client.delete(key, legacy_key, current_key)
 
     cursor = (
         mongo_col.find(
@@ -61,36 +73,54 @@ async def replay_symbol(
     )
     rows = await cursor.to_list(length=None)
     if not rows:
-        print(f"[SKIP] {symbol}: no rows in Mongo")
+        print(f"[SKIP] {symbol}/{resolution}: no rows in Mongo")
         return
 
-    serialized_rows: list[str] = []
-    for row in rows:
-        payload = {
-            "symbol": symbol,
-            "asset_type": row.get("asset_type"),
-            "bucket_start": _int_or_default(row.get("bucket_start")),
-            "date": row.get("date"),
-            "open": float(row.get("open", 0)),
-            "high": float(row.get("high", 0)),
-            "low": float(row.get("low", 0)),
-            "close": float(row.get("close", 0)),
-            "volume": float(row.get("volume", 0)),
-            "updated_at": row.get("updated_at") or datetime.now(timezone.utc).isoformat(timespec="seconds"),
-        }
-        serialized_rows.append(json.dumps(payload))
-
-    if serialized_rows:
-        await redis_client.rpush(key, *serialized_rows)
-        await redis_client.ltrim(key, -CANDLE_KEEP, -1)
-        await redis_client.expire(key, LIST_TTL_SECONDS)
-        await redis_client.setex(current_key, CURRENT_TTL_SECONDS, serialized_rows[-1])
-
-    print(f"[OK] {symbol}: replayed {len(serialized_rows)} rows")
+    asset_type = rows[-1].get("asset_type")
+    candles = ohlcv.dedup(
+        ohlcv.from_columns(
+            (_int_or_default(row.get("bucket_start")) for row in rows),
+            (float(row.get("open") or 0) for row in rows),
+            (float(row.get("high") or 0) for row in rows),
+            (float(row.get("low") or 0) for row in rows),
+            (float(row.get("close") or 0) for row in rows),
+            # 누적 카운터 차분 이전에 저장된 문서의 거래량은 부풀려져 있어 버린다.
+            (float(row.get("volume") or 0) if row.get("volume_kind") == "delta" else 0.0 for row in rows),
+        )
+    )
+    if rebuild:
+        offset = ohlcv.KST_DAY_OFFSET_SECONDS if resolution == "1d" and asset_type != "crypto" else 0
+        candles = ohlcv.resample(candles, RESOLUTION_SECONDS[resolution], offset)
+    candles = candles.tail(CANDLE_KEEP)
+
+    packed_rows = candles.rows()
+    bucket_start, open_p, high_p, low_p, close_p, volume_p = packed_rows[-1]
+    last_payload = {
+        "symbol": symbol,
+        "asset_type": asset_type,
+        "bucket_start": bucket_start,
+        "date": datetime.fromtimestamp(bucket_start, tz=KST).isoformat(timespec="seconds"),
+        "open": open_p,
+        "high": high_p,
+        "low": low_p,
+        "close": close_p,
+        "volume": volume_p,
+        "volume_kind": "delta",
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+    # candle_aggregator와 같은 키에 쓰므로 APPEND + 자르기 + TTL을 스크립트 하나로 처리한다
+    keep_chars = CANDLE_KEEP * RECORD_CHARS
+    await redis_client.register_script(APPEND_TRIM_LUA)(
+        keys=[key], args=[encode_candles(packed_rows), keep_chars, keep_chars, LIST_TTL_SECONDS]
+    )
+    await redis_client.setex(current_key, CURRENT_TTL_SECONDS, json.dumps(last_payload))
+
+    print(f"[OK] {symbol}/{resolution}: replayed {len(packed_rows)} rows")
 
 
 async def main():
-    parser = argparse.ArgumentParser(description="Replay Mongo candles_1m to Redis")
+    parser = argparse.ArgumentParser(description="Replay Mongo candles_{resolution} to Redis")
     parser.add_argument(
         "--symbols",
         default="BTC,ETH,SOL,XRP,005930,AAPL,NVDA,TSLA,MSFT",
@@ -102,6 +132,16 @@ async def main():
         default=7,
         help="lookback days from now (default: 7)",
     )
+    parser.add_argument(
+        "--resolutions",
+        default=",".join(RESOLUTIONS),
+        help=f"comma separated resolutions (default: {','.join(RESOLUTIONS)})",
+    )
+    parser.add_argument(
+        "--rebuild-rollups",
+        action="store_true",
+        help="rebuild 5m/15m/1h/1d from candles_1m instead of candles_{resolution}",
+    )
     parser.add_argument(
         "--no-reset",
         action="store_true",
@@ -110,6 +150,7 @@ async def main():
     args = parser.parse_args()
 
     symbols = [_normalize_symbol(s) for s in args.symbols.split(",") if _normalize_symbol(s)]
+    resolutions = [r.strip() for r in args.resolutions.split(",") if r.strip() in RESOLUTIONS]
     lookback = max(1, int(args.days))
     from_bucket = int((datetime.now(timezone.utc) - timedelta(days=lookback)).timestamp())
     from_bucket -= from_bucket % 60
@@ -121,11 +162,24 @@ async def main():
         await mongo_client.admin.command("ping")
         await redis_client.ping()
         db = mongo_client[MONGODB_DB_NAME]
-        col = db["candles_1m"]
 
-        print(f"[INFO] replay start symbols={symbols} days={lookback} reset={not args.no_reset}")
-        for symbol in symbols:
-            await replay_symbol(col, redis_client, symbol, from_bucket, reset=not args.no_reset)
+        print(
+            f"[INFO] replay start symbols={symbols} resolutions={resolutions} "
+            f"days={lookback} reset={not args.no_reset}"
+        )
+        for resolution in resolutions:
+            rebuild = args.rebuild_rollups and resolution != "1m"
+            col = db["candles_1m" if rebuild else f"candles_{resolution}"]
+            for symbol in symbols:
+                await replay_symbol(
+                    col,
+                    redis_client,
+                    symbol,
+                    from_bucket,
+                    reset=not args.no_reset,
+                    resolution=resolution,
+                    rebuild=rebuild,
+                )
         print("[DONE] replay complete")
     finally:
         mongo_client.close()
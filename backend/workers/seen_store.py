@@ -0,0 +1,295 @@
+"""
+============================================
+Seen Store - 수집한 뉴스 링크 중복 방지 저장소
+============================================
+
+producer_news의 SEEN_FILE(JSON 리스트) 대체.
+
+- 조회/기록 모두 O(1), 재시작 후에도 유지, SEEN_TTL_DAYS가 지난 링크는 자동 만료
+- asyncio 크롤러 안에서 쓰므로 모든 조회/기록은 코루틴이다 (이벤트 루프를 막지 않는다).
+- 목록 페이지 하나의 조회, 수집 후보 묶음의 조회+claim은 각각 왕복 한 번으로 처리한다.
+- SEEN_STORE_BACKEND
+  - sqlite: 로컬 파일 (단일 replica 기본값). 쿼리는 asyncio.to_thread, 만료는 주기적 DELETE
+  - redis : ZSET `news:seen:links` (member = 링크 sha1, score = 기록 시각) 하나에 모은다.
+            조회는 ZMSCORE/ZSCORE, 만료는 SEEN_EXPIRE_INTERVAL_SEC마다 ZREMRANGEBYSCORE. 여러 crawler replica가 공유한다.
+            같은 링크를 두 replica가 동시에 가져가지 않도록 claim 시 `news:seen:claim:{hash}` SET NX 락을 잡는다.
+- 흐름: claim_many(links) → 상세 수집 → 성공이면 add(link), 실패면 release(links) → Kafka flush 후 commit()
+  (Kafka 발행 전 프로세스가 죽으면 기록되지 않아 다음 poll에서 다시 수집된다)
+- 예전 SEEN_FILE이 있으면 첫 실행 때 한 번 가져오고 `.migrated`로 이름을 바꾼다.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional, Protocol
+
+SEEN_STORE_BACKEND = os.getenv("SEEN_STORE_BACKEND", "sqlite").strip().lower()
+SEEN_DB_PATH = os.getenv("SEEN_DB_PATH", "/home/kafka/seen_links.sqlite3")
+SEEN_REDIS_URL = os.getenv("SEEN_REDIS_URL") or os.getenv("REDIS_URL", "redis://localhost:6379")
+SEEN_TTL_DAYS = max(1, int(os.getenv("SEEN_TTL_DAYS", "14")))
+# 상세 수집 중인 링크 락 (수집이 이보다 오래 걸리면 다른 replica가 다시 가져갈 수 있다)
+SEEN_CLAIM_TTL_SEC = max(10, int(os.getenv("SEEN_CLAIM_TTL_SEC", "120")))
+SEEN_EXPIRE_INTERVAL_SEC = max(60, int(os.getenv("SEEN_EXPIRE_INTERVAL_SEC", "3600")))
+
+REDIS_KEY_PREFIX = "news:seen:"
+REDIS_SEEN_KEY = f"{REDIS_KEY_PREFIX}links"
+# sqlite IN (...) 바인딩 변수 상한(999) 아래로 나눠 조회한다.
+SQLITE_BATCH = 500
+
+
+def link_digest(link: str) -> str:
+    return hashlib.sha1(link.encode("utf-8")).hexdigest()
+
+
+def _claim_key(digest: str) -> str:
+    return f"{REDIS_KEY_PREFIX}claim:{digest}"
+
+
+class SeenBackend(Protocol):
+    name: str
+
+    async def contains_many(self, links: list[str]) -> list[bool]: ...
+
+    async def claim_many(self, links: list[str]) -> list[bool]: ...
+
+    async def release_many(self, links: Iterable[str]) -> None: ...
+
+    async def mark_many(self, links: Iterable[str]) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class SqliteSeenBackend:
+    name = "sqlite"
+
+    def __init__(self, path: str = SEEN_DB_PATH, ttl_days: int = SEEN_TTL_DAYS):
+        self.ttl_sec = ttl_days * 86400
+        self._lock = threading.Lock()
+        self._claims: set[str] = set()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen_links (link TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_links_seen_at ON seen_links(seen_at)")
+        self._last_expire = 0.0
+        self.expire()
+
+    def _seen(self, links: list[str]) -> set[str]:
+        cutoff = time.time() - self.ttl_sec
+        found: set[str] = set()
+        with self._lock:
+            for i in range(0, len(links), SQLITE_BATCH):
+                chunk = links[i:i + SQLITE_BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT link FROM seen_links WHERE seen_at >= ? AND link IN ({placeholders})",
+                    (cutoff, *chunk),
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    async def contains_many(self, links: list[str]) -> list[bool]:
+        if not links:
+            return []
+        found = await asyncio.to_thread(self._seen, links)
+        return [link in found for link in links]
+
+    async def claim_many(self, links: list[str]) -> list[bool]:
+        # 로컬 파일은 replica 하나만 쓰므로 프로세스 내 중복만 막으면 된다.
+        seen = await self.contains_many(links)
+        claimed = []
+        with self._lock:
+            for link, already in zip(links, seen):
+                ok = not already and link not in self._claims
+                if ok:
+                    self._claims.add(link)
+                claimed.append(ok)
+        return claimed
+
+    async def release_many(self, links: Iterable[str]) -> None:
+        with self._lock:
+            self._claims.difference_update(links)
+
+    def _mark(self, links: Iterable[str]) -> None:
+        now = time.time()
+        rows = [(link, now) for link in links]
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT OR REPLACE INTO seen_links (link, seen_at) VALUES (?, ?)", rows)
+            self.conn.execute("COMMIT")
+            self._claims.difference_update(link for link, _ in rows)
+        if now - self._last_expire > SEEN_EXPIRE_INTERVAL_SEC:
+            self.expire()
+
+    async def mark_many(self, links: Iterable[str]) -> None:
+        await asyncio.to_thread(self._mark, list(links))
+
+    def expire(self) -> int:
+        self._last_expire = time.time()
+        with self._lock:
+            cur = self.conn.execute("DELETE FROM seen_links WHERE seen_at < ?", (time.time() - self.ttl_sec,))
+        return cur.rowcount
+
+    async def close(self) -> None:
+        self.conn.close()
+
+
+class RedisSeenBackend:
+    name = "redis"
+
+    def __init__(self, url: str = SEEN_REDIS_URL, ttl_days: int = SEEN_TTL_DAYS):
+        import redis.asyncio as redis  # type: ignore
+
+        self.ttl_sec = ttl_days * 86400
+        self.client = redis.Redis.from_url(url, decode_responses=True, socket_timeout=2.0)
+        self.token = f"{os.getenv('HOSTNAME', 'local')}:{os.getpid()}"
+        self._last_expire = 0.0
+
+    async def connect(self) -> None:
+        await self.client.ping()
+        await self.expire()
+
+    def _is_seen(self, score: Optional[float], cutoff: float) -> bool:
+        # 만료 주기 사이에는 지난 member가 남아 있을 수 있어 score로 한 번 더 거른다.
+        return score is not None and float(score) >= cutoff
+
+    async def contains_many(self, links: list[str]) -> list[bool]:
+        if not links:
+            return []
+        scores = await self.client.zmscore(REDIS_SEEN_KEY, [link_digest(link) for link in links])
+        cutoff = time.time() - self.ttl_sec
+        return [self._is_seen(score, cutoff) for score in scores]
+
+    async def claim_many(self, links: list[str]) -> list[bool]:
+        """본 적 없는 링크만 claim한다. 조회와 SET NX를 파이프라인 한 번으로 보낸다."""
+        if not links:
+            return []
+        digests = [link_digest(link) for link in links]
+        pipe = self.client.pipeline(transaction=False)
+        for digest in digests:
+            pipe.zscore(REDIS_SEEN_KEY, digest)
+            pipe.set(_claim_key(digest), self.token, nx=True, ex=SEEN_CLAIM_TTL_SEC)
+        results = await pipe.execute()
+
+        cutoff = time.time() - self.ttl_sec
+        claimed: list[bool] = []
+        stale_claims: list[str] = []
+        for digest, score, acquired in zip(digests, results[0::2], results[1::2]):
+            seen = self._is_seen(score, cutoff)
+            if seen and acquired:
+                stale_claims.append(_claim_key(digest))
+            claimed.append(bool(acquired) and not seen)
+        if stale_claims:
+            await self.client.delete(*stale_claims)
+        return claimed
+
+    async def release_many(self, links: Iterable[str]) -> None:
+        keys = [_claim_key(link_digest(link)) for link in links]
+        if keys:
+            await self.client.delete(*keys)
+
+    async def mark_many(self, links: Iterable[str]) -> None:
+        digests = [link_digest(link) for link in links]
+        if not digests:
+            return
+        now = time.time()
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zadd(REDIS_SEEN_KEY, {digest: now for digest in digests})
+        pipe.delete(*(_claim_key(digest) for digest in digests))
+        await pipe.execute()
+        if now - self._last_expire > SEEN_EXPIRE_INTERVAL_SEC:
+            await self.expire()
+
+    async def expire(self) -> int:
+        self._last_expire = time.time()
+        return await self.client.zremrangebyscore(REDIS_SEEN_KEY, "-inf", f"({time.time() - self.ttl_sec}")
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class SeenLinks:
+    """
+    producer_news의 `seen_links` set 자리를 대신한다.
+    조회는 이번 실행에서 수집한 링크 + 저장소를 본다. add()는 commit() 때 저장소에 반영된다.
+    """
+
+    def __init__(self, backend: SeenBackend):
+        self.backend = backend
+        self._claimed: set[str] = set()
+        self._pending: set[str] = set()
+
+    async def contains_all(self, links: list[str]) -> bool:
+        rest = [link for link in links if link not in self._pending]
+        if not rest:
+            return True
+        return all(await self.backend.contains_many(rest))
+
+    async def claim_many(self, links: list[str]) -> list[str]:
+        """이미 본 링크와 다른 작업(replica)이 수집 중인 링크를 빼고 claim한 링크를 입력 순서대로 돌려준다."""
+        candidates = [link for link in dict.fromkeys(links) if link not in self._pending]
+        if not candidates:
+            return []
+        results = await self.backend.claim_many(candidates)
+        claimed = [link for link, ok in zip(candidates, results) if ok]
+        self._claimed.update(claimed)
+        return claimed
+
+    def add(self, link: str) -> None:
+        self._pending.add(link)
+
+    async def release(self, links: Iterable[str]) -> None:
+        links = list(links)
+        if not links:
+            return
+        self._claimed.difference_update(links)
+        await self.backend.release_many(links)
+
+    async def commit(self) -> int:
+        """add()된 링크를 저장소에 기록하고 남은 claim은 푼다."""
+        pending, self._pending = self._pending, set()
+        if pending:
+            await self.backend.mark_many(pending)
+        leftover, self._claimed = self._claimed - pending, set()
+        if leftover:
+            await self.backend.release_many(leftover)
+        return len(pending)
+
+    async def abort(self) -> None:
+        """발행 실패 시 이번 실행의 claim을 모두 풀어 다음 poll에서 다시 수집하게 한다."""
+        claimed, self._claimed, self._pending = self._claimed, set(), set()
+        if claimed:
+            await self.backend.release_many(claimed)
+
+
+async def migrate_legacy_file(backend: SeenBackend, path: Optional[str]) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return 0
+    links = [link for link in data if isinstance(link, str)] if isinstance(data, list) else []
+    if links:
+        await backend.mark_many(links)
+    try:
+        os.replace(path, path + ".migrated")
+    except OSError:
+        pass
+    return len(links)
+
+
+async def open_seen_store(legacy_file: Optional[str] = None) -> SeenLinks:
+    if SEEN_STORE_BACKEND == "redis":
+        redis_backend = RedisSeenBackend()
+        await redis_backend.connect()
+        backend: SeenBackend = redis_backend
+    else:
+        backend = SqliteSeenBackend()
+    migrated = await migrate_legacy_file(backend, legacy_file)
+    print(f"[seen] backend={backend.name} ttl_days={SEEN_TTL_DAYS} migrated={migrated}")
+    return SeenLinks(backend)
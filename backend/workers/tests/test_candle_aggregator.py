@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+WORKERS_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(WORKERS_ROOT))
+
+from candle_aggregator import (  # noqa: E402
+    CLOSE_GRACE_SECONDS,
+    MAX_TICK_AGE_SECONDS_CRYPTO,
+    CandleAggregator,
+)
+
+
+def _tick(symbol: str, price: float, ts: float) -> dict:
+    return {
+        "symbol": symbol,
+        "asset_type": "crypto",
+        "price": price,
+        "timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+    }
+
+
+def _finalized(aggregator: CandleAggregator, symbol: str) -> list:
+    return [s for s in aggregator.pending_redis if s.symbol == symbol and s.resolution == "1m"]
+
+
+def test_lagged_feed_keeps_every_tick_of_the_minute() -> None:
+    lag = 90
+    now = time.time()
+    minute = int(now - lag) - int(now - lag) % 60
+    aggregator = CandleAggregator()
+
+    # 틱 하나마다 flush 루프처럼 close_expired를 벽시계로 호출한다. 체결시각은 90초 밀려 있다.
+    prices = [100.0 + (offset % 7) for offset in range(60)]
+    prices[30] = 150.0
+    prices[45] = 50.0
+    for offset, price in enumerate(prices):
+        aggregator.process_tick(_tick("BTC", price, minute + offset))
+        aggregator.close_expired(time.time())
+
+    assert _finalized(aggregator, "BTC") == []
+    current = aggregator.states["BTC"]
+    assert current.bucket_start == minute
+    assert (current.high, current.low, current.close) == (150.0, 50.0, prices[-1])
+
+    # 다음 분 틱이 도착해야 확정된다.
+    aggregator.process_tick(_tick("BTC", 101.0, minute + 60))
+    aggregator.close_expired(time.time())
+    closed = _finalized(aggregator, "BTC")
+    assert len(closed) == 1
+    assert closed[0].bucket_start == minute
+    assert (closed[0].open, closed[0].high, closed[0].low, closed[0].close) == (
+        prices[0], 150.0, 50.0, prices[-1]
+    )
+    assert aggregator.states["BTC"].bucket_start == minute + 60
+
+
+def test_illiquid_symbol_closes_on_feed_watermark() -> None:
+    # 워터마크는 현재 시각을 넘지 않으므로 구간 끝 + 유예가 이미 지난 분을 쓴다.
+    lag = 90
+    now = time.time()
+    minute = int(now - lag) - int(now - lag) % 60
+    aggregator = CandleAggregator()
+
+    aggregator.process_tick(_tick("XRP", 1.0, minute + 5))
+    for offset in range(0, 60, 5):
+        aggregator.process_tick(_tick("BTC", 100.0, minute + offset))
+    aggregator.process_tick(_tick("BTC", 101.0, minute + 60))
+    aggregator.close_expired(time.time())
+    assert _finalized(aggregator, "XRP") == []
+
+    # XRP에는 새 틱이 없어도 다른 심볼 틱으로 피드 워터마크가 구간 끝 + 유예를 넘으면 확정된다.
+    aggregator.process_tick(_tick("BTC", 102.0, minute + 60 + CLOSE_GRACE_SECONDS))
+    aggregator.close_expired(time.time())
+    closed = _finalized(aggregator, "XRP")
+    assert [c.bucket_start for c in closed] == [minute]
+    assert "XRP" not in aggregator.states
+
+
+def test_stalled_feed_closes_on_wall_clock_after_max_tick_age() -> None:
+    now = time.time()
+    aggregator = CandleAggregator()
+    aggregator.process_tick(_tick("XRP", 1.0, now))
+    bucket_start = aggregator.states["XRP"].bucket_start
+
+    aggregator.close_expired(bucket_start + 60 + CLOSE_GRACE_SECONDS)
+    assert _finalized(aggregator, "XRP") == []
+
+    aggregator.close_expired(now + MAX_TICK_AGE_SECONDS_CRYPTO + 1)
+    closed = _finalized(aggregator, "XRP")
+    assert [c.bucket_start for c in closed] == [bucket_start]
+    assert "XRP" not in aggregator.states
+
+
+def test_volume_is_delta_of_cumulative_counter() -> None:
+    now = time.time()
+    minute = int(now) - int(now) % 60
+    aggregator = CandleAggregator()
+
+    for offset, acc_volume in enumerate([1000.0, 1004.0, 1010.0]):
+        message = _tick("ETH", 100.0, minute + offset)
+        message["acc_volume"] = acc_volume
+        aggregator.process_tick(message)
+    # 누적값이 없는 틱은 거래량을 더하지 않는다 (예전 틱 수 fallback 제거).
+    aggregator.process_tick(_tick("ETH", 101.0, minute + 3))
+
+    state = aggregator.states["ETH"]
+    assert state.volume == 10.0
+    assert state.to_payload()["volume_kind"] == "delta"
+
+    # 같은 날 카운터가 줄면 기준만 다시 잡는다.
+    message = _tick("ETH", 100.0, minute + 4)
+    message["acc_volume"] = 5.0
+    aggregator.process_tick(message)
+    assert aggregator.states["ETH"].volume == 10.0
+
+
+def test_volume_counter_reset_on_new_day() -> None:
+    aggregator = CandleAggregator()
+    aggregator.acc_volumes["SOL"] = (0, 50_000.0)
+    now = time.time()
+    message = _tick("SOL", 10.0, now)
+    message["acc_volume"] = 12.0
+    aggregator.process_tick(message)
+    assert aggregator.states["SOL"].volume == 12.0